@@ -0,0 +1,44 @@
+import argparse
+import random
+from rich.console import Console
+from rich.table import Table
+from n8n_factory.control_plane import simulate_batch_controller
+
+console = Console()
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic load through the adaptive batch size controller.")
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--initial-size", type=int, default=5)
+    parser.add_argument("--overhead-ms", type=float, default=200, help="Fixed cost per batch")
+    parser.add_argument("--per-item-ms", type=float, default=90, help="Cost per item in a batch")
+    parser.add_argument("--noise", type=float, default=0.1, help="Lognormal sigma applied to each latency")
+    parser.add_argument("--target", type=float, default=5000, help="p95 latency target (ms)")
+    parser.add_argument("--window", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    def latency(size: int) -> float:
+        return (args.overhead_ms + args.per_item_ms * size) * rng.lognormvariate(0, args.noise)
+
+    config = {"target_latency_ms": args.target, "window_size": args.window}
+    trajectory = simulate_batch_controller(latency, jobs=args.jobs, initial_size=args.initial_size, config=config)
+
+    table = Table(title=f"Batch controller (target p95 {args.target:.0f}ms)")
+    table.add_column("Job", style="dim")
+    table.add_column("Batch Size", style="cyan")
+    table.add_column("p50 (ms)", style="green")
+    table.add_column("p95 (ms)", style="magenta")
+    for point in trajectory:
+        table.add_row(str(point["job"]), str(point["batch_size"]), f"{point['p50']:.0f}", f"{point['p95']:.0f}")
+    console.print(table)
+
+    tail = trajectory[len(trajectory) // 2:]
+    if tail:
+        avg_p95 = sum(p["p95"] for p in tail) / len(tail)
+        sizes = [p["batch_size"] for p in tail]
+        console.print(f"Second half: p95 avg [bold]{avg_p95:.0f}ms[/bold], batch size {min(sizes)}-{max(sizes)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import ast
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Set
+
+# Recipe assertions are Python expressions limited to a small, side-effect free
+# subset: literals, names, comparisons, boolean/arithmetic operators,
+# subscripts, comprehensions and calls to the helpers below. The AST is
+# checked once and compiled once; evaluation then never sees builtins.
+
+HELPERS = {
+    "len": len, "all": all, "any": any, "sum": sum, "min": min, "max": max,
+    "abs": abs, "round": round, "sorted": sorted,
+    "str": str, "int": int, "float": float, "bool": bool, "set": set, "list": list,
+}
+# Names bound by the simulator when an assertion runs
+CONTEXT_NAMES = {"output", "json", "input", "history", "steps"}
+# Read-only methods that may be called on values
+METHODS = {"get", "keys", "values", "items", "count", "index", "startswith", "endswith",
+           "lower", "upper", "strip", "split"}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Compare, ast.IfExp,
+    ast.Constant, ast.Name, ast.Load, ast.Store, ast.Subscript, ast.Slice,
+    ast.Tuple, ast.List, ast.Dict, ast.Set, ast.Call, ast.Attribute,
+    ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp, ast.comprehension,
+    ast.And, ast.Or, ast.Not, ast.USub, ast.UAdd,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn, ast.Is, ast.IsNot,
+)
+
+
+class AssertionSyntaxError(ValueError):
+    """An assertion that doesn't parse or uses something outside the allowed subset."""
+
+
+class CompiledAssertion:
+    """
+    One validated assertion. `steps` lists the step ids it reads through
+    steps["<id>"]; `final` is True when it needs the end of the run (it reads
+    output/json/input/history or indexes steps dynamically).
+    """
+
+    def __init__(self, source: str, code, steps: Set[str], final: bool):
+        self.source = source
+        self.code = code
+        self.steps = steps
+        self.final = final
+
+    def evaluate(self, context: Dict[str, Any]) -> Any:
+        # One globals dict, so comprehensions see the helpers and context too
+        scope = dict(HELPERS)
+        scope.update(context)
+        scope["__builtins__"] = {}
+        return eval(self.code, scope)
+
+
+def _validate(tree: ast.AST, source: str) -> CompiledAssertion:
+    bound: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.comprehension):
+            bound.update(n.id for n in ast.walk(node.target) if isinstance(n, ast.Name))
+
+    steps: Set[str] = set()
+    final = False
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise AssertionSyntaxError(f"'{type(node).__name__}' is not allowed in assertions")
+        if isinstance(node, ast.Name):
+            if node.id not in HELPERS and node.id not in CONTEXT_NAMES and node.id not in bound:
+                raise AssertionSyntaxError(f"Unknown name '{node.id}'")
+            if node.id in CONTEXT_NAMES - {"steps"}:
+                final = True
+        elif isinstance(node, ast.Attribute):
+            if node.attr.startswith("_") or node.attr not in METHODS:
+                raise AssertionSyntaxError(f"Attribute '{node.attr}' is not allowed")
+        elif isinstance(node, ast.Call):
+            func = node.func
+            if not (isinstance(func, ast.Name) and func.id in HELPERS or isinstance(func, ast.Attribute)):
+                raise AssertionSyntaxError("Only helper functions and read-only methods can be called")
+        elif isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == "steps":
+            if isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str):
+                steps.add(node.slice.value)
+            else:
+                final = True
+    # `steps` used other than as steps["<id>"] (e.g. iterated) also needs the full run
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id == "steps":
+            parents = [p for p in ast.walk(tree) if isinstance(p, ast.Subscript) and p.value is node]
+            if not parents:
+                final = True
+    return CompiledAssertion(source, compile(tree, "<assertion>", "eval"), steps, final)
+
+
+@lru_cache(maxsize=1024)
+def compile_assertion(source: str) -> CompiledAssertion:
+    """Parses, validates and compiles an assertion. Raises AssertionSyntaxError."""
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise AssertionSyntaxError(f"Invalid syntax: {e.msg}")
+    return _validate(tree, source)
+
+
+class AssertionSuite:
+    """
+    The assertions of one recipe, compiled up front. Step assertions
+    (RecipeStep.assertions) run right after their step; recipe assertions
+    that only read steps["<id>"] run as soon as those steps have run, the
+    rest at the end.
+    """
+
+    def __init__(self, recipe):
+        self.results: List[Dict[str, Any]] = []
+        self.by_step: Dict[str, List[CompiledAssertion]] = {}
+        self.pending: List[CompiledAssertion] = []
+        self.final: List[CompiledAssertion] = []
+        self.failed = False
+        for step in recipe.steps:
+            for source in step.assertions:
+                compiled = self._compile(source)
+                if compiled:
+                    self.by_step.setdefault(step.id, []).append(compiled)
+        for source in recipe.assertions:
+            compiled = self._compile(source)
+            if compiled is None:
+                continue
+            (self.final if compiled.final or not compiled.steps else self.pending).append(compiled)
+
+    def _compile(self, source: str) -> Optional[CompiledAssertion]:
+        try:
+            return compile_assertion(source)
+        except AssertionSyntaxError as e:
+            self._record(source, "error", str(e))
+            return None
+
+    def _record(self, source: str, status: str, error: Optional[str] = None):
+        result = {"assertion": source, "status": status}
+        if error is not None:
+            result["error"] = error
+        self.results.append(result)
+        if status != "pass":
+            self.failed = True
+
+    def run(self, assertions: List[CompiledAssertion], context: Dict[str, Any], logger, scope: str = "") -> bool:
+        """Evaluates assertions, logging [PASS]/[FAIL]/[ERROR]. Returns False if any did not pass."""
+        ok = True
+        for assertion in assertions:
+            label = f"{assertion.source}{scope}"
+            try:
+                if assertion.evaluate(context):
+                    logger.info(f"  [PASS] {label}")
+                    self._record(assertion.source, "pass")
+                else:
+                    logger.error(f"  [FAIL] {label}")
+                    self._record(assertion.source, "fail")
+                    ok = False
+            except Exception as e:
+                logger.error(f"  [ERROR] {label}: {e}")
+                self._record(assertion.source, "error", str(e))
+                ok = False
+        return ok
+
+    def for_step(self, step_id: str) -> List[CompiledAssertion]:
+        """Removes and returns the assertions attached to a step."""
+        return self.by_step.pop(step_id, [])
+
+    def ready(self, executed: Set[str]) -> List[CompiledAssertion]:
+        """Removes and returns the recipe assertions whose steps have all run."""
+        ready = [a for a in self.pending if a.steps <= executed]
+        self.pending = [a for a in self.pending if a not in ready]
+        return ready
+
+    def take_final(self) -> List[CompiledAssertion]:
+        """Removes and returns everything left to run at the end of a simulation."""
+        remaining = self.pending + self.final
+        self.pending = []
+        self.final = []
+        return remaining
+
+    def skip_remaining(self):
+        """Marks assertions that never ran (unreached steps, or an early stop) as skipped."""
+        for assertions in [self.pending, self.final] + list(self.by_step.values()):
+            for assertion in assertions:
+                self.results.append({"assertion": assertion.source, "status": "skipped"})
+        self.pending = []
+        self.final = []
+        self.by_step = {}
+
+
+class StepOutputs(Mapping):
+    """steps["<id>"] for assertions: a step's output items, built only when read."""
+
+    def __init__(self, loaders: Dict[str, Callable[[], List[Dict[str, Any]]]]):
+        self._loaders = loaders
+        self._cache: Dict[str, List[Dict[str, Any]]] = {}
+
+    def __getitem__(self, step_id: str) -> List[Dict[str, Any]]:
+        if step_id not in self._cache:
+            self._cache[step_id] = self._loaders[step_id]()
+        return self._cache[step_id]
+
+    def __iter__(self):
+        return iter(self._loaders)
+
+    def __len__(self) -> int:
+        return len(self._loaders)
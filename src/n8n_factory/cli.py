@@ -10,6 +10,8 @@ from deepdiff import DeepDiff
 from .models import Recipe
 from .assembler import WorkflowAssembler
 from .simulator import WorkflowSimulator
+from .latency import LatencyEstimator
+from .sinks import CsvSink, HtmlReportSink, JsonlSink
 from .optimizer import WorkflowOptimizer
 from .normalizer import WorkflowNormalizer
 from .hardener import WorkflowHardener
@@ -53,11 +55,17 @@ from .commands.security import security_command
 from .commands.health import health_command
 from .commands.project import project_init_command
 from .commands.telemetry_cmd import telemetry_export_command
+from .commands.analytics import analytics_command
+from .commands.simulate_matrix import simulate_matrix_command
+from .commands.simulate_load import simulate_load_command
+from .js_runtime import JsRuntimePool
+from .sim_cache import DEFAULT_CACHE_DIR, SimulationCache
+from .commands.latency import latency_report
 from .logger import logger, setup_logger
 from .utils import load_recipe
 from .commands.ai import ask_command, list_models_command, optimize_prompt_command
 from .commands.ops import ops_monitor_command
-from .commands.schedule import schedule_worker_command, schedule_add_command, schedule_list_command, schedule_clear_command, schedule_run_command, schedule_reset_cursors_command, schedule_control_batch, schedule_control_gate
+from .commands.schedule import schedule_worker_command, schedule_add_command, schedule_list_command, schedule_clear_command, schedule_run_command, schedule_reset_cursors_command, schedule_control_batch, schedule_control_gate, schedule_control_limit, schedule_cluster_status, schedule_control_cron
 
 console = Console()
 
@@ -88,8 +96,23 @@ def main():
 
     # Simulate
     sim_p = subparsers.add_parser("simulate")
-    sim_p.add_argument("recipe"); sim_p.add_argument("--export-json"); sim_p.add_argument("--export-html"); sim_p.add_argument("--steps", type=int, default=100); sim_p.add_argument("--env"); sim_p.add_argument("--interactive", action="store_true"); sim_p.add_argument("--step", action="store_true")
-    sim_p.add_argument("--export-csv")
+    sim_p.add_argument("recipe", nargs="?"); sim_p.add_argument("--export-json"); sim_p.add_argument("--export-html"); sim_p.add_argument("--steps", type=int, default=100); sim_p.add_argument("--env"); sim_p.add_argument("--interactive", action="store_true"); sim_p.add_argument("--step", action="store_true")
+    sim_p.add_argument("--export-csv"); sim_p.add_argument("--export-jsonl", help="Stream one JSON line per step")
+    sim_p.add_argument("--matrix", metavar="RECIPES_DIR", help="Simulate every recipe in a directory against every fixture")
+    sim_p.add_argument("--fixtures", help="Glob of fixture JSON files for --matrix"); sim_p.add_argument("--workers", type=int, help="Worker processes for --matrix (default: CPU count)")
+    sim_p.add_argument("--junit", help="Write a JUnit XML report (--matrix)"); sim_p.add_argument("--json", action="store_true")
+    sim_p.add_argument("--latency", action="store_true", help="Estimate end-to-end latency in virtual time from mock_latency")
+    sim_p.add_argument("--runs", type=int, default=1000); sim_p.add_argument("--seed", type=int, default=0); sim_p.add_argument("--concurrency", type=int, default=1)
+    sim_p.add_argument("--latency-history", help="Job log to fit {dist: empirical, workflow: ...} latencies from (default: logs/jobs.jsonl)")
+    sim_p.add_argument("--run-code", action="store_true", help="Run Code steps' jsCode in sandboxed node workers instead of passing items through")
+    sim_p.add_argument("--js-workers", type=int, default=2); sim_p.add_argument("--js-timeout", type=int, default=1000, help="Per-call time limit in ms")
+    sim_p.add_argument("--js-memory", type=int, default=128, help="Heap limit per worker in MB"); sim_p.add_argument("--templates", "-t", default=default_templates)
+    sim_p.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_DIR, metavar="DIR", help=f"Reuse step outputs until the first changed step (default dir: {DEFAULT_CACHE_DIR})")
+    sim_p.add_argument("--clear-cache", action="store_true", help="Empty the --cache directory first")
+    sim_p.add_argument("--load", type=int, metavar="N", help="Stream N synthetic items through the recipe and report per-step throughput and memory")
+    sim_p.add_argument("--schema", help="JSON schema of the synthetic items (--load)"); sim_p.add_argument("--samples", help="JSON/JSONL payloads to resample items from (--load)")
+    sim_p.add_argument("--chunk-size", type=int, default=1000); sim_p.add_argument("--load-step", help="Step fed with the items (default: first root step)")
+    sim_p.add_argument("--no-memory", action="store_true", help="Skip memory tracking in --load (faster, throughput only)")
 
     # Optimize
     opt_p = subparsers.add_parser("optimize")
@@ -160,6 +183,9 @@ def main():
     q_add.add_argument("workflow"); q_add.add_argument("--mode", default="id", choices=["id", "file"]); q_add.add_argument("--data", default="{}")
     q_add.add_argument("--meta", default="{}")
     q_add.add_argument("--delay", type=int, default=0, help="Delay in ms")
+    q_add.add_argument("--idempotency-key", help="Reject the job if this key was enqueued within the dedup window")
+    q_add.add_argument("--dedup", action="store_true", help="Derive an idempotency key from workflow, data and meta")
+    q_add.add_argument("--dedup-window", type=int, help="Dedup window in seconds (default: 3600)")
     
     q_run = queue_subs.add_parser("run")
     q_run.add_argument("--concurrency", "-c", type=int, default=5)
@@ -167,6 +193,12 @@ def main():
     q_run.add_argument("--broker-port", type=int, help="Override broker port")
     q_run.add_argument("--refill-cmd", help="Command to execute when queue is low")
     q_run.add_argument("--refill-threshold", type=int, default=5, help="Queue size threshold for refill")
+    q_run.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port at /metrics")
+    q_run.add_argument("--cluster", action="store_true", help="Coordinate with other instances (leader election, shared slots)")
+    q_run.add_argument("--instance-id", help="Instance id in cluster mode (default: host:pid:random)")
+    q_run.add_argument("--runner", choices=["cli", "webhook"], default="cli", help="How jobs are started: `n8n execute` or a pooled webhook call")
+    q_run.add_argument("--webhook-url", help="Webhook base URL for --runner webhook (default: N8N_WEBHOOK_URL)")
+    q_run.add_argument("--dispatch-threads", type=int, default=0, help="Run jobs in a background pool of this size (0 = inline)")
 
     q_list = queue_subs.add_parser("list")
     q_list.add_argument("--limit", type=int, default=20); q_list.add_argument("--json", action="store_true")
@@ -180,12 +212,41 @@ def main():
     q_batch.add_argument("action", choices=["get", "set"])
     q_batch.add_argument("key", nargs="?")
     q_batch.add_argument("value", nargs="?")
+    q_batch.add_argument("--workflow", "-w", help="Batch group (workflow id or meta.batch_group)")
 
     q_gate = queue_subs.add_parser("gate")
-    q_gate.add_argument("action", choices=["get", "set"])
-    q_gate.add_argument("phase")
-    q_gate.add_argument("--dependency")
-    q_gate.add_argument("--condition", default="complete")
+    q_gate.add_argument("action", choices=["get", "set", "del", "waiting", "graph"])
+    q_gate.add_argument("phase", nargs="?")
+    q_gate.add_argument("--dependency", action="append", help="Dependency phase, repeatable; 'phase:condition' overrides --condition")
+    q_gate.add_argument("--condition", default="complete", help="'complete' or 'progress>=0.8'")
+    q_gate.add_argument("--run", help="Run id for graph durations and progress")
+    q_gate.add_argument("--json", action="store_true")
+
+    q_cluster = queue_subs.add_parser("cluster", help="Leader and shared slot usage in cluster mode")
+    q_cluster.add_argument("--json", action="store_true")
+
+    q_limit = queue_subs.add_parser("limit", help="Token-bucket rate limits per workflow or meta key")
+    q_limit.add_argument("action", choices=["get", "set", "del"])
+    q_limit.add_argument("scope", nargs="?", help="workflow:<id>, meta:<key>=<value> or meta:<key>")
+    q_limit.add_argument("--rate", type=float, help="Jobs allowed per --per seconds")
+    q_limit.add_argument("--per", type=float, default=1.0, help="Period in seconds for --rate")
+    q_limit.add_argument("--burst", type=int, help="Bucket capacity (max jobs in a burst)")
+    q_limit.add_argument("--json", action="store_true")
+
+    q_cron = queue_subs.add_parser("cron", help="Recurring jobs from cron expressions")
+    q_cron.add_argument("action", choices=["add", "list", "del", "next"])
+    q_cron.add_argument("name", nargs="?")
+    q_cron.add_argument("--cron", help="Cron expression, e.g. '*/15 * * * *' or @daily")
+    q_cron.add_argument("--workflow", "-w", help="Workflow id (or file path with --mode file)")
+    q_cron.add_argument("--mode", default="id", choices=["id", "file"])
+    q_cron.add_argument("--data", default="{}")
+    q_cron.add_argument("--meta", default="{}")
+    q_cron.add_argument("--jitter", type=int, default=0, help="Delay each run by up to this many seconds")
+    q_cron.add_argument("--missed", choices=["skip", "catchup"], default="skip", help="What to do with runs missed while no scheduler was up")
+    q_cron.add_argument("--horizon", type=int, default=10, help="Runs to materialise ahead")
+    q_cron.add_argument("--tz", default="UTC", help="Time zone of the cron expression")
+    q_cron.add_argument("--count", type=int, default=5, help="Run times shown by 'next'")
+    q_cron.add_argument("--json", action="store_true")
 
     # List
     list_p = subparsers.add_parser("list")
@@ -254,6 +315,8 @@ def main():
 
     watch_p = subparsers.add_parser("watch")
     watch_p.add_argument("recipe"); watch_p.add_argument("--templates", "-t", default=default_templates)
+    watch_p.add_argument("--simulate", action="store_true", help="Also re-simulate on change, resuming from the first changed step")
+    watch_p.add_argument("--cache", default=DEFAULT_CACHE_DIR, help="Simulation cache directory for --simulate")
 
     insp_p = subparsers.add_parser("inspect")
     insp_p.add_argument("template"); insp_p.add_argument("--templates", "-t", default=default_templates)
@@ -316,6 +379,15 @@ def main():
     stats_p.add_argument("recipe")
     stats_p.add_argument("--json", action="store_true")
 
+    # Analytics (scheduler job history)
+    analytics_p = subparsers.add_parser("analytics", help="Throughput, p95 and failures per workflow from job history")
+    analytics_p.add_argument("--since", help="Epoch, ISO date, or age such as 24h / 7d")
+    analytics_p.add_argument("--until", help="Epoch, ISO date, or age such as 1h")
+    analytics_p.add_argument("--workflow", "-w")
+    analytics_p.add_argument("--log-path", help="Active job log (default: N8N_FACTORY_LOG_PATH or logs/jobs.jsonl)")
+    analytics_p.add_argument("--compact", action="store_true", help="Seal the active log into a segment first")
+    analytics_p.add_argument("--json", action="store_true")
+
     # Creds
     creds_p = subparsers.add_parser("creds")
     creds_p.add_argument("--scaffold", action="store_true")
@@ -554,19 +626,58 @@ def main():
         # I will include them.
 
         elif args.command == "simulate":
+            if args.matrix:
+                ok = simulate_matrix_command(args.matrix, fixtures=args.fixtures, workers=args.workers, max_steps=args.steps,
+                                             env=args.env, report_json=args.export_json, junit=args.junit, json_output=args.json)
+                sys.exit(0 if ok else 1)
+            if not args.recipe:
+                sim_p.error("a recipe is required unless --matrix is given")
             recipe = load_recipe(args.recipe, env_name=args.env)
-            simulator = WorkflowSimulator()
-            history = simulator.simulate(recipe, max_steps=args.steps, interactive=args.interactive, step_mode=args.step)
+            if args.load:
+                simulate_load_command(recipe, args.load, schema_path=args.schema, samples_path=args.samples,
+                                      chunk_size=args.chunk_size, seed=args.seed, step_id=args.load_step,
+                                      track_memory=not args.no_memory, max_steps=args.steps, json_output=args.json)
+                return
+            latency_models = None
+            if args.latency:
+                # Checked up front, so a bad mock_latency fails before the simulation runs
+                try:
+                    latency_models = LatencyEstimator.models_for(recipe, args.latency_history)
+                except ValueError as e:
+                    console.print(f"[bold red]Error:[/bold red] {e}")
+                    sys.exit(1)
+            js_runtime = None
+            if args.run_code:
+                if not JsRuntimePool.available():
+                    console.print("[yellow]Node.js not found; Code steps will pass items through.[/yellow]")
+                else:
+                    js_runtime = JsRuntimePool(size=args.js_workers, timeout_ms=args.js_timeout, memory_mb=args.js_memory)
+            cache = None
+            if args.cache:
+                cache = SimulationCache(args.cache)
+                if args.clear_cache:
+                    cache.clear()
+            simulator = WorkflowSimulator(js_runtime=js_runtime, templates_dir=args.templates if js_runtime else None, cache=cache)
+            # Reports are streamed step by step while the simulation runs
+            exports = [(args.export_jsonl, JsonlSink, "JSONL history"), (args.export_html, HtmlReportSink, "HTML Report"),
+                       (args.export_csv, CsvSink, "CSV Report")]
+            sinks = [sink_cls(path) for path, sink_cls, _ in exports if path]
+            try:
+                history = simulator.simulate(recipe, max_steps=args.steps, interactive=args.interactive, step_mode=args.step, sinks=sinks)
+            finally:
+                if js_runtime:
+                    js_runtime.close()
             if args.export_json:
                 with open(args.export_json, 'w', encoding='utf-8') as f:
                     json.dump(history, f, indent=2)
                 console.print(f"[bold blue]Simulation history exported to:[/bold blue] {args.export_json}")
-            if args.export_html:
-                 simulator.generate_html_report(history, args.export_html)
-                 console.print(f"[bold blue]HTML Report exported to:[/bold blue] {args.export_html}")
-            if args.export_csv:
-                 simulator.export_csv(history, args.export_csv)
-                 console.print(f"[bold blue]CSV Report exported to:[/bold blue] {args.export_csv}")
+            for path, _, label in exports:
+                if path:
+                    console.print(f"[bold blue]{label} exported to:[/bold blue] {path}")
+            if args.latency:
+                report = simulator.estimate_latency(recipe, runs=args.runs, seed=args.seed, concurrency=args.concurrency,
+                                                    history_path=args.latency_history, models=latency_models)
+                latency_report(report, json_output=args.json)
 
         elif args.command == "publish":
             with console.status("[bold blue]Publishing...") as status:
@@ -697,14 +808,21 @@ def main():
         
         elif args.command == "queue":
             if args.queue_command == "add":
-                schedule_add_command(args.workflow, args.mode, args.data, args.meta, args.delay)
+                schedule_add_command(args.workflow, args.mode, args.data, args.meta, args.delay,
+                                     idempotency_key=args.idempotency_key, dedup=args.dedup, dedup_window=args.dedup_window)
             elif args.queue_command == "run":
                 schedule_run_command(
                     concurrency=args.concurrency, 
                     poll=args.poll, 
                     broker_port=args.broker_port,
                     refill_cmd=args.refill_cmd,
-                    refill_threshold=args.refill_threshold
+                    refill_threshold=args.refill_threshold,
+                    metrics_port=args.metrics_port,
+                    cluster=args.cluster,
+                    instance_id=args.instance_id,
+                    runner=args.runner,
+                    webhook_url=args.webhook_url,
+                    dispatch_threads=args.dispatch_threads
                 )
             elif args.queue_command == "list":
                 schedule_list_command(args.limit, args.json)
@@ -713,11 +831,19 @@ def main():
             elif args.queue_command == "reset-cursors":
                 schedule_reset_cursors_command(args.run_id)
             elif args.queue_command == "batch":
-                schedule_control_batch(args.action, args.key, args.value)
+                schedule_control_batch(args.action, args.key, args.value, workflow=args.workflow)
             elif args.queue_command == "gate":
-                schedule_control_gate(args.action, args.phase, args.dependency, args.condition)
+                schedule_control_gate(args.action, args.phase, args.dependency, args.condition, run_id=args.run, json_output=args.json)
+            elif args.queue_command == "cluster":
+                schedule_cluster_status(json_output=args.json)
+            elif args.queue_command == "limit":
+                schedule_control_limit(args.action, args.scope, rate=args.rate, per=args.per, burst=args.burst, json_output=args.json)
+            elif args.queue_command == "cron":
+                schedule_control_cron(args.action, args.name, cron=args.cron, workflow=args.workflow, mode=args.mode,
+                                      data=args.data, meta=args.meta, jitter=args.jitter, missed=args.missed,
+                                      horizon=args.horizon, tz=args.tz, count=args.count, json_output=args.json)
             else:
-                console.print("Use: queue add | list | clear | reset-cursors | batch | gate")
+                console.print("Use: queue add | list | clear | reset-cursors | batch | gate | limit | cluster | cron")
 
         elif args.command == "list": list_templates(args.templates, json_output=args.json)
         elif args.command == "info": info_command(args.recipe, dependencies=args.dependencies, json_output=args.json)
@@ -727,7 +853,7 @@ def main():
         elif args.command == "visualize": 
             recipe = load_recipe(args.recipe)
             visualize_recipe(recipe, format=args.format)
-        elif args.command == "watch": watch_recipe(args.recipe, args.templates)
+        elif args.command == "watch": watch_recipe(args.recipe, args.templates, simulate=args.simulate, cache_dir=args.cache)
         elif args.command == "inspect": inspect_template(args.template, args.templates, json_output=args.json)
         elif args.command == "diff": diff_recipe(args.recipe, args.target, args.templates, html_output=args.html, summary=args.summary, json_output=args.json)
 
@@ -751,6 +877,9 @@ def main():
         elif args.command == "stats":
             recipe = load_recipe(args.recipe)
             stats_command(recipe, json_output=args.json)
+        elif args.command == "analytics":
+            analytics_command(since=args.since, until=args.until, workflow=args.workflow,
+                              log_path=args.log_path, compact=args.compact, json_output=args.json)
         elif args.command == "doctor": doctor_command()
         elif args.command == "clean": clean_command(json_output=args.json)
         elif args.command == "config": config_command(json_output=args.json)
@@ -0,0 +1,53 @@
+import json
+import os
+from typing import Optional
+from rich.console import Console
+from rich.table import Table
+from ..history import JobHistory, JobHistorySink, parse_time
+
+console = Console()
+
+def analytics_command(since: Optional[str] = None, until: Optional[str] = None, workflow: Optional[str] = None,
+                      log_path: Optional[str] = None, compact: bool = False, json_output: bool = False):
+    """
+    Throughput, p95 duration and failure rate per workflow from the scheduler's job history.
+    """
+    log_path = log_path or os.getenv("N8N_FACTORY_LOG_PATH", "logs/jobs.jsonl")
+    try:
+        since_ts, until_ts = parse_time(since), parse_time(until)
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        return
+
+    if compact:
+        segment = JobHistorySink(log_path).rotate()
+        if segment and not json_output:
+            console.print(f"[green]Sealed active log into {segment}[/green]")
+
+    summary = JobHistory(log_path).summarize(since_ts, until_ts, workflow)
+
+    if json_output:
+        print(json.dumps(summary, indent=2))
+        return
+
+    if not summary["jobs"]:
+        console.print("[yellow]No jobs in range.[/yellow]")
+        return
+
+    table = Table(title=f"Job Analytics ({summary['jobs']} jobs)")
+    table.add_column("Workflow", style="cyan")
+    table.add_column("Jobs", style="green")
+    table.add_column("Jobs/h", style="green")
+    table.add_column("p50 (s)", style="magenta")
+    table.add_column("p95 (s)", style="magenta")
+    table.add_column("Failure Rate", style="red")
+    for name, stats in summary["workflows"].items():
+        table.add_row(
+            name,
+            str(stats["jobs"]),
+            f"{stats['throughput_per_hour']:g}" if stats["throughput_per_hour"] is not None else "-",
+            f"{stats['p50_s']:g}" if stats["p50_s"] is not None else "-",
+            f"{stats['p95_s']:g}" if stats["p95_s"] is not None else "-",
+            f"{stats['failure_rate']:.1%}",
+        )
+    console.print(table)
@@ -1,20 +1,16 @@
 import json
 import os
+from typing import Any, Dict, List
 from rich.console import Console
 from ..models import Recipe
+from ..simulator import WorkflowSimulator
 
 console = Console()
 
-def coverage_command(recipe: Recipe, simulation_json: str, json_output: bool = False):
-    if not os.path.exists(simulation_json):
-        err = f"Simulation history not found: {simulation_json}"
-        if json_output: print(json.dumps({"error": err})); return
-        else: console.print(f"[red]{err}[/red]"); return
-
-    with open(simulation_json, 'r', encoding='utf-8') as f:
-        history = json.load(f)
-        
+def compute_coverage(recipe: Recipe, history: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Step and per-branch coverage of a simulation history."""
     executed_steps = set()
+    taken_branches = {}
     # History structure depends on simulator.py output. 
     # Usually list of dicts with 'step_id' or similar.
     # Checking simulator.py logic (assumed): list of execution events.
@@ -27,20 +23,56 @@ def coverage_command(recipe: Recipe, simulation_json: str, json_output: bool = F
         sid = event.get("step_id") or event.get("node")
         if sid:
             executed_steps.add(sid)
+            for index, count in enumerate(event.get("branches") or []):
+                if count:
+                    taken_branches.setdefault(sid, set()).add(index)
             
     all_steps = set(s.id for s in recipe.steps)
     missed = all_steps - executed_steps
     
     coverage_pct = (len(executed_steps) / len(all_steps)) * 100 if all_steps else 0
     
+    # Per-branch coverage: which outputs of IF/Switch steps received items
+    branches = {}
+    for step in recipe.steps:
+        outputs = WorkflowSimulator.branch_outputs(step)
+        if outputs:
+            taken = taken_branches.get(step.id, set())
+            branches[step.id] = {
+                "taken": [o for o in outputs if o in taken],
+                "missed": [o for o in outputs if o not in taken]
+            }
+    total_branches = sum(len(b["taken"]) + len(b["missed"]) for b in branches.values())
+    taken_count = sum(len(b["taken"]) for b in branches.values())
+    branch_pct = (taken_count / total_branches) * 100 if total_branches else 100
+
     result = {
         "coverage_percent": round(coverage_pct, 2),
         "total_steps": len(all_steps),
         "executed_count": len(executed_steps),
         "executed_steps": list(executed_steps),
-        "missed_steps": list(missed)
+        "missed_steps": list(missed),
+        "branch_coverage_percent": round(branch_pct, 2),
+        "branches": branches
     }
     
+    return result
+
+def coverage_command(recipe: Recipe, simulation_json: str, json_output: bool = False):
+    if not os.path.exists(simulation_json):
+        err = f"Simulation history not found: {simulation_json}"
+        if json_output: print(json.dumps({"error": err})); return
+        else: console.print(f"[red]{err}[/red]"); return
+
+    with open(simulation_json, 'r', encoding='utf-8') as f:
+        history = json.load(f)
+        
+    result = compute_coverage(recipe, history)
+    coverage_pct = result["coverage_percent"]
+    missed = result["missed_steps"]
+    branches = result["branches"]
+    branch_pct = result["branch_coverage_percent"]
+
     if json_output:
         print(json.dumps(result, indent=2))
     else:
@@ -48,3 +80,9 @@ def coverage_command(recipe: Recipe, simulation_json: str, json_output: bool = F
         console.print(f"Coverage: [{color}]{coverage_pct:.1f}%[/{color}]")
         if missed:
             console.print(f"[dim]Missed:[/dim] {', '.join(missed)}")
+        if branches:
+            color = "green" if branch_pct == 100 else "yellow" if branch_pct > 50 else "red"
+            console.print(f"Branch coverage: [{color}]{branch_pct:.1f}%[/{color}]")
+            for sid, b in branches.items():
+                if b["missed"]:
+                    console.print(f"[dim]  {sid}: output(s) {', '.join(map(str, b['missed']))} never taken[/dim]")
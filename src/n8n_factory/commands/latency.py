@@ -0,0 +1,26 @@
+import json
+from typing import Any, Dict
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+def latency_report(report: Dict[str, Any], json_output: bool = False):
+    if json_output:
+        print(json.dumps(report, indent=2))
+        return
+
+    console.print(f"[bold]Virtual latency[/bold] over {report['runs']} runs (seed {report['seed']}): "
+                  f"p50 {report['p50_ms']:.1f}ms, p95 {report['p95_ms']:.1f}ms, p99 {report['p99_ms']:.1f}ms")
+    if report["throughput_per_s"] is not None:
+        console.print(f"Throughput: {report['throughput_per_s']:.2f} executions/s")
+    console.print(f"Critical path ({report['critical_path_share'] * 100:.0f}% of runs): {' -> '.join(report['critical_path'])}")
+
+    table = Table(title="Steps")
+    table.add_column("Step")
+    table.add_column("Mean (ms)", justify="right")
+    table.add_column("Critical share", justify="right")
+    for sid, stats in report["steps"].items():
+        name = f"[bold red]{sid}[/bold red]" if sid == report["bottleneck"] else sid
+        table.add_row(name, f"{stats['mean_ms']:.1f}", f"{stats['critical_share'] * 100:.1f}%")
+    console.print(table)
@@ -1,12 +1,16 @@
 import json
 import sys
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Optional, List, Union
 from rich.console import Console
 from rich.table import Table
 from ..queue_manager import QueueManager
 from ..scheduler import Scheduler
-from ..control_plane import AdaptiveBatchSizer, PhaseGate
+from ..control_plane import AdaptiveBatchSizer, PhaseGate, RateLimiter
 from ..operator import SystemOperator
+from ..coordination import ClusterCoordinator
+from ..recurring import RecurringJobs
+from ..resp import RedisError
 
 console = Console()
 
@@ -17,7 +21,9 @@ def schedule_worker_command(concurrency: int = 5, poll: int = 5):
     scheduler = Scheduler(concurrency=concurrency, poll_interval=poll)
     scheduler.start()
 
-def schedule_run_command(concurrency: int = 5, poll: int = 5, broker_port: Optional[int] = None, refill_cmd: Optional[str] = None, refill_threshold: int = 5):
+def schedule_run_command(concurrency: int = 5, poll: int = 5, broker_port: Optional[int] = None, refill_cmd: Optional[str] = None, refill_threshold: int = 5,
+                         metrics_port: Optional[int] = None, cluster: bool = False, instance_id: Optional[str] = None,
+                         runner: str = "cli", webhook_url: Optional[str] = None, dispatch_threads: int = 0):
     """
     Starts the queue consumer (worker) with optional broker port override.
     """
@@ -26,11 +32,18 @@ def schedule_run_command(concurrency: int = 5, poll: int = 5, broker_port: Optio
         poll_interval=poll, 
         broker_port=broker_port,
         refill_command=refill_cmd,
-        refill_threshold=refill_threshold
+        refill_threshold=refill_threshold,
+        metrics_port=metrics_port,
+        cluster=cluster,
+        instance_id=instance_id,
+        runner=runner,
+        webhook_url=webhook_url,
+        dispatch_threads=dispatch_threads
     )
     scheduler.start()
 
-def schedule_add_command(workflow: str, mode: str = "id", data: str = "{}", meta: str = "{}", delay: int = 0):
+def schedule_add_command(workflow: str, mode: str = "id", data: str = "{}", meta: str = "{}", delay: int = 0,
+                         idempotency_key: Optional[str] = None, dedup: bool = False, dedup_window: Optional[int] = None):
     """
     Adds a job to the queue.
     """
@@ -47,8 +60,16 @@ def schedule_add_command(workflow: str, mode: str = "id", data: str = "{}", meta
         console.print("[red]Invalid JSON meta[/red]")
         sys.exit(1)
 
-    queue.enqueue(workflow, inputs=inputs, mode=mode, meta=meta_dict, delay=delay)
-    
+    try:
+        res = queue.enqueue(workflow, inputs=inputs, mode=mode, meta=meta_dict, delay=delay,
+                            idempotency_key=idempotency_key, dedup=dedup, dedup_window=dedup_window)
+    except RedisError as e:
+        console.print(f"[red]Failed to add job:[/red] {e}")
+        sys.exit(1)
+    if res is None and (idempotency_key or dedup):
+        console.print(f"[yellow]Duplicate job skipped.[/yellow] Workflow: {workflow}")
+        return
+
     msg = f"[green]Job added to queue.[/green] Workflow: {workflow}"
     if delay > 0:
         msg += f" (Delayed: {delay}ms)"
@@ -62,9 +83,10 @@ def schedule_list_command(limit: int = 20, json_output: bool = False):
     total_size = queue.size()
     delayed_size = queue.delayed_size()
     jobs = queue.list_jobs(limit=limit)
+    dedup = queue.dedup_stats()
     
     if json_output:
-        print(json.dumps({"total": total_size, "delayed": delayed_size, "jobs": jobs}, indent=2))
+        print(json.dumps({"total": total_size, "delayed": delayed_size, "dedup": dedup, "jobs": jobs}, indent=2))
         return
 
     if not jobs and total_size == 0 and delayed_size == 0:
@@ -85,6 +107,8 @@ def schedule_list_command(limit: int = 20, json_output: bool = False):
             str(job.get("retries", 0))
         )
     console.print(table)
+    if dedup.get("accepted") or dedup.get("rejected"):
+        console.print(f"[dim]Dedup: {dedup.get('accepted', 0)} accepted, {dedup.get('rejected', 0)} duplicates rejected[/dim]")
 
 def schedule_clear_command():
     queue = QueueManager()
@@ -96,24 +120,44 @@ def schedule_reset_cursors_command(run_id: str):
     queue.reset_cursors(run_id)
     console.print(f"[green]Cursors reset for run_id: {run_id}[/green]")
 
-def schedule_control_batch(action: str, key: Optional[str] = None, value: Optional[str] = None):
+def schedule_control_batch(action: str, key: Optional[str] = None, value: Optional[str] = None, workflow: Optional[str] = None):
+    """
+    Inspects or tunes adaptive batch sizing. --workflow targets one batch group
+    (a workflow id or meta.batch_group) instead of the global defaults.
+    """
     operator = SystemOperator()
     sizer = AdaptiveBatchSizer(operator)
     
     if action == "get":
-        config = sizer.get_config()
-        current = sizer.get_batch_size()
-        console.print(f"Current Batch Size: [bold green]{current}[/bold green]")
+        config = sizer.get_config(workflow)
+        current = sizer.get_batch_size(workflow)
+        label = f" ({workflow})" if workflow else ""
+        console.print(f"Current Batch Size{label}: [bold green]{current}[/bold green]")
+        window = sizer.get_window_stats(workflow)
+        if window:
+            console.print(f"Window: {window.get('count', 0)} jobs, p50 {window.get('p50')}ms, p95 {window.get('p95')}ms, failure rate {window.get('failure_rate')}")
+        if workflow:
+            console.print(f"Overrides: {json.dumps(sizer.get_group_overrides(workflow))}")
         console.print("Configuration:")
         console.print(json.dumps(config, indent=2))
+
+        if not workflow:
+            groups = sizer.list_groups()
+            if groups:
+                table = Table(title="Batch Groups")
+                table.add_column("Group", style="cyan")
+                table.add_column("Batch Size", style="green")
+                table.add_column("p95 (ms)", style="magenta")
+                table.add_column("Failure Rate", style="red")
+                for group in groups:
+                    stats = sizer.get_window_stats(group)
+                    table.add_row(group, stats.get("batch_size", str(sizer.get_batch_size(group))), stats.get("p95", "-"), stats.get("failure_rate", "-"))
+                console.print(table)
     elif action == "set":
-        # Hacky config update via raw redis for now or specialized method
         if not key or not value:
             console.print("[red]Must provide key and value[/red]")
             return
         
-        # We need to update the JSON blob
-        config = sizer.get_config()
         try:
             # try parsing value as int/float
             if "." in value: val_parsed = float(value)
@@ -121,23 +165,215 @@ def schedule_control_batch(action: str, key: Optional[str] = None, value: Option
         except:
             val_parsed = value
             
-        config[key] = val_parsed
-        operator.inspect_redis(["SET", sizer.KEY_CONFIG, json.dumps(config)])
-        console.print(f"[green]Updated {key} to {val_parsed}[/green]")
+        sizer.set_config_value(key, val_parsed, group=workflow)
+        scope = f" for {workflow}" if workflow else ""
+        console.print(f"[green]Updated {key} to {val_parsed}{scope}[/green]")
 
-def schedule_control_gate(action: str, phase: str, dependency: Optional[str] = None, condition: str = "complete"):
+def schedule_control_gate(action: str, phase: Optional[str] = None, dependency: Optional[Union[str, List[str]]] = None, condition: str = "complete",
+                          run_id: Optional[str] = None, json_output: bool = False):
     operator = SystemOperator()
     gate = PhaseGate(operator)
     
+    if action == "waiting":
+        gates = gate.waiting_gates()
+        if not gates:
+            console.print("[yellow]No parked jobs.[/yellow]")
+            return
+        table = Table(title="Parked Jobs")
+        table.add_column("Run", style="cyan")
+        table.add_column("Phase", style="magenta")
+        table.add_column("Waiting", style="green")
+        for gated_run, gated_phase in gates:
+            if phase and gated_phase != str(phase):
+                continue
+            table.add_row(gated_run, gated_phase, str(gate.waiting_count(gated_run, gated_phase)))
+        console.print(table)
+        return
+
+    if action == "graph":
+        try:
+            graph = gate.graph(run_id)
+        except ValueError as e:
+            console.print(f"[red]{e}[/red]")
+            return
+        if json_output:
+            print(json.dumps(graph, indent=2))
+            return
+        if not graph["phases"]:
+            console.print("[yellow]No gate rules configured.[/yellow]")
+            return
+        critical = set(graph["critical_path"])
+        table = Table(title=f"Phase Gates{f' (run {run_id})' if run_id else ''}")
+        table.add_column("Phase", style="cyan")
+        table.add_column("Depends On", style="magenta")
+        table.add_column("Start", style="dim")
+        table.add_column("Finish", style="dim")
+        if run_id:
+            table.add_column("Progress", style="green")
+        for node in graph["phases"]:
+            deps = ", ".join(f"{d['phase']} ({d['condition']})" for d in node["dependencies"]) or "-"
+            name = f"[bold]{node['phase']}[/bold] *" if node["phase"] in critical else node["phase"]
+            row = [name, deps, f"{node['start']:g}", f"{node['finish']:g}"]
+            if run_id:
+                progress = node.get("progress")
+                row.append(f"{progress:.0%}" if progress is not None else "-")
+            table.add_row(*row)
+        console.print(table)
+        console.print(f"Critical path: [bold]{' -> '.join(graph['critical_path'])}[/bold] (makespan {graph['makespan']:g})")
+        return
+
+    if not phase:
+        console.print("[red]Must provide phase[/red]")
+        return
+
     if action == "set":
         if not dependency:
             console.print("[red]Must provide dependency phase[/red]")
             return
-        gate.set_rule(phase, dependency, condition)
-        console.print(f"[green]Gate set: {phase} depends on {dependency} ({condition})[/green]")
+        try:
+            gate.set_rule(phase, dependency, condition)
+        except ValueError as e:
+            console.print(f"[red]{e}[/red]")
+            return
+        deps = ", ".join(f"{d} ({c})" for d, c in gate.rule_dependencies(gate.get_rule(phase)))
+        console.print(f"[green]Gate set: {phase} depends on {deps or dependency}[/green]")
+    elif action == "del":
+        gate.remove_rule(phase)
+        console.print(f"[green]Gate removed: {phase}[/green]")
     elif action == "get":
         rule = gate.get_rule(phase)
-        if rule:
+        if json_output:
+            print(json.dumps(rule or {}, indent=2))
+        elif rule:
             console.print(f"[bold]{phase}[/bold]: {json.dumps(rule)}")
         else:
             console.print(f"No gate rule for {phase}")
+
+
+def schedule_control_limit(action: str, scope: Optional[str] = None, rate: Optional[float] = None, per: float = 1.0, burst: Optional[int] = None, json_output: bool = False):
+    operator = SystemOperator()
+    limiter = RateLimiter(operator)
+
+    if action == "set":
+        if not scope or not rate:
+            console.print("[red]Must provide scope and --rate[/red]")
+            return
+        if per <= 0:
+            console.print("[red]--per must be greater than 0[/red]")
+            return
+        burst = burst or max(1, int(rate))
+        limiter.set_limit(scope, rate / per, burst)
+        console.print(f"[green]Rate limit set: {scope} -> {rate:g} per {per:g}s (burst {burst})[/green]")
+    elif action == "del":
+        if not scope:
+            console.print("[red]Must provide scope[/red]")
+            return
+        limiter.remove_limit(scope)
+        console.print(f"[green]Rate limit removed: {scope}[/green]")
+    elif action == "get":
+        limits = limiter.get_limits()
+        if scope:
+            limits = {scope: limits[scope]} if scope in limits else {}
+
+        if json_output:
+            print(json.dumps(limits, indent=2))
+            return
+
+        if not limits:
+            console.print("[yellow]No rate limits configured.[/yellow]")
+            return
+
+        table = Table(title="Rate Limits")
+        table.add_column("Scope", style="cyan")
+        table.add_column("Rate (jobs/s)", style="green")
+        table.add_column("Burst", style="magenta")
+        for name, rule in limits.items():
+            table.add_row(name, f"{rule.get('rate', 0):g}", str(rule.get("burst", "")))
+        console.print(table)
+
+
+def schedule_cluster_status(json_output: bool = False):
+    """Shows the current leader and cluster-wide slot usage."""
+    operator = SystemOperator()
+    status = ClusterCoordinator(operator, concurrency=0).status()
+    status.pop("instance_id", None)
+    status.pop("capacity", None)
+
+    if json_output:
+        print(json.dumps(status, indent=2))
+        return
+
+    console.print(f"Leader: [bold]{status['leader'] or 'none'}[/bold]")
+    console.print(f"Slots in use: [green]{status['slots_in_use']}[/green]")
+    console.print(f"Active executions (last published): {status['active_executions']}")
+
+
+def schedule_control_cron(action: str, name: Optional[str] = None, cron: Optional[str] = None, workflow: Optional[str] = None,
+                          mode: str = "id", data: str = "{}", meta: str = "{}", jitter: int = 0, missed: str = "skip",
+                          horizon: int = RecurringJobs.DEFAULT_HORIZON, tz: str = "UTC", count: int = 5,
+                          json_output: bool = False):
+    """Manages recurring job specs (materialised by the scheduler leader)."""
+    operator = SystemOperator()
+    recurring = RecurringJobs(operator)
+
+    if action == "add":
+        if not name or not cron or not workflow:
+            console.print("[red]Must provide name, --cron and --workflow[/red]")
+            return
+        try:
+            inputs, meta_dict = json.loads(data), json.loads(meta)
+        except json.JSONDecodeError:
+            console.print("[red]Invalid JSON data or meta[/red]")
+            sys.exit(1)
+        try:
+            spec = recurring.add(name, cron, workflow, mode=mode, inputs=inputs, meta=meta_dict, jitter=jitter,
+                                 missed=missed, horizon=horizon, tz=tz)
+        except ValueError as e:
+            console.print(f"[red]{e}[/red]")
+            sys.exit(1)
+        console.print(f"[green]Recurring job set: {name} ({spec['cron']} {spec['tz']}) -> {workflow}[/green]")
+    elif action == "del":
+        if not name:
+            console.print("[red]Must provide name[/red]")
+            return
+        if recurring.remove(name):
+            console.print(f"[green]Recurring job removed: {name}[/green]")
+        else:
+            console.print(f"[yellow]No recurring job named '{name}'.[/yellow]")
+    elif action == "next":
+        if not name:
+            console.print("[red]Must provide name[/red]")
+            return
+        try:
+            times = recurring.preview(name, count)
+        except ValueError as e:
+            console.print(f"[red]{e}[/red]")
+            sys.exit(1)
+        stamps = [datetime.fromtimestamp(ts, timezone.utc).isoformat() for ts in times]
+        if json_output:
+            print(json.dumps({"name": name, "next": stamps}, indent=2))
+            return
+        for stamp in stamps:
+            console.print(stamp)
+    elif action == "list":
+        specs = recurring.specs()
+        states = recurring.states()
+        if json_output:
+            print(json.dumps([dict(spec, state=states.get(n)) for n, spec in specs.items()], indent=2))
+            return
+        if not specs:
+            console.print("[yellow]No recurring jobs configured.[/yellow]")
+            return
+        table = Table(title="Recurring Jobs")
+        table.add_column("Name", style="cyan")
+        table.add_column("Cron", style="green")
+        table.add_column("Workflow", style="magenta")
+        table.add_column("Missed")
+        table.add_column("Jitter (s)")
+        table.add_column("Materialised until")
+        for n, spec in sorted(specs.items()):
+            last = (states.get(n) or {}).get("last")
+            until = datetime.fromtimestamp(last, timezone.utc).isoformat() if last else "-"
+            table.add_row(n, f"{spec['cron']} ({spec.get('tz', 'UTC')})", spec["workflow"], spec.get("missed", "skip"),
+                          str(spec.get("jitter", 0)), until)
+        console.print(table)
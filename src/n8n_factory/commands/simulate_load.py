@@ -0,0 +1,170 @@
+import json
+import logging
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+from rich.console import Console
+from rich.table import Table
+from ..simulator import WorkflowSimulator
+from ..synthetic import item_stream
+
+console = Console()
+
+
+def load_payloads(path: str) -> List[Any]:
+    """Sample payloads from a JSON list/object or a JSONL file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return data if isinstance(data, list) else [data]
+
+
+def source_step(recipe, step_id: Optional[str] = None):
+    """The step synthetic items are fed into: step_id, or the first step without parents."""
+    steps = {s.id: s for s in recipe.steps}
+    if step_id:
+        if step_id not in steps:
+            raise ValueError(f"Unknown step '{step_id}'")
+        return steps[step_id]
+    incoming = WorkflowSimulator.build_graph(recipe)
+    for step in recipe.steps:
+        if not incoming[step.id]:
+            return step
+    raise ValueError("Recipe has no root step to feed items into")
+
+
+def run_load(recipe, count: int, schema: Optional[Dict[str, Any]] = None, samples: Optional[List[Any]] = None,
+             chunk_size: int = 1000, seed: int = 0, step_id: Optional[str] = None,
+             track_memory: bool = True, max_steps: int = 100) -> Dict[str, Any]:
+    """
+    Streams `count` synthetic items through the recipe, `chunk_size` at a
+    time, as the mock output of the source step. Returns totals and per-step
+    items, time and throughput. With track_memory, peak allocations per step
+    come from a separate traced pass over one chunk, so tracing doesn't slow
+    the timed run.
+    """
+    recipe = recipe.model_copy(deep=True)
+    source = source_step(recipe, step_id)
+    if schema is None and samples is None:
+        if source.mock is None:
+            raise ValueError(f"No schema or samples given and step '{source.id}' has no mock to sample from")
+        samples = WorkflowSimulator()._load_mock(source.mock)
+    stream = item_stream(count, schema=schema, samples=samples, chunk_size=chunk_size, seed=seed)
+
+    per_step: Dict[str, Dict[str, Any]] = {}
+    simulator = WorkflowSimulator(history_items=0, fail_fast=False)
+    chunks = errors = failed_assertions = 0
+    generate_s = 0.0
+    peak = None
+    log = logging.getLogger("n8n_factory")
+    level = log.level
+    log.setLevel(logging.WARNING)
+    started = time.perf_counter()
+    try:
+        chunk_iter = iter(stream)
+        while True:
+            t0 = time.perf_counter()
+            chunk = next(chunk_iter, None)
+            generate_s += time.perf_counter() - t0
+            if chunk is None:
+                break
+            chunks += 1
+            source.mock = chunk
+            history = simulator.simulate(recipe, max_steps=max_steps)
+            errors += sum(1 for h in history if "error" in h)
+            failed_assertions += sum(1 for a in simulator.assertion_results if a["status"] in ("fail", "error"))
+            for sid, stats in simulator.step_stats.items():
+                total = per_step.setdefault(sid, {"items_in": 0, "items_out": 0, "seconds": 0.0})
+                # The source step's real input is the synthetic chunk it emits
+                total["items_in"] += stats.get("items_out", 0) if sid == source.id else stats["items_in"]
+                total["items_out"] += stats.get("items_out", 0)
+                total["seconds"] += stats["seconds"]
+        elapsed = time.perf_counter() - started
+        if track_memory and chunks:
+            peak = _trace_chunk(simulator, recipe, source, next(iter(stream)), max_steps, per_step)
+    finally:
+        log.setLevel(level)
+
+    steps = {}
+    for sid, total in per_step.items():
+        steps[sid] = {
+            "items_in": total["items_in"],
+            "items_out": total["items_out"],
+            "seconds": round(total["seconds"], 4),
+            "items_per_s": round(total["items_in"] / total["seconds"], 1) if total["seconds"] > 0 else None,
+        }
+        if track_memory:
+            steps[sid]["peak_kb"] = round(total.get("peak_bytes", 0) / 1024, 1)
+    return {
+        "items": count,
+        "chunks": chunks,
+        "chunk_size": stream.chunk_size,
+        "source_step": source.id,
+        "seconds": round(elapsed, 4),
+        "generate_seconds": round(generate_s, 4),
+        "items_per_s": round(count / (elapsed - generate_s), 1) if elapsed > generate_s else None,
+        "peak_kb": round(peak / 1024, 1) if peak is not None else None,
+        "errors": errors,
+        "failed_assertions": failed_assertions,
+        "steps": steps,
+    }
+
+
+def _trace_chunk(simulator: WorkflowSimulator, recipe, source, chunk: List[Dict[str, Any]], max_steps: int,
+                 per_step: Dict[str, Dict[str, Any]]) -> int:
+    """Simulates one chunk under tracemalloc; records peak_bytes per step and returns the overall peak."""
+    tracing = not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        source.mock = chunk
+        simulator.simulate(recipe, max_steps=max_steps)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        if tracing:
+            tracemalloc.stop()
+    for sid, stats in simulator.step_stats.items():
+        if sid in per_step:
+            per_step[sid]["peak_bytes"] = stats.get("peak_bytes", 0)
+    return peak
+
+
+def simulate_load_command(recipe, count: int, schema_path: Optional[str] = None, samples_path: Optional[str] = None,
+                          chunk_size: int = 1000, seed: int = 0, step_id: Optional[str] = None,
+                          track_memory: bool = True, max_steps: int = 100, json_output: bool = False) -> Dict[str, Any]:
+    schema = None
+    if schema_path:
+        with open(schema_path, 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+    samples = load_payloads(samples_path) if samples_path else None
+    report = run_load(recipe, count, schema=schema, samples=samples, chunk_size=chunk_size, seed=seed,
+                      step_id=step_id, track_memory=track_memory, max_steps=max_steps)
+    if json_output:
+        print(json.dumps(report, indent=2))
+        return report
+
+    table = Table(title=f"Load: {report['items']} items into '{report['source_step']}' ({report['chunks']} chunks)")
+    table.add_column("Step")
+    table.add_column("Items in", justify="right")
+    table.add_column("Items out", justify="right")
+    table.add_column("Time (s)", justify="right")
+    table.add_column("Items/s", justify="right")
+    if track_memory:
+        table.add_column("Peak (KB)", justify="right")
+    for sid, stats in report["steps"].items():
+        row = [sid, str(stats["items_in"]), str(stats["items_out"]), f"{stats['seconds']:.3f}",
+               f"{stats['items_per_s']:.0f}" if stats["items_per_s"] else "-"]
+        if track_memory:
+            row.append(f"{stats['peak_kb']:.1f}")
+        table.add_row(*row)
+    console.print(table)
+    rate = f"{report['items_per_s']:.0f} items/s" if report["items_per_s"] else "-"
+    console.print(f"Simulated in {report['seconds']:.2f}s ({rate}, generation {report['generate_seconds']:.2f}s)"
+                  + (f", peak {report['peak_kb'] / 1024:.1f} MB per chunk" if report["peak_kb"] is not None else ""))
+    if report["errors"] or report["failed_assertions"]:
+        console.print(f"[red]{report['errors']} error(s), {report['failed_assertions']} failed assertion(s)[/red]")
+    return report
@@ -0,0 +1,178 @@
+import glob
+import json
+import logging
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+from rich.console import Console
+from rich.table import Table
+from ..simulator import WorkflowSimulator
+from ..utils import load_recipe
+from .coverage import compute_coverage
+
+console = Console()
+
+RECIPE_PATTERNS = ("*.yaml", "*.yml")
+
+
+def find_recipes(recipes_dir: str) -> List[str]:
+    paths = []
+    for pattern in RECIPE_PATTERNS:
+        paths.extend(glob.glob(os.path.join(recipes_dir, "**", pattern), recursive=True))
+    return sorted(paths)
+
+
+def apply_fixture(recipe, fixture: Any):
+    """
+    Puts fixture data into the recipe's mocks. A fixture is either
+    {"mocks": {step_id: data, ...}} or plain mock data for the first step.
+    """
+    mocks = fixture.get("mocks") if isinstance(fixture, dict) and isinstance(fixture.get("mocks"), dict) else None
+    if mocks is None:
+        mocks = {recipe.steps[0].id: fixture} if recipe.steps else {}
+    steps = {s.id: s for s in recipe.steps}
+    unknown = [sid for sid in mocks if sid not in steps]
+    if unknown:
+        raise ValueError(f"Fixture mocks unknown step(s): {', '.join(unknown)}")
+    for sid, data in mocks.items():
+        steps[sid].mock = data
+    return recipe
+
+
+def run_case(recipe_path: str, fixture_path: Optional[str], max_steps: int = 100, env: Optional[str] = None) -> Dict[str, Any]:
+    """Simulates one recipe/fixture pair. Runs in a worker process."""
+    case = {"recipe": recipe_path, "fixture": fixture_path}
+    # Results go into the report; keep per-step logging out of the CI output
+    log = logging.getLogger("n8n_factory")
+    level = log.level
+    log.setLevel(logging.CRITICAL)
+    started = time.perf_counter()
+    try:
+        recipe = load_recipe(recipe_path, env_name=env)
+        case["name"] = recipe.name
+        if fixture_path:
+            with open(fixture_path, 'r', encoding='utf-8') as f:
+                apply_fixture(recipe, json.load(f))
+        # Report every failed assertion of the case, not just the first
+        simulator = WorkflowSimulator(fail_fast=False)
+        history = simulator.simulate(recipe, max_steps=max_steps)
+        errors = [h["error"] for h in history if "error" in h]
+        case["assertions"] = simulator.assertion_results
+        case["coverage"] = compute_coverage(recipe, history)
+        if errors:
+            case["status"] = "error"
+            case["error"] = errors[0]
+        elif any(a["status"] in ("fail", "error") for a in simulator.assertion_results):
+            case["status"] = "fail"
+        else:
+            case["status"] = "pass"
+    except (Exception, SystemExit) as e:
+        case["status"] = "error"
+        case["error"] = str(e) or type(e).__name__
+    finally:
+        log.setLevel(level)
+    case["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return case
+
+
+def run_matrix(recipes_dir: str, fixtures: Optional[str] = None, workers: Optional[int] = None,
+               max_steps: int = 100, env: Optional[str] = None) -> Dict[str, Any]:
+    """Runs every recipe against every fixture matching the glob, across a process pool."""
+    recipes = find_recipes(recipes_dir)
+    fixture_paths = sorted(glob.glob(fixtures, recursive=True)) if fixtures else []
+    pairs = [(r, f) for r in recipes for f in (fixture_paths or [None])]
+
+    started = time.perf_counter()
+    if workers == 1 or len(pairs) <= 1:
+        cases = [run_case(r, f, max_steps, env) for r, f in pairs]
+    else:
+        workers = workers or os.cpu_count() or 1
+        # Several cases per task so short simulations don't pay a round trip each
+        chunksize = max(1, len(pairs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            cases = list(pool.map(run_case, [p[0] for p in pairs], [p[1] for p in pairs],
+                                  [max_steps] * len(pairs), [env] * len(pairs), chunksize=chunksize))
+
+    counts = {status: sum(1 for c in cases if c["status"] == status) for status in ("pass", "fail", "error")}
+    covered = [c["coverage"]["coverage_percent"] for c in cases if "coverage" in c]
+    return {
+        "summary": {
+            "cases": len(cases),
+            "recipes": len(recipes),
+            "fixtures": len(fixture_paths),
+            **counts,
+            "mean_coverage_percent": round(sum(covered) / len(covered), 2) if covered else 0,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2)
+        },
+        "cases": cases
+    }
+
+
+def write_junit(report: Dict[str, Any], path: str):
+    """One testsuite per recipe, one testcase per fixture."""
+    root = ET.Element("testsuites", tests=str(report["summary"]["cases"]),
+                      failures=str(report["summary"]["fail"]), errors=str(report["summary"]["error"]),
+                      time=f"{report['summary']['duration_ms'] / 1000:.3f}")
+    suites: Dict[str, ET.Element] = {}
+    for case in report["cases"]:
+        suite = suites.get(case["recipe"])
+        if suite is None:
+            suite = suites[case["recipe"]] = ET.SubElement(root, "testsuite", name=case["recipe"])
+        name = os.path.basename(case["fixture"]) if case["fixture"] else "default"
+        testcase = ET.SubElement(suite, "testcase", classname=case.get("name", case["recipe"]), name=name,
+                                 time=f"{case['duration_ms'] / 1000:.3f}")
+        if case["status"] == "error":
+            ET.SubElement(testcase, "error", message=case.get("error", "")).text = case.get("error", "")
+        elif case["status"] == "fail":
+            failed = [a for a in case["assertions"] if a["status"] in ("fail", "error")]
+            ET.SubElement(testcase, "failure", message=f"{len(failed)} assertion(s) failed").text = \
+                "\n".join(f"[{a['status'].upper()}] {a['assertion']}" for a in failed)
+    for suite in suites.values():
+        cases = list(suite)
+        suite.set("tests", str(len(cases)))
+        suite.set("failures", str(sum(1 for c in cases if c.find("failure") is not None)))
+        suite.set("errors", str(sum(1 for c in cases if c.find("error") is not None)))
+    ET.ElementTree(root).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def simulate_matrix_command(recipes_dir: str, fixtures: Optional[str] = None, workers: Optional[int] = None,
+                            max_steps: int = 100, env: Optional[str] = None, report_json: Optional[str] = None,
+                            junit: Optional[str] = None, json_output: bool = False) -> bool:
+    """Returns True when every case passed."""
+    report = run_matrix(recipes_dir, fixtures, workers, max_steps, env)
+    if report_json:
+        with open(report_json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if junit:
+        write_junit(report, junit)
+
+    summary = report["summary"]
+    if json_output:
+        print(json.dumps(report, indent=2))
+    else:
+        table = Table(title=f"Simulation Matrix ({summary['cases']} cases)")
+        table.add_column("Recipe")
+        table.add_column("Fixture")
+        table.add_column("Status")
+        table.add_column("Coverage", justify="right")
+        table.add_column("Time (ms)", justify="right")
+        colors = {"pass": "green", "fail": "yellow", "error": "red"}
+        for case in report["cases"]:
+            if case["status"] == "pass":
+                continue
+            coverage = case.get("coverage", {}).get("coverage_percent")
+            table.add_row(case["recipe"], case["fixture"] or "-",
+                          f"[{colors[case['status']]}]{case['status']}[/{colors[case['status']]}]",
+                          f"{coverage:.1f}%" if coverage is not None else "-", f"{case['duration_ms']:.1f}")
+        if table.row_count:
+            console.print(table)
+        console.print(f"[green]{summary['pass']} passed[/green], [yellow]{summary['fail']} failed[/yellow], "
+                      f"[red]{summary['error']} errors[/red] in {summary['duration_ms'] / 1000:.2f}s "
+                      f"(mean coverage {summary['mean_coverage_percent']:.1f}%)")
+        if report_json:
+            console.print(f"[bold blue]Report exported to:[/bold blue] {report_json}")
+        if junit:
+            console.print(f"[bold blue]JUnit report exported to:[/bold blue] {junit}")
+    return summary["fail"] == 0 and summary["error"] == 0
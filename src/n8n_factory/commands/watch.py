@@ -6,15 +6,19 @@ from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from rich.console import Console
 from ..assembler import WorkflowAssembler
+from ..sim_cache import DEFAULT_CACHE_DIR, SimulationCache
+from ..simulator import WorkflowSimulator
 from ..utils import load_recipe
 
 console = Console()
 
 class RecipeHandler(FileSystemEventHandler):
-    def __init__(self, recipe_path: str, templates_dir: str):
+    def __init__(self, recipe_path: str, templates_dir: str, simulate: bool = False, cache_dir: str = DEFAULT_CACHE_DIR):
         self.recipe_path = os.path.abspath(recipe_path)
         self.templates_dir = templates_dir
         self.assembler = WorkflowAssembler(templates_dir)
+        # One cache for the whole session: each change re-simulates from the first edited step
+        self.simulator = WorkflowSimulator(cache=SimulationCache(cache_dir)) if simulate else None
         self.ignore_patterns = []
         self._load_ignore()
 
@@ -42,15 +46,29 @@ class RecipeHandler(FileSystemEventHandler):
                 recipe = load_recipe(self.recipe_path)
                 self.assembler.assemble(recipe)
                 console.print(f"[bold green]Rebuild Successful at {time.strftime('%X')}[/bold green]")
+                if self.simulator:
+                    self.resimulate(recipe)
             except Exception as e:
                 console.print(f"[bold red]Build Failed:[/bold red] {e}")
 
-def watch_recipe(recipe_path: str, templates_dir: str):
+    def resimulate(self, recipe):
+        history = self.simulator.simulate(recipe)
+        errors = [h for h in history if "error" in h]
+        failed = [a for a in self.simulator.assertion_results if a["status"] in ("fail", "error")]
+        reused = len(self.simulator.cached_steps)
+        summary = f"{len(history)} step(s) simulated, {reused} from cache"
+        if errors or failed:
+            console.print(f"[bold red]Simulation failed:[/bold red] {summary}; "
+                          f"{len(errors)} error(s), {len(failed)} failed assertion(s)")
+        else:
+            console.print(f"[bold green]Simulation passed:[/bold green] {summary}")
+
+def watch_recipe(recipe_path: str, templates_dir: str, simulate: bool = False, cache_dir: str = DEFAULT_CACHE_DIR):
     if not os.path.exists(recipe_path):
         console.print(f"[bold red]Error:[/bold red] File {recipe_path} not found.")
         return
 
-    event_handler = RecipeHandler(recipe_path, templates_dir)
+    event_handler = RecipeHandler(recipe_path, templates_dir, simulate=simulate, cache_dir=cache_dir)
     observer = Observer()
     watch_dir = os.path.dirname(os.path.abspath(recipe_path))
     observer.schedule(event_handler, watch_dir, recursive=False)
@@ -2,209 +2,680 @@ import json
 import time
 import os
 import subprocess
-from typing import Optional, Dict, Any
-from .operator import SystemOperator
+import threading
+from collections import deque
+from typing import Optional, Dict, Any, List, Tuple, Deque, Callable, Union
+from .operator import SystemOperator, RedisPipeline
+from .queue_manager import QueueManager
+from .resp import RedisError, pairs_to_dict
 from .logger import logger
 
+class RollingWindow:
+    """
+    In-process window of the most recent job latencies and outcomes.
+    """
+    def __init__(self, size: int = 50):
+        self.samples: Deque[Tuple[float, bool]] = deque(maxlen=max(1, size))
+
+    def resize(self, size: int):
+        if size != self.samples.maxlen:
+            self.samples = deque(self.samples, maxlen=max(1, size))
+
+    def add(self, duration_ms: float, success: bool):
+        self.samples.append((duration_ms, success))
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def percentile(self, q: float) -> float:
+        """Linear-interpolated percentile (q in 0..100) of latencies in the window."""
+        if not self.samples:
+            return 0.0
+        values = sorted(d for d, _ in self.samples)
+        pos = (len(values) - 1) * q / 100.0
+        lower = int(pos)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (pos - lower)
+
+    def failure_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": len(self.samples),
+            "p50": round(self.percentile(50), 2),
+            "p95": round(self.percentile(95), 2),
+            "failure_rate": round(self.failure_rate(), 4)
+        }
+
+
+class BatchSizeController:
+    """
+    PID-style controller that steers the batch size so p95 latency tracks a target.
+    The error is normalised to the target, so gains don't depend on the latency scale,
+    and the output is applied multiplicatively because latency grows roughly linearly
+    with batch size.
+    """
+    def __init__(self, target_latency_ms: float = 5000, kp: float = 0.6, ki: float = 0.15, kd: float = 0.1,
+                 min_size: int = 1, max_size: int = 100, max_step: float = 0.2, failure_threshold: float = 0.1):
+        self.target_latency_ms = target_latency_ms
+        self.kp, self.ki, self.kd = kp, ki, kd
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_step = max_step
+        self.failure_threshold = failure_threshold
+        self.integral = 0.0
+        self.prev_error: Optional[float] = None
+        self.size: Optional[float] = None
+
+    def configure(self, config: Dict[str, Any]):
+        self.target_latency_ms = config.get("target_latency_ms", self.target_latency_ms)
+        self.kp = config.get("kp", self.kp)
+        self.ki = config.get("ki", self.ki)
+        self.kd = config.get("kd", self.kd)
+        self.min_size = config.get("min_size", self.min_size)
+        self.max_size = config.get("max_size", self.max_size)
+        self.max_step = config.get("adjustment_factor", 1 + self.max_step) - 1
+        self.failure_threshold = config.get("failure_threshold_rate", self.failure_threshold)
+
+    def update(self, current_size: int, p95_ms: float, failure_rate: float = 0.0) -> int:
+        # Keep fractional state between updates so small corrections aren't lost to rounding.
+        if self.size is None or round(self.size) != current_size:
+            self.size = float(current_size)
+
+        if failure_rate > self.failure_threshold:
+            # Failures trump latency: back off hard and forget accumulated growth.
+            self.integral = min(self.integral, 0.0)
+            self.prev_error = None
+            self.size *= max(0.5, 1 - failure_rate)
+        elif p95_ms > 0:
+            error = (self.target_latency_ms - p95_ms) / self.target_latency_ms
+            error = max(-1.0, min(1.0, error))
+            derivative = 0.0 if self.prev_error is None else error - self.prev_error
+            self.prev_error = error
+
+            output = self.kp * error + self.ki * (self.integral + error) + self.kd * derivative
+            if abs(output) < self.max_step:
+                # Anti-windup: only integrate while the output isn't saturated.
+                self.integral = max(-2.0, min(2.0, self.integral + error))
+            output = max(-self.max_step, min(self.max_step, output))
+            self.size *= 1 + output
+
+        self.size = max(float(self.min_size), min(float(self.max_size), self.size))
+        return int(round(self.size))
+
+
+class BatchGroupState:
+    """In-process window and controller for one batch group."""
+    def __init__(self, window_size: int = 50, flush_interval: float = 10.0):
+        self.window = RollingWindow(window_size)
+        self.controller = BatchSizeController()
+        self.flush_interval = flush_interval # seconds, from the group's flush_interval_s
+        self.jobs_since_flush = 0
+        self.last_flush = time.monotonic()
+
+
 class AdaptiveBatchSizer:
+    """
+    Keeps a separate window, controller and current size per batch group, so a slow
+    workflow doesn't shrink the batch size of a fast one. The group is the job's
+    meta.batch_group, or its workflow id. Group None is the global default.
+    """
     KEY_CONFIG = "n8n_factory:config:batch_sizing"
     KEY_CURRENT = "n8n_factory:state:batch_size"
+    KEY_WINDOW = "n8n_factory:stats:batch_window"
+    KEY_GROUPS = "n8n_factory:state:batch_groups"
     
     def __init__(self, operator: SystemOperator, default_size: int = 10):
         self.operator = operator
         self.default_size = default_size
+        self.groups: Dict[Optional[str], BatchGroupState] = {}
+        self.flush_interval = 10.0 # seconds, until a group's config is read
+        self._lock = threading.RLock() # update_stats may be called from dispatch threads
         self._ensure_config()
 
+    @staticmethod
+    def group_for(workflow: str, meta: Dict[str, Any]) -> str:
+        return str((meta or {}).get("batch_group") or workflow)
+
+    def _key(self, base: str, group: Optional[str]) -> str:
+        return f"{base}:{group}" if group else base
+
+    def _state(self, group: Optional[str]) -> BatchGroupState:
+        if group not in self.groups:
+            self.groups[group] = BatchGroupState(flush_interval=self.flush_interval)
+        return self.groups[group]
+
     def _ensure_config(self):
         """Ensures default config exists in Redis."""
         defaults = {
             "min_size": 1,
             "max_size": 100,
-            "target_latency_ms": 5000, # 5 seconds per batch target
+            "target_latency_ms": 5000, # p95 latency target per batch
             "failure_threshold_rate": 0.1, # 10% failure rate triggers backoff
-            "adjustment_factor": 1.2,
-            "window_size": 10 # Number of jobs to average over
+            "adjustment_factor": 1.2, # max change per adjustment (+/-20%)
+            "window_size": 50, # Number of recent jobs in the rolling window
+            "flush_interval_s": 10, # How often window stats are flushed to Redis
+            "kp": 0.6,
+            "ki": 0.15,
+            "kd": 0.1
         }
         # Set if not exists (NX)
         self.operator.inspect_redis(["SET", self.KEY_CONFIG, json.dumps(defaults), "NX"])
         self.operator.inspect_redis(["SET", self.KEY_CURRENT, str(self.default_size), "NX"])
 
-    def get_batch_size(self) -> int:
-        res = self.operator.inspect_redis(["GET", self.KEY_CURRENT])
+    def get_batch_size(self, group: Optional[str] = None) -> int:
+        """Current size for a group, falling back to the global size until the group has its own."""
+        res = self.operator.inspect_redis(["GET", self._key(self.KEY_CURRENT, group)])
+        if group and not (isinstance(res, str) and res.strip()):
+            return self.get_batch_size()
         try:
             return int(res)
         except (ValueError, TypeError):
             return self.default_size
 
-    def get_config(self) -> Dict[str, Any]:
-        res = self.operator.inspect_redis(["GET", self.KEY_CONFIG])
+    def get_config(self, group: Optional[str] = None) -> Dict[str, Any]:
+        """Global config, with the group's overrides applied on top."""
+        config = self._get_json(self.KEY_CONFIG)
+        if group:
+            config.update(self._get_json(self._key(self.KEY_CONFIG, group)))
+        return config
+
+    def get_group_overrides(self, group: str) -> Dict[str, Any]:
+        return self._get_json(self._key(self.KEY_CONFIG, group))
+
+    def set_config_value(self, key: str, value: Any, group: Optional[str] = None):
+        """Sets a config value globally, or as an override for one group."""
+        config = self.get_group_overrides(group) if group else self.get_config()
+        config[key] = value
+        self.operator.inspect_redis(["SET", self._key(self.KEY_CONFIG, group), json.dumps(config)])
+
+    def _get_json(self, key: str) -> Dict[str, Any]:
+        res = self.operator.inspect_redis(["GET", key])
         try:
-            return json.loads(res)
+            data = json.loads(res)
+            return data if isinstance(data, dict) else {}
         except (TypeError, json.JSONDecodeError):
             return {}
 
-    def update_stats(self, duration_ms: float, success: bool):
-        """
-        Called by scheduler after a job. Updates moving averages and adjusts batch size.
-        """
-        # We'll use a simple atomic update script or just read/write for now.
-        # Ideally, we should store a list of recent stats in Redis to be stateless.
-        
-        # 1. Push stat to a list
-        stat = json.dumps({"d": duration_ms, "s": int(success)})
-        key_stats = "n8n_factory:stats:recent_jobs"
-        
-        config = self.get_config()
-        window = config.get("window_size", 10)
-        
-        self.operator.inspect_redis(["LPUSH", key_stats, stat])
-        self.operator.inspect_redis(["LTRIM", key_stats, "0", str(window - 1)])
-        
-        # 2. Check if we have enough data to decide
-        # (Optimization: Only check every N jobs or probabilistic to save Redis calls)
-        if time.time() % 5 < 0.5: # Simple throttle, or just do it every time if low volume
-            self._recalculate(key_stats, config)
-
-    def _recalculate(self, key_stats: str, config: Dict[str, Any]):
-        # Get all stats
-        items = self.operator.inspect_redis(["LRANGE", key_stats, "0", "-1"])
-        if not items:
-            return
-            
-        durations = []
-        failures = 0
-        
+    def list_groups(self) -> List[str]:
         try:
-            lines = items.splitlines() if isinstance(items, str) else items
-            for item in lines:
-                if not item: continue
-                data = json.loads(item)
-                durations.append(data["d"])
-                if data["s"] == 0:
-                    failures += 1
-        except Exception as e:
-            logger.error(f"Error parsing stats: {e}")
-            return
+            res = self.operator.redis(["SMEMBERS", self.KEY_GROUPS])
+        except RedisError as e:
+            logger.warning(f"Failed to list batch groups: {e}")
+            return []
+        return sorted(str(g) for g in res) if isinstance(res, list) else []
+
+    def get_window_stats(self, group: Optional[str] = None) -> Dict[str, str]:
+        """Returns the last window snapshot flushed to Redis (by any scheduler)."""
+        try:
+            res = self.operator.redis(["HGETALL", self._key(self.KEY_WINDOW, group)])
+        except RedisError as e:
+            logger.warning(f"Failed to read window stats: {e}")
+            return {}
+        return pairs_to_dict(res)
+
+    def update_stats(self, duration_ms: float, success: bool, group: Optional[str] = None):
+        """
+        Called by scheduler after a job. Records the job in the group's in-process
+        window; Redis is only touched when the window is flushed.
+        """
+        with self._lock:
+            state = self._state(group)
+            state.window.add(duration_ms, success)
+            state.jobs_since_flush += 1
 
-        if not durations:
+            due = time.monotonic() - state.last_flush >= state.flush_interval
+            if due or state.jobs_since_flush >= state.window.samples.maxlen:
+                self.flush(group)
+
+    def flush(self, group: Optional[str] = None):
+        """
+        Feeds the group's window into its controller, then publishes the new batch
+        size and the window snapshot.
+        """
+        state = self._state(group)
+        state.last_flush = time.monotonic()
+        state.jobs_since_flush = 0
+        if not len(state.window):
             return
 
-        avg_latency = sum(durations) / len(durations)
-        failure_rate = failures / len(durations)
-        
-        current_size = self.get_batch_size()
-        new_size = current_size
-        
-        # Logic
-        target = config.get("target_latency_ms", 5000)
-        max_size = config.get("max_size", 50)
-        min_size = config.get("min_size", 1)
-        factor = config.get("adjustment_factor", 1.2)
-        
-        if failure_rate > config.get("failure_threshold_rate", 0.1):
-            # High failure -> slash batch size
-            new_size = max(min_size, int(current_size / factor))
-            logger.warning(f"High failure rate ({failure_rate:.2f}). Reducing batch size to {new_size}.")
-        
-        elif avg_latency > target * 1.2:
-            # Too slow -> reduce
-            new_size = max(min_size, int(current_size / factor))
-            logger.info(f"Latency high ({avg_latency:.0f}ms > {target}ms). Reducing batch size to {new_size}.")
-            
-        elif avg_latency < target * 0.8:
-            # Too fast -> increase
-            new_size = min(max_size, int(current_size * factor) + 1)
-            # logger.info(f"Latency low ({avg_latency:.0f}ms). Increasing batch size to {new_size}.")
-            
-        if new_size != current_size:
-            self.operator.inspect_redis(["SET", self.KEY_CURRENT, str(new_size)])
+        config = self.get_config(group)
+        state.controller.configure(config)
+        state.flush_interval = float(config.get("flush_interval_s", state.flush_interval))
+        state.window.resize(int(config.get("window_size", state.window.samples.maxlen)))
+
+        stats = state.window.snapshot()
+        current_size = self.get_batch_size(group)
+        new_size = state.controller.update(current_size, stats["p95"], stats["failure_rate"])
+
+        label = f"[{group}] " if group else ""
+        if stats["failure_rate"] > state.controller.failure_threshold:
+            logger.warning(f"{label}High failure rate ({stats['failure_rate']:.2f}). Reducing batch size to {new_size}.")
+        elif new_size != current_size:
+            logger.info(f"{label}p95 latency {stats['p95']:.0f}ms (target {state.controller.target_latency_ms}ms). Batch size {current_size} -> {new_size}.")
+
+        fields = []
+        for k, v in {**stats, "batch_size": new_size, "updated_at": round(time.time(), 3)}.items():
+            fields.extend([k, str(v)])
+        with RedisPipeline(self.operator) as pipe:
+            if new_size != current_size or group:
+                pipe.command(["SET", self._key(self.KEY_CURRENT, group), str(new_size)])
+            pipe.command(["HSET", self._key(self.KEY_WINDOW, group)] + fields)
+            if group:
+                pipe.command(["SADD", self.KEY_GROUPS, group])
+
+
+def simulate_batch_controller(latency_model: Callable[[int], float], jobs: int = 500, initial_size: int = 10,
+                              config: Optional[Dict[str, Any]] = None) -> List[Dict[str, float]]:
+    """
+    Offline harness for the batch size controller. Replays 'jobs' synthetic jobs whose
+    latency comes from latency_model(batch_size), flushing the window the same way the
+    sizer does, and returns one snapshot per flush.
+    """
+    config = config or {}
+    window = RollingWindow(int(config.get("window_size", 20)))
+    controller = BatchSizeController()
+    controller.configure(config)
+
+    size = initial_size
+    trajectory = []
+    for i in range(1, jobs + 1):
+        window.add(latency_model(size), True)
+        if i % window.samples.maxlen == 0:
+            stats = window.snapshot()
+            size = controller.update(size, stats["p95"], stats["failure_rate"])
+            trajectory.append({**stats, "job": i, "batch_size": size})
+    return trajectory
 
 
 class PhaseGate:
+    """
+    Holds jobs of a phase until the phase's dependency has progressed far enough.
+    Rules are cached in-process and reloaded when their version key changes.
+    Cursor hashes are fetched once per run per dispatch round (see prefetch), and
+    blocked jobs are parked in a per-gate waiting list until release_ready() opens it.
+    """
     KEY_RULES = "n8n_factory:config:gates"
+    KEY_RULES_VERSION = "n8n_factory:config:gates:version"
+    KEY_WAITING_INDEX = "n8n_factory:gate:waiting"
+    WAITING_KEY_PREFIX = "n8n_factory:gate:waiting"
+    CURSORS_KEY_PREFIX = QueueManager.CURSORS_KEY_PREFIX
     FALLBACK_CURSOR_FILE = ".n8n-factory/cursors.json"
+    RULES_CHECK_INTERVAL = 2 # seconds between rule version checks
+
+    # KEYS: waiting list, waiting index. ARGV: payload, index member.
+    PARK_SCRIPT = """
+redis.call('LPUSH', KEYS[1], ARGV[1])
+redis.call('SADD', KEYS[2], ARGV[2])
+return 1
+"""
+    # Moves every parked job to the consumer end of the queue, oldest first,
+    # and drops the gate from the index in the same step.
+    # KEYS: waiting list, queue, waiting index. ARGV: index member.
+    RELEASE_SCRIPT = """
+local n = 0
+local job = redis.call('LPOP', KEYS[1])
+while job do
+  redis.call('RPUSH', KEYS[2], job)
+  n = n + 1
+  job = redis.call('LPOP', KEYS[1])
+end
+redis.call('SREM', KEYS[3], ARGV[1])
+return n
+"""
     
-    def __init__(self, operator: SystemOperator):
+    def __init__(self, operator: SystemOperator, queue: Optional[QueueManager] = None):
         self.operator = operator
+        # Cursors are read through the queue, so coalesced writes not yet flushed are seen
+        self.queue = queue or QueueManager(operator)
+        self._rules: Dict[str, Dict[str, Any]] = {}
+        self._rules_version: Optional[str] = None
+        self._rules_checked_at = 0.0
+        self._cursor_cache: Dict[str, Dict[str, Any]] = {}
+        self._file_cache: Optional[Dict[str, Any]] = None
 
-    def set_rule(self, phase: str, dependency: str, condition: str = "complete"):
+    def set_rule(self, phase: str, dependency: Union[str, List[str]], condition: str = "complete"):
         """
         Defines a rule: 'phase' cannot run until 'dependency' meets 'condition'.
+        'dependency' may be a list for fan-in phases; entries of the form
+        'phase:condition' override the shared condition for that dependency.
+        Raises ValueError for unknown conditions or if the rule would create a cycle.
         """
+        phase = str(phase)
+        deps = []
+        for spec in ([dependency] if isinstance(dependency, str) else dependency):
+            dep_phase, _, dep_condition = str(spec).partition(":")
+            dep_condition = dep_condition or condition
+            if self.parse_condition(dep_condition) is None:
+                raise ValueError(f"Unknown gate condition '{dep_condition}'")
+            deps.append({"phase": dep_phase, "condition": dep_condition})
+        if not deps:
+            raise ValueError("A gate rule needs at least one dependency")
+
+        # Single dependencies keep the original rule format
+        if len(deps) == 1:
+            rule = {"dependency": deps[0]["phase"], "condition": deps[0]["condition"]}
+        else:
+            rule = {"dependencies": deps}
+
+        self._rules_checked_at = 0.0
+        rules = dict(self.get_rules())
+        rules[phase] = rule
+        cycle = self.find_cycle(rules)
+        if cycle:
+            raise ValueError(f"Gate rule would create a cycle: {' -> '.join(cycle)}")
+
         # We store rules as a hash: phase -> json_rule
-        rule = {"dependency": dependency, "condition": condition}
-        self.operator.inspect_redis(["HSET", self.KEY_RULES, str(phase), json.dumps(rule)])
+        self.operator.inspect_redis(["HSET", self.KEY_RULES, phase, json.dumps(rule)])
+        self.operator.inspect_redis(["INCR", self.KEY_RULES_VERSION])
+        self._rules_checked_at = 0.0
 
-    def get_rule(self, phase: str) -> Optional[Dict[str, Any]]:
-        res = self.operator.inspect_redis(["HGET", self.KEY_RULES, str(phase)])
-        if res and res.strip():
+    def remove_rule(self, phase: str):
+        self.operator.inspect_redis(["HDEL", self.KEY_RULES, str(phase)])
+        self.operator.inspect_redis(["INCR", self.KEY_RULES_VERSION])
+        self._rules_checked_at = 0.0
+
+    @staticmethod
+    def parse_condition(condition: str) -> Optional[float]:
+        """
+        Returns the progress fraction a condition requires: 'complete' is 1.0,
+        'progress>=0.8' is 0.8. Returns None if the condition is not recognised.
+        """
+        condition = (condition or "complete").replace(" ", "")
+        if condition == "complete":
+            return 1.0
+        if condition.startswith("progress>="):
             try:
-                return json.loads(res)
-            except:
-                pass
+                threshold = float(condition[len("progress>="):])
+            except ValueError:
+                return None
+            return threshold if 0.0 < threshold <= 1.0 else None
+        return None
+
+    @staticmethod
+    def rule_dependencies(rule: Optional[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        """Normalises both rule formats to a list of (phase, condition)."""
+        if not rule:
+            return []
+        if "dependencies" in rule:
+            return [(str(d.get("phase")), d.get("condition", "complete")) for d in rule["dependencies"]]
+        return [(str(rule.get("dependency")), rule.get("condition", "complete"))]
+
+    @classmethod
+    def find_cycle(cls, rules: Dict[str, Dict[str, Any]]) -> Optional[List[str]]:
+        """Returns the phases of a dependency cycle, or None if the rules form a DAG."""
+        graph = {phase: [dep for dep, _ in cls.rule_dependencies(rule)] for phase, rule in rules.items()}
+        state: Dict[str, int] = {} # 1 = on the current path, 2 = done
+        path: List[str] = []
+
+        def visit(phase: str) -> Optional[List[str]]:
+            state[phase] = 1
+            path.append(phase)
+            for dep in graph.get(phase, []):
+                if state.get(dep) == 1:
+                    return path[path.index(dep):] + [dep]
+                if dep not in state:
+                    cycle = visit(dep)
+                    if cycle:
+                        return cycle
+            path.pop()
+            state[phase] = 2
+            return None
+
+        for phase in graph:
+            if phase not in state:
+                cycle = visit(phase)
+                if cycle:
+                    return cycle
         return None
 
+    def get_rules(self) -> Dict[str, Dict[str, Any]]:
+        now = time.time()
+        if now - self._rules_checked_at < self.RULES_CHECK_INTERVAL:
+            return self._rules
+        self._rules_checked_at = now
+
+        try:
+            version = self.operator.redis(["GET", self.KEY_RULES_VERSION])
+            if version and version == self._rules_version:
+                return self._rules
+            res = self.operator.redis(["HGETALL", self.KEY_RULES])
+        except RedisError as e:
+            logger.warning(f"Failed to read gate rules, keeping the cached ones: {e}")
+            return self._rules
+
+        rules = {}
+        for phase, rule in pairs_to_dict(res).items():
+            try:
+                rules[phase] = json.loads(rule)
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring invalid gate rule for phase '{phase}'")
+        self._rules = rules
+        self._rules_version = version
+        return rules
+
+    def get_rule(self, phase: str) -> Optional[Dict[str, Any]]:
+        return self.get_rules().get(str(phase))
+
+    def prefetch(self, jobs: List[Dict[str, Any]]):
+        """
+        Loads cursors for every run that has a gated job in 'jobs' in one round-trip,
+        so the following can_run() calls don't go back to Redis.
+        """
+        self._cursor_cache = {}
+        self._file_cache = None
+        rules = self.get_rules()
+        if not rules:
+            return
+        run_ids: List[str] = []
+        for job in jobs:
+            meta = job.get("meta") or {}
+            run_id = meta.get("run_id", "default")
+            if str(meta.get("phase")) in rules and run_id not in run_ids:
+                run_ids.append(run_id)
+        if len(run_ids) == 1:
+            self._cursor_cache[run_ids[0]] = self._load_cursors(run_ids[0])
+        elif run_ids:
+            self._cursor_cache.update(self.queue.get_cursors_bulk(run_ids))
+
+    def _load_cursors(self, run_id: str) -> Dict[str, Any]:
+        return self.queue.get_all_cursors(run_id)
+
     def can_run(self, run_id: str, phase: str) -> bool:
         """
         Checks if the phase is allowed to run for the given run_id.
+        Every dependency must meet its condition.
         """
-        rule = self.get_rule(phase)
-        if not rule:
+        deps = self.rule_dependencies(self.get_rule(phase))
+        if not deps:
             return True # No rule = open
-            
-        dep_phase = rule.get("dependency")
-        cursor_key = f"n8n_factory:cursors:{run_id}"
-        dep_current_field = f"{dep_phase}_current"
-        dep_total_field = f"{dep_phase}_total"
-        
-        # 1. Try Redis
-        current_val, total_val = self._check_redis(cursor_key, dep_current_field, dep_total_field)
-        
-        # 2. Try File Fallback if Redis missed
-        if current_val is None or total_val is None:
-            current_val, total_val = self._check_file(run_id, dep_current_field, dep_total_field)
 
-        # 3. Evaluate
-        # Default to locked if data missing
-        if current_val is None or total_val is None:
-            return False
-            
-        if rule.get("condition") == "complete":
-            # Complete means current >= total
-            # Also require total > 0 to ensure it actually started/initialized
-            if total_val > 0 and current_val >= total_val:
-                return True
-            return False
-            
+        # Redis (prefetched for this round if available)
+        if run_id not in self._cursor_cache:
+            self._cursor_cache[run_id] = self._load_cursors(run_id)
+        cursors = self._cursor_cache[run_id]
+
+        for dep_phase, condition in deps:
+            progress = self._progress(run_id, cursors, dep_phase)
+            # Default to locked if data missing
+            if progress is None:
+                return False
+            required = self.parse_condition(condition)
+            if required is not None and progress < required:
+                return False
         return True
 
-    def _check_redis(self, key, field_current, field_total):
-        vals = self.operator.inspect_redis(["HMGET", key, field_current, field_total])
-        if not vals:
-            return None, None
-        
-        lines = vals.splitlines()
+    def _progress(self, run_id: str, cursors: Dict[str, Any], phase: str) -> Optional[float]:
+        """Fraction of 'phase' done for the run, from Redis cursors or the fallback file."""
+        field_current, field_total = f"{phase}_current", f"{phase}_total"
+        current_val = self._to_int(cursors.get(field_current))
+        total_val = self._to_int(cursors.get(field_total))
+
+        # Try File Fallback if Redis missed
+        if current_val is None or total_val is None:
+            current_val, total_val = self._check_file(run_id, field_current, field_total)
+            current_val, total_val = self._to_int(current_val), self._to_int(total_val)
+
+        # Require total > 0 to ensure the phase actually started/initialized
+        if current_val is None or total_val is None or total_val <= 0:
+            return None
+        return min(1.0, current_val / total_val)
+
+    def graph(self, run_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Describes the gate DAG and its critical path. A phase can start once each
+        dependency reaches its required progress, so a 'progress>=0.8' edge lets
+        the phases overlap. Phase durations are 1 unit, or the phase's item total
+        when a run_id is given. Progress per phase is included for that run.
+        """
+        rules = self.get_rules()
+        cursors = self._load_cursors(run_id) if run_id else {}
+        phases: List[str] = []
+        for phase, rule in rules.items():
+            for dep, _ in self.rule_dependencies(rule):
+                if dep not in phases:
+                    phases.append(dep)
+            if phase not in phases:
+                phases.append(phase)
+
+        def duration(phase: str) -> float:
+            total = self._to_int(cursors.get(f"{phase}_total"))
+            return float(total) if total else 1.0
+
+        start: Dict[str, float] = {}
+        finish: Dict[str, float] = {}
+        binding: Dict[str, Optional[str]] = {}
+
+        def schedule(phase: str):
+            if phase in finish:
+                return
+            start[phase], binding[phase] = 0.0, None
+            for dep, condition in self.rule_dependencies(rules.get(phase)):
+                schedule(dep)
+                required = self.parse_condition(condition) or 1.0
+                ready = start[dep] + required * duration(dep)
+                if ready > start[phase]:
+                    start[phase], binding[phase] = ready, dep
+            finish[phase] = start[phase] + duration(phase)
+
+        if self.find_cycle(rules):
+            raise ValueError("Gate rules contain a cycle")
+        for phase in phases:
+            schedule(phase)
+
+        critical_path: List[str] = []
+        if finish:
+            node: Optional[str] = max(phases, key=lambda p: finish[p])
+            while node is not None:
+                critical_path.insert(0, node)
+                node = binding[node]
+
+        nodes = []
+        for phase in phases:
+            node_info = {
+                "phase": phase,
+                "dependencies": [{"phase": d, "condition": c} for d, c in self.rule_dependencies(rules.get(phase))],
+                "start": round(start[phase], 3),
+                "finish": round(finish[phase], 3),
+            }
+            if run_id:
+                node_info["progress"] = self._progress(run_id, cursors, phase)
+            nodes.append(node_info)
+
+        return {
+            "phases": nodes,
+            "critical_path": critical_path,
+            "makespan": round(max(finish.values()), 3) if finish else 0.0,
+        }
+
+    @staticmethod
+    def _to_int(value: Any) -> Optional[int]:
         try:
-            c = int(lines[0]) if len(lines) > 0 and lines[0].strip() else None
-            t = int(lines[1]) if len(lines) > 1 and lines[1].strip() else None
-            return c, t
-        except (ValueError, IndexError):
-            return None, None
+            return int(value) if value is not None and str(value).strip() else None
+        except (ValueError, TypeError):
+            return None
 
     def _check_file(self, run_id, field_current, field_total):
-        if not os.path.exists(self.FALLBACK_CURSOR_FILE):
-            return None, None
-            
-        try:
-            with open(self.FALLBACK_CURSOR_FILE, 'r') as f:
-                data = json.load(f)
-                run_data = data.get(run_id, {})
-                c = run_data.get(field_current)
-                t = run_data.get(field_total)
-                return c, t
-        except Exception as e:
-            logger.warning(f"Failed to read fallback cursor file: {e}")
-            return None, None
+        if self._file_cache is None:
+            self._file_cache = {}
+            if not os.path.exists(self.FALLBACK_CURSOR_FILE):
+                return None, None
+            try:
+                with open(self.FALLBACK_CURSOR_FILE, 'r') as f:
+                    self._file_cache = json.load(f)
+            except Exception as e:
+                logger.warning(f"Failed to read fallback cursor file: {e}")
+                return None, None
+
+        run_data = self._file_cache.get(run_id, {})
+        return run_data.get(field_current), run_data.get(field_total)
+
+    # Parking
+
+    def _waiting_key(self, run_id: str, phase: str) -> str:
+        return f"{self.WAITING_KEY_PREFIX}:{run_id}:{phase}"
+
+    def park(self, job: Dict[str, Any]):
+        """Parks a blocked job until its gate opens."""
+        meta = job.get("meta") or {}
+        run_id, phase = str(meta.get("run_id", "default")), str(meta.get("phase"))
+        self.operator.inspect_redis([
+            "EVAL", self.PARK_SCRIPT, "2", self._waiting_key(run_id, phase), self.KEY_WAITING_INDEX,
+            json.dumps(job), json.dumps([run_id, phase])
+        ])
+
+    def waiting_gates(self) -> List[Tuple[str, str]]:
+        """(run_id, phase) pairs with parked jobs, read with SSCAN so a large index is paged."""
+        gates = []
+        cursor = "0"
+        while True:
+            try:
+                reply = self.operator.redis(["SSCAN", self.KEY_WAITING_INDEX, cursor, "COUNT", "500"])
+            except RedisError as e:
+                logger.warning(f"Failed to read parked gates: {e}")
+                return gates
+            if not isinstance(reply, list) or len(reply) != 2:
+                return gates
+            cursor, members = str(reply[0]), reply[1]
+            for member in (members if isinstance(members, list) else []):
+                try:
+                    run_id, phase = json.loads(member)
+                    gates.append((run_id, phase))
+                except (TypeError, ValueError):
+                    continue
+            if cursor == "0":
+                return gates
+
+    def waiting_count(self, run_id: str, phase: str) -> int:
+        res = self.operator.inspect_redis(["LLEN", self._waiting_key(run_id, phase)])
+        return self._to_int(res) or 0
+
+    def release_ready(self, queue_key: str) -> int:
+        """
+        Moves parked jobs whose gate has opened to the front of the queue.
+        Returns the number of jobs released.
+        """
+        gates = self.waiting_gates()
+        if not gates:
+            return 0
+
+        self.prefetch([{"meta": {"run_id": run_id, "phase": phase}} for run_id, phase in gates])
+        released = 0
+        for run_id, phase in gates:
+            if not self.can_run(run_id, phase):
+                continue
+            res = self.operator.inspect_redis([
+                "EVAL", self.RELEASE_SCRIPT, "3", self._waiting_key(run_id, phase), queue_key,
+                self.KEY_WAITING_INDEX, json.dumps([run_id, phase])
+            ])
+            count = self._to_int(res) or 0
+            if count:
+                logger.info(f"Gate open for phase {phase} (run {run_id}). Released {count} parked job(s).")
+            released += count
+        return released
 
 class AutoRefiller:
     def __init__(self, operator: SystemOperator):
@@ -230,3 +701,132 @@ class AutoRefiller:
                     subprocess.Popen(command, shell=True)
                 except Exception as e:
                     logger.error(f"Failed to trigger refill command: {e}")
+
+class RateLimiter:
+    """
+    Token-bucket rate limits shared across schedulers via Redis.
+    Rules are stored per scope:
+      - 'workflow:<id>'       one bucket for a workflow
+      - 'meta:<key>=<value>'  one bucket for jobs whose meta matches exactly
+      - 'meta:<key>'          one bucket per distinct value of a meta key
+    """
+    KEY_RULES = "n8n_factory:config:rate_limits"
+    KEY_BUCKET_PREFIX = "n8n_factory:ratelimit"
+    RULES_TTL = 5 # seconds between rule refreshes
+
+    # Checks every bucket first and only takes a token from each if all of them
+    # have one, so a job never burns quota on one limit while blocked on another.
+    # Uses the server clock so all schedulers agree on refill time.
+    # KEYS: bucket keys. ARGV: rate, burst pairs (tokens/sec, capacity).
+    # Returns 0 if allowed, otherwise ms until a token is available.
+    TOKEN_BUCKET_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local wait = 0
+local tokens = {}
+for i, key in ipairs(KEYS) do
+  local rate = tonumber(ARGV[2 * i - 1])
+  local burst = tonumber(ARGV[2 * i])
+  local b = redis.call('HMGET', key, 'tokens', 'ts')
+  local cur = tonumber(b[1]) or burst
+  local ts = tonumber(b[2]) or now
+  cur = math.min(burst, cur + math.max(0, now - ts) * rate / 1000)
+  tokens[i] = cur
+  if cur < 1 then
+    wait = math.max(wait, math.ceil((1 - cur) * 1000 / rate))
+  end
+end
+if wait == 0 then
+  for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    redis.call('HMSET', key, 'tokens', tostring(tokens[i] - 1), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(burst * 1000 / rate) + 1000)
+  end
+end
+return wait
+"""
+
+    def __init__(self, operator: SystemOperator):
+        self.operator = operator
+        self._rules: Dict[str, Dict[str, Any]] = {}
+        self._rules_loaded_at = 0.0
+
+    def set_limit(self, scope: str, rate: float, burst: Optional[int] = None):
+        """
+        Sets a limit of 'rate' jobs per second for a scope, allowing bursts of 'burst' jobs.
+        """
+        if rate <= 0:
+            raise ValueError("Rate must be greater than 0")
+        rule = {"rate": rate, "burst": burst or max(1, int(rate))}
+        self.operator.inspect_redis(["HSET", self.KEY_RULES, scope, json.dumps(rule)])
+        self._rules_loaded_at = 0.0
+
+    def remove_limit(self, scope: str):
+        self.operator.inspect_redis(["HDEL", self.KEY_RULES, scope])
+        self._rules_loaded_at = 0.0
+
+    def get_limits(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            res = self.operator.redis(["HGETALL", self.KEY_RULES])
+        except RedisError as e:
+            logger.warning(f"Failed to read rate limit rules: {e}")
+            return {}
+        rules = {}
+        for scope, rule in pairs_to_dict(res).items():
+            try:
+                rules[scope] = json.loads(rule)
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring invalid rate limit rule for '{scope}'")
+        return rules
+
+    def _get_rules(self) -> Dict[str, Dict[str, Any]]:
+        now = time.time()
+        if now - self._rules_loaded_at > self.RULES_TTL:
+            self._rules = self.get_limits()
+            self._rules_loaded_at = now
+        return self._rules
+
+    def buckets_for(self, workflow: str, meta: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Returns (bucket_key, rule) pairs that apply to a job."""
+        rules = self._get_rules()
+        if not rules:
+            return []
+
+        buckets = []
+        scope = f"workflow:{workflow}"
+        if scope in rules:
+            buckets.append((f"{self.KEY_BUCKET_PREFIX}:{scope}", rules[scope]))
+
+        for key, value in (meta or {}).items():
+            if isinstance(value, (dict, list)):
+                continue
+            exact = f"meta:{key}={value}"
+            if exact in rules:
+                buckets.append((f"{self.KEY_BUCKET_PREFIX}:{exact}", rules[exact]))
+            per_value = f"meta:{key}"
+            if per_value in rules:
+                buckets.append((f"{self.KEY_BUCKET_PREFIX}:{per_value}:{value}", rules[per_value]))
+        return buckets
+
+    def acquire(self, workflow: str, meta: Dict[str, Any] = {}) -> int:
+        """
+        Takes one token from every bucket that applies to the job.
+        Returns 0 if the job may run, otherwise the delay in ms before retrying.
+        """
+        buckets = self.buckets_for(workflow, meta)
+        if not buckets:
+            return 0
+
+        keys = [key for key, _ in buckets]
+        args = []
+        for _, rule in buckets:
+            args.extend([str(rule.get("rate", 1)), str(rule.get("burst", 1))])
+
+        res = self.operator.inspect_redis(["EVAL", self.TOKEN_BUCKET_SCRIPT, str(len(keys))] + keys + args)
+        try:
+            return int(res)
+        except (ValueError, TypeError):
+            # Fail open: a broken limiter should not stall the queue.
+            logger.warning(f"Rate limit check failed for '{workflow}': {res}")
+            return 0
@@ -0,0 +1,206 @@
+import os
+import socket
+import uuid
+from typing import Optional, List
+from .operator import SystemOperator
+from .resp import RedisError
+from .logger import logger
+
+def default_instance_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LeaderElection:
+    """
+    Redis lease: one instance holds the key and renews it every tick.
+    If the holder stops renewing, the lease expires and another instance takes it.
+    """
+    KEY_PREFIX = "n8n_factory:leader"
+
+    # KEYS: lease key. ARGV: instance id, ttl (ms). Returns 1 if this instance holds the lease.
+    ACQUIRE_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder == ARGV[1] then
+  redis.call('PEXPIRE', KEYS[1], ARGV[2])
+  return 1
+end
+if not holder then
+  redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+  return 1
+end
+return 0
+"""
+    # Only the holder may release.
+    RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+    def __init__(self, operator: SystemOperator, name: str = "scheduler", ttl_ms: int = 15000, instance_id: Optional[str] = None):
+        self.operator = operator
+        self.key = f"{self.KEY_PREFIX}:{name}"
+        self.ttl_ms = ttl_ms
+        self.instance_id = instance_id or default_instance_id()
+        self.is_leader = False
+
+    def try_acquire(self) -> bool:
+        """Acquires or renews the lease. Returns True if this instance is the leader."""
+        res = self.operator.inspect_redis(["EVAL", self.ACQUIRE_SCRIPT, "1", self.key, self.instance_id, str(self.ttl_ms)])
+        leader = isinstance(res, str) and res.strip() == "1"
+        if leader != self.is_leader:
+            logger.info(f"{'Acquired' if leader else 'Lost'} scheduler leadership ({self.instance_id}).")
+        self.is_leader = leader
+        return leader
+
+    def release(self):
+        if self.is_leader:
+            self.operator.inspect_redis(["EVAL", self.RELEASE_SCRIPT, "1", self.key, self.instance_id])
+            self.is_leader = False
+
+    def current_leader(self) -> Optional[str]:
+        try:
+            return self.operator.redis(["GET", self.key]) or None
+        except RedisError:
+            return None
+
+
+class SlotSemaphore:
+    """
+    Execution slots kept in Redis. Each dispatched job holds a lease (a ZSET member
+    scored by its expiry) from dispatch until it completes, so a finished job frees
+    its slot at once and the limit holds across instances. Leases of crashed
+    instances expire after lease_ttl_ms.
+    """
+    KEY = "n8n_factory:slots"
+    SEQ_KEY = "n8n_factory:slots:seq"
+
+    # Grants up to ARGV[3] leases so that the leases held never exceed ARGV[2].
+    # KEYS: slots zset, sequence. ARGV: ttl (ms), capacity, wanted, owner.
+    ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local used = redis.call('ZCARD', KEYS[1])
+local grant = math.min(tonumber(ARGV[3]), tonumber(ARGV[2]) - used)
+local leases = {}
+for i = 1, grant do
+  local id = ARGV[4] .. ':' .. redis.call('INCR', KEYS[2])
+  redis.call('ZADD', KEYS[1], now + tonumber(ARGV[1]), id)
+  leases[i] = id
+end
+return leases
+"""
+    # Replaces the placeholder leases for executions started outside the queue:
+    # as many as the DB count exceeds the real leases held, expiring after ARGV[2] ms.
+    # KEYS: slots zset. ARGV: running executions in the DB, ttl (ms). Returns the placeholders added.
+    RECONCILE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+for _, member in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+  if string.sub(member, 1, 9) == 'external:' then
+    redis.call('ZREM', KEYS[1], member)
+  end
+end
+local missing = tonumber(ARGV[1]) - redis.call('ZCARD', KEYS[1])
+for i = 1, missing do
+  redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), 'external:' .. i)
+end
+return math.max(missing, 0)
+"""
+
+    def __init__(self, operator: SystemOperator, capacity: int, owner: Optional[str] = None, lease_ttl_ms: int = 3600 * 1000):
+        self.operator = operator
+        self.capacity = capacity
+        self.owner = owner or default_instance_id()
+        self.lease_ttl_ms = lease_ttl_ms
+
+    def acquire(self, wanted: int) -> Optional[List[str]]:
+        """
+        Returns the lease ids granted (possibly fewer than wanted, or none),
+        or None if Redis could not be reached.
+        """
+        if wanted <= 0:
+            return []
+        try:
+            res = self.operator.redis([
+                "EVAL", self.ACQUIRE_SCRIPT, "2", self.KEY, self.SEQ_KEY,
+                str(self.lease_ttl_ms), str(self.capacity), str(wanted), self.owner
+            ])
+        except RedisError as e:
+            logger.warning(f"Slot acquisition failed: {e}")
+            return None
+        if isinstance(res, str):
+            # Through redis-cli a script's array reply comes back one element per line
+            res = res.split()
+        return [str(lease) for lease in res] if isinstance(res, list) else []
+
+    def reconcile(self, db_active: int, ttl_ms: int) -> Optional[int]:
+        """
+        Corrects drift against the DB: running executions without a lease
+        (started outside the queue) get placeholder leases until the next
+        reconciliation. Returns the placeholders held, or None on failure.
+        """
+        try:
+            return int(self.operator.redis(["EVAL", self.RECONCILE_SCRIPT, "1", self.KEY, str(max(0, db_active)), str(ttl_ms)]))
+        except (RedisError, ValueError, TypeError) as e:
+            logger.warning(f"Slot reconciliation failed: {e}")
+            return None
+
+    def release(self, lease_id: str):
+        self.operator.inspect_redis(["ZREM", self.KEY, lease_id])
+
+    def in_use(self) -> int:
+        try:
+            return int(self.operator.redis(["ZCARD", self.KEY]))
+        except (RedisError, ValueError, TypeError):
+            return 0
+
+
+class ClusterCoordinator:
+    """
+    Multi-instance scheduling: a leader runs the singleton duties (delayed-job
+    promotion, refill, gate release, DB reconciliation) and publishes the DB
+    count for `queue cluster`; every instance dispatches through SlotSemaphore.
+    """
+    KEY_ACTIVE = "n8n_factory:cluster:active_executions"
+
+    def __init__(self, operator: SystemOperator, concurrency: int, instance_id: Optional[str] = None,
+                 lease_ttl_ms: int = 15000, active_ttl_ms: int = 300000):
+        self.operator = operator
+        self.instance_id = instance_id or default_instance_id()
+        self.election = LeaderElection(operator, ttl_ms=lease_ttl_ms, instance_id=self.instance_id)
+        self.slots = SlotSemaphore(operator, concurrency, owner=self.instance_id)
+        self.active_ttl_ms = active_ttl_ms
+
+    @property
+    def is_leader(self) -> bool:
+        return self.election.is_leader
+
+    def elect(self) -> bool:
+        return self.election.try_acquire()
+
+    def publish_active(self, count: int):
+        self.operator.inspect_redis(["SET", self.KEY_ACTIVE, str(count), "PX", str(self.active_ttl_ms)])
+
+    def shared_active(self) -> int:
+        """Active executions as last published by the leader (0 if unknown)."""
+        res = self.operator.inspect_redis(["GET", self.KEY_ACTIVE])
+        try:
+            return int(res)
+        except (ValueError, TypeError):
+            return 0
+
+    def status(self) -> dict:
+        return {
+            "instance_id": self.instance_id,
+            "leader": self.election.current_leader(),
+            "slots_in_use": self.slots.in_use(),
+            "capacity": self.slots.capacity,
+            "active_executions": self.shared_active(),
+        }
+
+    def shutdown(self):
+        self.election.release()
@@ -0,0 +1,249 @@
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Compiler for the n8n expressions the simulator understands, e.g.
+#   {{ $json.a.b }}  {{ $json["x y"][0] }}  {{ $node["Fetch"].json.id }}
+#   {{ $json.price * $json.qty > 100 && $json.status != "done" }}
+# A template string is parsed once into a closure taking (item, nodes), where
+# nodes maps step ids to their first output item ({"json": ...}).
+
+Evaluator = Callable[[Dict[str, Any], Dict[str, Any]], Any]
+
+TEMPLATE = re.compile(r'{{(.*?)}}', re.S)
+TOKEN = re.compile(r'''
+    \s*(?:
+      (?P<number>\d+(?:\.\d+)?)
+    | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    | (?P<name>[$A-Za-z_][$\w]*)
+    | (?P<op>===|!==|==|!=|<=|>=|&&|\|\||[-+*/%<>!?:.()\[\]])
+    )''', re.X)
+
+# Binary operators by precedence, lowest first
+PRECEDENCE = [("||",), ("&&",), ("==", "!=", "===", "!=="), ("<", ">", "<=", ">="), ("+", "-"), ("*", "/", "%")]
+LITERALS = {"true": True, "false": False, "null": None, "undefined": None}
+
+
+class ExpressionError(ValueError):
+    """An expression the compiler cannot parse."""
+
+
+def _tokenize(source: str) -> List[Tuple[str, str]]:
+    tokens = []
+    pos = 0
+    source = source.rstrip()
+    while pos < len(source):
+        match = TOKEN.match(source, pos)
+        if not match or match.end() == pos:
+            raise ExpressionError(f"Unexpected character at {pos}: {source[pos:pos + 10]!r}")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+
+def _loose_equal(a: Any, b: Any) -> bool:
+    if a == b:
+        return True
+    if isinstance(a, (int, float)) and isinstance(b, str) or isinstance(b, (int, float)) and isinstance(a, str):
+        try:
+            return float(a) == float(b)
+        except ValueError:
+            return False
+    return False
+
+
+def _add(a: Any, b: Any) -> Any:
+    if isinstance(a, str) or isinstance(b, str):
+        return f"{'' if a is None else a}{'' if b is None else b}"
+    return a + b
+
+
+def _safe(op: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+    def apply(a, b):
+        try:
+            return op(a, b)
+        except (TypeError, ZeroDivisionError):
+            return None
+    return apply
+
+
+BINARY = {
+    "==": _loose_equal,
+    "!=": lambda a, b: not _loose_equal(a, b),
+    "===": lambda a, b: a == b and type(a) is type(b),
+    "!==": lambda a, b: not (a == b and type(a) is type(b)),
+    "<": _safe(lambda a, b: a < b),
+    ">": _safe(lambda a, b: a > b),
+    "<=": _safe(lambda a, b: a <= b),
+    ">=": _safe(lambda a, b: a >= b),
+    "+": _safe(_add),
+    "-": _safe(lambda a, b: a - b),
+    "*": _safe(lambda a, b: a * b),
+    "/": _safe(lambda a, b: a / b),
+    "%": _safe(lambda a, b: a % b),
+}
+
+
+def _get(container: Any, key: Any) -> Any:
+    if isinstance(container, dict):
+        return container.get(key)
+    if isinstance(container, (list, str)) and isinstance(key, (int, float)) and not isinstance(key, bool):
+        index = int(key)
+        return container[index] if -len(container) <= index < len(container) else None
+    if isinstance(container, (list, str)) and key == "length":
+        return len(container)
+    return None
+
+
+class _Parser:
+    """Recursive descent over the token list, building closures as it goes."""
+
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos][1] if self.pos < len(self.tokens) else None
+
+    def take(self, expected: Optional[str] = None) -> Tuple[str, str]:
+        if self.pos >= len(self.tokens):
+            raise ExpressionError("Unexpected end of expression")
+        token = self.tokens[self.pos]
+        if expected is not None and token[1] != expected:
+            raise ExpressionError(f"Expected {expected!r}, got {token[1]!r}")
+        self.pos += 1
+        return token
+
+    def parse(self) -> Evaluator:
+        node = self.ternary()
+        if self.pos != len(self.tokens):
+            raise ExpressionError(f"Unexpected {self.peek()!r}")
+        return node
+
+    def ternary(self) -> Evaluator:
+        cond = self.binary(0)
+        if self.peek() != "?":
+            return cond
+        self.take("?")
+        yes = self.ternary()
+        self.take(":")
+        no = self.ternary()
+        return lambda item, nodes: yes(item, nodes) if cond(item, nodes) else no(item, nodes)
+
+    def binary(self, level: int) -> Evaluator:
+        if level == len(PRECEDENCE):
+            return self.unary()
+        left = self.binary(level + 1)
+        while self.peek() in PRECEDENCE[level] and self.tokens[self.pos][0] == "op":
+            op = self.take()[1]
+            right = self.binary(level + 1)
+            if op == "&&":
+                left = (lambda lhs, rhs: lambda item, nodes: lhs(item, nodes) and rhs(item, nodes))(left, right)
+            elif op == "||":
+                left = (lambda lhs, rhs: lambda item, nodes: lhs(item, nodes) or rhs(item, nodes))(left, right)
+            else:
+                left = (lambda f, lhs, rhs: lambda item, nodes: f(lhs(item, nodes), rhs(item, nodes)))(BINARY[op], left, right)
+        return left
+
+    def unary(self) -> Evaluator:
+        if self.peek() == "!":
+            self.take()
+            operand = self.unary()
+            return lambda item, nodes: not operand(item, nodes)
+        if self.peek() == "-":
+            self.take()
+            operand = self.unary()
+            negate = _safe(lambda a, _: -a)
+            return lambda item, nodes: negate(operand(item, nodes), None)
+        return self.postfix(self.primary())
+
+    def postfix(self, node: Evaluator) -> Evaluator:
+        while self.peek() in (".", "["):
+            if self.take()[1] == ".":
+                kind, name = self.take()
+                if kind != "name":
+                    raise ExpressionError(f"Expected a property name, got {name!r}")
+                node = (lambda n, key: lambda item, nodes: _get(n(item, nodes), key))(node, name)
+            else:
+                key = self.ternary()
+                self.take("]")
+                node = (lambda n, k: lambda item, nodes: _get(n(item, nodes), k(item, nodes)))(node, key)
+        return node
+
+    def primary(self) -> Evaluator:
+        kind, value = self.take()
+        if kind == "number":
+            number = float(value) if "." in value else int(value)
+            return lambda item, nodes: number
+        if kind == "string":
+            text = re.sub(r'\\(.)', r'\1', value[1:-1])
+            return lambda item, nodes: text
+        if kind == "name":
+            if value == "$json":
+                return lambda item, nodes: item.get("json", {})
+            if value == "$node":
+                return lambda item, nodes: nodes
+            if value in LITERALS:
+                constant = LITERALS[value]
+                return lambda item, nodes: constant
+            raise ExpressionError(f"Unknown name {value!r}")
+        if value == "(":
+            node = self.ternary()
+            self.take(")")
+            return node
+        raise ExpressionError(f"Unexpected {value!r}")
+
+
+@lru_cache(maxsize=4096)
+def compile_expression(source: str) -> Evaluator:
+    """Compiles the inside of one {{ ... }} into a closure. Raises ExpressionError."""
+    return _Parser(_tokenize(source)).parse()
+
+
+@lru_cache(maxsize=4096)
+def compile_template(template: str) -> Evaluator:
+    """
+    Compiles a string with {{ ... }} placeholders. Each placeholder is replaced
+    by str() of its value; placeholders that evaluate to null/undefined or do
+    not parse are left as written, like the original regex resolver.
+    """
+    parts: List[Any] = []
+    last = 0
+    for match in TEMPLATE.finditer(template):
+        if match.start() > last:
+            parts.append(template[last:match.start()])
+        try:
+            parts.append((compile_expression(match.group(1).strip()), match.group(0)))
+        except ExpressionError:
+            parts.append(match.group(0))
+        last = match.end()
+    if last < len(template):
+        parts.append(template[last:])
+
+    if not any(isinstance(p, tuple) for p in parts):
+        return lambda item, nodes: template
+
+    def render(item, nodes):
+        out = []
+        for part in parts:
+            if isinstance(part, str):
+                out.append(part)
+            else:
+                value = part[0](item, nodes)
+                out.append(part[1] if value is None else str(value))
+        return "".join(out)
+    return render
+
+
+def compile_value(value: Any) -> Evaluator:
+    """Compiles a parameter value (string, or dict/list of them) once for all items."""
+    if isinstance(value, str):
+        return compile_template(value) if "{{" in value else (lambda item, nodes: value)
+    if isinstance(value, dict):
+        fields = [(k, compile_value(v)) for k, v in value.items()]
+        return lambda item, nodes: {k: f(item, nodes) for k, f in fields}
+    if isinstance(value, list):
+        elements = [compile_value(v) for v in value]
+        return lambda item, nodes: [f(item, nodes) for f in elements]
+    return lambda item, nodes: value
@@ -0,0 +1,343 @@
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+from .logger import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation and appends are not locked across processes
+    fcntl = None
+
+# Columns kept in sealed segments. Workflow and status are dictionary-encoded.
+COLUMNS = ["timestamp", "workflow", "status", "duration", "retries", "batch_size", "error", "meta"]
+DICT_COLUMNS = ("workflow", "status")
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linear-interpolated percentile (q in 0..100) of an unsorted list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100.0
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+@contextmanager
+def log_lock(path: str):
+    """
+    Exclusive lock on '<path>.lock'. Appends and rotation both take it, so
+    `analytics --compact` in another process can't truncate the active log
+    between the scheduler's appends.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as handle:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+def parse_time(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """
+    Parses an epoch timestamp, an ISO date/time, or a relative age such as
+    '30m', '24h' or '7d' (meaning that long ago).
+    """
+    if value is None or value == "":
+        return None
+    now = time.time() if now is None else now
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhdw])", value.strip())
+    if match:
+        units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+        return now - float(match.group(1)) * units[match.group(2)]
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Unrecognised time '{value}' (use epoch seconds, ISO date, or e.g. 24h / 7d)")
+
+
+class JobHistorySink:
+    """
+    Append-only job history for the scheduler.
+
+    Entries are buffered in memory and appended to the active JSONL file in
+    batches. When the active file exceeds max_bytes or is older than
+    rotate_interval, it is sealed into a gzip'd columnar segment under
+    '<log dir>/history/' and registered in index.json with its time range and
+    workflows, so analytics only opens the segments a query needs.
+    """
+    INDEX_FILE = "index.json"
+
+    def __init__(self, path: str = "logs/jobs.jsonl", flush_size: int = 50, flush_interval: float = 5.0,
+                 max_bytes: int = 10 * 1024 * 1024, rotate_interval: float = 86400.0):
+        self.path = path
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.segment_dir = os.path.join(os.path.dirname(path) or ".", "history")
+        self.buffer: List[Dict[str, Any]] = []
+        self.last_flush = time.monotonic()
+        self._lock = threading.RLock() # the scheduler may write from dispatch threads
+
+    def write(self, entry: Dict[str, Any]):
+        with self._lock:
+            self.buffer.append(entry)
+            if len(self.buffer) >= self.flush_size:
+                self.flush()
+            else:
+                self.flush_if_due()
+
+    def flush_if_due(self):
+        """Flushes when flush_interval has passed, so idle periods don't hold entries back."""
+        if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Appends buffered entries to the active file, rotating it if due."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        self.last_flush = time.monotonic()
+        try:
+            with log_lock(self.path):
+                if self.buffer:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write("".join(json.dumps(entry) + "\n" for entry in self.buffer))
+                    self.buffer = []
+                if self._rotation_due():
+                    self._rotate()
+        except Exception as e:
+            logger.error(f"Failed to write job log: {e}")
+
+    def close(self):
+        self.flush()
+
+    def _rotation_due(self) -> bool:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return False
+        if size == 0:
+            return False
+        if size >= self.max_bytes:
+            return True
+        first = self._first_timestamp()
+        return first is not None and time.time() - first >= self.rotate_interval
+
+    def _first_timestamp(self) -> Optional[float]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return float(json.loads(f.readline()).get("timestamp"))
+        except Exception:
+            return None
+
+    def rotate(self) -> Optional[str]:
+        """
+        Seals the active file into a compressed columnar segment.
+        Returns the segment path, or None if there was nothing to seal.
+        """
+        with self._lock:
+            if not self.buffer and not os.path.exists(self.path):
+                return None
+            with log_lock(self.path):
+                return self._rotate()
+
+    def _rotate(self) -> Optional[str]:
+        # Called with log_lock held
+        self.buffer, pending = [], self.buffer
+        if pending:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in pending))
+
+        entries = read_jsonl(self.path)
+        if not entries:
+            return None
+        entries.sort(key=lambda e: e.get("timestamp") or 0)
+
+        os.makedirs(self.segment_dir, exist_ok=True)
+        start, end = entries[0].get("timestamp") or 0, entries[-1].get("timestamp") or 0
+        name = f"segment-{int(start)}-{int(end)}-{len(entries)}.json.gz"
+        segment_path = os.path.join(self.segment_dir, name)
+        with gzip.open(segment_path, "wt", encoding="utf-8") as f:
+            json.dump(to_columns(entries), f, separators=(",", ":"))
+
+        index = load_index(self.segment_dir)
+        index.append({
+            "file": name,
+            "start": start,
+            "end": end,
+            "count": len(entries),
+            "workflows": sorted({str(e.get("workflow")) for e in entries}),
+        })
+        save_index(self.segment_dir, index)
+
+        # Truncate only once the segment and index are on disk
+        open(self.path, "w").close()
+        logger.debug(f"Rotated job log into {segment_path} ({len(entries)} jobs).")
+        return segment_path
+
+
+def read_jsonl(path: str) -> List[Dict[str, Any]]:
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                if line.strip():
+                    entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+def to_columns(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    columns: Dict[str, Any] = {"count": len(entries), "dictionaries": {}}
+    for name in COLUMNS:
+        values = [entry.get(name) for entry in entries]
+        if name in DICT_COLUMNS:
+            dictionary: List[Any] = []
+            positions: Dict[Any, int] = {}
+            codes = []
+            for value in values:
+                if value not in positions:
+                    positions[value] = len(dictionary)
+                    dictionary.append(value)
+                codes.append(positions[value])
+            columns["dictionaries"][name] = dictionary
+            columns[name] = codes
+        else:
+            columns[name] = values
+    return columns
+
+def from_columns(data: Dict[str, Any], names: Optional[List[str]] = None) -> Dict[str, List[Any]]:
+    """Decodes the requested columns of a segment (all by default)."""
+    result = {}
+    for name in names or COLUMNS:
+        values = data.get(name, [None] * data.get("count", 0))
+        if name in data.get("dictionaries", {}):
+            dictionary = data["dictionaries"][name]
+            values = [dictionary[code] for code in values]
+        result[name] = values
+    return result
+
+def load_index(segment_dir: str) -> List[Dict[str, Any]]:
+    path = os.path.join(segment_dir, JobHistorySink.INDEX_FILE)
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Failed to read history index: {e}")
+        return []
+
+def save_index(segment_dir: str, index: List[Dict[str, Any]]):
+    path = os.path.join(segment_dir, JobHistorySink.INDEX_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class JobHistory:
+    """Read side: queries sealed segments plus the active JSONL file."""
+
+    QUERY_COLUMNS = ["timestamp", "workflow", "status", "duration"]
+
+    def __init__(self, path: str = "logs/jobs.jsonl"):
+        self.path = path
+        self.segment_dir = os.path.join(os.path.dirname(path) or ".", "history")
+
+    def segments_for(self, since: Optional[float] = None, until: Optional[float] = None,
+                     workflow: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Index entries whose time range and workflows can match the query."""
+        selected = []
+        for seg in load_index(self.segment_dir):
+            if since is not None and seg.get("end", 0) < since:
+                continue
+            if until is not None and seg.get("start", 0) > until:
+                continue
+            if workflow and workflow not in seg.get("workflows", []):
+                continue
+            selected.append(seg)
+        return selected
+
+    def rows(self, since: Optional[float] = None, until: Optional[float] = None,
+             workflow: Optional[str] = None) -> Dict[str, List[Any]]:
+        """Returns the matching jobs as columns (timestamp, workflow, status, duration)."""
+        out: Dict[str, List[Any]] = {name: [] for name in self.QUERY_COLUMNS}
+
+        def take(columns: Dict[str, List[Any]]):
+            for i, ts in enumerate(columns["timestamp"]):
+                ts = ts or 0
+                if since is not None and ts < since:
+                    continue
+                if until is not None and ts > until:
+                    continue
+                if workflow and columns["workflow"][i] != workflow:
+                    continue
+                for name in self.QUERY_COLUMNS:
+                    out[name].append(columns[name][i])
+
+        for seg in self.segments_for(since, until, workflow):
+            try:
+                with gzip.open(os.path.join(self.segment_dir, seg["file"]), "rt", encoding="utf-8") as f:
+                    take(from_columns(json.load(f), self.QUERY_COLUMNS))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable history segment {seg.get('file')}: {e}")
+
+        active = read_jsonl(self.path)
+        if active:
+            take({name: [entry.get(name) for entry in active] for name in self.QUERY_COLUMNS})
+        return out
+
+    def summarize(self, since: Optional[float] = None, until: Optional[float] = None,
+                  workflow: Optional[str] = None) -> Dict[str, Any]:
+        """Per-workflow throughput, duration percentiles and failure rate."""
+        rows = self.rows(since, until, workflow)
+        timestamps = [ts for ts in rows["timestamp"] if ts]
+        start = since if since is not None else (min(timestamps) if timestamps else None)
+        end = until if until is not None else (max(timestamps) if timestamps else None)
+        hours = max((end - start) / 3600.0, 1 / 3600.0) if start is not None and end is not None else None
+
+        grouped: Dict[str, Dict[str, List[Any]]] = {}
+        for i, name in enumerate(rows["workflow"]):
+            group = grouped.setdefault(str(name), {"durations": [], "failed": 0, "count": 0})
+            group["count"] += 1
+            if rows["status"][i] != "success":
+                group["failed"] += 1
+            if rows["duration"][i] is not None:
+                group["durations"].append(float(rows["duration"][i]))
+
+        workflows = {}
+        for name, group in sorted(grouped.items()):
+            p50 = percentile(group["durations"], 50)
+            p95 = percentile(group["durations"], 95)
+            workflows[name] = {
+                "jobs": group["count"],
+                "failed": group["failed"],
+                "failure_rate": round(group["failed"] / group["count"], 4),
+                "throughput_per_hour": round(group["count"] / hours, 2) if hours else None,
+                "p50_s": round(p50, 3) if p50 is not None else None,
+                "p95_s": round(p95, 3) if p95 is not None else None,
+            }
+
+        return {
+            "since": start,
+            "until": end,
+            "jobs": len(rows["workflow"]),
+            "workflows": workflows,
+        }
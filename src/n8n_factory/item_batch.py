@@ -0,0 +1,176 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from .expressions import compile_value
+
+try:
+    import numpy as np
+except ImportError:  # optional: numeric columns fall back to Python lists
+    np = None
+
+# Placeholder for a field an item does not have (distinct from a null value)
+MISSING = object()
+
+FIELD_EXPRESSION = re.compile(r'^{{\s*[$]json\.([a-zA-Z0-9_]+)\s*}}$')
+FIELD_ACCESS = re.compile(r"""[$]json(?:\.([A-Za-z_][$\w]*)|\[\s*(?:"([^"\\]*)"|'([^'\\]*)')\s*\])""")
+NUMERIC_OPS = ("larger", "smaller", "largerEqual", "smallerEqual")
+
+
+def fields_used(value: Any) -> Optional[List[str]]:
+    """Top-level json fields an expression reads, or None if it may read any."""
+    if isinstance(value, dict):
+        value = list(value.values())
+    text = "\n".join(map(str, value)) if isinstance(value, list) else str(value)
+    matches = FIELD_ACCESS.findall(text)
+    if len(matches) != text.count("$json"):
+        return None
+    return sorted({"".join(m) for m in matches})
+
+
+class ItemBatch:
+    """
+    Simulation items stored column-wise: one list per `json` field instead of
+    one dict per item. Routing takes index subsets of the columns, and numeric
+    columns get a NumPy view (when NumPy is installed) for vectorised compares.
+    Batches are never modified in place, so steps can share them freely.
+    """
+
+    def __init__(self, columns: Dict[str, List[Any]], length: int, extras: Optional[List[Dict[str, Any]]] = None):
+        self.columns = columns
+        self.length = length
+        # Top-level keys other than "json" (binary, pairedItem...), per item
+        self.extras = extras
+        self._numeric: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return self.length
+
+    @classmethod
+    def from_items(cls, items: Sequence[Dict[str, Any]]) -> "ItemBatch":
+        columns: Dict[str, List[Any]] = {}
+        extras = None
+        for i, item in enumerate(items):
+            data = item.get("json", {}) if isinstance(item, dict) else {}
+            for key, value in data.items():
+                column = columns.get(key)
+                if column is None:
+                    column = columns[key] = [MISSING] * i
+                column.append(value)
+            for column in columns.values():
+                if len(column) == i:
+                    column.append(MISSING)
+            other = {k: v for k, v in item.items() if k != "json"} if isinstance(item, dict) else {}
+            if other:
+                if extras is None:
+                    extras = [{}] * i
+                extras.append(other)
+            elif extras is not None:
+                extras.append({})
+        return cls(columns, len(items), extras)
+
+    @classmethod
+    def empty(cls) -> "ItemBatch":
+        return cls({}, 0)
+
+    @classmethod
+    def concat(cls, batches: Sequence["ItemBatch"]) -> "ItemBatch":
+        batches = [b for b in batches if len(b)]
+        if len(batches) == 1:
+            return batches[0]
+        keys: List[str] = []
+        for batch in batches:
+            keys.extend(k for k in batch.columns if k not in keys)
+        columns = {}
+        for key in keys:
+            column: List[Any] = []
+            for batch in batches:
+                column.extend(batch.columns.get(key) or [MISSING] * len(batch))
+            columns[key] = column
+        extras = None
+        if any(b.extras for b in batches):
+            extras = []
+            for batch in batches:
+                extras.extend(batch.extras or [{}] * len(batch))
+        return cls(columns, sum(len(b) for b in batches), extras)
+
+    def item(self, index: int) -> Dict[str, Any]:
+        data = {k: c[index] for k, c in self.columns.items() if c[index] is not MISSING}
+        item = {"json": data}
+        if self.extras and self.extras[index]:
+            item.update(self.extras[index])
+        return item
+
+    def to_items(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        count = self.length if limit is None else min(limit, self.length)
+        return [self.item(i) for i in range(count)]
+
+    def take(self, indices: Sequence[int]) -> "ItemBatch":
+        """A new batch with the items at the given positions."""
+        if len(indices) == self.length:
+            return self
+        columns = {k: [c[i] for i in indices] for k, c in self.columns.items()}
+        extras = [self.extras[i] for i in indices] if self.extras else None
+        return ItemBatch(columns, len(indices), extras)
+
+    def numeric(self, key: str):
+        """The column as a float array, or None if NumPy is missing or the column isn't all numbers."""
+        if np is None or key not in self.columns:
+            return None
+        if key not in self._numeric:
+            column = self.columns[key]
+            numeric = all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in column)
+            self._numeric[key] = np.asarray(column, dtype=float) if numeric else None
+        return self._numeric[key]
+
+    def with_column(self, key: str, values: List[Any]) -> "ItemBatch":
+        """A new batch sharing this one's columns, with `key` set to values."""
+        columns = dict(self.columns)
+        columns[key] = values
+        return ItemBatch(columns, self.length, self.extras)
+
+    def resolve(self, value: Any, nodes: Optional[Dict[str, Any]] = None) -> List[Any]:
+        """
+        The value of an expression for every item. The expression is compiled
+        once; a bare `{{ $json.field }}` is read straight from the column.
+        """
+        match = FIELD_EXPRESSION.match(value) if isinstance(value, str) else None
+        if match:
+            column = self.columns.get(match.group(1))
+            if column is None:
+                return [value] * self.length
+            return [value if v is MISSING or v is None else str(v) for v in column]
+        if not isinstance(value, (str, dict, list)) or (isinstance(value, str) and "{{" not in value):
+            return [value] * self.length
+        evaluate = compile_value(value)
+        nodes = nodes or {}
+        fields = fields_used(value)
+        if fields is None or self.extras:
+            return [evaluate(self.item(i), nodes) for i in range(self.length)]
+        # Rows only need the fields the expression reads
+        columns = [(f, self.columns[f]) for f in fields if f in self.columns]
+        return [evaluate({"json": {f: c[i] for f, c in columns if c[i] is not MISSING}}, nodes)
+                for i in range(self.length)]
+
+    def compare(self, left: Any, right: Any, op: str, compare_one: Callable[[Any, Any, str], bool],
+                nodes: Optional[Dict[str, Any]] = None) -> List[bool]:
+        """
+        Evaluates `left op right` for every item. Numeric comparisons of a
+        column against a constant run on the NumPy view when there is one.
+        """
+        match = FIELD_EXPRESSION.match(left) if isinstance(left, str) else None
+        if match and op in NUMERIC_OPS and not (isinstance(right, str) and "{{" in right):
+            values = self.numeric(match.group(1))
+            if values is not None:
+                try:
+                    r = float(right)
+                except (TypeError, ValueError):
+                    return [False] * self.length
+                mask = {"larger": values > r, "smaller": values < r,
+                        "largerEqual": values >= r, "smallerEqual": values <= r}[op]
+                return mask.tolist()
+        lefts = self.resolve(left, nodes)
+        rights = self.resolve(right, nodes)
+        return [compare_one(lhs, rhs, op) for lhs, rhs in zip(lefts, rights)]
+
+    def summary(self, sample: int = 3) -> Dict[str, Any]:
+        """What history keeps for a large batch: size, fields and the first few items."""
+        return {"count": self.length, "fields": list(self.columns), "sample": self.to_items(sample)}
@@ -0,0 +1,247 @@
+import itertools
+import json
+import queue
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from .logger import logger
+
+# Runs n8n Code-node JavaScript for the simulator in long-lived `node`
+# processes. Each worker reads one JSON request per line on stdin and answers
+# on stdout; scripts are compiled once per worker and run in a fresh vm
+# context (no require/process) with a time limit, and the worker process has
+# a V8 heap limit. vm contexts are isolation, not a security boundary: only
+# simulate code you would run anyway.
+
+RUNNER = r"""
+const vm = require('vm');
+const readline = require('readline');
+const scripts = new Map();
+// Full input of a per-item run split into chunks: sent once per worker and run,
+// parsed (inside the context, so code can't change it for later chunks) on first use.
+let shared = { key: null, raw: null };
+const BOOT = new vm.Script(
+  'var __chunk = JSON.parse(__raw); delete globalThis.__raw; var __all = null;' +
+  'Object.defineProperty(globalThis, "items", { get: () => __all || (__all = __allRaw ? JSON.parse(__allRaw()) : __chunk) });' +
+  'var $input = { all: () => items, first: () => items[0], last: () => items[items.length - 1] };');
+
+// Code is the body of an async function, so it may await. The context runs its
+// microtasks before runInContext returns (microtaskMode 'afterEvaluate'), so the
+// time limit covers the whole await chain; the result is handed out through
+// __done/__fail.
+function compile(code, perItem) {
+  const key = (perItem ? 'each:' : 'all:') + code;
+  let script = scripts.get(key);
+  if (!script) {
+    const body = perItem
+      ? '(async function () { const __out = []; const __input = $input;' +
+        ' for (let __i = 0; __i < __chunk.length; __i++) {' +
+        ' const item = __chunk[__i]; const $json = item.json; const $itemIndex = __offset + __i;' +
+        ' const $input = { all: __input.all, first: __input.first, last: __input.last, item: item };' +
+        ' __out.push(await (async function () {\n' + code + '\n})()); } return __out; })().then(__done, __fail)'
+      : '(async function () {\n' + code + '\n})().then(__done, __fail)';
+    script = new vm.Script(body, { filename: 'code-node.js' });
+    if (scripts.size >= 256) scripts.clear();
+    scripts.set(key, script);
+  }
+  return script;
+}
+
+function execute(req, log) {
+  if (req.all !== undefined) shared = { key: req.inputKey, raw: req.all };
+  if (req.inputKey !== undefined && shared.key !== req.inputKey) throw new Error('Full input was not sent to this worker');
+  const allRaw = req.inputKey !== undefined ? () => shared.raw : null;
+  return new Promise((resolve, reject) => {
+    const script = compile(req.code, req.perItem);
+    const ctx = vm.createContext({ __raw: req.items, __allRaw: allRaw, __offset: req.offset || 0, __done: resolve, __fail: reject,
+                                   console: { log, info: log, warn: log, error: log, debug: log } },
+                                 { microtaskMode: 'afterEvaluate' });
+    BOOT.runInContext(ctx, { timeout: req.timeout });
+    script.runInContext(ctx, { timeout: req.timeout });
+    // The context has no timers or I/O: if __done/__fail haven't run by now, they never will
+    setImmediate(() => reject(new Error('Code awaited a promise that never settles')));
+  });
+}
+
+function normalize(result) {
+  if (result === undefined || result === null) return [];
+  const list = Array.isArray(result) ? result : [result];
+  return list.map(r => (r !== null && typeof r === 'object' && !Array.isArray(r) && 'json' in r) ? r : { json: r });
+}
+
+readline.createInterface({ input: process.stdin }).on('line', async line => {
+  let req;
+  try { req = JSON.parse(line); } catch (e) { return; }
+  const logs = [];
+  const log = (...args) => { if (logs.length < 100) logs.push(args.map(a => typeof a === 'string' ? a : JSON.stringify(a)).join(' ')); };
+  let reply;
+  try {
+    const result = await execute(req, log);
+    const items = req.perItem ? [].concat(...result.map(normalize)) : normalize(result);
+    reply = { id: req.id, ok: true, items: JSON.parse(JSON.stringify(items)), logs };
+  } catch (e) {
+    reply = { id: req.id, ok: false, error: String(e && e.message || e), logs };
+  }
+  process.stdout.write(JSON.stringify(reply) + '\n');
+});
+"""
+
+
+class JsRuntimeError(RuntimeError):
+    """The code threw, timed out, or its worker died (e.g. over the memory limit)."""
+
+
+class _Worker:
+    """One warm node process; requests are answered in order, one at a time."""
+
+    def __init__(self, node: str, memory_mb: int):
+        self.proc = subprocess.Popen(
+            [node, f"--max-old-space-size={memory_mb}", "-e", RUNNER],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, encoding="utf-8", bufsize=1
+        )
+        self.lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._requests = 0
+        self.input_key: Optional[int] = None # full input of a chunked run the worker holds
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.proc.stdout:
+            self.lines.put(line)
+        self.lines.put(None)
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def request(self, payload: Dict[str, Any], wait: float) -> Dict[str, Any]:
+        self._requests += 1
+        payload["id"] = self._requests
+        try:
+            self.proc.stdin.write(json.dumps(payload) + "\n")
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            raise JsRuntimeError("JS worker is not running")
+        try:
+            line = self.lines.get(timeout=wait)
+        except queue.Empty:
+            self.kill()
+            raise JsRuntimeError(f"JS code did not answer within {wait:.1f}s")
+        if line is None:
+            self.kill()
+            raise JsRuntimeError("JS worker exited (memory limit exceeded?)")
+        return json.loads(line)
+
+    def kill(self):
+        if self.alive:
+            self.proc.kill()
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+class JsRuntimePool:
+    """
+    A pool of `size` warm node workers for Code steps. run() sends the items
+    as JSON over the worker's pipe; "run once for each item" code is split
+    into batches of batch_size spread over the pool. Each request runs under
+    timeout_ms, and each worker under a memory_mb heap limit; workers that
+    crash or hang are replaced.
+    """
+
+    def __init__(self, size: int = 2, timeout_ms: int = 1000, memory_mb: int = 128,
+                 batch_size: int = 1000, node_path: Optional[str] = None):
+        self.size = max(1, size)
+        self.timeout_ms = timeout_ms
+        self.memory_mb = memory_mb
+        self.batch_size = max(1, batch_size)
+        self.node = node_path or shutil.which("node")
+        self._idle: "queue.LifoQueue[_Worker]" = queue.LifoQueue()
+        self._started = 0
+        self._lock = threading.Lock()
+        self._workers: List[_Worker] = []
+        self._runs = itertools.count(1)
+
+    @staticmethod
+    def available(node_path: Optional[str] = None) -> bool:
+        return bool(node_path or shutil.which("node"))
+
+    def _acquire(self) -> _Worker:
+        while True:
+            worker = self._take()
+            if worker.alive:
+                return worker
+            self._release(worker)
+
+    def _take(self) -> _Worker:
+        with self._lock:
+            if self._idle.empty() and self._started < self.size:
+                if not self.node:
+                    raise JsRuntimeError("Node.js not found; install node to run Code steps in simulation")
+                worker = _Worker(self.node, self.memory_mb)
+                self._workers.append(worker)
+                self._started += 1
+                return worker
+        return self._idle.get()
+
+    def _release(self, worker: _Worker):
+        if worker.alive:
+            self._idle.put(worker)
+            return
+        with self._lock:
+            self._workers.remove(worker)
+            self._started -= 1
+
+    def _call(self, code: str, items: List[Dict[str, Any]], per_item: bool, offset: int = 0,
+              full_input: Optional[Tuple[int, str]] = None) -> List[Dict[str, Any]]:
+        worker = self._acquire()
+        payload = {"code": code, "items": json.dumps(items), "perItem": per_item,
+                   "offset": offset, "timeout": self.timeout_ms}
+        if full_input:
+            # $input.all() of a chunk is the whole input; each worker receives it once per run
+            key, raw = full_input
+            payload["inputKey"] = key
+            if worker.input_key != key:
+                payload["all"] = raw
+                worker.input_key = key
+        try:
+            # Grace on top of the script timeout for transfer and (first) startup
+            reply = worker.request(payload, wait=self.timeout_ms / 1000.0 + 5.0)
+        finally:
+            self._release(worker)
+        for line in reply.get("logs", []):
+            logger.debug(f"    [js] {line}")
+        if not reply.get("ok"):
+            raise JsRuntimeError(reply.get("error", "JS code failed"))
+        return reply["items"]
+
+    def run(self, code: str, items: List[Dict[str, Any]], per_item: bool = False) -> List[Dict[str, Any]]:
+        """Runs Code-node JavaScript over items and returns the output items."""
+        if not per_item or len(items) <= self.batch_size:
+            return self._call(code, items, per_item)
+        batches = [(items[i:i + self.batch_size], i) for i in range(0, len(items), self.batch_size)]
+        full_input = (next(self._runs), json.dumps(items))
+        with ThreadPoolExecutor(max_workers=self.size) as pool:
+            results = list(pool.map(lambda b: self._call(code, b[0], True, b[1], full_input), batches))
+        return [item for result in results for item in result]
+
+    def close(self):
+        with self._lock:
+            for worker in self._workers:
+                try:
+                    worker.proc.stdin.close()
+                except OSError:
+                    pass
+                worker.kill()
+            self._workers = []
+            self._started = 0
+            self._idle = queue.LifoQueue()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
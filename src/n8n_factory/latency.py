@@ -0,0 +1,178 @@
+import math
+import random
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from .history import JobHistory, percentile
+from .logger import logger
+
+# Virtual-time latency estimation for simulated recipes. Nothing sleeps: every
+# run samples one latency per step and walks the DAG, so a step starts when
+# the last of its parents finishes and parallel branches overlap for free.
+
+DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal", "exponential", "empirical")
+# Parameters sample() can't default
+REQUIRED_PARAMS = {"uniform": ("max",), "normal": ("mean",), "lognormal": ("median",), "exponential": ("mean",)}
+
+
+class LatencyModel:
+    """
+    Latency distribution of one step, in milliseconds. Built from mock_latency:
+    a number (constant), or a dict such as {"dist": "normal", "mean": 120, "std": 30},
+    {"dist": "uniform", "min": 50, "max": 80}, {"dist": "lognormal", "median": 200, "sigma": 0.5},
+    {"dist": "exponential", "mean": 40}, {"dist": "empirical", "samples": [...]} or
+    {"dist": "empirical", "workflow": "<id>"} (durations from the job history log).
+    """
+
+    def __init__(self, dist: str = "constant", samples: Optional[List[float]] = None, **params: float):
+        if dist not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{dist}' (use {', '.join(DISTRIBUTIONS)})")
+        if dist == "empirical" and not samples:
+            raise ValueError("Empirical latency needs at least one sample")
+        missing = [name for name in REQUIRED_PARAMS.get(dist, ()) if name not in params]
+        if missing:
+            raise ValueError(f"{dist.capitalize()} latency needs {', '.join(missing)}")
+        if dist == "lognormal" and params["median"] <= 0:
+            raise ValueError("Lognormal latency needs a median above 0")
+        self.dist = dist
+        self.samples = samples or []
+        self.params = params
+
+    @classmethod
+    def from_spec(cls, spec: Any, history: Optional[JobHistory] = None) -> "LatencyModel":
+        if spec is None:
+            return cls("constant", value=0.0)
+        if isinstance(spec, (int, float)):
+            return cls("constant", value=float(spec))
+        if not isinstance(spec, dict):
+            raise ValueError(f"Invalid latency spec: {spec!r}")
+        params = dict(spec)
+        dist = params.pop("dist", "constant")
+        if dist == "empirical" and "workflow" in params:
+            return cls.fit(params["workflow"], history or JobHistory())
+        samples = params.pop("samples", None)
+        try:
+            samples = [float(s) for s in samples] if samples else None
+            params = {k: float(v) for k, v in params.items()}
+        except (TypeError, ValueError):
+            raise ValueError(f"Latency parameters must be numbers: {spec!r}")
+        return cls(dist, samples=samples, **params)
+
+    @classmethod
+    def fit(cls, workflow: str, history: JobHistory) -> "LatencyModel":
+        """Empirical model from the durations of a workflow's successful jobs."""
+        rows = history.rows(workflow=workflow)
+        samples = [float(d) * 1000 for d, status in zip(rows["duration"], rows["status"])
+                   if d is not None and status == "success"]
+        if not samples:
+            raise ValueError(f"No successful jobs for workflow '{workflow}' in {history.path}")
+        return cls("empirical", samples=samples)
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.dist == "constant":
+            return p.get("value", 0.0)
+        if self.dist == "uniform":
+            return rng.uniform(p.get("min", 0.0), p["max"])
+        if self.dist == "normal":
+            return max(0.0, rng.gauss(p["mean"], p.get("std", 0.0)))
+        if self.dist == "lognormal":
+            return rng.lognormvariate(math.log(p["median"]), p.get("sigma", 0.0))
+        if self.dist == "exponential":
+            return rng.expovariate(1.0 / p["mean"]) if p["mean"] > 0 else 0.0
+        return rng.choice(self.samples)
+
+
+class LatencyEstimator:
+    """
+    Monte Carlo over a recipe's executed sub-graph in virtual time.
+
+    incoming maps step ids to their (parent id, output) edges as built by
+    WorkflowSimulator.build_graph; order is a topological order of the steps
+    that actually ran.
+    """
+
+    def __init__(self, order: Sequence[str], incoming: Dict[str, List[Tuple[str, int]]],
+                 models: Dict[str, LatencyModel]):
+        self.order = list(order)
+        ran = set(self.order)
+        self.parents = {sid: [src for src, _ in incoming.get(sid, []) if src in ran] for sid in self.order}
+        self.models = models
+
+    @staticmethod
+    def models_for(recipe, history_path: Optional[str] = None) -> Dict[str, LatencyModel]:
+        """Builds the model of every step; a bad spec raises ValueError naming the step."""
+        history = JobHistory(history_path) if history_path else None
+        models = {}
+        for step in recipe.steps:
+            try:
+                models[step.id] = LatencyModel.from_spec(step.mock_latency, history)
+            except ValueError as e:
+                raise ValueError(f"Step '{step.id}' mock_latency: {e}")
+        return models
+
+    @classmethod
+    def for_recipe(cls, recipe, executed: Sequence[str], incoming: Dict[str, List[Tuple[str, int]]],
+                   history_path: Optional[str] = None,
+                   models: Optional[Dict[str, LatencyModel]] = None) -> "LatencyEstimator":
+        if models is None:
+            models = cls.models_for(recipe, history_path)
+        return cls(executed, incoming, {sid: models[sid] for sid in executed})
+
+    def run_once(self, rng: random.Random) -> Tuple[float, List[str], Dict[str, float], Dict[str, float]]:
+        """One virtual execution: total ms, critical path, start and finish times per step."""
+        start: Dict[str, float] = {}
+        finish: Dict[str, float] = {}
+        via: Dict[str, Optional[str]] = {}
+        for sid in self.order:
+            parents = self.parents[sid]
+            latest = max(parents, key=lambda p: finish[p]) if parents else None
+            start[sid] = finish[latest] if latest else 0.0
+            finish[sid] = start[sid] + self.models[sid].sample(rng)
+            via[sid] = latest
+        if not finish:
+            return 0.0, [], start, finish
+        end = max(self.order, key=lambda sid: finish[sid])
+        path = [end]
+        while via[path[-1]]:
+            path.append(via[path[-1]])
+        return finish[end], path[::-1], start, finish
+
+    def estimate(self, runs: int = 1000, seed: int = 0, concurrency: int = 1) -> Dict[str, Any]:
+        """Latency percentiles, most frequent critical path and bottleneck over many runs."""
+        rng = random.Random(seed)
+        totals: List[float] = []
+        paths: Counter = Counter()
+        critical_ms = {sid: 0.0 for sid in self.order}
+        step_ms = {sid: 0.0 for sid in self.order}
+        for _ in range(max(1, runs)):
+            total, path, start, finish = self.run_once(rng)
+            totals.append(total)
+            paths[tuple(path)] += 1
+            for sid in self.order:
+                step_ms[sid] += finish[sid] - start[sid]
+            for sid in path:
+                critical_ms[sid] += finish[sid] - start[sid]
+
+        count = len(totals)
+        mean = sum(totals) / count
+        path, hits = paths.most_common(1)[0] if paths else ((), 0)
+        bottleneck = max(critical_ms, key=critical_ms.get) if critical_ms else None
+        report = {
+            "runs": count,
+            "seed": seed,
+            "mean_ms": round(mean, 3),
+            "p50_ms": round(percentile(totals, 50), 3),
+            "p95_ms": round(percentile(totals, 95), 3),
+            "p99_ms": round(percentile(totals, 99), 3),
+            "max_ms": round(max(totals), 3),
+            # Executions per second with `concurrency` runs in flight
+            "throughput_per_s": round(concurrency * 1000.0 / mean, 3) if mean > 0 else None,
+            "critical_path": list(path),
+            "critical_path_share": round(hits / count, 4),
+            "bottleneck": bottleneck,
+            "steps": {sid: {"mean_ms": round(step_ms[sid] / count, 3),
+                            "critical_share": round(critical_ms[sid] / sum(totals), 4) if sum(totals) else 0.0}
+                      for sid in self.order},
+        }
+        logger.debug(f"Latency estimate over {count} runs: p95 {report['p95_ms']}ms, bottleneck {bottleneck}")
+        return report
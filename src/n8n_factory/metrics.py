@@ -0,0 +1,201 @@
+import abc
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from .logger import logger
+
+# Prometheus text exposition format (version 0.0.4), kept dependency-free.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        pass
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + float(amount)
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(v)}" for key, v in self.values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> (per-bucket counts, sum, count)
+        self.values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        value = float(value)
+        key = self._key(labels)
+        with self._lock:
+            state = self.values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self.values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class SchedulerMetrics(MetricsRegistry):
+    """
+    Scheduler and queue metrics. Values are recorded from data the scheduler
+    already has in hand each tick, so scraping never touches Redis.
+    """
+    def __init__(self):
+        super().__init__()
+        self.queue_depth = self.register(Gauge("n8n_factory_queue_depth", "Jobs waiting in the ready queue."))
+        self.delayed_depth = self.register(Gauge("n8n_factory_queue_delayed_depth", "Jobs waiting in the delayed queue."))
+        self.in_flight = self.register(Gauge("n8n_factory_jobs_in_flight", "Jobs this instance has dispatched that are still running."))
+        self.dispatch_latency = self.register(Histogram(
+            "n8n_factory_dispatch_latency_seconds", "Time from enqueue to dispatch."))
+        self.job_duration = self.register(Histogram(
+            "n8n_factory_job_duration_seconds", "Job execution time.", ("workflow", "status")))
+        self.jobs = self.register(Counter("n8n_factory_jobs_total", "Jobs executed.", ("workflow", "status")))
+        self.retries = self.register(Counter("n8n_factory_job_retries_total", "Failed jobs requeued for retry.", ("workflow",)))
+        self.batch_size = self.register(Gauge("n8n_factory_batch_size", "Batch size used for the last job of each group.", ("group",)))
+        self.gate_blocked = self.register(Counter("n8n_factory_gate_blocked_total", "Jobs parked by a phase gate.", ("phase",)))
+        self.gate_released = self.register(Counter("n8n_factory_gate_released_total", "Parked jobs released by phase gates."))
+        self.rate_limited = self.register(Counter("n8n_factory_rate_limited_total", "Jobs deferred by rate limits.", ("workflow",)))
+        self.started_at = time.time()
+
+
+class MetricsServer:
+    """Serves a registry at /metrics from a daemon thread."""
+
+    def __init__(self, registry: MetricsRegistry, port: int, host: str = "0.0.0.0"):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.httpd: Optional[ThreadingHTTPServer] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> int:
+        """Starts serving and returns the bound port (useful with port 0)."""
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # keep scrapes out of the scheduler output
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-server", daemon=True)
+        self.thread.start()
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+        return self.port
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
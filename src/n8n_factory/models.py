@@ -16,7 +16,8 @@ class RecipeStep(BaseModel):
     params: Dict[str, Any] = {}
     mock: Optional[Any] = None
     mock_error: Optional[str] = None 
-    mock_latency: Optional[int] = None
+    # ms, or a distribution such as {"dist": "normal", "mean": 120, "std": 30} (see latency.py)
+    mock_latency: Optional[Union[int, float, Dict[str, Any]]] = None
     breakpoint: bool = False
     debug: bool = False
     description: Optional[str] = None
@@ -28,6 +29,8 @@ class RecipeStep(BaseModel):
     notes: Optional[str] = None
     disabled: bool = False
     retry: Optional[RetryConfig] = None
+    # Checked by the simulator right after this step runs
+    assertions: List[str] = []
 
 class ImportItem(BaseModel):
     path: str
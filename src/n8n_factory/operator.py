@@ -1,7 +1,10 @@
 import subprocess
 import json
+import shlex
+import uuid
 import logging
 from typing import List, Dict, Any, Optional, Union
+from .resp import RedisConnection, RedisError, decode_reply
 
 logger = logging.getLogger("n8n_factory")
 
@@ -12,6 +15,10 @@ class SystemOperator:
         self.db_container = db_container or os.getenv("DB_CONTAINER_NAME", "postgres")
         # Default changed to n8n-redis as per requirements, adjustable via env or init arg
         self.redis_container = redis_container or os.getenv("REDIS_CONTAINER_NAME", "n8n-redis")
+        # With REDIS_HOST set, Redis is spoken to directly over RESP instead of via docker exec redis-cli
+        self.redis_host = os.getenv("REDIS_HOST")
+        self.redis_port = int(os.getenv("REDIS_PORT", "6379"))
+        self._redis_conn: Optional[RedisConnection] = None
 
     def _run_cmd(self, cmd: List[str]) -> str:
         try:
@@ -74,7 +81,14 @@ class SystemOperator:
         """
         import os
         redis_args = command.split() if isinstance(command, str) else command
-        
+
+        conn = self.redis_connection()
+        if conn:
+            try:
+                return format_raw(conn.execute(*redis_args)).strip()
+            except RedisError as e:
+                return f"Redis command failed: {e}"
+
         # Inject Auth if present
         redis_password = os.getenv("REDIS_PASSWORD")
         auth_args = ["-a", redis_password] if redis_password else []
@@ -85,11 +99,60 @@ class SystemOperator:
         except RuntimeError as e:
              return f"Redis command failed: {e}"
 
+    def redis_connection(self) -> Optional[RedisConnection]:
+        """The direct RESP connection, or None when Redis is reached through redis-cli."""
+        if not self.redis_host:
+            return None
+        if self._redis_conn is None:
+            import os
+            self._redis_conn = RedisConnection(self.redis_host, self.redis_port, password=os.getenv("REDIS_PASSWORD"))
+        return self._redis_conn
+
+    def redis(self, command: List[Any], decode: bool = True) -> Any:
+        """
+        Runs a Redis command and returns a typed reply: int, str (bytes with
+        decode=False over a direct connection), list or None. Error replies and
+        connection failures raise RedisError.
+
+        Without REDIS_HOST the command goes through redis-cli wrapped in the
+        pipeline script, so replies keep their types; scripts (EVAL) are run as
+        they are and return redis-cli's text.
+        """
+        conn = self.redis_connection()
+        if conn:
+            reply = conn.execute(*command)
+            return decode_reply(reply) if decode else reply
+
+        if str(command[0]).upper() in ("EVAL", "EVALSHA"):
+            res = self.inspect_redis([str(a) for a in command])
+            if res.startswith("Redis command failed"):
+                raise RedisError(res)
+            return res
+
+        res = self.inspect_redis(["EVAL", RedisPipeline.SCRIPT, "0", json.dumps([[str(a) for a in command]])])
+        try:
+            reply = json.loads(res)[0]
+        except (TypeError, ValueError, IndexError, KeyError):
+            raise RedisError(res)
+        if isinstance(reply, dict) and "err" in reply:
+            raise RedisError(reply["err"])
+        return [] if reply == {} else reply
+
+    def pipeline(self) -> "RedisPipeline":
+        """
+        Batches Redis commands into one round-trip:
+            with operator.pipeline() as p:
+                p.command(["HSET", key, field, value])
+            p.results
+        """
+        return RedisPipeline(self)
+
     def execute_workflow(self, workflow_id: Optional[str] = None, file_path: Optional[str] = None, env: Dict[str, str] = {}, broker_port: Optional[int] = None) -> str:
         """
         Executes an n8n workflow.
         """
         import os
+        env = dict(env) # never mutate the caller's (or the default) dict
         env_args = []
         
         # Merge broker port into env if provided or found in system env
@@ -111,11 +174,14 @@ class SystemOperator:
              # We can try passing via stdin if n8n supports it? No.
              # We must `docker cp` it first to a temp loc.
              
-             container_tmp = "/tmp/exec_workflow.json"
+             # Unique per job so concurrent file-mode jobs don't overwrite each other;
+             # removed in the same exec once n8n has read it.
+             container_tmp = f"/tmp/n8n_factory_{uuid.uuid4().hex}.json"
              cp_cmd = ["docker", "cp", file_path, f"{self.n8n_container}:{container_tmp}"]
              self._run_cmd(cp_cmd)
              
-             cmd = ["docker", "exec"] + env_args + ["-u", "node", self.n8n_container, "n8n", "execute", "--file", container_tmp]
+             script = f"n8n execute --file {shlex.quote(container_tmp)}; rc=$?; rm -f {shlex.quote(container_tmp)}; exit $rc"
+             cmd = ["docker", "exec"] + env_args + ["-u", "node", self.n8n_container, "sh", "-c", script]
         else:
             raise ValueError("Must provide workflow_id or file_path")
 
@@ -173,6 +239,27 @@ class SystemOperator:
         """
         return self.run_db_query(query)
 
+    def count_active_executions(self, limit: int = 100, max_age_hours: int = 24) -> Optional[int]:
+        """
+        Counts running executions, up to 'limit', without joining workflow_entity.
+        The status/startedAt filter can use an index on execution_entity(status, "startedAt"),
+        and the LIMIT bounds the scan. Returns None if the query failed.
+        """
+        query = f"""
+            SELECT count(*) AS active FROM (
+                SELECT 1 FROM execution_entity
+                WHERE status = 'running' AND "startedAt" > now() - interval '{int(max_age_hours)} hours'
+                LIMIT {int(limit)}
+            ) running
+        """
+        results = self.run_db_query(query)
+        if not results:
+            return None
+        try:
+            return int(results[0].get("active", 0))
+        except (TypeError, ValueError, AttributeError):
+            return None
+
     def get_execution_details(self, execution_id: str) -> Optional[Dict[str, Any]]:
         """
         Fetches status and basic details for a specific execution.
@@ -188,3 +275,109 @@ class SystemOperator:
         """
         results = self.run_db_query(query)
         return results[0] if results else None
+
+
+class RedisPipeline:
+    """
+    Queues Redis commands and runs them in a single redis-cli call. The batch is
+    sent as one EVAL whose script runs each command and returns the replies as
+    JSON, which keeps nil, integer and array replies apart (raw redis-cli output
+    does not). Because it is a script, the batch is also atomic; blocking and
+    scripting commands (BLPOP, EVAL, ...) cannot be queued.
+    """
+    SCRIPT = """
+local out = {}
+for i, cmd in ipairs(cjson.decode(ARGV[1])) do
+  local res = redis.pcall(unpack(cmd))
+  if res == false then
+    res = cjson.null
+  elseif type(res) == 'table' and res.ok then
+    res = res.ok
+  end
+  out[i] = res
+end
+return cjson.encode(out)
+"""
+
+    def __init__(self, operator: "SystemOperator"):
+        self.operator = operator
+        self.commands: List[List[str]] = []
+        self.results: List[Any] = []
+
+    def command(self, args: List[Any]) -> int:
+        """Queues a command; returns its index in results."""
+        self.commands.append([a if isinstance(a, bytes) else str(a) for a in args])
+        return len(self.commands) - 1
+
+    def __len__(self) -> int:
+        return len(self.commands)
+
+    def execute(self) -> List[Any]:
+        """
+        Sends the queued commands. Nil replies are None, error replies are
+        {"err": "..."} and every reply is None if the batch itself failed.
+        """
+        commands, self.commands = self.commands, []
+        if not commands:
+            self.results = []
+            return self.results
+
+        conn = self.operator.redis_connection() if isinstance(self.operator, SystemOperator) else None
+        if conn:
+            self.results = self._execute_direct(conn, commands)
+            return self.results
+
+        try:
+            # redis-cli only carries text: UTF-8 bytes are sent as strings, binary values fail the batch
+            payload = json.dumps(commands, default=lambda a: a.decode("utf-8"))
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Redis pipeline of {len(commands)} commands failed: {e}")
+            self.results = [None] * len(commands)
+            return self.results
+
+        res = self.operator.inspect_redis(["EVAL", self.SCRIPT, "0", payload])
+        try:
+            replies = json.loads(res)
+        except (TypeError, ValueError):
+            logger.warning(f"Redis pipeline of {len(commands)} commands failed: {res}")
+            self.results = [None] * len(commands)
+            return self.results
+
+        # cjson encodes empty Lua tables as objects
+        self.results = [[] if r == {} else r for r in (replies if isinstance(replies, list) else [])]
+        self.results += [None] * (len(commands) - len(self.results))
+        return self.results
+
+    @staticmethod
+    def _execute_direct(conn: RedisConnection, commands: List[List[str]]) -> List[Any]:
+        # MULTI/EXEC keeps the batch atomic, as the script does
+        try:
+            replies = conn.pipeline([["MULTI"]] + commands + [["EXEC"]])[-1]
+        except RedisError as e:
+            logger.warning(f"Redis pipeline of {len(commands)} commands failed: {e}")
+            return [None] * len(commands)
+        if not isinstance(replies, list):
+            logger.warning(f"Redis pipeline of {len(commands)} commands failed: {replies}")
+            return [None] * len(commands)
+        return [{"err": str(r)} if isinstance(r, RedisError) else decode_reply(r) for r in replies]
+
+    def __enter__(self) -> "RedisPipeline":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.execute()
+        return False
+
+
+def format_raw(reply: Any) -> str:
+    """Renders a typed reply the way redis-cli prints it when not on a terminal."""
+    if reply is None:
+        return ""
+    if isinstance(reply, RedisError):
+        raise reply
+    if isinstance(reply, bytes):
+        return reply.decode("utf-8", "replace")
+    if isinstance(reply, list):
+        return "\n".join(format_raw(r) for r in reply)
+    return str(reply)
@@ -1,24 +1,180 @@
 import json
 import time
-from typing import Optional, Dict, Any, List
-from .operator import SystemOperator
+import os
+import base64
+import hashlib
+import uuid
+import zlib
+from typing import Optional, Dict, Any, List, Iterator, Tuple, Union
+from .operator import SystemOperator, RedisPipeline
+from .resp import RedisError, pairs_to_dict
 from .logger import logger
 
+class JobCodec:
+    """
+    Encodes job payloads. 'json' is compact JSON; 'zlib' (compressed JSON) and
+    'msgpack' (needs the msgpack package) are tagged binary formats. Binary
+    payloads need a direct Redis connection (REDIS_HOST); through redis-cli they
+    are base64-armoured instead. decode() reads every format, including the
+    plain JSON written by older versions.
+    """
+    NAMES = ("json", "zlib", "msgpack")
+
+    def __init__(self, name: str = "json", binary: bool = False):
+        if name not in self.NAMES:
+            raise ValueError(f"Unknown job encoding '{name}' (use {', '.join(self.NAMES)})")
+        if name == "msgpack":
+            try:
+                import msgpack
+            except ImportError:
+                raise ValueError("The msgpack job encoding needs the 'msgpack' package (pip install msgpack).")
+        self.name = name
+        self.binary = binary
+
+    def encode(self, job: Dict[str, Any]) -> Union[str, bytes]:
+        if self.name == "json":
+            return json.dumps(job, separators=(",", ":"))
+        if self.name == "zlib":
+            tag, data = b"Z", zlib.compress(json.dumps(job, separators=(",", ":")).encode("utf-8"))
+        else:
+            import msgpack
+            tag, data = b"M", msgpack.packb(job)
+        if self.binary:
+            return tag + data
+        return tag.lower().decode() + base64.b64encode(data).decode("ascii")
+
+    @staticmethod
+    def decode(payload: Union[str, bytes]) -> Dict[str, Any]:
+        raw = payload.encode("utf-8") if isinstance(payload, str) else bytes(payload)
+        tag = raw[:1]
+        if tag in (b"z", b"m"):
+            tag, raw = tag.upper(), b" " + base64.b64decode(raw[1:])
+        if tag == b"Z":
+            return json.loads(zlib.decompress(raw[1:]))
+        if tag == b"M":
+            import msgpack
+            return msgpack.unpackb(raw[1:])
+        return json.loads(raw)
+
+
 class QueueManager:
     QUEUE_KEY = "n8n_factory:job_queue"
     DELAYED_KEY = "n8n_factory:job_queue:delayed"
+    JOBS_KEY = "n8n_factory:jobs" # job id -> payload; the queue and delayed set hold ids
     CURSORS_KEY_PREFIX = "n8n_factory:cursors"
+    DEDUP_KEY_PREFIX = "n8n_factory:dedup"
+    DEDUP_STATS_KEY = "n8n_factory:stats:dedup"
+    DEFAULT_DEDUP_WINDOW = 3600 # seconds
+    LIST_PAGE_SIZE = 500
+
+    # Claims the idempotency key and pushes the job in one step, so a duplicate
+    # can never slip in between the check and the push.
+    # KEYS: dedup key, queue key, stats key, jobs hash. ARGV: window (s), payload, ready time ('' = immediate), job id.
+    # Returns the queue depth (or 1 for delayed jobs), or -1 for a duplicate.
+    DEDUP_ENQUEUE_SCRIPT = """
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[1]) then
+  redis.call('HINCRBY', KEYS[3], 'rejected', 1)
+  return -1
+end
+redis.call('HINCRBY', KEYS[3], 'accepted', 1)
+redis.call('HSET', KEYS[4], ARGV[4], ARGV[2])
+if ARGV[3] == '' then
+  return redis.call('LPUSH', KEYS[2], ARGV[4])
+end
+return redis.call('ZADD', KEYS[2], ARGV[3], ARGV[4])
+"""
+
+    # Pops the next id and takes its payload out of the jobs hash. Entries without
+    # a payload in the hash are inline payloads (parked gate jobs, older queues).
+    # KEYS: queue, jobs hash.
+    POP_SCRIPT = """
+local id = redis.call('RPOP', KEYS[1])
+if not id then return false end
+local payload = redis.call('HGET', KEYS[2], id)
+if not payload then return id end
+redis.call('HDEL', KEYS[2], id)
+return payload
+"""
+
+    # Same for the first delayed job that is ready. KEYS: delayed zset, jobs hash. ARGV: now (ms).
+    CLAIM_DELAYED_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 1)
+if #ids == 0 then return false end
+redis.call('ZREM', KEYS[1], ids[1])
+local payload = redis.call('HGET', KEYS[2], ids[1])
+if not payload then return ids[1] end
+redis.call('HDEL', KEYS[2], ids[1])
+return payload
+"""
+
+    # KEYS: queue, delayed zset, jobs hash. ARGV: job id. Returns 1 if the job was removed.
+    REMOVE_SCRIPT = """
+local removed = redis.call('ZREM', KEYS[2], ARGV[1])
+if removed == 0 then removed = redis.call('LREM', KEYS[1], 1, ARGV[1]) end
+redis.call('HDEL', KEYS[3], ARGV[1])
+return removed
+"""
+
+    # Moves ready delayed jobs to the consumer end of the queue in one step.
+    # KEYS: delayed zset, queue. ARGV: now (ms), limit.
+    PROMOTE_SCRIPT = """
+local jobs = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, job in ipairs(jobs) do
+  redis.call('ZREM', KEYS[1], job)
+  redis.call('RPUSH', KEYS[2], job)
+end
+return #jobs
+"""
 
     def __init__(self, operator: Optional[SystemOperator] = None):
         self.operator = operator or SystemOperator()
+        self.dedup_window = int(os.getenv("N8N_FACTORY_DEDUP_WINDOW", self.DEFAULT_DEDUP_WINDOW))
+        # Cursor writes within this interval are coalesced (last write wins) and sent
+        # in one round-trip; 0 writes every update immediately.
+        self.cursor_flush_interval = float(os.getenv("N8N_FACTORY_CURSOR_FLUSH_INTERVAL", "0"))
+        self._pending_cursors: Dict[str, Dict[str, str]] = {}
+        self._cursors_flushed_at = time.monotonic()
+        binary = isinstance(self.operator, SystemOperator) and self.operator.redis_connection() is not None
+        self.codec = JobCodec(os.getenv("N8N_FACTORY_JOB_ENCODING", "json"), binary=binary)
+
+    @staticmethod
+    def derive_idempotency_key(workflow: str, inputs: Dict[str, Any], meta: Dict[str, Any]) -> str:
+        """Derives a stable key from the workflow, its inputs and a hash of meta."""
+        inputs_hash = hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        meta_hash = hashlib.sha1(json.dumps(meta, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return f"{workflow}:{inputs_hash[:16]}:{meta_hash[:16]}"
 
-    def enqueue(self, workflow: str, inputs: Dict[str, Any] = {}, mode: str = "id", meta: Dict[str, Any] = {}, delay: int = 0) -> str:
+    def enqueue(self, workflow: str, inputs: Dict[str, Any] = {}, mode: str = "id", meta: Dict[str, Any] = {}, delay: int = 0,
+                idempotency_key: Optional[str] = None, dedup: bool = False, dedup_window: Optional[int] = None) -> Optional[str]:
         """
         Adds a job to the queue.
         mode: 'id' or 'file'
         delay: delay in milliseconds before the job becomes available
+        idempotency_key: rejects the job if the same key was enqueued within the dedup window
+        dedup: derive an idempotency key from workflow, inputs and meta when none is given
+        Returns None if the job was rejected as a duplicate; raises RedisError if
+        it could not be stored.
         """
-        job = {
+        job = self.build_job(workflow, inputs, mode, meta)
+
+        if dedup and not idempotency_key:
+            idempotency_key = self.derive_idempotency_key(workflow, inputs, meta)
+        if idempotency_key:
+            job["idempotency_key"] = idempotency_key
+            return self._enqueue_unique(job, idempotency_key, delay, dedup_window or self.dedup_window)
+
+        res = self._store(job, delay)
+        if delay > 0:
+            logger.info(f"Enqueued delayed job for workflow '{workflow}' (Delay: {delay}ms).")
+        else:
+            logger.info(f"Enqueued job for workflow '{workflow}'. Queue depth: {res}")
+        return res
+
+    @staticmethod
+    def build_job(workflow: str, inputs: Dict[str, Any], mode: str = "id", meta: Dict[str, Any] = {},
+                  job_id: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "id": job_id or uuid.uuid4().hex,
             "workflow": workflow,
             "mode": mode,
             "inputs": inputs,
@@ -26,103 +182,198 @@ class QueueManager:
             "timestamp": time.time(),
             "retries": 0
         }
-        payload = json.dumps(job)
-        
+
+    def schedule_many(self, entries: List[Tuple[Dict[str, Any], float]], extra: Optional[List[List[Any]]] = None) -> int:
+        """
+        Adds jobs to the delayed set at absolute ready times (epoch ms) in one
+        round-trip. 'extra' commands are sent in the same batch. Re-adding a job
+        id only moves its ready time, so callers can use stable ids.
+        """
+        if not entries and not extra:
+            return 0
+        with RedisPipeline(self.operator) as pipe:
+            for job, ready_at in entries:
+                pipe.command(["HSET", self.JOBS_KEY, job["id"], self.codec.encode(job)])
+                pipe.command(["ZADD", self.DELAYED_KEY, str(ready_at), job["id"]])
+            for command in extra or []:
+                pipe.command(command)
+        return len(entries)
+
+    def _store(self, job: Dict[str, Any], delay: int = 0) -> str:
+        """
+        Writes the payload under the job id and pushes the id, in one round-trip.
+        Raises RedisError if the job was not stored.
+        """
+        job_id = job.setdefault("id", uuid.uuid4().hex)
+        with RedisPipeline(self.operator) as pipe:
+            pipe.command(["HSET", self.JOBS_KEY, job_id, self.codec.encode(job)])
+            if delay > 0:
+                pipe.command(["ZADD", self.DELAYED_KEY, str((time.time() * 1000) + delay), job_id])
+            else:
+                pipe.command(["LPUSH", self.QUEUE_KEY, job_id])
+        failed = [r for r in pipe.results if r is None or isinstance(r, dict)]
+        if failed:
+            raise RedisError(f"Failed to store job '{job_id}': {failed[0] or 'no reply'}")
+        return str(pipe.results[-1])
+
+    def _enqueue_unique(self, job: Dict[str, Any], idempotency_key: str, delay: int, window: int) -> Optional[str]:
+        workflow = job["workflow"]
+        payload = self.codec.encode(job)
         if delay > 0:
-            ready_time = (time.time() * 1000) + delay
-            # Use ZADD for delayed queue
-            res = self.operator.inspect_redis(["ZADD", self.DELAYED_KEY, str(ready_time), payload])
-            logger.info(f"Enqueued delayed job for workflow '{workflow}' (Delay: {delay}ms).")
+            target, ready = self.DELAYED_KEY, str((time.time() * 1000) + delay)
         else:
-            # Use list args to avoid shell splitting issues with JSON
-            res = self.operator.inspect_redis(["LPUSH", self.QUEUE_KEY, payload])
-            logger.info(f"Enqueued job for workflow '{workflow}'. Queue depth: {res}")
-            
+            target, ready = self.QUEUE_KEY, ""
+
+        dedup_key = f"{self.DEDUP_KEY_PREFIX}:{idempotency_key}"
+        res = self.operator.inspect_redis([
+            "EVAL", self.DEDUP_ENQUEUE_SCRIPT, "4", dedup_key, target, self.DEDUP_STATS_KEY, self.JOBS_KEY,
+            str(window), payload, ready, job["id"]
+        ])
+        if not isinstance(res, str) or res.startswith("Redis command failed"):
+            raise RedisError(f"Failed to store job '{job['id']}': {res}")
+        if res.strip() == "-1":
+            logger.info(f"Skipped duplicate job for workflow '{workflow}' (key: {idempotency_key}).")
+            return None
+
+        logger.info(f"Enqueued job for workflow '{workflow}' (key: {idempotency_key}).")
         return res
 
+    def dedup_stats(self) -> Dict[str, int]:
+        """Returns how many keyed enqueues were accepted and rejected as duplicates."""
+        try:
+            res = self.operator.redis(["HGETALL", self.DEDUP_STATS_KEY])
+        except RedisError as e:
+            logger.warning(f"Failed to read dedup stats: {e}")
+            res = []
+        stats = {"accepted": 0, "rejected": 0}
+        for field, value in pairs_to_dict(res).items():
+            try:
+                stats[field] = int(value)
+            except ValueError:
+                pass
+        return stats
+
     def requeue(self, job: Dict[str, Any], delay: int = 0):
         """
-        Pushes a job back onto the queue (e.g. after failure).
+        Pushes a job back onto the queue (e.g. after failure). Raises RedisError
+        if the job could not be stored.
         """
+        res = self._store(job, delay)
         if delay > 0:
-            ready_time = (time.time() * 1000) + delay
-            payload = json.dumps(job)
-            res = self.operator.inspect_redis(["ZADD", self.DELAYED_KEY, str(ready_time), payload])
             logger.warning(f"Requeued job for workflow '{job.get('workflow')}' with delay {delay}ms.")
-            return res
         else:
-            payload = json.dumps(job)
-            res = self.operator.inspect_redis(["LPUSH", self.QUEUE_KEY, payload])
             logger.warning(f"Requeued job for workflow '{job.get('workflow')}'. Queue depth: {res}")
-            return res
+        return res
+
+    def remove(self, job_id: str) -> bool:
+        """Removes a queued or delayed job by id (O(1) for delayed jobs)."""
+        res = self.operator.inspect_redis([
+            "EVAL", self.REMOVE_SCRIPT, "3", self.QUEUE_KEY, self.DELAYED_KEY, self.JOBS_KEY, job_id
+        ])
+        return isinstance(res, str) and res.strip() == "1"
+
+    def promote_delayed(self, limit: int = 100) -> int:
+        """
+        Moves up to 'limit' ready delayed jobs onto the queue atomically.
+        Used by the cluster leader so instances don't race on the delayed set.
+        """
+        res = self.operator.inspect_redis([
+            "EVAL", self.PROMOTE_SCRIPT, "2", self.DELAYED_KEY, self.QUEUE_KEY, str(time.time() * 1000), str(limit)
+        ])
+        try:
+            return int(res)
+        except (ValueError, TypeError):
+            return 0
 
-    def dequeue(self) -> Optional[Dict[str, Any]]:
+    def dequeue(self, include_delayed: bool = True) -> Optional[Dict[str, Any]]:
         """
         Removes and returns the next job from the queue.
-        Checks delayed queue first for ready jobs.
+        Checks delayed queue first for ready jobs, unless include_delayed is False
+        (jobs are then promoted by promote_delayed()).
         """
-        # 1. Check delayed queue for jobs ready now
-        now = time.time() * 1000
-        # ZRANGEBYSCORE key -inf now LIMIT 0 1
-        res = self.operator.inspect_redis(["ZRANGEBYSCORE", self.DELAYED_KEY, "-inf", str(now), "LIMIT", "0", "1"])
-        
-        # If we got a delayed job, try to remove it (atomically ideally, but here distinct steps)
-        # Note: In a high-concurrency env, this race condition (read-then-remove) could be an issue.
-        # Ideally we use a Lua script. For this factory tool, we assume single scheduler or low contention.
-        if res and res.strip():
-            # Redis CLI might return list with one item
-            payload = res.strip()
-            # Remove it
-            rem_res = self.operator.inspect_redis(["ZREM", self.DELAYED_KEY, payload])
-            if rem_res and int(rem_res) > 0:
-                try:
-                    return json.loads(payload)
-                except json.JSONDecodeError:
-                    logger.error(f"Failed to decode delayed job: {payload}")
-
-        # 2. Regular queue
-        # RPOP returns the element or nothing
-        res = self.operator.inspect_redis(["RPOP", self.QUEUE_KEY])
-        if not res or res.strip() == "":
+        if include_delayed:
+            job = self._pop(["EVAL", self.CLAIM_DELAYED_SCRIPT, "2", self.DELAYED_KEY, self.JOBS_KEY, str(time.time() * 1000)])
+            if job:
+                return job
+        return self._pop_ready()
+
+    def _pop_ready(self) -> Optional[Dict[str, Any]]:
+        return self._pop(["EVAL", self.POP_SCRIPT, "2", self.QUEUE_KEY, self.JOBS_KEY])
+
+    def _pop(self, command: List[str]) -> Optional[Dict[str, Any]]:
+        try:
+            payload = self.operator.redis(command, decode=False)
+        except RedisError as e:
+            logger.error(f"Failed to pop job: {e}")
+            return None
+        if not payload or not isinstance(payload, (str, bytes)):
             return None
-        
         try:
-            return json.loads(res)
-        except json.JSONDecodeError:
-            logger.error(f"Failed to decode job from queue: {res}")
+            return self.codec.decode(payload)
+        except Exception:
+            logger.error(f"Failed to decode job from queue: {payload[:200]!r}")
             return None
 
     def size(self) -> int:
-        res = self.operator.inspect_redis(["LLEN", self.QUEUE_KEY])
-        try:
-            return int(res)
-        except ValueError:
-            return 0
-            
+        return self._count(["LLEN", self.QUEUE_KEY])
+
     def delayed_size(self) -> int:
-        res = self.operator.inspect_redis(["ZCARD", self.DELAYED_KEY])
+        return self._count(["ZCARD", self.DELAYED_KEY])
+
+    def _count(self, command: List[str]) -> int:
         try:
-            return int(res)
-        except ValueError:
+            res = self.operator.redis(command)
+        except RedisError as e:
+            logger.warning(f"{command[0]} failed: {e}")
             return 0
+        return res if isinstance(res, int) else 0
 
     def clear(self):
         self.operator.inspect_redis(["DEL", self.QUEUE_KEY])
         self.operator.inspect_redis(["DEL", self.DELAYED_KEY])
+        self.operator.inspect_redis(["DEL", self.JOBS_KEY])
 
     def list_jobs(self, limit: int = 10) -> List[Dict[str, Any]]:
-        # LRANGE key 0 limit-1
-        res = self.operator.inspect_redis(["LRANGE", self.QUEUE_KEY, "0", str(limit - 1)])
-        # redis-cli returns list items separated by newlines
-        jobs = []
-        for line in res.splitlines():
-            try:
-                if line.strip():
-                    jobs.append(json.loads(line))
-            except json.JSONDecodeError:
-                pass
+        jobs: List[Dict[str, Any]] = []
+        if limit <= 0:
+            return jobs
+        for job in self.iter_jobs(page_size=min(limit, self.LIST_PAGE_SIZE)):
+            jobs.append(job)
+            if len(jobs) >= limit:
+                break
         return jobs
 
+    def iter_jobs(self, page_size: int = LIST_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+        """
+        Streams queued jobs (next to run last, as stored) with LRANGE pages,
+        so large queues are never read in one reply.
+        """
+        start = 0
+        while True:
+            try:
+                page = self.operator.redis(["LRANGE", self.QUEUE_KEY, start, start + page_size - 1], decode=False)
+            except RedisError as e:
+                logger.warning(f"Failed to list jobs: {e}")
+                return
+            if not isinstance(page, list) or not page:
+                return
+            try:
+                payloads = self.operator.redis(["HMGET", self.JOBS_KEY] + page, decode=False)
+            except RedisError as e:
+                logger.warning(f"Failed to list jobs: {e}")
+                return
+            if not isinstance(payloads, list):
+                payloads = [None] * len(page)
+            for entry, payload in zip(page, payloads):
+                try:
+                    # Entries without a stored payload are inline jobs
+                    yield self.codec.decode(payload if payload else entry)
+                except Exception:
+                    logger.warning(f"Skipping undecodable job payload at index {start}")
+            if len(page) < page_size:
+                return
+            start += page_size
+
     # Cursor Management
     
     def _get_cursor_key(self, run_id: str) -> str:
@@ -130,28 +381,72 @@ class QueueManager:
 
     def set_cursor(self, run_id: str, cursor: str, value: Any):
         """Sets a cursor value for a specific run."""
-        key = self._get_cursor_key(run_id)
-        self.operator.inspect_redis(["HSET", key, cursor, str(value)])
+        if self.cursor_flush_interval <= 0:
+            key = self._get_cursor_key(run_id)
+            self.operator.inspect_redis(["HSET", key, cursor, str(value)])
+            return
+
+        self._pending_cursors.setdefault(run_id, {})[cursor] = str(value)
+        self.flush_cursors_if_due()
+
+    def flush_cursors_if_due(self):
+        """Flushes pending cursor writes once cursor_flush_interval has passed."""
+        if self._pending_cursors and time.monotonic() - self._cursors_flushed_at >= self.cursor_flush_interval:
+            self.flush_cursors()
+
+    def flush_cursors(self):
+        """Writes coalesced cursor updates, one HSET per run, in a single round-trip."""
+        self._cursors_flushed_at = time.monotonic()
+        pending, self._pending_cursors = self._pending_cursors, {}
+        if not pending:
+            return
+        with RedisPipeline(self.operator) as pipe:
+            for run_id, fields in pending.items():
+                args = ["HSET", self._get_cursor_key(run_id)]
+                for cursor, value in fields.items():
+                    args.extend([cursor, value])
+                pipe.command(args)
 
     def get_cursor(self, run_id: str, cursor: str) -> Optional[str]:
         """Gets a cursor value."""
+        pending = self._pending_cursors.get(run_id, {})
+        if cursor in pending:
+            return pending[cursor]
         key = self._get_cursor_key(run_id)
-        res = self.operator.inspect_redis(["HGET", key, cursor])
-        return res if res and res.strip() else None
-        
+        try:
+            res = self.operator.redis(["HGET", key, cursor])
+        except RedisError as e:
+            logger.warning(f"Failed to read cursor '{cursor}' of run '{run_id}': {e}")
+            return None
+        return res if isinstance(res, str) else None
+
     def get_all_cursors(self, run_id: str) -> Dict[str, str]:
         """Gets all cursors for a run."""
         key = self._get_cursor_key(run_id)
-        res = self.operator.inspect_redis(["HGETALL", key])
-        # Redis CLI HGETALL returns key\nval\nkey\nval...
-        lines = res.splitlines()
+        try:
+            res = self.operator.redis(["HGETALL", key])
+        except RedisError as e:
+            logger.warning(f"Failed to read cursors of run '{run_id}': {e}")
+            res = []
+        result = pairs_to_dict(res)
+        result.update(self._pending_cursors.get(run_id, {}))
+        return result
+
+    def get_cursors_bulk(self, run_ids: List[str]) -> Dict[str, Dict[str, str]]:
+        """Gets all cursors for several runs in one round-trip."""
+        with RedisPipeline(self.operator) as pipe:
+            for run_id in run_ids:
+                pipe.command(["HGETALL", self._get_cursor_key(run_id)])
         result = {}
-        for i in range(0, len(lines), 2):
-            if i + 1 < len(lines):
-                result[lines[i]] = lines[i+1]
+        for run_id, reply in zip(run_ids, pipe.results):
+            cursors = pairs_to_dict(reply)
+            cursors.update(self._pending_cursors.get(run_id, {}))
+            result[run_id] = cursors
         return result
 
     def reset_cursors(self, run_id: str):
         """Clears all cursors for a run."""
+        self._pending_cursors.pop(run_id, None)
         key = self._get_cursor_key(run_id)
         self.operator.inspect_redis(["DEL", key])
+
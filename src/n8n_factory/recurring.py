@@ -0,0 +1,306 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Set, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from .operator import SystemOperator
+from .queue_manager import QueueManager
+from .resp import RedisError, pairs_to_dict
+from .logger import logger
+
+ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+WEEKDAYS = ["sun", "mon", "tue", "wed", "thu", "fri", "sat"]
+
+
+class CronExpression:
+    """
+    Standard 5-field cron expression (minute hour day-of-month month day-of-week)
+    with ranges, steps, lists, month/day names and the @daily-style aliases.
+    As in cron, when both day fields are restricted a day matching either runs.
+    """
+    FIELDS = [("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 6)]
+    MAX_SEARCH_DAYS = 366 * 5
+
+    def __init__(self, expression: str, tz: str = "UTC"):
+        self.expression = expression.strip()
+        fields = ALIASES.get(self.expression.lower(), self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression '{expression}' needs 5 fields (minute hour day month weekday)")
+        try:
+            self.tz = ZoneInfo(tz)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown time zone '{tz}'")
+        parsed = [self._parse_field(value, name, low, high) for value, (name, low, high) in zip(fields, self.FIELDS)]
+        self.minutes, self.hours, self.days, self.months, self.weekdays = parsed
+        self.day_restricted = fields[2] != "*"
+        self.weekday_restricted = fields[4] != "*"
+
+    @staticmethod
+    def _parse_field(value: str, name: str, low: int, high: int) -> Set[int]:
+        names = MONTHS if name == "month" else WEEKDAYS if name == "weekday" else []
+        # Sunday may be written as 7
+        top = 7 if name == "weekday" else high
+
+        def number(token: str) -> int:
+            token = token.lower()
+            if token in names:
+                return names.index(token) + (1 if name == "month" else 0)
+            try:
+                n = int(token)
+            except ValueError:
+                raise ValueError(f"Invalid {name} '{token}' in cron expression")
+            if not low <= n <= top:
+                raise ValueError(f"{name} {n} out of range {low}-{top}")
+            return n
+
+        values: Set[int] = set()
+        for part in value.split(","):
+            base, _, step_text = part.partition("/")
+            step = 1
+            if step_text:
+                if not step_text.isdigit() or int(step_text) == 0:
+                    raise ValueError(f"Invalid step '{step_text}' for {name}")
+                step = int(step_text)
+            if base == "*":
+                start, end = low, high
+            elif "-" in base:
+                start_text, end_text = base.split("-", 1)
+                start, end = number(start_text), number(end_text)
+                if start > end:
+                    raise ValueError(f"Invalid {name} range '{base}'")
+            else:
+                start = number(base)
+                end = high if step_text else start
+            values.update(range(start, end + 1, step))
+        if name == "weekday" and 7 in values:
+            values.discard(7)
+            values.add(0)
+        return values
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.isoweekday() % 7) in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, ts: float) -> float:
+        """The first run time strictly after 'ts' (epoch seconds)."""
+        dt = datetime.fromtimestamp(ts, self.tz).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=self.MAX_SEARCH_DAYS)
+        while dt < limit:
+            if dt.month not in self.months:
+                year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+                dt = dt.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+            elif dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt.timestamp()
+        raise ValueError(f"Cron expression '{self.expression}' never matches")
+
+    def upcoming(self, after: float, count: int) -> List[float]:
+        times = []
+        ts = after
+        for _ in range(count):
+            ts = self.next_after(ts)
+            times.append(ts)
+        return times
+
+
+class RecurringJobs:
+    """
+    Recurring job specs kept in Redis. The scheduler leader materialises the next
+    'horizon' runs of each spec into the delayed queue in one round-trip, with
+    stable job ids (cron:<name>:<time>) so repeated passes never duplicate a run.
+
+    Missed runs (the scheduler was down) follow the spec's policy: 'skip' drops
+    them, 'catchup' enqueues them right away (at most MAX_CATCHUP per spec).
+    """
+    KEY_SPECS = "n8n_factory:recurring"
+    KEY_STATE = "n8n_factory:recurring:state"
+    MISSED_POLICIES = ("skip", "catchup")
+    DEFAULT_HORIZON = 10
+    MAX_CATCHUP = 100
+    MATERIALIZE_INTERVAL = 30.0 # seconds between passes
+    DOWNTIME_THRESHOLD = 300.0 # a pass this late means runs were missed, not just queued
+
+    def __init__(self, operator: SystemOperator, queue: Optional[QueueManager] = None):
+        self.operator = operator
+        self.queue = queue or QueueManager(operator)
+        self._last_pass = 0.0
+
+    def add(self, name: str, cron: str, workflow: str, mode: str = "id", inputs: Optional[Dict[str, Any]] = None,
+            meta: Optional[Dict[str, Any]] = None, jitter: int = 0, missed: str = "skip",
+            horizon: int = DEFAULT_HORIZON, tz: str = "UTC") -> Dict[str, Any]:
+        """Validates and stores a spec (replacing any spec of the same name)."""
+        CronExpression(cron, tz)
+        if missed not in self.MISSED_POLICIES:
+            raise ValueError(f"Missed-run policy must be one of {', '.join(self.MISSED_POLICIES)}")
+        if jitter < 0 or horizon < 1:
+            raise ValueError("jitter must be >= 0 and horizon >= 1")
+        if ":" in name:
+            raise ValueError("Recurring job names cannot contain ':'")
+        spec = {
+            "name": name, "cron": cron, "tz": tz, "workflow": workflow, "mode": mode,
+            "inputs": inputs or {}, "meta": meta or {}, "jitter": int(jitter), "missed": missed, "horizon": int(horizon),
+        }
+        self.operator.inspect_redis(["HSET", self.KEY_SPECS, name, json.dumps(spec)])
+        return spec
+
+    def remove(self, name: str, now: Optional[float] = None) -> bool:
+        """Deletes a spec and the runs it has already materialised."""
+        spec = self.specs().get(name)
+        if not spec:
+            return False
+        state = self.states().get(name, {})
+        now = time.time() if now is None else now
+        last = state.get("last")
+        if last:
+            cron = CronExpression(spec["cron"], spec.get("tz", "UTC"))
+            # Runs after the last pass are still waiting in the delayed queue
+            for ts in self._between(cron, min(state.get("checked", now), now), last, int(spec.get("horizon", self.DEFAULT_HORIZON))):
+                self.queue.remove(self.job_id(name, ts))
+        self.operator.inspect_redis(["HDEL", self.KEY_SPECS, name])
+        self.operator.inspect_redis(["HDEL", self.KEY_STATE, name])
+        return True
+
+    def specs(self) -> Dict[str, Dict[str, Any]]:
+        return self._load(self.KEY_SPECS)
+
+    def states(self) -> Dict[str, Dict[str, Any]]:
+        return self._load(self.KEY_STATE)
+
+    def _load(self, key: str) -> Dict[str, Dict[str, Any]]:
+        try:
+            raw = pairs_to_dict(self.operator.redis(["HGETALL", key]))
+        except RedisError as e:
+            logger.warning(f"Failed to read {key}: {e}")
+            return {}
+        loaded = {}
+        for name, value in raw.items():
+            try:
+                loaded[name] = json.loads(value)
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring malformed entry '{name}' in {key}")
+        return loaded
+
+    @staticmethod
+    def job_id(name: str, ts: float) -> str:
+        return f"cron:{name}:{int(ts)}"
+
+    @staticmethod
+    def jitter_for(name: str, ts: float, jitter: int) -> int:
+        """Deterministic per-run offset, so re-materialising a run keeps its time."""
+        if jitter <= 0:
+            return 0
+        digest = hashlib.sha1(f"{name}:{int(ts)}".encode("utf-8")).hexdigest()
+        return int(digest[:8], 16) % (jitter + 1)
+
+    @staticmethod
+    def _between(cron: CronExpression, start: float, end: float, cap: int) -> List[float]:
+        """Run times in (start, end], at most 'cap' of them."""
+        times = []
+        ts = start
+        while len(times) < cap:
+            ts = cron.next_after(ts)
+            if ts > end:
+                break
+            times.append(ts)
+        return times
+
+    def materialize_if_due(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        if now - self._last_pass < self.MATERIALIZE_INTERVAL:
+            return 0
+        return self.materialize(now)
+
+    def materialize(self, now: Optional[float] = None) -> int:
+        """Writes the upcoming runs of every spec to the delayed queue. Returns the runs added."""
+        now = time.time() if now is None else now
+        self._last_pass = now
+        specs = self.specs()
+        if not specs:
+            return 0
+        states = self.states()
+
+        entries: List[Tuple[Dict[str, Any], float]] = []
+        extra: List[List[Any]] = []
+        state_fields: List[str] = []
+        for name, spec in specs.items():
+            try:
+                runs, stale, state = self._plan(spec, states.get(name, {}), now)
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Skipping recurring job '{name}': {e}")
+                continue
+            entries.extend(runs)
+            for job_id in stale:
+                extra.append(["ZREM", self.queue.DELAYED_KEY, job_id])
+                extra.append(["HDEL", self.queue.JOBS_KEY, job_id])
+            state_fields.extend([name, json.dumps(state)])
+
+        # Runs and the new state go in one batch, so a failed write is simply redone
+        if state_fields:
+            extra.append(["HSET", self.KEY_STATE] + state_fields)
+        self.queue.schedule_many(entries, extra=extra)
+        if entries:
+            logger.debug(f"Materialised {len(entries)} recurring runs.")
+        return len(entries)
+
+    def _plan(self, spec: Dict[str, Any], state: Dict[str, Any], now: float):
+        """Returns (runs to add, stale job ids to drop, new state) for one spec."""
+        name = spec["name"]
+        cron = CronExpression(spec["cron"], spec.get("tz", "UTC"))
+        horizon = int(spec.get("horizon", self.DEFAULT_HORIZON))
+        last = state.get("last")
+        checked = state.get("checked", now)
+        runs: List[Tuple[Dict[str, Any], float]] = []
+        stale: List[str] = []
+
+        if last is not None:
+            missed = self._between(cron, last, now, self.MAX_CATCHUP + 1)
+            if spec.get("missed") == "catchup":
+                if len(missed) > self.MAX_CATCHUP:
+                    logger.warning(f"Recurring job '{name}' missed more than {self.MAX_CATCHUP} runs; catching up the first {self.MAX_CATCHUP}.")
+                for ts in missed[:self.MAX_CATCHUP]:
+                    runs.append((self._job(spec, ts), now * 1000))
+            else:
+                if missed:
+                    logger.info(f"Recurring job '{name}': skipped {len(missed)} missed run(s).")
+                if now - checked > self.DOWNTIME_THRESHOLD:
+                    # Runs materialised before the outage are overdue now; drop them too
+                    stale = [self.job_id(name, ts) for ts in self._between(cron, checked, min(now, last), horizon)]
+
+        upcoming = cron.upcoming(now, horizon)
+        for ts in upcoming:
+            if last is None or ts > last:
+                ready = ts + self.jitter_for(name, ts, int(spec.get("jitter", 0)))
+                runs.append((self._job(spec, ts), ready * 1000))
+        new_last = max([last or 0.0] + upcoming)
+        return runs, stale, {"last": new_last, "checked": now}
+
+    def _job(self, spec: Dict[str, Any], ts: float) -> Dict[str, Any]:
+        meta = dict(spec.get("meta") or {}, recurring=spec["name"], scheduled_for=ts)
+        job = QueueManager.build_job(spec["workflow"], spec.get("inputs") or {}, spec.get("mode", "id"), meta,
+                                     job_id=self.job_id(spec["name"], ts))
+        job["timestamp"] = ts # dispatch latency counts from the scheduled time
+        return job
+
+    def preview(self, name: str, count: int = 5, now: Optional[float] = None) -> List[float]:
+        spec = self.specs().get(name)
+        if not spec:
+            raise ValueError(f"No recurring job named '{name}'")
+        return CronExpression(spec["cron"], spec.get("tz", "UTC")).upcoming(time.time() if now is None else now, count)
@@ -0,0 +1,183 @@
+import select
+import socket
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+# Minimal RESP2 client: typed replies (int, bytes, list, None) and RedisError for
+# error replies, without going through redis-cli's human-readable output.
+
+CRLF = b"\r\n"
+
+
+class RedisError(Exception):
+    """An error reply from Redis, or a failure to reach it."""
+
+
+def encode_command(args: Sequence[Any]) -> bytes:
+    """Encodes a command as a RESP array of bulk strings."""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, (bytes, bytearray, memoryview)):
+            data = bytes(arg)
+        else:
+            data = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n" % len(data))
+        parts.append(data)
+        parts.append(CRLF)
+    return b"".join(parts)
+
+
+def read_reply(stream) -> Any:
+    """
+    Reads one reply from a buffered binary stream. Bulk strings are returned as
+    bytes (the payload is sliced straight from the read, not decoded), error
+    replies as RedisError instances so that one failed command in a pipeline
+    doesn't hide the others.
+    """
+    line = stream.readline()
+    if not line.endswith(CRLF):
+        raise RedisError("Connection closed by Redis")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode("utf-8")
+    if kind == b"-":
+        return RedisError(body.decode("utf-8", "replace"))
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        if len(data) != length + 2:
+            raise RedisError("Connection closed by Redis")
+        return data[:-2]
+    if kind == b"*":
+        count = int(body)
+        if count < 0:
+            return None
+        return [read_reply(stream) for _ in range(count)]
+    raise RedisError(f"Unexpected reply type {kind!r}")
+
+
+def decode_reply(reply: Any) -> Any:
+    """Turns bytes in a reply into str (recursively)."""
+    if isinstance(reply, bytes):
+        return reply.decode("utf-8", "replace")
+    if isinstance(reply, list):
+        return [decode_reply(r) for r in reply]
+    return reply
+
+
+def pairs_to_dict(reply: Any) -> Dict[str, str]:
+    """Turns a flat [field, value, ...] reply (HGETALL) into a dict."""
+    if not isinstance(reply, list):
+        return {}
+    return {str(reply[i]): str(reply[i + 1]) for i in range(0, len(reply) - 1, 2)}
+
+
+class RedisConnection:
+    """
+    One TCP connection to Redis, shared by the scheduler threads behind a lock.
+    Reconnects if the connection dropped between commands, but never resends
+    commands that were already written.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 6379, password: Optional[str] = None,
+                 db: int = 0, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.db = db
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        try:
+            self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as e:
+            raise RedisError(f"Cannot connect to Redis at {self.host}:{self.port}: {e}")
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._stream = self._sock.makefile("rb")
+        setup = []
+        if self.password:
+            setup.append(["AUTH", self.password])
+        if self.db:
+            setup.append(["SELECT", self.db])
+        try:
+            replies = self._send(setup)
+        except (OSError, RedisError) as e:
+            # Don't keep a half-set-up connection for the next command
+            self.close()
+            raise RedisError(f"Redis connection setup failed: {e}")
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                self.close()
+                raise reply
+
+    def _send(self, commands: List[Sequence[Any]]) -> List[Any]:
+        if not commands:
+            return []
+        self._sock.sendall(b"".join(encode_command(c) for c in commands))
+        return [read_reply(self._stream) for _ in commands]
+
+    def _stale(self) -> bool:
+        """An idle connection with something to read (EOF or a goodbye error) was closed by the server."""
+        try:
+            readable, _, _ = select.select([self._sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def pipeline(self, commands: List[Sequence[Any]]) -> List[Any]:
+        """
+        Sends all commands in one write and reads their replies in order. Only a
+        failed send is retried (once, on a fresh connection); once the commands
+        are written they may have run, so a failed read raises RedisError.
+        """
+        if not commands:
+            return []
+        payload = b"".join(encode_command(c) for c in commands)
+        with self._lock:
+            if self._sock is not None and self._stale():
+                self.close()
+            reused = self._sock is not None
+            if not reused:
+                self._connect()
+            try:
+                self._sock.sendall(payload)
+            except OSError as e:
+                # Closed by the server since the stale check: nothing was executed
+                self.close()
+                if not reused:
+                    raise RedisError(str(e))
+                self._connect()
+                try:
+                    self._sock.sendall(payload)
+                except OSError as e:
+                    self.close()
+                    raise RedisError(str(e))
+            try:
+                return [read_reply(self._stream) for _ in commands]
+            except (OSError, RedisError) as e:
+                self.close()
+                raise RedisError(str(e))
+
+    def execute(self, *args: Any) -> Any:
+        """Runs one command; raises RedisError on an error reply."""
+        reply = self.pipeline([args])[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    def close(self):
+        for closable in (self._stream, self._sock):
+            try:
+                if closable:
+                    closable.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._stream = None
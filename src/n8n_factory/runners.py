@@ -0,0 +1,91 @@
+import abc
+import os
+from typing import Optional, Dict, Any
+import requests
+from requests.adapters import HTTPAdapter
+from .operator import SystemOperator
+
+
+class WorkflowRunner(abc.ABC):
+    """
+    Starts a queued job in n8n. run() returns the result text, or a string
+    starting with "Execution failed" (the convention SystemOperator uses).
+    """
+    name = "base"
+
+    @abc.abstractmethod
+    def run(self, job: Dict[str, Any], env: Dict[str, str], broker_port: Optional[int] = None) -> str:
+        pass
+
+    def close(self):
+        pass
+
+
+class CliRunner(WorkflowRunner):
+    """Runs `n8n execute` inside the container (boots a CLI process per job)."""
+    name = "cli"
+
+    def __init__(self, operator: SystemOperator):
+        self.operator = operator
+
+    def run(self, job: Dict[str, Any], env: Dict[str, str], broker_port: Optional[int] = None) -> str:
+        workflow = job.get("workflow")
+        if job.get("mode") == "id":
+            return self.operator.execute_workflow(workflow_id=workflow, env=env, broker_port=broker_port)
+        return self.operator.execute_workflow(file_path=workflow, env=env, broker_port=broker_port)
+
+
+class WebhookRunner(WorkflowRunner):
+    """
+    Triggers workflows through their Webhook trigger on the running n8n instance,
+    reusing pooled keep-alive connections, so a job starts in milliseconds instead
+    of booting a CLI process.
+
+    The webhook path is meta.webhook_path, or the workflow id itself. Job inputs
+    are POSTed as JSON; the batch size is sent in the X-Batch-Size header.
+    File-mode jobs have no webhook and fall back to the CLI runner.
+    """
+    name = "webhook"
+
+    def __init__(self, base_url: Optional[str] = None, pool_size: int = 10, timeout: float = 600.0,
+                 fallback: Optional[WorkflowRunner] = None):
+        self.base_url = (base_url or os.getenv("N8N_WEBHOOK_URL", "http://localhost:5678/webhook")).rstrip("/")
+        self.timeout = timeout
+        self.fallback = fallback
+        # Shared by the dispatch threads; pool_maxsize keeps one connection per thread alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def url_for(self, job: Dict[str, Any]) -> str:
+        meta = job.get("meta") or {}
+        path = str(meta.get("webhook_path") or job.get("workflow")).lstrip("/")
+        return f"{self.base_url}/{path}"
+
+    def run(self, job: Dict[str, Any], env: Dict[str, str], broker_port: Optional[int] = None) -> str:
+        if job.get("mode") != "id":
+            if self.fallback:
+                return self.fallback.run(job, env, broker_port)
+            return "Execution failed: file-mode jobs need the cli runner"
+
+        url = self.url_for(job)
+        headers = {"X-Batch-Size": str(env.get("BATCH_SIZE", ""))}
+        try:
+            res = self.session.post(url, json=job.get("inputs") or {}, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            return f"Execution failed: {e}"
+        if res.status_code >= 400:
+            return f"Execution failed: HTTP {res.status_code} from {url}: {res.text[:200]}"
+        return res.text.strip() or f"HTTP {res.status_code}"
+
+    def close(self):
+        self.session.close()
+
+
+def create_runner(name: str, operator: SystemOperator, webhook_url: Optional[str] = None, pool_size: int = 10) -> WorkflowRunner:
+    if name == "cli":
+        return CliRunner(operator)
+    if name == "webhook":
+        return WebhookRunner(webhook_url, pool_size=pool_size, fallback=CliRunner(operator))
+    raise ValueError(f"Unknown runner '{name}' (use cli or webhook)")
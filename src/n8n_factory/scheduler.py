@@ -1,17 +1,27 @@
 import time
-import json
 import os
-from typing import Optional
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List
 from rich.console import Console
 from .operator import SystemOperator
 from .queue_manager import QueueManager
-from .control_plane import AdaptiveBatchSizer, PhaseGate, AutoRefiller
+from .control_plane import AdaptiveBatchSizer, PhaseGate, AutoRefiller, RateLimiter
+from .history import JobHistorySink
+from .metrics import SchedulerMetrics, MetricsServer
+from .coordination import ClusterCoordinator, SlotSemaphore
+from .runners import WorkflowRunner, create_runner
+from .recurring import RecurringJobs
+from .resp import RedisError
 from .logger import logger
 
 console = Console()
 
 class Scheduler:
-    def __init__(self, concurrency: int = 5, poll_interval: int = 5, broker_port: Optional[int] = None, refill_command: Optional[str] = None, refill_threshold: int = 5):
+    def __init__(self, concurrency: int = 5, poll_interval: int = 5, broker_port: Optional[int] = None, refill_command: Optional[str] = None, refill_threshold: int = 5,
+                 metrics_port: Optional[int] = None, cluster: bool = False, instance_id: Optional[str] = None,
+                 runner: str = "cli", webhook_url: Optional[str] = None, dispatch_threads: int = 0):
         self.concurrency = concurrency
         self.poll_interval = poll_interval
         self.broker_port = broker_port
@@ -21,79 +31,203 @@ class Scheduler:
         self.operator = SystemOperator()
         self.queue = QueueManager(operator=self.operator)
         self.sizer = AdaptiveBatchSizer(self.operator)
-        self.gate = PhaseGate(self.operator)
+        self.gate = PhaseGate(self.operator, self.queue)
         self.refiller = AutoRefiller(self.operator)
+        self.limiter = RateLimiter(self.operator)
+        self.recurring = RecurringJobs(self.operator, self.queue)
+        # Multi-instance coordination (leader election + shared slots) is opt-in
+        self.coordinator = ClusterCoordinator(self.operator, concurrency, instance_id=instance_id) if cluster else None
+        # Slots are leased on dispatch and returned on completion. Every
+        # reconcile_interval seconds the DB count corrects drift (executions started
+        # outside the queue); it is also the fallback when Redis is unreachable.
+        self.slots = self.coordinator.slots if self.coordinator else SlotSemaphore(self.operator, concurrency)
+        self.reconcile_interval = int(os.getenv("N8N_FACTORY_RECONCILE_INTERVAL", "60"))
+        self._last_reconcile = 0.0
+        self._db_active = 0
+        self._in_flight = 0 # leases this instance holds for dispatched jobs
         
+        # How jobs are started: `n8n execute` through self.operator, or webhooks (see runners.py)
+        self.runner: WorkflowRunner = create_runner(runner, self.operator, webhook_url=webhook_url, pool_size=max(concurrency, 1))
+        # With dispatch_threads > 0 jobs run in the background, holding their slot lease
+        # until they finish, and the tick loop keeps polling.
+        self.dispatcher = ThreadPoolExecutor(max_workers=dispatch_threads, thread_name_prefix="dispatch") if dispatch_threads > 0 else None
+        self._lock = threading.Lock()
+
         self.running = False
         self.jobs_processed_session = 0
+
+        # Metrics are always recorded in-process; the HTTP endpoint is opt-in
+        self.metrics = SchedulerMetrics()
+        self.metrics_port = metrics_port
+        self.metrics_server: Optional[MetricsServer] = None
         
         # Ensure log directory exists
         self.job_log_file = os.getenv("N8N_FACTORY_LOG_PATH", "logs/jobs.jsonl")
         log_dir = os.path.dirname(self.job_log_file)
         if log_dir:
             os.makedirs(log_dir, exist_ok=True)
+        self.history = JobHistorySink(self.job_log_file)
 
     def start(self):
         console.print(f"[bold green]Starting Scheduler (Concurrency: {self.concurrency}, Broker Port: {self.broker_port or 'Default'})[/bold green]")
         if self.refill_command:
             console.print(f"[cyan]Auto-refill enabled (Threshold: {self.refill_threshold}):[/cyan] {self.refill_command}")
             
+        if self.metrics_port is not None:
+            self.metrics_server = MetricsServer(self.metrics, self.metrics_port)
+            port = self.metrics_server.start()
+            console.print(f"[cyan]Metrics:[/cyan] http://localhost:{port}/metrics")
+        if self.coordinator:
+            console.print(f"[cyan]Cluster mode:[/cyan] instance {self.coordinator.instance_id}")
+
         self.running = True
-        
-        while self.running:
-            try:
-                self._tick()
-                time.sleep(self.poll_interval)
-            except KeyboardInterrupt:
-                console.print("\n[yellow]Stopping scheduler...[/yellow]")
-                self.running = False
-            except Exception as e:
-                logger.error(f"Scheduler error: {e}")
-                time.sleep(self.poll_interval)
+        # SIGTERM (docker stop, systemd) ends the loop like Ctrl+C, so shutdown still runs
+        on_main_thread = threading.current_thread() is threading.main_thread()
+        previous_handler = signal.signal(signal.SIGTERM, self._handle_sigterm) if on_main_thread else None
+
+        try:
+            while self.running:
+                try:
+                    self._tick()
+                    self.history.flush_if_due()
+                    self.queue.flush_cursors_if_due()
+                    time.sleep(self.poll_interval)
+                except KeyboardInterrupt:
+                    console.print("\n[yellow]Stopping scheduler...[/yellow]")
+                    self.running = False
+                except Exception as e:
+                    logger.error(f"Scheduler error: {e}")
+                    time.sleep(self.poll_interval)
+        finally:
+            if on_main_thread:
+                signal.signal(signal.SIGTERM, previous_handler or signal.SIG_DFL)
+            self.shutdown()
+
+    def _handle_sigterm(self, signum, frame):
+        console.print("\n[yellow]Received SIGTERM, stopping scheduler...[/yellow]")
+        self.running = False
+
+    def shutdown(self):
+        """Waits for running jobs, then flushes job history and coalesced cursor writes."""
+        self.running = False
+        if self.dispatcher:
+            console.print("[yellow]Waiting for running jobs...[/yellow]")
+            self.dispatcher.shutdown(wait=True)
+        self.runner.close()
+        self.history.close()
+        self.queue.flush_cursors()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.coordinator:
+            self.coordinator.shutdown()
 
     def _tick(self):
-        # 1. Check active executions
-        active_execs = self.operator.get_active_executions()
-        active_count = len(active_execs)
-        
-        # 2. Check slots
-        slots_available = self.concurrency - active_count
+        # In cluster mode only the leader runs singleton duties (reconciliation, recurring
+        # jobs, promotion, gate release, refill); every instance leases from the shared slots.
+        leader = self.coordinator.elect() if self.coordinator else True
+
+        if leader:
+            # 1. Correct slot drift against the DB (only occasionally)
+            self._reconcile()
+            # 2. Recurring specs are materialised ahead into the delayed queue
+            self.recurring.materialize_if_due()
+            if self.coordinator:
+                self.queue.promote_delayed()
+            # --- Gate Release ---
+            # Parked jobs whose dependency has completed go back to the front of the queue.
+            released = self.gate.release_ready(self.queue.QUEUE_KEY)
+            if released:
+                self.metrics.gate_released.inc(released)
         
         # 3. Check queue sizes (needed for refill check regardless of slots)
         queue_size = self.queue.size()
         delayed_size = self.queue.delayed_size()
         total_queued = queue_size + delayed_size
+        self.metrics.queue_depth.set(queue_size)
+        self.metrics.delayed_depth.set(delayed_size)
 
         # --- Auto Refill Check ---
-        if self.refill_command:
+        if self.refill_command and leader:
             self.refiller.check_and_refill(total_queued, self.refill_threshold, self.refill_command)
         
-        if slots_available > 0:
-            if total_queued > 0:
-                logger.info(f"Slots available: {slots_available}. Queue size: {queue_size} (Delayed: {delayed_size})")
-                
-                # Dequeue and run up to slots_available
-                # Note: dequeue checks delayed queue automatically
-                for _ in range(slots_available):
-                    job = self.queue.dequeue()
+        # 4. Lease free slots. The semaphore is the source of truth, so slots
+        # returned by finished jobs are reused on the next tick.
+        if total_queued > 0:
+            leases = self.slots.acquire(min(self.concurrency, total_queued))
+            if leases is None:
+                # Redis unreachable: without a shared semaphore only a standalone
+                # scheduler may dispatch, against the last DB count
+                free = 0 if self.coordinator else max(0, self.concurrency - self._db_active)
+                leases = [None] * min(free, total_queued)
+            if leases:
+                self._track_leases(len(leases))
+                logger.info(f"Slots leased: {len(leases)}. Queue size: {queue_size} (Delayed: {delayed_size})")
+
+                # Dequeue one job per lease, then evaluate gates for the whole batch at once
+                # Note: dequeue checks delayed queue automatically (outside cluster mode)
+                jobs = []
+                for _ in range(len(leases)):
+                    job = self.queue.dequeue(include_delayed=self.coordinator is None)
                     if not job:
                         break
-                    
-                    self._execute_job(job)
+                    jobs.append(job)
+                self._release_leases(leases[len(jobs):])
+
+                self.gate.prefetch(jobs)
+                for job, lease in zip(jobs, leases):
+                    if self.dispatcher:
+                        self.dispatcher.submit(self._run_leased, job, lease)
+                    else:
+                        self._run_leased(job, lease)
             else:
-                # Queue is empty. Check cursors for warning.
-                # Heuristic: If we have active run_ids with remaining items, warn.
-                # This is tricky without knowing *which* run_ids are active. 
-                # We can check if any gate is blocked? No.
-                # Ideally, we'd need a registry of active runs. 
-                # For now, we skip generic warning to avoid noise unless we have specific context.
-                pass
-        else:
-            logger.debug(f"Max concurrency reached ({active_count}/{self.concurrency}).")
+                logger.debug(f"Max concurrency reached ({self.concurrency} slots in use).")
+
+    def _run_leased(self, job: dict, lease: Optional[str]):
+        try:
+            self._execute_job(job)
+        except Exception as e:
+            logger.error(f"Unhandled error in job {job.get('workflow')}: {e}")
+        finally:
+            self._release_leases([lease])
+
+    def _release_leases(self, leases: List[Optional[str]]):
+        for lease in leases:
+            if lease:
+                self.slots.release(lease)
+        self._track_leases(-len(leases))
+
+    def _track_leases(self, delta: int):
+        """Counts leases held in-process, so the in-flight gauge needs no Redis round-trip."""
+        with self._lock:
+            self._in_flight += delta
+            self.metrics.in_flight.set(self._in_flight)
+
+    def _requeue(self, job: dict, delay: int) -> bool:
+        """Puts a job back on the queue; returns False (and logs the lost job) if Redis didn't take it."""
+        try:
+            self.queue.requeue(job, delay=delay)
+            return True
+        except RedisError as e:
+            logger.error(f"Failed to requeue job {job.get('workflow')} ({job.get('id')}); it is lost: {e}")
+            return False
+
+    def _reconcile(self, force: bool = False):
+        """Corrects slot drift against the DB's count of running executions when due."""
+        now = time.time()
+        if not force and now - self._last_reconcile < self.reconcile_interval:
+            return
+        self._last_reconcile = now
+        count = self.operator.count_active_executions(limit=self.concurrency * 2)
+        if count is None:
+            logger.warning("Could not count running executions in the DB; slot drift not corrected.")
+            return
+        self._db_active = count
+        self.slots.reconcile(count, ttl_ms=self.reconcile_interval * 1000)
+        if self.coordinator:
+            self.coordinator.publish_active(count)
 
     def _execute_job(self, job: dict):
         workflow = job.get("workflow")
-        mode = job.get("mode")
         meta = job.get("meta", {})
         # Ensure default is empty dict, using single braces
         inputs = job.get("inputs", dict())
@@ -105,19 +239,37 @@ class Scheduler:
         if phase:
             # Check if we can run this phase
             if not self.gate.can_run(run_id, str(phase)):
-                logger.info(f"Phase {phase} gated for run {run_id}. Requeueing with delay.")
-                self.queue.requeue(job, delay=10000) # Check again in 10s
+                logger.info(f"Phase {phase} gated for run {run_id}. Parking until dependency completes.")
+                self.gate.park(job)
+                self.metrics.gate_blocked.inc(phase=str(phase))
                 return
 
+        # --- Rate Limiting ---
+        # Over-limit jobs are deferred, not failed, so they don't burn retries.
+        wait_ms = self.limiter.acquire(workflow, meta)
+        if wait_ms > 0:
+            logger.info(f"Rate limit reached for {workflow}. Deferring {wait_ms}ms.")
+            if self._requeue(job, wait_ms):
+                self.metrics.rate_limited.inc(workflow=workflow)
+            return
+
         # --- Adaptive Batch Sizing ---
+        # Sized per workflow (or meta.batch_group) so pipelines don't share one size.
+        batch_group = self.sizer.group_for(workflow, meta)
         # Allow override from meta
         if "batch_size" in meta:
              batch_size = int(meta["batch_size"])
         else:
-             batch_size = self.sizer.get_batch_size()
+             batch_size = self.sizer.get_batch_size(batch_group)
         
-        self.jobs_processed_session += 1
-        console.print(f"[blue]Starting job #{self.jobs_processed_session}:[/blue] {workflow} [dim](Batch: {batch_size})[/dim]")
+        with self._lock:
+            self.jobs_processed_session += 1
+            job_number = self.jobs_processed_session
+        enqueued_at = job.get("timestamp")
+        if isinstance(enqueued_at, (int, float)):
+            self.metrics.dispatch_latency.observe(max(0.0, time.time() - enqueued_at))
+        self.metrics.batch_size.set(batch_size, group=batch_group or "")
+        console.print(f"[blue]Starting job #{job_number}:[/blue] {workflow} [dim](Batch: {batch_size})[/dim]")
         
         start_time = time.time()
         status = "unknown"
@@ -131,11 +283,7 @@ class Scheduler:
                 "N8N_BATCH_SIZE": str(batch_size)
             }
             
-            res = ""
-            if mode == 'id':
-                res = self.operator.execute_workflow(workflow_id=workflow, env=safe_env, broker_port=self.broker_port)
-            else:
-                res = self.operator.execute_workflow(file_path=workflow, env=safe_env, broker_port=self.broker_port)
+            res = self.runner.run(job, safe_env, broker_port=self.broker_port)
             
             # Check for failure string from operator
             if res.startswith("Execution failed"):
@@ -157,14 +305,17 @@ class Scheduler:
                 # Exponential backoff: 2s, 4s, 8s, 16s, 32s
                 delay = 2000 * (2 ** retries) 
                 logger.warning(f"Requeueing job {workflow} (Retry {job['retries']}/{max_retries}) in {delay}ms.")
-                self.queue.requeue(job, delay=delay)
+                if self._requeue(job, delay):
+                    self.metrics.retries.inc(workflow=workflow)
             else:
                 logger.error(f"Job {workflow} failed max retries. Dropping.")
 
         finally:
             # --- Update Stats ---
             duration_ms = (time.time() - start_time) * 1000
-            self.sizer.update_stats(duration_ms, success=(status == "success"))
+            self.metrics.jobs.inc(workflow=workflow, status=status)
+            self.metrics.job_duration.observe(duration_ms / 1000.0, workflow=workflow, status=status)
+            self.sizer.update_stats(duration_ms, success=(status == "success"), group=batch_group)
 
             # Structured Logging
             log_entry = {
@@ -177,9 +328,5 @@ class Scheduler:
                 "retries": job.get("retries", 0),
                 "batch_size": batch_size
             }
-            
-            try:
-                with open(self.job_log_file, "a", encoding="utf-8") as f:
-                    f.write(json.dumps(log_entry) + "\n")
-            except Exception as e:
-                logger.error(f"Failed to write job log: {e}")
\ No newline at end of file
+            # Buffered; rotated into compressed columnar segments (see history.py)
+            self.history.write(log_entry)
\ No newline at end of file
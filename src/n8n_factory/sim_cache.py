@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from .logger import logger
+
+# Content-addressed checkpoints of simulated step outputs. A step's key hashes
+# its definition, the code it would run and the key of the step simulated
+# before it, so keys chain in simulation order: editing a step changes its key
+# and every key after it, while everything before it is read back instead of
+# re-simulated. Entries are immutable files named by their key.
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = ".n8n-factory-cache/simulate"
+# Step fields that can change what a step outputs (not assertions, latency, notes...)
+KEY_FIELDS = {"id", "template", "params", "mock", "connections_from", "disabled"}
+
+
+def _mock_stamp(mock: Any) -> Optional[List[Any]]:
+    """Identifies the contents of a `file:` mock without reading it."""
+    if isinstance(mock, str) and mock.startswith("file:"):
+        path = mock[5:]
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return [path, None]
+        return [os.path.abspath(path), stat.st_mtime_ns, stat.st_size]
+    return None
+
+
+class SimulationCache:
+    """
+    Step outputs on disk under `root`, addressed by step_key(). Recent entries
+    are also kept in memory, so a long-running watch loop rarely reads them back.
+    """
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, memory_entries: int = 256):
+        self.root = root
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, List[List[Dict[str, Any]]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def step_key(previous: str, step, rendered: Optional[str] = None, runtime: str = "") -> str:
+        """Key of one simulated step, chained to the key of the step simulated before it."""
+        definition = step.model_dump(include=KEY_FIELDS, mode="json")
+        payload = [CACHE_VERSION, previous, definition, rendered, _mock_stamp(step.mock), runtime]
+        encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[List[List[Dict[str, Any]]]]:
+        """The items on each output of a cached step, or None."""
+        outputs = self._memory.get(key)
+        if outputs is not None:
+            self._memory.move_to_end(key)
+        else:
+            try:
+                with open(self.path(key), "r", encoding="utf-8") as f:
+                    outputs = json.load(f)["outputs"]
+            except (OSError, ValueError, KeyError):
+                self.misses += 1
+                return None
+            self._remember(key, outputs)
+        self.hits += 1
+        return outputs
+
+    def put(self, key: str, outputs: List[List[Dict[str, Any]]]):
+        path = self.path(key)
+        self._remember(key, outputs)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name and renamed, so readers never see half an entry
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "outputs": outputs}, f, separators=(",", ":"), default=str)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.debug(f"Could not write simulation cache entry {key}: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _remember(self, key: str, outputs: List[List[Dict[str, Any]]]):
+        self._memory[key] = outputs
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        self._memory.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
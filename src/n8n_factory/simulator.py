@@ -1,194 +1,458 @@
-from typing import Any, Dict, List
-import re
+from typing import Any, Dict, List, Optional, Tuple
+import heapq
 import time
+import tracemalloc
 import json
-import csv
 from .models import Recipe
+from .item_batch import ItemBatch
+from .expressions import compile_value
+from .latency import LatencyEstimator, LatencyModel
+from .assertions import AssertionSuite, StepOutputs
+from .sinks import CsvSink, HistorySink, HtmlReportSink, replay
+from .js_runtime import JsRuntimeError, JsRuntimePool
+from .loader import TemplateLoader
+from .sim_cache import SimulationCache
 from .logger import logger
 
 class WorkflowSimulator:
-    def __init__(self):
+    # Batches larger than this are kept in history as a summary, not a copy
+    HISTORY_ITEMS = 100
+
+    def __init__(self, history_items: int = HISTORY_ITEMS, fail_fast: bool = True,
+                 js_runtime: Optional[JsRuntimePool] = None, templates_dir: Optional[str] = None,
+                 cache: Optional[SimulationCache] = None):
         self.history: List[Dict[str, Any]] = []
+        self.history_items = history_items
+        # step id -> first output item, for $node["X"].json
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.assertion_results: List[Dict[str, Any]] = []
+        self.sinks: List[HistorySink] = []
+        # Stop at the first failing step or step-ready assertion
+        self.fail_fast = fail_fast
+        # Code steps run their jsCode in this pool; without one they pass items through
+        self.js_runtime = js_runtime
+        self.loader = TemplateLoader(templates_dir) if templates_dir else None
+        # Step outputs are checkpointed here and reused while their step keys match
+        self.cache = cache
+        self.cached_steps: List[str] = []
+        # step id -> items_in/items_out/seconds (+ peak_bytes while tracemalloc is tracing)
+        self.step_stats: Dict[str, Dict[str, Any]] = {}
 
     def _resolve_expressions(self, value: Any, context_item: Dict) -> Any:
-        if isinstance(value, str):
-            # Matches {{ $json.key }} with optional spaces
-            pattern = re.compile(r'{{\s*[$]json\.([a-zA-Z0-9_]+)\s*}}')
-            def replace_match(match):
-                field = match.group(1)
-                data = context_item.get("json", {})
-                val = data.get(field, None)
-                return str(val) if val is not None else match.group(0)
-            return pattern.sub(replace_match, value)
-        elif isinstance(value, dict):
-             return {k: self._resolve_expressions(v, context_item) for k, v in value.items()}
-        elif isinstance(value, list):
-             return [self._resolve_expressions(v, context_item) for v in value]
-        return value
-
-    def simulate(self, recipe: Recipe, max_steps: int = 100, interactive: bool = False, step_mode: bool = False) -> List[Dict[str, Any]]:
+        # Compiled once per distinct value (see expressions.py), then applied to the item
+        return compile_value(value)(context_item, self.nodes)
+
+    @staticmethod
+    def build_graph(recipe: Recipe) -> Dict[str, List[Tuple[str, int]]]:
+        """
+        Incoming edges of every step as (source step, source output index), wired
+        the way the assembler wires them: connections_from when given, otherwise
+        output 0 of the previous step. Loop back-edges are not followed.
+        """
+        incoming: Dict[str, List[Tuple[str, int]]] = {}
+        previous = None
+        for step in recipe.steps:
+            edges = []
+            if step.connections_from is not None:
+                for conn in step.connections_from:
+                    if isinstance(conn, str):
+                        edges.append((conn, 0))
+                    else:
+                        edges.append((conn.node, conn.index))
+            elif previous:
+                edges.append((previous, 0))
+            incoming[step.id] = edges
+            previous = step.id
+        return incoming
+
+    @staticmethod
+    def topological_order(recipe: Recipe, incoming: Dict[str, List[Tuple[str, int]]]) -> List[str]:
+        """Kahn's algorithm, ties broken by recipe order. Raises ValueError on cycles."""
+        position = {step.id: i for i, step in enumerate(recipe.steps)}
+        for step_id, edges in incoming.items():
+            for source, _ in edges:
+                if source not in position:
+                    raise ValueError(f"Step '{step_id}' references unknown step '{source}'")
+        pending = {step_id: len(edges) for step_id, edges in incoming.items()}
+        outgoing: Dict[str, List[str]] = {step.id: [] for step in recipe.steps}
+        for step_id, edges in incoming.items():
+            for source, _ in edges:
+                outgoing[source].append(step_id)
+
+        ready_heap = [(position[s], s) for s, count in pending.items() if count == 0]
+        heapq.heapify(ready_heap)
+        order = []
+        while ready_heap:
+            _, step_id = heapq.heappop(ready_heap)
+            order.append(step_id)
+            for target in outgoing[step_id]:
+                pending[target] -= 1
+                if pending[target] == 0:
+                    heapq.heappush(ready_heap, (position[target], target))
+        if len(order) != len(recipe.steps):
+            stuck = sorted(set(pending) - set(order), key=position.get)
+            raise ValueError(f"Cycle detected in connections involving: {', '.join(stuck)}")
+        return order
+
+    @staticmethod
+    def branch_outputs(step) -> List[int]:
+        """Output indexes a branching step can route items to (empty for other steps)."""
+        if step.template == "if":
+            return [0, 1]
+        if step.template == "switch":
+            outputs = {int(rule.get("output", 0)) for rule in step.params.get("rules") or [] if isinstance(rule, dict)}
+            if not step.params.get("rules"):
+                outputs.add(0)
+            outputs.add(int(step.params.get("fallback_output", max(outputs) + 1)))
+            return sorted(outputs)
+        return []
+
+    def simulate(self, recipe: Recipe, max_steps: int = 100, interactive: bool = False, step_mode: bool = False,
+                 sinks: Optional[List[HistorySink]] = None) -> List[Dict[str, Any]]:
+        """
+        Runs the recipe and returns its history. Each step event is also
+        streamed to `sinks` (see sinks.py) as soon as the step finishes.
+        """
+        self.sinks = sinks or []
+        for sink in self.sinks:
+            sink.open(recipe.name)
+        try:
+            return self._simulate(recipe, max_steps, interactive, step_mode)
+        finally:
+            for sink in self.sinks:
+                sink.close()
+
+    def _emit(self, event: Dict[str, Any]):
+        self.history.append(event)
+        for sink in self.sinks:
+            sink.write(event)
+
+    def _simulate(self, recipe: Recipe, max_steps: int, interactive: bool, step_mode: bool) -> List[Dict[str, Any]]:
         self.history = []
+        self.nodes = {}
+        self.assertion_results = []
+        self.cached_steps = []
+        self.step_stats = {}
         logger.info(f"--- Starting Simulation: {recipe.name} ---")
-        
-        current_items = [{"json": {}}] 
-        
-        for i, step in enumerate(recipe.steps):
-            if i >= max_steps:
+
+        # Compiled once up front; invalid assertions are reported, not run
+        suite = AssertionSuite(recipe)
+        for result in suite.results:
+            logger.error(f"  [ERROR] {result['assertion']}: {result['error']}")
+
+        incoming = self.build_graph(recipe)
+        try:
+            order = self.topological_order(recipe, incoming)
+        except ValueError as e:
+            logger.error(f"Cannot simulate: {e}")
+            return self.history
+
+        steps = {step.id: step for step in recipe.steps}
+        # step id -> item batch on each output index
+        outputs: Dict[str, List[ItemBatch]] = {}
+        final_output = ItemBatch.empty()
+        # Input of the last executed step, for the end-of-run assertions
+        last_input = ItemBatch.empty()
+        executed = 0
+        stopped = False
+        step_key = ""
+
+        for step_id in order:
+            step = steps[step_id]
+            edges = incoming[step_id]
+            if edges:
+                fed = [outputs[src][idx] for src, idx in edges if src in outputs and idx < len(outputs[src])]
+                # Only nodes that receive items run, as in n8n
+                if not any(len(batch) for batch in fed):
+                    logger.debug(f"Skipping unreachable step {step_id}")
+                    continue
+                current = ItemBatch.concat(fed)
+            else:
+                current = ItemBatch.from_items([{"json": {}}])
+
+            if executed >= max_steps:
                  logger.warning("Simulation limit reached. Stopping.")
                  break
+            executed += 1
+            last_input = current
 
             if step_mode:
-                input(f"Step {i+1}: {step.id}. Press Enter to execute...")
+                input(f"Step {executed}: {step.id}. Press Enter to execute...")
 
             if step.breakpoint and interactive:
                 print(f"\n[BREAKPOINT] Step: {step.id}")
-                print(f"Current Input: {json.dumps(current_items, indent=2)}")
+                print(f"Current Input: {json.dumps(current.to_items(), indent=2)}")
                 input("Press Enter to continue...")
 
-            logger.info(f"[Step {i+1}: {step.id} ({step.template})]")
-            
-            if step.mock_latency:
+            logger.info(f"[Step {executed}: {step.id} ({step.template})]")
+
+            if isinstance(step.mock_latency, dict):
+                logger.info(f"  > Simulating latency: {step.mock_latency.get('dist', 'constant')} distribution")
+            elif step.mock_latency:
                 logger.info(f"  > Simulating latency: {step.mock_latency}ms")
 
             if step.mock_error:
                 logger.error(f"  > Simulated Error: {step.mock_error}")
-                self.history.append({
+                self._emit({
                     "step_id": step.id,
                     "template": step.template,
-                    "input": current_items,
+                    "input": self._record(current),
                     "error": step.mock_error
                 })
+                final_output = ItemBatch.empty()
                 break
 
             step_result = {
                 "step_id": step.id,
                 "template": step.template,
-                "input": current_items
+                "input": self._record(current)
             }
-            
-            if step.mock:
-                logger.info("  > Using Mock Data.")
-                mock_data = step.mock
-                if isinstance(mock_data, str) and mock_data.startswith("file:"):
-                    import os
-                    path = mock_data[5:]
-                    if os.path.exists(path):
-                        with open(path, 'r') as f:
-                            mock_data = json.load(f)
-                    else:
-                        logger.warning(f"Mock data file not found: {path}")
 
-                if isinstance(mock_data, list):
-                    current_items = mock_data
-                elif isinstance(mock_data, dict):
-                    if "json" in mock_data:
-                        current_items = [mock_data]
-                    else:
-                        current_items = [{"json": mock_data}]
-                else:
-                    current_items = [{"json": {"value": mock_data}}]
+            js_code = self._js_code(step) if self.js_runtime and not step.mock else None
+            cached = None
+            if self.cache:
+                step_key = self.cache.step_key(step_key, step, js_code, "js" if self.js_runtime else "")
+                cached = None if step.mock else self.cache.get(step_key)
+
+            started = time.perf_counter()
+            if tracemalloc.is_tracing():
+                base_memory = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+
+            if cached is not None:
+                logger.info("  > Restored from cache.")
+                step_outputs = [ItemBatch.from_items(items) for items in cached]
+                step_result["cached"] = True
+                self.cached_steps.append(step.id)
+            elif step.mock:
+                logger.info("  > Using Mock Data.")
+                step_outputs = [ItemBatch.from_items(self._load_mock(step.mock))]
+            elif js_code:
+                try:
+                    step_outputs = self._run_code(step, js_code, current)
+                except JsRuntimeError as e:
+                    logger.error(f"  > Code Error: {e}")
+                    step_result["error"] = str(e)
+                    self._emit(step_result)
+                    final_output = ItemBatch.empty()
+                    break
+            elif step.template == "if":
+                step_outputs = self._run_if(step, current)
+            elif step.template == "switch":
+                step_outputs = self._run_switch(step, current)
+            elif step.template == "filter":
+                step_outputs = self._run_filter(step, current)
+            elif step.template == "set" and step.params.get("name"):
+                step_outputs = self._run_set(step, current)
             else:
-                if step.template == "if":
-                    logger.info("  > Evaluating IF condition...")
-                    left_raw = step.params.get("left")
-                    right_raw = step.params.get("right")
-                    op = step.params.get("operator", "equal")
-                    
-                    ctx = current_items[0] if current_items else {"json": {}}
-                    left = self._resolve_expressions(left_raw, ctx)
-                    right = self._resolve_expressions(right_raw, ctx)
-                    
-                    is_true = False
-                    if op == "equal":
-                        is_true = (str(left) == str(right))
-                    elif op == "notEqual":
-                        is_true = (str(left) != str(right))
-                    
-                    logger.info(f"    Condition: '{left}' {op} '{right}' -> {is_true}")
-                
+                if step.template == "merge" and len(edges) > 1:
+                    logger.info(f"  > Merging {len(current)} items from {len(edges)} inputs.")
                 logger.info("  > Passing previous output.")
-            
-            step_result["output"] = current_items
-            self.history.append(step_result)
-            
-            preview = str(current_items)
-            if len(preview) > 100:
-                preview = preview[:100] + "..."
-            logger.info(f"  Output: {preview}")
-            
+                step_outputs = [current]
+
+            stats = {"items_in": len(current), "seconds": time.perf_counter() - started}
+            if tracemalloc.is_tracing():
+                stats["peak_bytes"] = max(0, tracemalloc.get_traced_memory()[1] - base_memory)
+            self.step_stats[step.id] = stats
+
+            if self.cache and cached is None and not step.mock:
+                self.cache.put(step_key, [batch.to_items() for batch in step_outputs])
+            outputs[step.id] = step_outputs
+            final_output = ItemBatch.concat(step_outputs) if len(step_outputs) > 1 else step_outputs[0]
+            stats["items_out"] = len(final_output)
+            if len(final_output):
+                self.nodes[step.id] = final_output.item(0)
+            step_result["output"] = self._record(final_output)
+            if len(step_outputs) > 1:
+                step_result["branches"] = [len(batch) for batch in step_outputs]
+            self._emit(step_result)
+
+            logger.info(f"  Output: {self._preview(final_output)}")
+
+            due = suite.for_step(step.id) + suite.ready(set(outputs))
+            if due:
+                context = {
+                    "history": self.history,
+                    "input": current.to_items(),
+                    "output": final_output.to_items(),
+                    "json": final_output.item(0)["json"] if len(final_output) else {},
+                    "steps": self._step_outputs(outputs),
+                }
+                if not suite.run(due, context, logger, f" (after {step.id})") and self.fail_fast:
+                    logger.error("  Assertion failed; stopping simulation early.")
+                    stopped = True
+                    break
+
         logger.info("\n--- Simulation Complete ---")
-        
-        if recipe.assertions:
-            self._evaluate_assertions(recipe.assertions, self.history)
-            
+        if self.cached_steps:
+            logger.info(f"Reused {len(self.cached_steps)} cached step(s) of {executed}.")
+
+        remaining = [] if stopped else suite.take_final()
+        if remaining:
+            logger.info("Running Assertions...")
+            final_items = final_output.to_items()
+            suite.run(remaining, {
+                "history": self.history,
+                "input": last_input.to_items(),
+                "output": final_items,
+                "json": final_items[0].get("json") if final_items else {},
+                "steps": self._step_outputs(outputs),
+            }, logger)
+        suite.skip_remaining()
+        self.assertion_results = suite.results
+
         return self.history
 
-    def _evaluate_assertions(self, assertions: List[str], history: List[Dict]):
-        logger.info("Running Assertions...")
-        final_output = history[-1]['output'] if history and 'output' in history[-1] else []
-        context = {
-            "history": history,
-            "output": final_output,
-            "json": final_output[0].get("json") if final_output else {}
-        }
-        for expr in assertions:
-            try:
-                result = eval(expr, {"__builtins__": None}, context)
-                if result:
-                    logger.info(f"  [PASS] {expr}")
-                else:
-                    logger.error(f"  [FAIL] {expr}")
-            except Exception as e:
-                logger.error(f"  [ERROR] {expr}: {e}")
+    @staticmethod
+    def _step_outputs(outputs: Dict[str, List[ItemBatch]]) -> StepOutputs:
+        return StepOutputs({sid: (lambda batches=batches: ItemBatch.concat(batches).to_items())
+                            for sid, batches in outputs.items()})
 
-    def generate_html_report(self, history: List[Dict], output_path: str):
-        html = """
-        <html>
-        <head>
-            <title>Simulation Report</title>
-            <style>
-                body { font-family: sans-serif; padding: 20px; }
-                .step { border: 1px solid #ccc; margin-bottom: 20px; padding: 10px; border-radius: 5px; }
-                .step.error { border-color: red; background-color: #fff0f0; }
-                .step h3 { margin-top: 0; background: #f0f0f0; padding: 5px; }
-                pre { background: #333; color: #fff; padding: 10px; overflow-x: auto; }
-            </style>
-        </head>
-        <body>
-            <h1>Simulation Report</h1>
+    def estimate_latency(self, recipe: Recipe, runs: int = 1000, seed: int = 0, concurrency: int = 1,
+                         history_path: Optional[str] = None,
+                         models: Optional[Dict[str, LatencyModel]] = None) -> Dict[str, Any]:
         """
-        for item in history:
-            is_error = "error" in item
-            cls = "step error" if is_error else "step"
-            html += f"""
-            <div class="{cls}">
-                <h3>{item['step_id']} <small>({item['template']})</small></h3>
-                <p><strong>Input:</strong></p>
-                <pre>{json.dumps(item.get('input'), indent=2)}</pre>
-            """
-            if is_error:
-                 html += f"<p><strong>Error:</strong> {item['error']}</p>"
+        Virtual-time latency of the steps the last simulate() executed: samples
+        each step's mock_latency distribution `runs` times (seeded, no sleeping)
+        and reports percentiles, the critical path and the bottleneck step.
+        Pass models from LatencyEstimator.models_for() to check the specs
+        before simulating.
+        """
+        executed = [h["step_id"] for h in self.history]
+        estimator = LatencyEstimator.for_recipe(recipe, executed, self.build_graph(recipe), history_path, models)
+        return estimator.estimate(runs=runs, seed=seed, concurrency=concurrency)
+
+    def _record(self, batch: ItemBatch) -> Any:
+        """History copy of a batch: the items themselves, or a summary for large batches."""
+        if len(batch) <= self.history_items:
+            return batch.to_items()
+        return batch.summary()
+
+    @staticmethod
+    def _preview(batch: ItemBatch, width: int = 100) -> str:
+        # Only renders the first few items, however large the batch is
+        preview = str(batch.to_items(10))
+        if len(batch) > 10:
+            preview = preview[:-1] + ", ...]"
+        if len(preview) > width:
+            preview = preview[:width] + "..."
+        return preview
+
+    def _load_mock(self, mock_data: Any) -> List[Dict[str, Any]]:
+        if isinstance(mock_data, str) and mock_data.startswith("file:"):
+            import os
+            path = mock_data[5:]
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    mock_data = json.load(f)
             else:
-                 html += f"<p><strong>Output:</strong></p><pre>{json.dumps(item.get('output'), indent=2)}</pre>"
-            html += "</div>"
-        html += "</body></html>"
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(html)
+                logger.warning(f"Mock data file not found: {path}")
+
+        if isinstance(mock_data, list):
+            return mock_data
+        if isinstance(mock_data, dict):
+            if "json" in mock_data:
+                return [mock_data]
+            return [{"json": mock_data}]
+        return [{"json": {"value": mock_data}}]
+
+    @staticmethod
+    def _compare(left: Any, right: Any, op: str) -> bool:
+        if op == "equal":
+            return str(left) == str(right)
+        if op == "notEqual":
+            return str(left) != str(right)
+        if op == "contains":
+            return str(right) in str(left)
+        if op in ("larger", "smaller", "largerEqual", "smallerEqual"):
+            try:
+                lhs, rhs = float(left), float(right)
+            except (TypeError, ValueError):
+                return False
+            return {"larger": lhs > rhs, "smaller": lhs < rhs, "largerEqual": lhs >= rhs, "smallerEqual": lhs <= rhs}[op]
+        return False
+
+    def _run_if(self, step, batch: ItemBatch) -> List[ItemBatch]:
+        """Routes each item to output 0 (true) or 1 (false)."""
+        logger.info("  > Evaluating IF condition...")
+        left_raw = step.params.get("left")
+        right_raw = step.params.get("right")
+        op = step.params.get("operator", "equal")
+
+        if len(batch):
+            first = batch.item(0)
+            left = self._resolve_expressions(left_raw, first)
+            right = self._resolve_expressions(right_raw, first)
+            logger.info(f"    Condition: '{left}' {op} '{right}' -> {self._compare(left, right, op)}")
+
+        mask = batch.compare(left_raw, right_raw, op, self._compare, self.nodes)
+        true_idx = [i for i, hit in enumerate(mask) if hit]
+        false_idx = [i for i, hit in enumerate(mask) if not hit]
+        if len(batch) > 1:
+            logger.info(f"    Routed {len(true_idx)} item(s) to true, {len(false_idx)} to false.")
+        return [batch.take(true_idx), batch.take(false_idx)]
+
+    def _js_code(self, step) -> Optional[str]:
+        """The step's jsCode: params.code for `code` steps, else from the rendered template."""
+        if step.template == "code":
+            return step.params.get("code") or step.params.get("jsCode")
+        if not self.loader:
+            return None
+        try:
+            rendered = self.loader.render_template(step.template, step.params)
+        except Exception as e:
+            logger.debug(f"Not running {step.id} as code: {e}")
+            return None
+        return rendered.get("parameters", {}).get("jsCode")
+
+    def _run_code(self, step, code: str, batch: ItemBatch) -> List[ItemBatch]:
+        """Runs jsCode in the JS runtime pool (all items at once, or per item with mode runOnceForEachItem)."""
+        per_item = step.params.get("mode") == "runOnceForEachItem"
+        logger.info(f"  > Running JS code on {len(batch)} item(s){' (per item)' if per_item else ''}.")
+        return [ItemBatch.from_items(self.js_runtime.run(code, batch.to_items(), per_item=per_item))]
+
+    def _run_filter(self, step, batch: ItemBatch) -> List[ItemBatch]:
+        """Keeps the items whose {{ $json.value }} passes `operator value`."""
+        logger.info("  > Evaluating FILTER condition...")
+        mask = batch.compare("{{ $json.value }}", step.params.get("value"), step.params.get("operator", "equal"),
+                             self._compare, self.nodes)
+        kept = [i for i, hit in enumerate(mask) if hit]
+        logger.info(f"    Kept {len(kept)} of {len(batch)} item(s).")
+        return [batch.take(kept)]
+
+    def _run_set(self, step, batch: ItemBatch) -> List[ItemBatch]:
+        """Sets json[name] to the resolved value on every item."""
+        name = step.params["name"]
+        logger.info(f"  > Setting '{name}' on {len(batch)} item(s).")
+        return [batch.with_column(name, batch.resolve(step.params.get("value"), self.nodes))]
+
+    def _run_switch(self, step, batch: ItemBatch) -> List[ItemBatch]:
+        """
+        Routes each item to the output of the first rule whose value matches
+        params.value (default {{ $json.value }}), else to the fallback output.
+        Rules are params.rules [{"value": ..., "output": n}] or a single match_value.
+        """
+        logger.info("  > Evaluating SWITCH rules...")
+        value_raw = step.params.get("value", "{{ $json.value }}")
+        rules = step.params.get("rules") or [{"value": step.params.get("match_value"), "output": 0}]
+        branches = self.branch_outputs(step)
+        fallback = int(step.params.get("fallback_output", branches[-1]))
+        routed: List[List[int]] = [[] for _ in range(max(branches) + 1)]
+        values = batch.resolve(value_raw, self.nodes)
+        rule_values = [(int(rule.get("output", 0)), batch.resolve(rule.get("value"), self.nodes))
+                       for rule in rules if isinstance(rule, dict)]
+        for i, value in enumerate(values):
+            target = fallback
+            for output, candidates in rule_values:
+                if str(value) == str(candidates[i]):
+                    target = output
+                    break
+            routed[target].append(i)
+        logger.info(f"    Routed: {', '.join(f'output {i}: {len(r)}' for i, r in enumerate(routed))}")
+        return [batch.take(indices) for indices in routed]
+
+    def generate_html_report(self, history: List[Dict], output_path: str):
+        replay(history, HtmlReportSink(output_path))
 
     def export_csv(self, history: List[Dict], output_path: str):
-        rows = []
-        for item in history:
-            row = {
-                "step_id": item["step_id"],
-                "template": item["template"],
-                "input": json.dumps(item.get("input")),
-                "output": json.dumps(item.get("output")),
-                "error": item.get("error", "")
-            }
-            rows.append(row)
-            
-        if rows:
-            with open(output_path, "w", newline='', encoding="utf-8") as f:
-                writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-                writer.writeheader()
-                writer.writerows(rows)
\ No newline at end of file
+        replay(history, CsvSink(output_path))
@@ -0,0 +1,177 @@
+import abc
+import csv
+import html
+import json
+import os
+from typing import Any, Dict, IO, List, Optional
+
+# Sinks the simulator streams step events into as each step finishes. Every
+# event is written and dropped, so the size of an export never has to fit in
+# memory; payloads are already bounded by WorkflowSimulator.history_items.
+
+
+class HistorySink(abc.ABC):
+    """Receives simulation events: open() once, write() per step, close() at the end."""
+
+    def open(self, recipe_name: str):
+        pass
+
+    @abc.abstractmethod
+    def write(self, event: Dict[str, Any]):
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonlSink(HistorySink):
+    """One compact JSON object per line and step."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file: Optional[IO[str]] = None
+
+    def open(self, recipe_name: str):
+        self._file = open(self.path, "w", encoding="utf-8")
+
+    def write(self, event: Dict[str, Any]):
+        self._file.write(json.dumps(event, separators=(",", ":"), default=str) + "\n")
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class CsvSink(HistorySink):
+    """step_id, template, input, output, error rows, written as they arrive."""
+
+    FIELDS = ["step_id", "template", "input", "output", "error"]
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file: Optional[IO[str]] = None
+        self._writer = None
+
+    def open(self, recipe_name: str):
+        self._file = open(self.path, "w", newline='', encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=self.FIELDS)
+        self._writer.writeheader()
+
+    def write(self, event: Dict[str, Any]):
+        self._writer.writerow({
+            "step_id": event.get("step_id"),
+            "template": event.get("template"),
+            "input": json.dumps(event.get("input"), default=str),
+            "output": json.dumps(event.get("output"), default=str),
+            "error": event.get("error", "")
+        })
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class HtmlReportSink(HistorySink):
+    """
+    HTML report written step by step. Payloads show at most `max_items` items
+    and `max_chars` characters; every `steps_per_page` steps start a new page
+    (report.html, report.2.html, ...) linked to its neighbours.
+    """
+
+    STYLE = """
+                body { font-family: sans-serif; padding: 20px; }
+                .step { border: 1px solid #ccc; margin-bottom: 20px; padding: 10px; border-radius: 5px; }
+                .step.error { border-color: red; background-color: #fff0f0; }
+                .step h3 { margin-top: 0; background: #f0f0f0; padding: 5px; }
+                pre { background: #333; color: #fff; padding: 10px; overflow-x: auto; }
+                .more { color: #888; font-style: italic; }
+                nav { margin: 10px 0; }
+    """
+
+    def __init__(self, path: str, steps_per_page: int = 200, max_items: int = 20, max_chars: int = 20000):
+        self.path = path
+        self.steps_per_page = steps_per_page
+        self.max_items = max_items
+        self.max_chars = max_chars
+        self.title = "Simulation Report"
+        self._file: Optional[IO[str]] = None
+        self._page = 0
+        self._on_page = 0
+
+    def page_path(self, page: int) -> str:
+        if page <= 1:
+            return self.path
+        root, ext = os.path.splitext(self.path)
+        return f"{root}.{page}{ext or '.html'}"
+
+    def open(self, recipe_name: str):
+        self.title = f"Simulation Report: {recipe_name}" if recipe_name else "Simulation Report"
+        self._start_page(1)
+
+    def _start_page(self, page: int):
+        self._page = page
+        self._on_page = 0
+        self._file = open(self.page_path(page), "w", encoding="utf-8")
+        self._file.write(f"<html>\n<head>\n<title>{html.escape(self.title)}</title>\n<style>{self.STYLE}</style>\n</head>\n<body>\n")
+        self._file.write(f"<h1>{html.escape(self.title)}</h1>\n")
+        if page > 1:
+            self._file.write(f'<nav><a href="{html.escape(os.path.basename(self.page_path(page - 1)))}">&larr; Previous</a> Page {page}</nav>\n')
+
+    def _end_page(self, has_next: bool):
+        if has_next:
+            self._file.write(f'<nav><a href="{html.escape(os.path.basename(self.page_path(self._page + 1)))}">Next &rarr;</a></nav>\n')
+        self._file.write("</body></html>\n")
+        self._file.close()
+        self._file = None
+
+    def render_payload(self, payload: Any) -> str:
+        more = ""
+        if isinstance(payload, list) and len(payload) > self.max_items:
+            more = f"... {len(payload) - self.max_items} more item(s)"
+            payload = payload[:self.max_items]
+        elif isinstance(payload, dict) and "count" in payload and "sample" in payload:
+            more = f"... {payload['count'] - len(payload['sample'])} more item(s) not kept in history"
+        text = json.dumps(payload, indent=2, default=str)
+        if len(text) > self.max_chars:
+            more = f"... truncated {len(text) - self.max_chars} character(s)" + (f"; {more}" if more else "")
+            text = text[:self.max_chars]
+        out = f"<pre>{html.escape(text, quote=False)}</pre>"
+        if more:
+            out += f'<p class="more">{html.escape(more)}</p>'
+        return out
+
+    def write(self, event: Dict[str, Any]):
+        if self._file is None:
+            self.open("")
+        if self._on_page >= self.steps_per_page:
+            self._end_page(has_next=True)
+            self._start_page(self._page + 1)
+        self._on_page += 1
+
+        is_error = "error" in event
+        parts = [f'<div class="{"step error" if is_error else "step"}">',
+                 f"<h3>{html.escape(str(event.get('step_id')))} <small>({html.escape(str(event.get('template')))})</small></h3>",
+                 "<p><strong>Input:</strong></p>", self.render_payload(event.get("input"))]
+        if is_error:
+            parts.append(f"<p><strong>Error:</strong> {html.escape(str(event['error']))}</p>")
+        else:
+            parts.append("<p><strong>Output:</strong></p>")
+            parts.append(self.render_payload(event.get("output")))
+        parts.append("</div>\n")
+        self._file.write("\n".join(parts))
+
+    def close(self):
+        if self._file:
+            self._end_page(has_next=False)
+
+
+def replay(history: List[Dict[str, Any]], sink: HistorySink, recipe_name: str = ""):
+    """Writes an already collected history through a sink."""
+    sink.open(recipe_name)
+    try:
+        for event in history:
+            sink.write(event)
+    finally:
+        sink.close()
@@ -0,0 +1,178 @@
+import math
+import random
+import string
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Synthetic item streams for load-testing simulations. A JSON schema is
+# compiled once into nested generator closures (like expressions.py does for
+# expressions), so producing an item is a handful of calls into one seeded
+# random.Random; no schema walking happens per item.
+
+Generator = Callable[[random.Random], Any]
+
+LETTERS = string.ascii_letters + string.digits
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _string(schema: Dict[str, Any]) -> Generator:
+    fmt = schema.get("format")
+    if fmt == "email":
+        return lambda rng: "".join(rng.choices(string.ascii_lowercase, k=8)) + "@example.com"
+    if fmt == "uuid":
+        return lambda rng: str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    if fmt == "date-time":
+        return lambda rng: (EPOCH + timedelta(seconds=rng.randrange(365 * 86400))).isoformat()
+    if fmt == "date":
+        return lambda rng: (EPOCH + timedelta(days=rng.randrange(365))).date().isoformat()
+    if fmt in ("uri", "url"):
+        return lambda rng: "https://example.com/" + "".join(rng.choices(string.ascii_lowercase, k=8))
+    low = int(schema.get("minLength", 1))
+    high = max(low, int(schema.get("maxLength", max(low, 12))))
+    return lambda rng: "".join(rng.choices(LETTERS, k=rng.randint(low, high)))
+
+
+def _bound(schema: Dict[str, Any], inclusive: str, exclusive: str):
+    """A bound and whether it is exclusive: `exclusive*` is a number (draft 6+) or a flag on the inclusive key (draft 4)."""
+    value, flag = schema.get(inclusive), schema.get(exclusive)
+    if isinstance(flag, bool):
+        return value, flag and value is not None
+    if flag is not None and (value is None or (flag >= value if exclusive == "exclusiveMinimum" else flag <= value)):
+        return flag, True
+    return value, False
+
+
+def _number(schema: Dict[str, Any], integer: bool) -> Generator:
+    low, low_open = _bound(schema, "minimum", "exclusiveMinimum")
+    high, high_open = _bound(schema, "maximum", "exclusiveMaximum")
+    if low is None:
+        low = 0 if high is None or high > 0 else high - 1000
+    if high is None:
+        high = low + 1000
+    if integer:
+        low = math.floor(low) + 1 if low_open else math.ceil(low)
+        high = math.ceil(high) - 1 if high_open else math.floor(high)
+        if low > high:
+            raise ValueError(f"No integer satisfies the bounds of {schema}")
+        return lambda rng: rng.randint(low, high)
+    # Values are rounded to 4 decimals, so keep a rounding step away from open bounds
+    low += 1e-4 if low_open else 0
+    high -= 1e-4 if high_open else 0
+    if low > high:
+        raise ValueError(f"No number satisfies the bounds of {schema}")
+    return lambda rng: round(rng.uniform(low, high), 4)
+
+
+def _object(schema: Dict[str, Any]) -> Generator:
+    properties = schema.get("properties", {})
+    required = set(schema.get("required", properties))
+    # Optional properties appear in about half the items
+    fields = [(name, compile_schema(sub), name in required) for name, sub in properties.items()]
+
+    def generate(rng: random.Random) -> Dict[str, Any]:
+        return {name: gen(rng) for name, gen, always in fields if always or rng.random() < 0.5}
+    return generate
+
+
+def _array(schema: Dict[str, Any]) -> Generator:
+    item = compile_schema(schema.get("items", {}))
+    low = int(schema.get("minItems", 0))
+    high = max(low, int(schema.get("maxItems", low + 5)))
+    return lambda rng: [item(rng) for _ in range(rng.randint(low, high))]
+
+
+def compile_schema(schema: Any) -> Generator:
+    """Compiles a JSON schema (a practical subset) into a value generator."""
+    if not isinstance(schema, dict):
+        return lambda rng: None
+    if "const" in schema:
+        value = schema["const"]
+        return lambda rng: value
+    if "enum" in schema:
+        values = list(schema["enum"])
+        return lambda rng: rng.choice(values)
+    if "examples" in schema and schema["examples"]:
+        values = list(schema["examples"])
+        return lambda rng: rng.choice(values)
+    for key in ("oneOf", "anyOf"):
+        if key in schema:
+            options = [compile_schema(s) for s in schema[key]]
+            return lambda rng: rng.choice(options)(rng)
+
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        options = [compile_schema(dict(schema, type=k)) for k in kind]
+        return lambda rng: rng.choice(options)(rng)
+    if kind is None:
+        kind = "object" if "properties" in schema else "array" if "items" in schema else "string"
+    if kind == "object":
+        return _object(schema)
+    if kind == "array":
+        return _array(schema)
+    if kind == "string":
+        return _string(schema)
+    if kind in ("integer", "number"):
+        return _number(schema, kind == "integer")
+    if kind == "boolean":
+        return lambda rng: rng.random() < 0.5
+    return lambda rng: None
+
+
+def sample_generator(samples: List[Any]) -> Generator:
+    """
+    Resamples real payloads field by field: each top-level field takes the
+    value of that field in a random sample, so values keep their real
+    distribution while combinations are new.
+    """
+    payloads = [s.get("json", s) if isinstance(s, dict) else s for s in samples]
+    if not payloads:
+        raise ValueError("Need at least one sample payload")
+    if not all(isinstance(p, dict) for p in payloads):
+        return lambda rng: rng.choice(payloads)
+    fields: Dict[str, List[Any]] = {}
+    for payload in payloads:
+        for key, value in payload.items():
+            fields.setdefault(key, []).append(value)
+    total = len(payloads)
+    # Each field appears as often as it did in the samples
+    columns = [(key, values, len(values) / total) for key, values in fields.items()]
+
+    def generate(rng: random.Random) -> Dict[str, Any]:
+        return {key: rng.choice(values) for key, values, share in columns if share >= 1 or rng.random() < share}
+    return generate
+
+
+class ItemStream:
+    """`count` synthetic items as {"json": ...}, yielded in chunks of `chunk_size`."""
+
+    def __init__(self, generator: Generator, count: int, chunk_size: int = 1000, seed: int = 0):
+        self.generator = generator
+        self.count = count
+        self.chunk_size = max(1, chunk_size)
+        self.seed = seed
+
+    @classmethod
+    def from_schema(cls, schema: Dict[str, Any], count: int, chunk_size: int = 1000, seed: int = 0) -> "ItemStream":
+        return cls(compile_schema(schema), count, chunk_size, seed)
+
+    @classmethod
+    def from_samples(cls, samples: List[Any], count: int, chunk_size: int = 1000, seed: int = 0) -> "ItemStream":
+        return cls(sample_generator(samples), count, chunk_size, seed)
+
+    def __iter__(self) -> Iterator[List[Dict[str, Any]]]:
+        rng = random.Random(self.seed)
+        generate = self.generator
+        for start in range(0, self.count, self.chunk_size):
+            size = min(self.chunk_size, self.count - start)
+            yield [{"json": generate(rng)} for _ in range(size)]
+
+
+def item_stream(count: int, schema: Optional[Dict[str, Any]] = None, samples: Optional[List[Any]] = None,
+                chunk_size: int = 1000, seed: int = 0) -> ItemStream:
+    """A stream from a JSON schema, or from sampled payloads when no schema is given."""
+    if schema is not None:
+        return ItemStream.from_schema(schema, count, chunk_size, seed)
+    if samples is not None:
+        return ItemStream.from_samples(samples, count, chunk_size, seed)
+    raise ValueError("A schema or sample payloads are required")
@@ -0,0 +1,90 @@
+import unittest
+from n8n_factory.assertions import AssertionSyntaxError, compile_assertion
+from n8n_factory.models import Recipe, RecipeStep
+from n8n_factory.simulator import WorkflowSimulator
+
+
+class TestCompileAssertion(unittest.TestCase):
+    def test_helpers_and_comprehensions(self):
+        assertion = compile_assertion("len(output) == 3 and all(i['json']['v'] > 0 for i in output)")
+        output = [{"json": {"v": n}} for n in (1, 2, 3)]
+        self.assertTrue(assertion.evaluate({"output": output}))
+        self.assertTrue(compile_assertion("json.get('x', 0) + 1 == 1").evaluate({"json": {}}))
+
+    def test_rejects_unsafe_expressions(self):
+        for source in [
+            "__import__('os')",
+            "().__class__.__bases__",
+            "open('/etc/passwd')",
+            "output.append(1)",
+            "(lambda: 1)()",
+            "x := 1",
+            "[i for i in output] if output else exec('1')",
+            "len(output",
+        ]:
+            with self.assertRaises(AssertionSyntaxError, msg=source):
+                compile_assertion(source)
+
+    def test_step_dependencies(self):
+        self.assertEqual(compile_assertion("len(steps['a']) == len(steps['b'])").steps, {"a", "b"})
+        self.assertFalse(compile_assertion("len(steps['a']) == 1").final)
+        self.assertTrue(compile_assertion("len(steps['a']) == len(output)").final)
+        self.assertTrue(compile_assertion("len(steps) == 2").final)
+
+    def test_compiled_once(self):
+        self.assertIs(compile_assertion("len(output) == 1"), compile_assertion("len(output) == 1"))
+
+
+class TestSimulatorAssertions(unittest.TestCase):
+    def recipe(self, **kwargs):
+        return Recipe(name="Asserts", steps=[
+            RecipeStep(id="src", template="webhook", mock=[{"json": {"v": 1}}, {"json": {"v": 5}}],
+                       assertions=["len(output) == 2"]),
+            RecipeStep(id="check", template="if", params={"left": "{{ $json.v }}", "right": "3", "operator": "larger"}),
+            RecipeStep(id="big", template="set", connections_from=[{"node": "check", "index": 0}],
+                       assertions=["all(i['json']['v'] > 3 for i in input)"]),
+            RecipeStep(id="small", template="set", connections_from=[{"node": "check", "index": 1}]),
+        ], **kwargs)
+
+    def test_step_and_recipe_assertions(self):
+        recipe = self.recipe(assertions=["len(steps['big']) == 1", "len(output) == 1"])
+        sim = WorkflowSimulator()
+        with self.assertLogs("n8n_factory", level="INFO") as logs:
+            sim.simulate(recipe)
+        text = "\n".join(logs.output)
+        self.assertIn("[PASS] len(output) == 2 (after src)", text)
+        self.assertIn("[PASS] len(steps['big']) == 1 (after big)", text)
+        self.assertEqual([r["status"] for r in sim.assertion_results], ["pass", "pass", "pass", "pass"])
+
+    def test_failure_stops_early(self):
+        recipe = self.recipe(assertions=["len(steps['src']) == 5", "len(output) == 1"])
+        sim = WorkflowSimulator()
+        history = sim.simulate(recipe)
+        self.assertEqual([h["step_id"] for h in history], ["src"])
+        statuses = {r["assertion"]: r["status"] for r in sim.assertion_results}
+        self.assertEqual(statuses["len(steps['src']) == 5"], "fail")
+        self.assertEqual(statuses["len(output) == 1"], "skipped")
+
+        history = WorkflowSimulator(fail_fast=False).simulate(recipe)
+        self.assertEqual(len(history), 4)
+
+    def test_final_input_is_the_full_batch(self):
+        recipe = Recipe(name="Large", steps=[
+            RecipeStep(id="src", template="webhook", mock=[{"json": {"v": i}} for i in range(150)]),
+            RecipeStep(id="tag", template="set", params={"name": "t", "value": "x"}),
+        ], assertions=["len(input) == 150 and input[-1]['json']['v'] == 149"])
+        sim = WorkflowSimulator(history_items=100)
+        history = sim.simulate(recipe)
+        self.assertEqual(history[-1]["input"]["count"], 150) # history keeps a summary
+        self.assertEqual(sim.assertion_results[-1]["status"], "pass")
+
+    def test_invalid_assertion_is_reported(self):
+        sim = WorkflowSimulator()
+        with self.assertLogs("n8n_factory", level="ERROR") as logs:
+            sim.simulate(self.recipe(assertions=["__import__('os').system('true')"]))
+        self.assertIn("[ERROR] __import__('os').system('true')", "\n".join(logs.output))
+        self.assertEqual(sim.assertion_results[0]["status"], "error")
+
+
+if __name__ == '__main__':
+    unittest.main()
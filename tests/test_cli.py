@@ -44,6 +44,25 @@ def test_cli_simulate(temp_templates_dir, tmp_path, caplog):
     
     assert "--- Starting Simulation: Sim Test ---" in caplog.text
 
+def test_cli_simulate_latency_checks_specs_first(temp_templates_dir, tmp_path, capsys, caplog):
+    caplog.set_level(logging.INFO)
+    recipe_path = tmp_path / "recipe.yaml"
+    recipe_data = {
+        "name": "Bad Latency",
+        "steps": [{"id": "s1", "template": "webhook", "params": {"path": "p", "method": "m"},
+                   "mock_latency": {"dist": "normal"}}]
+    }
+    with open(recipe_path, "w") as f:
+        yaml.dump(recipe_data, f)
+
+    with patch.object(sys, 'argv', ["n8n-factory", "simulate", str(recipe_path), "--latency"]):
+        with pytest.raises(SystemExit) as exc:
+            main()
+
+    assert exc.value.code == 1
+    assert "Step 's1' mock_latency" in capsys.readouterr().out
+    assert "Starting Simulation" not in caplog.text
+
 def test_cli_optimize(temp_templates_dir, tmp_path, capsys):
     recipe_path = tmp_path / "recipe.yaml"
     recipe_data = {
@@ -61,5 +61,11 @@ def test_operator_exec_file_cp(mock_run):
     assert args0[1] == "cp"
     
     args1 = mock_run.call_args_list[1][0][0]
-    assert args1[6] == "execute"
-    assert "--file" in args1
\ No newline at end of file
+    # Unique temp path per job, removed after execution
+    target = args0[3].split(":", 1)[1]
+    assert target.startswith("/tmp/n8n_factory_")
+    assert f"n8n execute --file {target}" in args1[-1]
+    assert f"rm -f {target}" in args1[-1]
+
+    op.execute_workflow(file_path="w.json")
+    assert mock_run.call_args_list[2][0][0][3] != args0[3]
\ No newline at end of file
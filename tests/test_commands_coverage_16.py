@@ -22,14 +22,14 @@ def test_cli_simulate_csv(tmp_path):
         from n8n_factory.models import Recipe, RecipeStep
         mock_load.return_value = Recipe(name="R", steps=[RecipeStep(id="s1", template="no_op")])
         
-        # We need WorkflowSimulator to actually write CSV or we mock it?
-        # cli.py calls simulator.export_csv
+        # cli.py streams the CSV through a CsvSink passed to simulate
         # Let's mock WorkflowSimulator
         with patch("n8n_factory.cli.WorkflowSimulator") as MockSim:
             MockSim.return_value.simulate.return_value = [{"step": "s1"}]
             with patch("sys.argv", ["n8n-factory", "simulate", str(recipe), "--export-csv", str(out)]):
                 main()
-            MockSim.return_value.export_csv.assert_called()
+            sinks = MockSim.return_value.simulate.call_args.kwargs["sinks"]
+            assert [type(s).__name__ for s in sinks] == ["CsvSink"]
 
 def test_operator_analyze_crash():
     op = SystemOperator()
@@ -1,7 +1,20 @@
 import unittest
 from unittest.mock import MagicMock, patch, ANY
 import json
-from n8n_factory.control_plane import AdaptiveBatchSizer, PhaseGate
+from n8n_factory.control_plane import AdaptiveBatchSizer, PhaseGate, RateLimiter, RollingWindow, BatchSizeController, simulate_batch_controller
+from n8n_factory.operator import RedisPipeline
+from n8n_factory.resp import RedisError
+
+def redis_commands(mock_op):
+    """Commands sent through inspect_redis, with pipelined batches expanded."""
+    commands = []
+    for c in mock_op.inspect_redis.call_args_list:
+        args = c[0][0]
+        if args[:2] == ["EVAL", RedisPipeline.SCRIPT]:
+            commands.extend(json.loads(args[3]))
+        else:
+            commands.append(args)
+    return commands
 
 class TestAdaptiveBatchSizer(unittest.TestCase):
     def setUp(self):
@@ -20,87 +33,158 @@ class TestAdaptiveBatchSizer(unittest.TestCase):
         self.mock_op.inspect_redis.return_value = "invalid"
         self.assertEqual(self.sizer.get_batch_size(), 10) # Default
 
-    @patch('time.time')
-    def test_update_stats_increases_size(self, mock_time):
-        mock_time.return_value = 100.0 # 100 % 5 = 0 < 0.5
-        
-        # Setup config
-        config = {
-            "min_size": 1, "max_size": 100, "target_latency_ms": 5000,
-            "failure_threshold_rate": 0.1, "adjustment_factor": 2.0, "window_size": 2
-        }
+    def test_update_stats_buffers_in_process(self):
+        self.mock_op.inspect_redis.reset_mock()
+        self.sizer.update_stats(500, True)
+        self.sizer.update_stats(600, True)
+        # No Redis round-trips until the window is flushed
+        self.mock_op.inspect_redis.assert_not_called()
+        self.assertEqual(len(self.sizer.groups[None].window), 2)
+
+    def test_flush_increases_size_when_fast(self):
+        config = {"min_size": 1, "max_size": 100, "target_latency_ms": 5000,
+                  "failure_threshold_rate": 0.1, "adjustment_factor": 2.0, "window_size": 2}
+        self.mock_op.inspect_redis.reset_mock()
         self.mock_op.inspect_redis.side_effect = [
-            None, # LPUSH
-            None, # LTRIM
-            # _recalculate calls
-            # LRANGE returns 2 fast successes
-            json.dumps({"d": 500, "s": 1}) + "\n" + json.dumps({"d": 600, "s": 1}),
             json.dumps(config), # get_config
-            "10", # get_batch_size (current)
-            None  # SET new size
+            "10",               # get_batch_size
+            '["OK",1]'          # pipelined SET new size + HSET window snapshot
         ]
+        self.sizer.update_stats(500, True)
+        self.sizer.update_stats(600, True)
+        self.sizer.flush()
+        self.assertEqual(self.mock_op.inspect_redis.call_count, 3)
 
-        # Note: Order of calls inside implementation matters for side_effect.
-        # Impl: LPUSH, LTRIM, Check time, LRANGE, get_config (inside _recal), get_batch_size, SET
-        # Wait, get_config is called in update_stats BEFORE LPUSH too to get window size.
-        # Let's check implementation again.
-        # update_stats: get_config(), LPUSH, LTRIM, check time, _recalculate
-        # _recalculate: LRANGE, get_batch_size, SET
-        # Wait, inside _recalculate I pass config, so it doesn't fetch it again?
-        # Impl: def _recalculate(self, key_stats: str, config: Dict[str, Any]):
-        # So correct order: 
-        # 1. get_config (in update_stats)
-        # 2. LPUSH
-        # 3. LTRIM
-        # 4. LRANGE
-        # 5. get_batch_size
-        # 6. SET
-        
-        self.mock_op.inspect_redis.side_effect = [
-            json.dumps(config), # 1. get_config
-            None, # 2. LPUSH
-            None, # 3. LTRIM
-            json.dumps({"d": 500, "s": 1}) + "\n" + json.dumps({"d": 600, "s": 1}), # 4. LRANGE
-            "10", # 5. get_batch_size
-            None  # 6. SET
-        ]
+        calls = redis_commands(self.mock_op)
+        set_call = next(c for c in calls if c[0] == "SET")
+        self.assertEqual(set_call[1], self.sizer.KEY_CURRENT)
+        self.assertGreater(int(set_call[2]), 10)
+        self.assertLessEqual(int(set_call[2]), 20) # capped by adjustment_factor
 
-        self.sizer.update_stats(500, True)
-        
-        # Verify SET called with increased size (10 * 2 + 1 = 21)
-        self.mock_op.inspect_redis.assert_called_with(["SET", self.sizer.KEY_CURRENT, "21"])
-
-    @patch('time.time')
-    def test_update_stats_decreases_on_failure(self, mock_time):
-        mock_time.return_value = 100.0 # 100 % 5 = 0 < 0.5
-        
-        # Setup config
-        config = {
-            "min_size": 1, "max_size": 100, "target_latency_ms": 5000,
-            "failure_threshold_rate": 0.1, "adjustment_factor": 2.0, "window_size": 2
-        }
-        
-        # Order:
-        # 1. get_config
-        # 2. LPUSH
-        # 3. LTRIM
-        # 4. LRANGE
-        # 5. get_batch_size
-        # 6. SET
-        
+        hset = calls[-1]
+        self.assertEqual(hset[:2], ["HSET", self.sizer.KEY_WINDOW])
+        self.assertIn("p95", hset)
+
+    def test_flush_decreases_on_failure(self):
+        config = {"min_size": 1, "max_size": 100, "target_latency_ms": 5000,
+                  "failure_threshold_rate": 0.1, "adjustment_factor": 2.0, "window_size": 2}
+        self.mock_op.inspect_redis.side_effect = [json.dumps(config), "50", None]
+        self.sizer._state(None).window.add(100, False)
+        self.sizer._state(None).window.add(100, False)
+        self.sizer.flush()
+        # 100% failures -> halve: 50 -> 25
+        self.assertIn(["SET", self.sizer.KEY_CURRENT, "25"], redis_commands(self.mock_op))
+
+    def test_flush_triggered_when_window_full(self):
+        self.sizer._state(None).window.resize(3)
+        with patch.object(self.sizer, "flush") as mock_flush:
+            self.sizer.update_stats(100, True)
+            self.sizer.update_stats(100, True)
+            mock_flush.assert_not_called()
+            self.sizer.update_stats(100, True)
+            mock_flush.assert_called_once()
+
+
+    def test_group_for(self):
+        self.assertEqual(AdaptiveBatchSizer.group_for("wf1", {}), "wf1")
+        self.assertEqual(AdaptiveBatchSizer.group_for("wf1", {"batch_group": "llm"}), "llm")
+
+    def test_group_batch_size_falls_back_to_global(self):
+        self.mock_op.inspect_redis.reset_mock()
+        self.mock_op.inspect_redis.side_effect = ["", "30"]
+        self.assertEqual(self.sizer.get_batch_size("etl"), 30)
+        calls = [c[0][0] for c in self.mock_op.inspect_redis.call_args_list]
+        self.assertEqual(calls, [["GET", "n8n_factory:state:batch_size:etl"], ["GET", "n8n_factory:state:batch_size"]])
+
+    def test_group_config_overrides_global(self):
         self.mock_op.inspect_redis.side_effect = [
-            json.dumps(config), # 1
-            None, # 2
-            None, # 3
-            json.dumps({"d": 100, "s": 0}) + "\n" + json.dumps({"d": 100, "s": 0}), # 4
-            "50", # 5 (current size)
-            None # 6
+            json.dumps({"target_latency_ms": 5000, "max_size": 100}),
+            json.dumps({"target_latency_ms": 30000})
         ]
+        config = self.sizer.get_config("llm")
+        self.assertEqual(config, {"target_latency_ms": 30000, "max_size": 100})
 
-        self.sizer.update_stats(100, False)
-        
-        # Verify decrease: 50 / 2 = 25
-        self.mock_op.inspect_redis.assert_called_with(["SET", self.sizer.KEY_CURRENT, "25"])
+    def test_groups_are_sized_independently(self):
+        config = json.dumps({"target_latency_ms": 1000, "adjustment_factor": 1.5, "window_size": 50})
+        def redis(args):
+            if args[0] == "GET" and args[1].startswith(AdaptiveBatchSizer.KEY_CONFIG):
+                return config if args[1] == AdaptiveBatchSizer.KEY_CONFIG else ""
+            if args[0] == "GET":
+                return "10"
+            return "1"
+        self.mock_op.inspect_redis.reset_mock()
+        self.mock_op.inspect_redis.side_effect = redis
+
+        for _ in range(5):
+            self.sizer.update_stats(10000, True, group="slow_llm")
+            self.sizer.update_stats(50, True, group="fast_etl")
+        self.sizer.flush("slow_llm")
+        self.sizer.flush("fast_etl")
+
+        commands = redis_commands(self.mock_op)
+        sets = {c[1]: int(c[2]) for c in commands if c[0] == "SET"}
+        self.assertLess(sets["n8n_factory:state:batch_size:slow_llm"], 10)
+        self.assertGreater(sets["n8n_factory:state:batch_size:fast_etl"], 10)
+        self.assertNotIn(AdaptiveBatchSizer.KEY_CURRENT, sets)
+        self.assertIn(["SADD", AdaptiveBatchSizer.KEY_GROUPS, "fast_etl"], commands)
+
+    def test_flush_interval_override_is_per_group(self):
+        def redis(args):
+            if args[:2] == ["GET", AdaptiveBatchSizer.KEY_CONFIG + ":llm"]:
+                return json.dumps({"flush_interval_s": 120})
+            if args[0] == "GET":
+                return json.dumps({"flush_interval_s": 5}) if args[1] == AdaptiveBatchSizer.KEY_CONFIG else "10"
+            return "1"
+        self.mock_op.inspect_redis.side_effect = redis
+        self.sizer.update_stats(100, True, group="llm")
+        self.sizer.update_stats(100, True, group="etl")
+        self.sizer.flush("llm")
+        self.sizer.flush("etl")
+        self.assertEqual(self.sizer.groups["llm"].flush_interval, 120.0)
+        self.assertEqual(self.sizer.groups["etl"].flush_interval, 5.0)
+        self.assertEqual(self.sizer.flush_interval, 10.0)
+
+class TestRollingWindow(unittest.TestCase):
+    def test_percentiles_and_failure_rate(self):
+        window = RollingWindow(size=100)
+        for i in range(1, 101):
+            window.add(float(i), success=(i % 10 != 0))
+        self.assertAlmostEqual(window.percentile(50), 50.5)
+        self.assertAlmostEqual(window.percentile(95), 95.05)
+        self.assertAlmostEqual(window.failure_rate(), 0.1)
+
+    def test_window_is_bounded(self):
+        window = RollingWindow(size=3)
+        for d in [1000, 1, 2, 3]:
+            window.add(d, True)
+        self.assertEqual(len(window), 3)
+        self.assertEqual(window.percentile(100), 3)
+
+
+class TestBatchSizeController(unittest.TestCase):
+    def test_converges_under_synthetic_load(self):
+        import random
+        rng = random.Random(42)
+        # Latency grows linearly with batch size: p95 hits 5s around size 45-50
+        model = lambda size: (200 + 90 * size) * rng.lognormvariate(0, 0.1)
+
+        for initial in (2, 100):
+            trajectory = simulate_batch_controller(model, jobs=1200, initial_size=initial, config={"window_size": 20})
+            tail = trajectory[-20:]
+            avg_p95 = sum(p["p95"] for p in tail) / len(tail)
+            sizes = [p["batch_size"] for p in tail]
+            self.assertAlmostEqual(avg_p95, 5000, delta=500)
+            self.assertLessEqual(max(sizes) - min(sizes), 10)
+
+    def test_respects_bounds(self):
+        controller = BatchSizeController(target_latency_ms=1000, min_size=2, max_size=20)
+        size = 10
+        for _ in range(50):
+            size = controller.update(size, p95_ms=10)
+        self.assertEqual(size, 20)
+        for _ in range(50):
+            size = controller.update(size, p95_ms=100000)
+        self.assertEqual(size, 2)
 
 
 class TestPhaseGate(unittest.TestCase):
@@ -108,36 +192,194 @@ class TestPhaseGate(unittest.TestCase):
         self.mock_op = MagicMock()
         self.gate = PhaseGate(self.mock_op)
 
+    RULE_2 = ["2", json.dumps({"dependency": "1", "condition": "complete"})]
+
+    def _redis(self, replies):
+        """Answers operator.redis() by the key each command reads."""
+        self.mock_op.redis.side_effect = lambda cmd, *a, **k: replies.get(cmd[1])
+
+    def _rules(self, cursors=None, **replies):
+        self._redis({PhaseGate.KEY_RULES_VERSION: "1", PhaseGate.KEY_RULES: self.RULE_2, **(cursors or {}), **replies})
+
     def test_set_rule(self):
         self.gate.set_rule("3", "2", "complete")
         expected_json = json.dumps({"dependency": "2", "condition": "complete"})
-        self.mock_op.inspect_redis.assert_called_with(["HSET", self.gate.KEY_RULES, "3", expected_json])
+        self.mock_op.inspect_redis.assert_any_call(["HSET", self.gate.KEY_RULES, "3", expected_json])
+        # Bumping the version invalidates every scheduler's cached rules
+        self.mock_op.inspect_redis.assert_called_with(["INCR", self.gate.KEY_RULES_VERSION])
 
     def test_can_run_no_rule(self):
         self.mock_op.inspect_redis.return_value = None # HGET returns nothing
         self.assertTrue(self.gate.can_run("run1", "phase1"))
 
     def test_can_run_locked(self):
-        # HGET rule
-        rule = json.dumps({"dependency": "1", "condition": "complete"})
-        
-        # HMGET cursors (current=5, total=10)
-        cursors = "5\n10" 
-        
-        self.mock_op.inspect_redis.side_effect = [rule, cursors]
-        
+        self._rules({f"{PhaseGate.CURSORS_KEY_PREFIX}:run1": ["1_current", "5", "1_total", "10"]})
+
         self.assertFalse(self.gate.can_run("run1", "2"))
 
     def test_can_run_unlocked(self):
-        # HGET rule
-        rule = json.dumps({"dependency": "1", "condition": "complete"})
-        
-        # HMGET cursors (current=10, total=10)
-        cursors = "10\n10" 
-        
-        self.mock_op.inspect_redis.side_effect = [rule, cursors]
-        
+        self._rules({f"{PhaseGate.CURSORS_KEY_PREFIX}:run1": ["1_current", "10", "1_total", "10"]})
+
         self.assertTrue(self.gate.can_run("run1", "2"))
 
+    def test_rules_cached_until_version_changes(self):
+        self._rules()
+        self.gate.get_rules()
+        self.gate._rules_checked_at = 0.0 # force a version check
+        self.assertIn("2", self.gate.get_rules())
+        # Second check only read the version key
+        self.assertEqual([c[0][0][0] for c in self.mock_op.redis.call_args_list], ["GET", "HGETALL", "GET"])
+
+    def test_rules_kept_when_redis_fails(self):
+        self._rules()
+        self.gate.get_rules()
+        self.gate._rules_checked_at = 0.0
+        self.mock_op.redis.side_effect = RedisError("connection refused")
+        self.assertIn("2", self.gate.get_rules())
+
+    def test_prefetch_one_hgetall_per_run(self):
+        cursor_key = f"{PhaseGate.CURSORS_KEY_PREFIX}:r1"
+        self._rules({cursor_key: ["1_current", "10", "1_total", "10"]})
+        jobs = [{"meta": {"run_id": "r1", "phase": 2}} for _ in range(5)] + [{"meta": {"run_id": "r1", "phase": 1}}]
+        self.gate.prefetch(jobs)
+        for job in jobs:
+            self.assertTrue(self.gate.can_run("r1", str(job["meta"]["phase"])))
+        self.mock_op.inspect_redis.assert_not_called()
+        self.assertEqual([c[0][0] for c in self.mock_op.redis.call_args_list].count(["HGETALL", cursor_key]), 1)
+
+    def test_prefetch_reads_cursors_through_queue(self):
+        self._rules()
+        self.mock_op.inspect_redis.return_value = json.dumps([["1_current", "3", "1_total", "10"], []])
+        self.gate.queue.cursor_flush_interval = 60
+        self.gate.queue.set_cursor("r2", "1_current", 10) # coalesced, not yet in Redis
+        self.gate.queue._pending_cursors["r2"]["1_total"] = "10"
+        self.gate.prefetch([{"meta": {"run_id": "r1", "phase": 2}}, {"meta": {"run_id": "r2", "phase": 2}}])
+        self.assertFalse(self.gate.can_run("r1", "2"))
+        self.assertTrue(self.gate.can_run("r2", "2"))
+        # Only the rules came through redis(); the cursors came in one pipeline
+        self.assertEqual(self.mock_op.redis.call_count, 2)
+
+    def test_park(self):
+        job = {"workflow": "wf", "meta": {"run_id": "r1", "phase": 2}}
+        self.gate.park(job)
+        args = self.mock_op.inspect_redis.call_args[0][0]
+        self.assertEqual(args[0], "EVAL")
+        self.assertEqual(args[3:5], [f"{PhaseGate.WAITING_KEY_PREFIX}:r1:2", PhaseGate.KEY_WAITING_INDEX])
+        self.assertEqual(json.loads(args[5]), job)
+        self.assertEqual(args[6], json.dumps(["r1", "2"]))
+
+    def test_release_ready_only_open_gates(self):
+        self._rules(**{PhaseGate.KEY_WAITING_INDEX: ["0", [json.dumps(["r1", "2"]), json.dumps(["r2", "2"])]]}) # SSCAN
+        self.mock_op.inspect_redis.side_effect = [
+            json.dumps([["1_current", "10", "1_total", "10"],  # r1 cursors (open)
+                        ["1_current", "3", "1_total", "10"]]), # r2 cursors (closed), one pipeline
+            "4",                                         # EVAL release r1
+        ]
+        with patch("os.path.exists", return_value=False):
+            released = self.gate.release_ready("queue")
+        self.assertEqual(released, 4)
+        args = self.mock_op.inspect_redis.call_args[0][0]
+        self.assertEqual(args[3:6], [f"{PhaseGate.WAITING_KEY_PREFIX}:r1:2", "queue", PhaseGate.KEY_WAITING_INDEX])
+
+    def _with_rules(self, rules):
+        self.gate._rules = rules
+        self.gate._rules_checked_at = 1e18 # skip version checks
+
+    def test_fan_in_with_progress_threshold(self):
+        self._with_rules({"3": {"dependencies": [
+            {"phase": "1", "condition": "complete"},
+            {"phase": "2", "condition": "progress>=0.8"},
+        ]}})
+        self.gate._cursor_cache["r1"] = {"1_current": "10", "1_total": "10", "2_current": "8", "2_total": "10"}
+        self.assertTrue(self.gate.can_run("r1", "3"))
+        self.gate._cursor_cache["r1"]["2_current"] = "7"
+        self.assertFalse(self.gate.can_run("r1", "3"))
+
+    def test_set_rule_multiple_dependencies(self):
+        self._with_rules({})
+        self.gate.set_rule("3", ["1", "2:progress>=0.8"])
+        hset = [c[0][0] for c in self.mock_op.inspect_redis.call_args_list if c[0][0][0] == "HSET"][0]
+        self.assertEqual(json.loads(hset[3]), {"dependencies": [
+            {"phase": "1", "condition": "complete"},
+            {"phase": "2", "condition": "progress>=0.8"},
+        ]})
+
+    def test_set_rule_rejects_cycle_and_bad_condition(self):
+        self._rules()
+        with self.assertRaises(ValueError):
+            self.gate.set_rule("1", "2")
+        with self.assertRaises(ValueError):
+            self.gate.set_rule("4", "3", "progress>=2")
+        self.assertFalse(any(c[0][0][0] == "HSET" for c in self.mock_op.inspect_redis.call_args_list))
+
+    def test_graph_critical_path(self):
+        self._with_rules({
+            "2": {"dependency": "1", "condition": "progress>=0.5"},
+            "3": {"dependencies": [{"phase": "1", "condition": "complete"}, {"phase": "2", "condition": "complete"}]},
+        })
+        graph = self.gate.graph()
+        # 2 overlaps with 1 and finishes last, so it binds phase 3
+        self.assertEqual(graph["critical_path"], ["1", "2", "3"])
+        self.assertEqual(graph["makespan"], 2.5)
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.mock_op = MagicMock()
+        self.limiter = RateLimiter(self.mock_op)
+
+    def test_set_limit(self):
+        self.limiter.set_limit("workflow:wf1", 2.0, burst=5)
+        self.mock_op.inspect_redis.assert_called_with(
+            ["HSET", RateLimiter.KEY_RULES, "workflow:wf1", json.dumps({"rate": 2.0, "burst": 5})]
+        )
+
+    def test_acquire_no_rules(self):
+        self.mock_op.redis.return_value = []
+        self.assertEqual(self.limiter.acquire("wf1", {}), 0)
+        # Only the rules lookup, no EVAL
+        self.mock_op.redis.assert_called_once_with(["HGETALL", RateLimiter.KEY_RULES])
+        self.mock_op.inspect_redis.assert_not_called()
+
+    def test_acquire_matches_workflow_and_meta(self):
+        self.mock_op.redis.return_value = [
+            "workflow:wf1", json.dumps({"rate": 1, "burst": 1}),
+            "meta:api=openai", json.dumps({"rate": 0.5, "burst": 2}),
+            "meta:tenant", json.dumps({"rate": 10, "burst": 10}),
+        ]
+        self.mock_op.inspect_redis.return_value = "0"
+
+        wait = self.limiter.acquire("wf1", {"api": "openai", "tenant": "acme", "phase": "1"})
+        self.assertEqual(wait, 0)
+
+        args = self.mock_op.inspect_redis.call_args[0][0]
+        self.assertEqual(args[0], "EVAL")
+        self.assertEqual(args[2], "3")
+        self.assertEqual(args[3:6], [
+            "n8n_factory:ratelimit:workflow:wf1",
+            "n8n_factory:ratelimit:meta:api=openai",
+            "n8n_factory:ratelimit:meta:tenant:acme",
+        ])
+        self.assertEqual(args[6:], ["1", "1", "0.5", "2", "10", "10"])
+
+    def test_acquire_over_limit_returns_wait(self):
+        self.mock_op.redis.return_value = ["workflow:wf1", json.dumps({"rate": 1, "burst": 1})]
+        self.mock_op.inspect_redis.return_value = "750"
+        self.assertEqual(self.limiter.acquire("wf1"), 750)
+
+    def test_rules_are_cached(self):
+        self.mock_op.redis.return_value = ["workflow:wf1", json.dumps({"rate": 1, "burst": 1})]
+        self.mock_op.inspect_redis.return_value = "0"
+        self.limiter.acquire("wf1")
+        self.limiter.acquire("wf1")
+        self.assertEqual(self.mock_op.redis.call_count, 1)
+
+    def test_acquire_fails_open(self):
+        self.mock_op.redis.return_value = ["workflow:wf1", json.dumps({"rate": 1, "burst": 1})]
+        self.mock_op.inspect_redis.return_value = "Redis command failed: boom"
+        self.assertEqual(self.limiter.acquire("wf1"), 0)
+        self.limiter._rules_loaded_at = 0.0
+        self.mock_op.redis.side_effect = RedisError("connection refused")
+        self.assertEqual(self.limiter.acquire("wf1"), 0)
+
 if __name__ == '__main__':
     unittest.main()
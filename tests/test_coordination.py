@@ -0,0 +1,158 @@
+import unittest
+from unittest.mock import MagicMock, patch, call
+from n8n_factory.coordination import LeaderElection, SlotSemaphore, ClusterCoordinator
+from n8n_factory.resp import RedisError
+from n8n_factory.scheduler import Scheduler
+
+class TestLeaderElection(unittest.TestCase):
+    def setUp(self):
+        self.mock_op = MagicMock()
+        self.election = LeaderElection(self.mock_op, instance_id="node-a", ttl_ms=5000)
+
+    def test_acquire_and_renew(self):
+        self.mock_op.inspect_redis.return_value = "1"
+        self.assertTrue(self.election.try_acquire())
+        args = self.mock_op.inspect_redis.call_args[0][0]
+        self.assertEqual(args[0], "EVAL")
+        self.assertEqual(args[3:], ["n8n_factory:leader:scheduler", "node-a", "5000"])
+
+    def test_not_leader_when_held_or_on_error(self):
+        self.mock_op.inspect_redis.return_value = "0"
+        self.assertFalse(self.election.try_acquire())
+        self.mock_op.inspect_redis.return_value = "Redis command failed: timeout"
+        self.assertFalse(self.election.try_acquire())
+
+    def test_release_only_when_leader(self):
+        self.election.release()
+        self.mock_op.inspect_redis.assert_not_called()
+        self.election.is_leader = True
+        self.election.release()
+        self.assertEqual(self.mock_op.inspect_redis.call_args[0][0][-1], "node-a")
+        self.assertFalse(self.election.is_leader)
+
+    def test_current_leader(self):
+        self.mock_op.redis.return_value = "node-b"
+        self.assertEqual(self.election.current_leader(), "node-b")
+        self.mock_op.redis.return_value = None
+        self.assertIsNone(self.election.current_leader())
+        self.mock_op.redis.side_effect = RedisError("connection refused")
+        self.assertIsNone(self.election.current_leader())
+
+class TestSlotSemaphore(unittest.TestCase):
+    def test_acquire_parses_leases(self):
+        mock_op = MagicMock()
+        mock_op.redis.return_value = ["node-a:1", "node-a:2"]
+        slots = SlotSemaphore(mock_op, capacity=4, owner="node-a")
+        self.assertEqual(slots.acquire(3), ["node-a:1", "node-a:2"])
+        args = mock_op.redis.call_args[0][0]
+        self.assertEqual(args[-3:], ["4", "3", "node-a"])
+        # Through redis-cli the script's reply is text, one lease per line
+        mock_op.redis.return_value = "node-a:3\nnode-a:4\n"
+        self.assertEqual(slots.acquire(2), ["node-a:3", "node-a:4"])
+
+    def test_acquire_nothing_wanted_or_failed(self):
+        mock_op = MagicMock()
+        slots = SlotSemaphore(mock_op, capacity=4)
+        self.assertEqual(slots.acquire(0), [])
+        mock_op.redis.assert_not_called()
+        mock_op.redis.return_value = []
+        self.assertEqual(slots.acquire(2), [])
+        mock_op.redis.side_effect = RedisError("boom")
+        self.assertIsNone(slots.acquire(2))
+
+    def test_reconcile_tops_up_external_executions(self):
+        mock_op = MagicMock()
+        mock_op.redis.return_value = 2
+        slots = SlotSemaphore(mock_op, capacity=4)
+        self.assertEqual(slots.reconcile(5, ttl_ms=60000), 2)
+        self.assertEqual(mock_op.redis.call_args[0][0][3:], [SlotSemaphore.KEY, "5", "60000"])
+        mock_op.redis.side_effect = RedisError("boom")
+        self.assertIsNone(slots.reconcile(5, ttl_ms=60000))
+        self.assertEqual(slots.in_use(), 0)
+
+class TestClusterScheduling(unittest.TestCase):
+    def _scheduler(self, MockOp, MockQueue):
+        scheduler = Scheduler(concurrency=4, cluster=True, refill_command="refill", instance_id="node-a")
+        scheduler.coordinator = MagicMock()
+        scheduler.slots = scheduler.coordinator.slots
+        scheduler.refiller = MagicMock()
+        scheduler.history = MagicMock()
+        queue = MockQueue.return_value
+        queue.size.return_value = 2
+        queue.delayed_size.return_value = 0
+        return scheduler, queue
+
+    @patch('n8n_factory.scheduler.SystemOperator')
+    @patch('n8n_factory.scheduler.QueueManager')
+    @patch('n8n_factory.scheduler.AdaptiveBatchSizer')
+    @patch('n8n_factory.scheduler.PhaseGate')
+    @patch('n8n_factory.scheduler.RateLimiter')
+    def test_follower_skips_singleton_duties(self, MockLimiter, MockGate, MockSizer, MockQueue, MockOp):
+        scheduler, queue = self._scheduler(MockOp, MockQueue)
+        scheduler.coordinator.elect.return_value = False
+        scheduler.coordinator.slots.acquire.return_value = ["l1", "l2"]
+        scheduler.coordinator.slots.in_use.return_value = 1
+        MockLimiter.return_value.acquire.return_value = 0
+        queue.dequeue.side_effect = [{"workflow": "wf1", "mode": "id"}, None]
+        MockOp.return_value.execute_workflow.return_value = "OK"
+
+        scheduler._tick()
+
+        MockOp.return_value.count_active_executions.assert_not_called()
+        queue.promote_delayed.assert_not_called()
+        MockGate.return_value.release_ready.assert_not_called()
+        scheduler.refiller.check_and_refill.assert_not_called()
+        scheduler.coordinator.slots.reconcile.assert_not_called()
+        scheduler.coordinator.slots.acquire.assert_called_with(2)
+        queue.dequeue.assert_called_with(include_delayed=False)
+        # Unused lease returned immediately, used lease after the job
+        scheduler.coordinator.slots.release.assert_has_calls([call("l2"), call("l1")])
+
+    @patch('n8n_factory.scheduler.SystemOperator')
+    @patch('n8n_factory.scheduler.QueueManager')
+    @patch('n8n_factory.scheduler.AdaptiveBatchSizer')
+    @patch('n8n_factory.scheduler.PhaseGate')
+    @patch('n8n_factory.scheduler.RateLimiter')
+    def test_leader_runs_singleton_duties(self, MockLimiter, MockGate, MockSizer, MockQueue, MockOp):
+        scheduler, queue = self._scheduler(MockOp, MockQueue)
+        scheduler.coordinator.elect.return_value = True
+        MockGate.return_value.release_ready.return_value = 0
+        scheduler.coordinator.slots.acquire.return_value = []
+        scheduler.coordinator.slots.in_use.return_value = 4
+        MockOp.return_value.count_active_executions.return_value = 1
+
+        scheduler._tick()
+
+        scheduler.coordinator.slots.reconcile.assert_called_once_with(1, ttl_ms=60000)
+        scheduler.coordinator.publish_active.assert_called_with(1)
+        queue.promote_delayed.assert_called_once()
+        MockGate.return_value.release_ready.assert_called_once()
+        scheduler.refiller.check_and_refill.assert_called_once()
+        # No slots granted cluster-wide -> nothing dequeued
+        queue.dequeue.assert_not_called()
+
+    @patch('n8n_factory.scheduler.SystemOperator')
+    @patch('n8n_factory.scheduler.QueueManager')
+    @patch('n8n_factory.scheduler.AdaptiveBatchSizer')
+    @patch('n8n_factory.scheduler.PhaseGate')
+    @patch('n8n_factory.scheduler.RateLimiter')
+    def test_follower_dispatches_nothing_without_redis(self, MockLimiter, MockGate, MockSizer, MockQueue, MockOp):
+        scheduler, queue = self._scheduler(MockOp, MockQueue)
+        scheduler.coordinator.elect.return_value = False
+        scheduler.coordinator.slots.acquire.return_value = None
+        scheduler.coordinator.slots.in_use.return_value = 0
+
+        scheduler._tick()
+
+        queue.dequeue.assert_not_called()
+
+class TestClusterCoordinator(unittest.TestCase):
+    def test_shared_active(self):
+        mock_op = MagicMock()
+        coordinator = ClusterCoordinator(mock_op, 5, instance_id="node-a")
+        coordinator.publish_active(3)
+        mock_op.inspect_redis.assert_called_with(["SET", ClusterCoordinator.KEY_ACTIVE, "3", "PX", "300000"])
+        mock_op.inspect_redis.return_value = "3"
+        self.assertEqual(coordinator.shared_active(), 3)
+        mock_op.inspect_redis.return_value = ""
+        self.assertEqual(coordinator.shared_active(), 0)
@@ -0,0 +1,73 @@
+import time
+import unittest
+from n8n_factory.expressions import ExpressionError, compile_expression, compile_template, compile_value
+from n8n_factory.models import Recipe, RecipeStep
+from n8n_factory.simulator import WorkflowSimulator
+
+
+class TestExpressions(unittest.TestCase):
+    def setUp(self):
+        self.item = {"json": {"a": {"b": 2}, "x y": [10, 20], "price": 4, "qty": 30, "status": "open", "name": "n"}}
+        self.nodes = {"Fetch": {"json": {"id": 7}}}
+
+    def evaluate(self, source):
+        return compile_expression(source)(self.item, self.nodes)
+
+    def test_paths(self):
+        self.assertEqual(self.evaluate("$json.a.b"), 2)
+        self.assertEqual(self.evaluate('$json["x y"][1]'), 20)
+        self.assertEqual(self.evaluate('$node["Fetch"].json.id'), 7)
+        self.assertEqual(self.evaluate("$json['x y'].length"), 2)
+        self.assertIsNone(self.evaluate("$json.missing.deeper"))
+
+    def test_operators(self):
+        self.assertTrue(self.evaluate('$json.price * $json.qty > 100 && $json.status != "done"'))
+        self.assertEqual(self.evaluate("$json.name + '-' + $json.a.b"), "n-2")
+        self.assertEqual(self.evaluate("-($json.price - 10) % 4"), 2)
+        self.assertEqual(self.evaluate("$json.missing || 'default'"), "default")
+        self.assertEqual(self.evaluate("$json.price >= 4 ? 'big' : 'small'"), "big")
+        self.assertTrue(self.evaluate("$json.price == '4'"))
+        self.assertFalse(self.evaluate("$json.price === '4'"))
+        self.assertIsNone(self.evaluate("$json.price / 0"))
+
+    def test_syntax_errors(self):
+        for source in ["$json.", "$json.a +", "($json.a", "foo.bar", "$json.a @ 1"]:
+            with self.assertRaises(ExpressionError, msg=source):
+                compile_expression(source)
+
+    def test_templates_keep_unresolved_placeholders(self):
+        render = compile_template("id={{ $json.a.b }} {{ $json.nope }} {{ broken( }}")
+        self.assertEqual(render(self.item, self.nodes), "id=2 {{ $json.nope }} {{ broken( }}")
+        self.assertIs(compile_template("{{ $json.a.b }}"), compile_template("{{ $json.a.b }}"))
+
+    def test_compile_value_recurses(self):
+        evaluate = compile_value({"k": ["{{ $json.status }}", 3]})
+        self.assertEqual(evaluate(self.item, self.nodes), {"k": ["open", 3]})
+
+
+class TestSimulatorExpressions(unittest.TestCase):
+    def test_set_and_node_references(self):
+        recipe = Recipe(name="Expr", steps=[
+            RecipeStep(id="Fetch", template="webhook", mock={"id": 7, "price": 3}),
+            RecipeStep(id="total", template="set", params={"name": "label", "value": "{{ $node[\"Fetch\"].json.id }}-{{ $json.price * 2 }}"}),
+        ])
+        history = WorkflowSimulator().simulate(recipe)
+        self.assertEqual(history[-1]["output"], [{"json": {"id": 7, "price": 3, "label": "7-6"}}])
+
+    def test_large_batch_through_if_set_and_filter(self):
+        items = [{"json": {"value": i % 10, "qty": i}} for i in range(100000)]
+        recipe = Recipe(name="Big", steps=[
+            RecipeStep(id="src", template="webhook", mock=items),
+            RecipeStep(id="check", template="if", params={"left": "{{ $json.qty % 2 === 0 }}", "right": "True"}),
+            RecipeStep(id="tag", template="set", params={"name": "tag", "value": "{{ $json.value > 4 ? 'high' : 'low' }}"}),
+            RecipeStep(id="keep", template="filter", params={"value": "8", "operator": "equal"}),
+        ])
+        started = time.time()
+        history = WorkflowSimulator().simulate(recipe)
+        self.assertLess(time.time() - started, 30)
+        self.assertEqual(history[-1]["output"]["count"], 10000)
+        self.assertEqual(history[-1]["output"]["sample"][0], {"json": {"value": 8, "qty": 8, "tag": "high"}})
+
+
+if __name__ == '__main__':
+    unittest.main()
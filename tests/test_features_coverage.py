@@ -22,7 +22,7 @@ def test_cli_simulate_html(tmp_path, capsys):
     # We patch WorkflowSimulator in cli.py where it is instantiated
     with patch("n8n_factory.cli.WorkflowSimulator") as MockSim:
         instance = MockSim.return_value
-        # Mock simulate to return some data so generate_html_report receives it
+        # Mock simulate to return some data
         instance.simulate.return_value = [{"step": "s1", "output": []}]
         
         with patch.object(sys, 'argv', ["n8n-factory", "simulate", str(recipe_path), "--export-html", str(html_output)]):
@@ -30,8 +30,10 @@ def test_cli_simulate_html(tmp_path, capsys):
         
         # Verify simulate was called
         instance.simulate.assert_called()
-        # Verify generate_html_report was called with the history and output path
-        instance.generate_html_report.assert_called_once_with(instance.simulate.return_value, str(html_output))
+        # The HTML report is streamed: an HtmlReportSink for the output path is passed to simulate
+        sinks = instance.simulate.call_args.kwargs["sinks"]
+        assert [type(s).__name__ for s in sinks] == ["HtmlReportSink"]
+        assert sinks[0].path == str(html_output)
 
 # Unit test for generate_html_report
 def test_generate_html_report_content(tmp_path):
@@ -78,7 +80,8 @@ def test_queue_add(capsys):
         with patch.object(sys, 'argv', ["n8n-factory", "queue", "add", "my_workflow", "--data", '{"a":1}']):
             main()
         
-        instance.enqueue.assert_called_once_with("my_workflow", inputs={"a": 1}, mode="id", meta={}, delay=0)
+        instance.enqueue.assert_called_once_with("my_workflow", inputs={"a": 1}, mode="id", meta={}, delay=0,
+                                                idempotency_key=None, dedup=False, dedup_window=None)
         captured = capsys.readouterr()
         assert "Job added to queue" in captured.out
 
@@ -95,6 +98,45 @@ def test_queue_list(capsys):
         captured = capsys.readouterr()
         assert "wf1" in captured.out
 
+def test_queue_list_json_includes_dedup(capsys):
+    with patch("n8n_factory.commands.schedule.QueueManager") as MockQM:
+        instance = MockQM.return_value
+        instance.size.return_value = 1
+        instance.delayed_size.return_value = 0
+        instance.list_jobs.return_value = []
+        instance.dedup_stats.return_value = {"accepted": 3, "rejected": 2}
+
+        with patch.object(sys, 'argv', ["n8n-factory", "queue", "list", "--json"]):
+            main()
+
+        data = json.loads(capsys.readouterr().out)
+        assert data["dedup"] == {"accepted": 3, "rejected": 2}
+
+def test_queue_gate_graph_json(capsys):
+    with patch("n8n_factory.commands.schedule.PhaseGate") as MockGate, \
+         patch("n8n_factory.commands.schedule.SystemOperator"):
+        MockGate.return_value.graph.return_value = {"phases": [], "critical_path": [], "makespan": 0.0}
+
+        with patch.object(sys, 'argv', ["n8n-factory", "queue", "gate", "graph", "--run", "r1", "--json"]):
+            main()
+
+        MockGate.return_value.graph.assert_called_once_with("r1")
+        assert json.loads(capsys.readouterr().out)["critical_path"] == []
+
+def test_analytics_json(tmp_path, capsys):
+    log_path = tmp_path / "jobs.jsonl"
+    with open(log_path, "w") as f:
+        f.write(json.dumps({"timestamp": 100, "workflow": "wf1", "status": "success", "duration": 2.0}) + "\n")
+        f.write(json.dumps({"timestamp": 200, "workflow": "wf1", "status": "failed", "duration": 4.0}) + "\n")
+
+    with patch.object(sys, 'argv', ["n8n-factory", "analytics", "--log-path", str(log_path), "--compact", "--json"]):
+        main()
+
+    data = json.loads(capsys.readouterr().out)
+    assert data["workflows"]["wf1"]["jobs"] == 2
+    assert data["workflows"]["wf1"]["failure_rate"] == 0.5
+    assert (tmp_path / "history" / "index.json").exists()
+
 # Test queue clear
 def test_queue_clear(capsys):
     with patch("n8n_factory.commands.schedule.QueueManager") as MockQM:
@@ -0,0 +1,104 @@
+import gzip
+import json
+import os
+import time
+import unittest
+import tempfile
+import threading
+from n8n_factory.history import JobHistorySink, JobHistory, parse_time, percentile, load_index, log_lock
+
+class TestJobHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "jobs.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _entry(self, ts, workflow="wf1", status="success", duration=1.0):
+        return {"timestamp": ts, "workflow": workflow, "status": status, "duration": duration,
+                "error": None, "meta": {}, "retries": 0, "batch_size": 10}
+
+    def test_buffered_writes(self):
+        now = time.time()
+        sink = JobHistorySink(self.path, flush_size=3, flush_interval=3600)
+        sink.write(self._entry(now))
+        sink.write(self._entry(now))
+        self.assertFalse(os.path.exists(self.path))
+        sink.write(self._entry(now))
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+    def test_rotation_by_size_writes_columnar_segment(self):
+        sink = JobHistorySink(self.path, flush_size=1, max_bytes=1)
+        sink.write(self._entry(100, "wf1"))
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+        index = load_index(sink.segment_dir)
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index[0]["workflows"], ["wf1"])
+        with gzip.open(os.path.join(sink.segment_dir, index[0]["file"]), "rt") as f:
+            data = json.load(f)
+        self.assertEqual(data["dictionaries"]["workflow"], ["wf1"])
+        self.assertEqual(data["workflow"], [0])
+
+    def test_rotation_by_age(self):
+        sink = JobHistorySink(self.path, flush_size=1, rotate_interval=60)
+        sink.write(self._entry(time.time()))
+        self.assertGreater(os.path.getsize(self.path), 0)
+        self.assertEqual(load_index(sink.segment_dir), [])
+
+        open(self.path, "w").close()
+        sink.write(self._entry(time.time() - 120))
+        self.assertEqual(os.path.getsize(self.path), 0)
+        self.assertEqual(len(load_index(sink.segment_dir)), 1)
+
+    @unittest.skipIf(os.name == "nt", "log_lock needs fcntl")
+    def test_appends_wait_for_compaction_lock(self):
+        writer = JobHistorySink(self.path, flush_size=1, rotate_interval=float("inf"))
+        writer.write(self._entry(100))
+        done = threading.Event()
+        with log_lock(self.path):
+            # As if `analytics --compact` were sealing the log in another process
+            thread = threading.Thread(target=lambda: (writer.write(self._entry(101)), done.set()))
+            thread.start()
+            self.assertFalse(done.wait(0.2))
+            JobHistorySink(self.path)._rotate()
+        thread.join(5)
+        self.assertTrue(done.is_set())
+        self.assertEqual(load_index(writer.segment_dir)[0]["count"], 1)
+        with open(self.path) as f:
+            self.assertEqual([json.loads(line)["timestamp"] for line in f], [101])
+
+    def test_summarize_across_segments_and_active_log(self):
+        # Timestamps are far in the past, so disable age-based rotation
+        sink = JobHistorySink(self.path, flush_size=1, rotate_interval=float("inf"))
+        for i in range(20):
+            sink.write(self._entry(1000 + i, "wf1", duration=float(i + 1)))
+        sink.write(self._entry(1500, "wf2", status="failed"))
+        sink.rotate()
+        sink.write(self._entry(5000, "wf1", duration=100.0))
+        sink.flush()
+
+        history = JobHistory(self.path)
+        summary = history.summarize(since=900, until=2000)
+        self.assertEqual(summary["jobs"], 21)
+        self.assertEqual(summary["workflows"]["wf1"]["jobs"], 20)
+        self.assertAlmostEqual(summary["workflows"]["wf1"]["p95_s"], 19.05)
+        self.assertEqual(summary["workflows"]["wf2"]["failure_rate"], 1.0)
+
+        # Segments outside the range are not opened
+        self.assertEqual(history.segments_for(since=3000), [])
+        self.assertEqual(history.summarize(since=3000)["workflows"]["wf1"]["jobs"], 1)
+        self.assertEqual(history.segments_for(workflow="wf3"), [])
+
+    def test_parse_time(self):
+        self.assertEqual(parse_time("2h", now=10000), 10000 - 7200)
+        self.assertEqual(parse_time("1700000000"), 1700000000.0)
+        self.assertIsNotNone(parse_time("2024-01-01"))
+        with self.assertRaises(ValueError):
+            parse_time("yesterday")
+
+    def test_percentile(self):
+        self.assertIsNone(percentile([], 95))
+        self.assertEqual(percentile([3, 1, 2], 50), 2)
@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import patch
+from n8n_factory import item_batch
+from n8n_factory.item_batch import ItemBatch
+from n8n_factory.simulator import WorkflowSimulator
+
+
+class TestItemBatch(unittest.TestCase):
+    def setUp(self):
+        self.items = [
+            {"json": {"value": 5, "name": "a"}},
+            {"json": {"name": "b"}, "binary": {"file": "x"}},
+            {"json": {"value": 12, "name": None}},
+        ]
+        self.batch = ItemBatch.from_items(self.items)
+
+    def test_round_trip_keeps_missing_fields_and_extras(self):
+        self.assertEqual(len(self.batch), 3)
+        self.assertEqual(self.batch.to_items(), self.items)
+        self.assertEqual(self.batch.to_items(limit=1), self.items[:1])
+
+    def test_take_and_concat(self):
+        picked = self.batch.take([2, 1])
+        self.assertEqual(picked.to_items(), [self.items[2], self.items[1]])
+        joined = ItemBatch.concat([picked, ItemBatch.from_items([{"json": {"other": 1}}])])
+        self.assertEqual(joined.to_items()[-1], {"json": {"other": 1}})
+        self.assertEqual(joined.to_items()[0], self.items[2])
+
+    def test_resolve_reads_columns_like_the_item_resolver(self):
+        sim = WorkflowSimulator()
+        expected = [sim._resolve_expressions("{{ $json.value }}", item) for item in self.items]
+        self.assertEqual(self.batch.resolve("{{ $json.value }}"), expected)
+        self.assertEqual(self.batch.resolve("id-{{ $json.name }}"),
+                         ["id-a", "id-b", "id-{{ $json.name }}"])
+
+    def test_numeric_compare(self):
+        sim = WorkflowSimulator()
+        mask = self.batch.compare("{{ $json.value }}", "10", "larger", sim._compare)
+        self.assertEqual(mask, [False, False, True])
+
+    def test_numeric_column_needs_numpy(self):
+        with patch.object(item_batch, "np", None):
+            self.assertIsNone(ItemBatch.from_items([{"json": {"v": 1}}]).numeric("v"))
+        # Columns with missing values are never numeric
+        self.assertIsNone(self.batch.numeric("value"))
+
+    @unittest.skipIf(item_batch.np is None, "numpy not installed")
+    def test_numeric_column_uses_numpy(self):
+        batch = ItemBatch.from_items([{"json": {"v": i}} for i in range(5)])
+        self.assertEqual(batch.numeric("v").tolist(), [0.0, 1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(batch.compare("{{ $json.v }}", "2", "largerEqual", None), [False, False, True, True, True])
+
+
+class TestLargeSimulation(unittest.TestCase):
+    def test_history_summarises_large_batches(self):
+        from n8n_factory.models import Recipe, RecipeStep
+        items = [{"json": {"value": i}} for i in range(1000)]
+        recipe = Recipe(name="Big", steps=[
+            RecipeStep(id="src", template="webhook", mock=items),
+            RecipeStep(id="keep", template="filter", params={"value": "989", "operator": "larger"}),
+            RecipeStep(id="out", template="set"),
+        ], assertions=["output[9]['json']['value'] == 999"])
+        with self.assertLogs("n8n_factory", level="INFO") as logs:
+            history = WorkflowSimulator().simulate(recipe)
+        self.assertIn("[PASS] output[9]['json']['value'] == 999", "\n".join(logs.output))
+        self.assertEqual(history[0]["output"]["count"], 1000)
+        self.assertEqual(history[0]["output"]["sample"], items[:3])
+        self.assertEqual(history[2]["output"], items[990:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+from n8n_factory.js_runtime import JsRuntimeError, JsRuntimePool
+from n8n_factory.models import Recipe, RecipeStep
+from n8n_factory.simulator import WorkflowSimulator
+
+
+@unittest.skipUnless(JsRuntimePool.available(), "node is not installed")
+class TestJsRuntimePool(unittest.TestCase):
+    def setUp(self):
+        self.pool = JsRuntimePool(size=2, timeout_ms=500, memory_mb=64, batch_size=10)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_run_once_for_all_items(self):
+        items = [{"json": {"v": i}} for i in range(3)]
+        out = self.pool.run("return items.map(i => ({json: {v: i.json.v * 2}}));", items)
+        self.assertEqual([i["json"]["v"] for i in out], [0, 2, 4])
+        out = self.pool.run("return {total: $input.all().length};", items)
+        self.assertEqual(out, [{"json": {"total": 3}}])
+
+    def test_per_item_batches_keep_order(self):
+        items = [{"json": {"v": i}} for i in range(35)]
+        out = self.pool.run("return {v: $json.v, index: $itemIndex};", items, per_item=True)
+        self.assertEqual([i["json"]["index"] for i in out], list(range(35)))
+
+    def test_per_item_input_item(self):
+        items = [{"json": {"v": i}} for i in range(3)]
+        out = self.pool.run("return {v: $input.item.json.v, same: $input.item === item, n: $input.all().length};",
+                            items, per_item=True)
+        self.assertEqual([i["json"] for i in out], [{"v": i, "same": True, "n": 3} for i in range(3)])
+
+    def test_chunked_per_item_runs_see_the_whole_input(self):
+        items = [{"json": {"v": i}} for i in range(25)]
+        code = ("return {n: $input.all().length, items: items.length, first: $input.first().json.v,"
+                " last: $input.last().json.v, v: $input.item.json.v};")
+        out = self.pool.run(code, items, per_item=True)
+        # Every chunk of 10 sees all 25 items
+        self.assertEqual([i["json"] for i in out],
+                         [{"n": 25, "items": 25, "first": 0, "last": 24, "v": i} for i in range(25)])
+        out = self.pool.run("return {n: $input.all().length};", items[:12], per_item=True)
+        self.assertEqual({i["json"]["n"] for i in out}, {12})
+
+    def test_code_can_await(self):
+        items = [{"json": {"v": i}} for i in range(3)]
+        out = self.pool.run("const v = await Promise.resolve(items.length); return {v};", items)
+        self.assertEqual(out, [{"json": {"v": 3}}])
+        out = self.pool.run("return {v: await Promise.resolve($json.v + 1)};", items, per_item=True)
+        self.assertEqual([i["json"]["v"] for i in out], [1, 2, 3])
+        with self.assertRaisesRegex(JsRuntimeError, "late"):
+            self.pool.run("await null; throw new Error('late');", items)
+        with self.assertRaisesRegex(JsRuntimeError, "never settles"):
+            self.pool.run("await new Promise(() => {});", items)
+
+    def test_awaiting_loop_times_out(self):
+        with self.assertRaisesRegex(JsRuntimeError, "timed out"):
+            self.pool.run("while (true) { await null; }", [])
+        self.assertEqual(self.pool.run("return {ok: 1};", []), [{"json": {"ok": 1}}])
+
+    def test_workers_are_reused(self):
+        self.pool.run("return items;", [])
+        worker = self.pool._workers[0]
+        self.pool.run("return items;", [])
+        self.assertEqual(self.pool._workers, [worker])
+
+    def test_sandbox_has_no_require_or_process(self):
+        with self.assertRaises(JsRuntimeError):
+            self.pool.run("return require('fs');", [])
+        out = self.pool.run("return {p: typeof process};", [])
+        self.assertEqual(out[0]["json"]["p"], "undefined")
+
+    def test_timeout_keeps_worker_usable(self):
+        with self.assertRaisesRegex(JsRuntimeError, "timed out"):
+            self.pool.run("while (true) {}", [])
+        self.assertEqual(self.pool.run("return {ok: 1};", []), [{"json": {"ok": 1}}])
+
+    def test_memory_limit_replaces_worker(self):
+        with self.assertRaises(JsRuntimeError):
+            self.pool.run("const a = []; while (true) { a.push(new Array(1e6).fill(1)); }", [])
+        self.assertEqual(self.pool.run("return {ok: 1};", []), [{"json": {"ok": 1}}])
+
+
+@unittest.skipUnless(JsRuntimePool.available(), "node is not installed")
+class TestSimulatorCode(unittest.TestCase):
+    def test_code_step_runs_js(self):
+        recipe = Recipe(name="Code", steps=[
+            RecipeStep(id="src", template="webhook", mock=[{"json": {"a": 1}}, {"json": {"a": 2}}]),
+            RecipeStep(id="double", template="code", params={"code": "return items.map(i => ({json: {a: i.json.a * 2}}));"}),
+        ])
+        with JsRuntimePool(size=1) as pool:
+            history = WorkflowSimulator(js_runtime=pool).simulate(recipe)
+        self.assertEqual(history[-1]["output"], [{"json": {"a": 2}}, {"json": {"a": 4}}])
+
+    def test_code_error_stops_simulation(self):
+        recipe = Recipe(name="Code", steps=[
+            RecipeStep(id="boom", template="code", params={"code": "throw new Error('bad input');"}),
+            RecipeStep(id="after", template="set"),
+        ])
+        with JsRuntimePool(size=1) as pool:
+            history = WorkflowSimulator(js_runtime=pool).simulate(recipe)
+        self.assertEqual([h["step_id"] for h in history], ["boom"])
+        self.assertIn("bad input", history[0]["error"])
+
+    def test_template_js_code_is_rendered(self):
+        recipe = Recipe(name="Flatten", steps=[
+            RecipeStep(id="src", template="webhook", mock={"a": {"b": 1}}),
+            RecipeStep(id="flat", template="json_flatten"),
+        ])
+        with JsRuntimePool(size=1) as pool:
+            history = WorkflowSimulator(js_runtime=pool, templates_dir="templates").simulate(recipe)
+        self.assertNotIn("error", history[-1])
+        self.assertNotEqual(history[-1]["output"], history[-1]["input"])
+
+
+class TestSimulatorWithoutRuntime(unittest.TestCase):
+    def test_code_step_passes_through(self):
+        recipe = Recipe(name="Code", steps=[
+            RecipeStep(id="src", template="webhook", mock={"a": 1}),
+            RecipeStep(id="noop", template="code", params={"code": "return [];"}),
+        ])
+        history = WorkflowSimulator().simulate(recipe)
+        self.assertEqual(history[-1]["output"], [{"json": {"a": 1}}])
+
+
+if __name__ == "__main__":
+    unittest.main()
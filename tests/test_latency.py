@@ -0,0 +1,88 @@
+import json
+import random
+import unittest
+from n8n_factory.history import JobHistory
+from n8n_factory.latency import LatencyEstimator, LatencyModel
+from n8n_factory.models import Recipe, RecipeStep
+from n8n_factory.simulator import WorkflowSimulator
+
+
+class TestLatencyModel(unittest.TestCase):
+    def test_specs(self):
+        rng = random.Random(1)
+        self.assertEqual(LatencyModel.from_spec(25).sample(rng), 25.0)
+        self.assertEqual(LatencyModel.from_spec(None).sample(rng), 0.0)
+        uniform = LatencyModel.from_spec({"dist": "uniform", "min": 10, "max": 20})
+        self.assertTrue(all(10 <= uniform.sample(rng) <= 20 for _ in range(100)))
+        normal = LatencyModel.from_spec({"dist": "normal", "mean": 5, "std": 50})
+        self.assertTrue(all(normal.sample(rng) >= 0 for _ in range(100)))
+        self.assertIn(LatencyModel.from_spec({"dist": "empirical", "samples": [1, 2]}).sample(rng), (1.0, 2.0))
+        with self.assertRaises(ValueError):
+            LatencyModel.from_spec({"dist": "gamma"})
+
+    def test_incomplete_specs_raise_value_error(self):
+        for spec in ({"dist": "normal"}, {"dist": "uniform", "min": 5}, {"dist": "lognormal", "median": 0},
+                     {"dist": "exponential"}, {"dist": "normal", "mean": "fast"}):
+            with self.assertRaises(ValueError):
+                LatencyModel.from_spec(spec)
+        recipe = Recipe(name="R", steps=[RecipeStep(id="a", template="set", mock_latency={"dist": "normal"})])
+        with self.assertRaisesRegex(ValueError, "Step 'a'"):
+            LatencyEstimator.for_recipe(recipe, ["a"], {"a": []})
+
+    def test_fit_from_job_history(self):
+        import tempfile, os
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "jobs.jsonl")
+            with open(path, "w") as f:
+                for duration, status in [(0.2, "success"), (0.4, "success"), (9.0, "failed"), (1.0, "success")]:
+                    f.write(json.dumps({"timestamp": 1, "workflow": "wf", "status": status, "duration": duration}) + "\n")
+            model = LatencyModel.from_spec({"dist": "empirical", "workflow": "wf"}, JobHistory(path))
+            self.assertEqual(sorted(model.samples), [200.0, 400.0, 1000.0])
+            with self.assertRaises(ValueError):
+                LatencyModel.fit("other", JobHistory(path))
+
+
+class TestLatencyEstimator(unittest.TestCase):
+    def recipe(self):
+        # start -> (slow | fast) -> join: branches overlap in virtual time
+        return Recipe(name="Fan", steps=[
+            RecipeStep(id="start", template="webhook", mock={"value": 1}, mock_latency=10),
+            RecipeStep(id="slow", template="set", connections_from=["start"], mock_latency={"dist": "uniform", "min": 100, "max": 200}),
+            RecipeStep(id="fast", template="set", connections_from=["start"], mock_latency=30),
+            RecipeStep(id="join", template="merge", connections_from=["slow", "fast"], mock_latency=5),
+        ])
+
+    def test_parallel_branches_and_critical_path(self):
+        sim = WorkflowSimulator()
+        recipe = self.recipe()
+        sim.simulate(recipe)
+        report = sim.estimate_latency(recipe, runs=500, seed=3)
+
+        self.assertEqual(report["critical_path"], ["start", "slow", "join"])
+        self.assertEqual(report["critical_path_share"], 1.0)
+        self.assertEqual(report["bottleneck"], "slow")
+        # Total is start + slow + join, not the sum of all steps
+        self.assertTrue(115 <= report["p50_ms"] <= 215)
+        self.assertLess(report["max_ms"], 215)
+        self.assertAlmostEqual(report["steps"]["fast"]["mean_ms"], 30.0)
+        self.assertEqual(report["steps"]["fast"]["critical_share"], 0.0)
+
+    def test_deterministic_for_a_seed(self):
+        sim = WorkflowSimulator()
+        recipe = self.recipe()
+        sim.simulate(recipe)
+        self.assertEqual(sim.estimate_latency(recipe, runs=50, seed=7), sim.estimate_latency(recipe, runs=50, seed=7))
+        self.assertNotEqual(sim.estimate_latency(recipe, runs=50, seed=7)["p50_ms"],
+                            sim.estimate_latency(recipe, runs=50, seed=8)["p50_ms"])
+
+    def test_only_executed_steps_count(self):
+        estimator = LatencyEstimator(["a", "c"], {"a": [], "b": [("a", 0)], "c": [("b", 0), ("a", 0)]},
+                                     {"a": LatencyModel.from_spec(10), "c": LatencyModel.from_spec(1)})
+        report = estimator.estimate(runs=1, concurrency=4)
+        self.assertEqual(report["max_ms"], 11.0)
+        self.assertEqual(report["critical_path"], ["a", "c"])
+        self.assertAlmostEqual(report["throughput_per_s"], 4000 / 11, places=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
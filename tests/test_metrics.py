@@ -0,0 +1,95 @@
+import unittest
+import urllib.request
+import urllib.error
+from unittest.mock import MagicMock, patch
+from n8n_factory.metrics import _Metric, Counter, Gauge, Histogram, MetricsRegistry, MetricsServer, SchedulerMetrics
+from n8n_factory.scheduler import Scheduler
+
+class TestMetrics(unittest.TestCase):
+    def test_counter_and_gauge_render(self):
+        registry = MetricsRegistry()
+        jobs = registry.register(Counter("jobs_total", "Jobs.", ("workflow",)))
+        depth = registry.register(Gauge("depth", "Depth."))
+        jobs.inc(workflow='a"b')
+        jobs.inc(2, workflow='a"b')
+        depth.set(7)
+        text = registry.render()
+        self.assertIn("# TYPE jobs_total counter", text)
+        self.assertIn('jobs_total{workflow="a\\"b"} 3', text)
+        self.assertIn("depth 7", text)
+
+    def test_non_finite_values_render(self):
+        gauge = Gauge("ratio", "Ratio.", ("kind",))
+        gauge.set(float("nan"), kind="nan")
+        gauge.set(float("-inf"), kind="low")
+        lines = gauge.render()
+        self.assertIn('ratio{kind="nan"} NaN', lines)
+        self.assertIn('ratio{kind="low"} -Inf', lines)
+
+    def test_histogram_buckets_are_cumulative(self):
+        hist = Histogram("dur", "Duration.", buckets=(1.0, 5.0))
+        for value in (0.5, 2.0, 10.0):
+            hist.observe(value)
+        lines = hist.render()
+        self.assertIn('dur_bucket{le="1"} 1', lines)
+        self.assertIn('dur_bucket{le="5"} 2', lines)
+        self.assertIn('dur_bucket{le="+Inf"} 3', lines)
+        self.assertIn("dur_sum 12.5", lines)
+        self.assertIn("dur_count 3", lines)
+
+    def test_metric_types_must_render_samples(self):
+        with self.assertRaises(TypeError):
+            _Metric("x", "X.")
+
+    def test_local_scrape(self):
+        metrics = SchedulerMetrics()
+        metrics.queue_depth.set(12)
+        server = MetricsServer(metrics, 0, host="127.0.0.1")
+        port = server.start()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as res:
+                self.assertIn("text/plain", res.headers["Content-Type"])
+                body = res.read().decode("utf-8")
+            self.assertIn("n8n_factory_queue_depth 12", body)
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/other", timeout=5)
+        finally:
+            server.stop()
+
+    @patch('n8n_factory.scheduler.SystemOperator')
+    @patch('n8n_factory.scheduler.QueueManager')
+    @patch('n8n_factory.scheduler.AdaptiveBatchSizer')
+    @patch('n8n_factory.scheduler.PhaseGate')
+    @patch('n8n_factory.scheduler.RateLimiter')
+    def test_scheduler_records_without_redis_calls(self, MockLimiter, MockGate, MockSizer, MockQueue, MockOp):
+        scheduler = Scheduler(concurrency=2)
+        scheduler.history = MagicMock()
+        scheduler.slots = MagicMock()
+        scheduler.slots.acquire.return_value = ["lease-1"]
+        MockOp.return_value.count_active_executions.return_value = 1
+        in_flight_during_job = []
+        def execute(*args, **kwargs):
+            in_flight_during_job.append(scheduler.metrics.in_flight.get())
+            return "OK"
+        MockOp.return_value.execute_workflow.side_effect = execute
+        MockQueue.return_value.size.return_value = 3
+        MockQueue.return_value.delayed_size.return_value = 1
+        MockQueue.return_value.dequeue.side_effect = [{"workflow": "wf1", "mode": "id", "timestamp": 0}]
+        MockGate.return_value.release_ready.return_value = 0
+        MockLimiter.return_value.acquire.return_value = 0
+        MockSizer.return_value.group_for.return_value = "wf1"
+        MockSizer.return_value.get_batch_size.return_value = 25
+
+        scheduler._tick()
+
+        m = scheduler.metrics
+        self.assertEqual(m.queue_depth.get(), 3)
+        self.assertEqual(m.delayed_depth.get(), 1)
+        self.assertEqual(in_flight_during_job, [1])
+        self.assertEqual(m.in_flight.get(), 0)
+        scheduler.slots.in_use.assert_not_called()
+        self.assertEqual(m.jobs.get(workflow="wf1", status="success"), 1)
+        self.assertEqual(m.job_duration.count(workflow="wf1", status="success"), 1)
+        self.assertEqual(m.dispatch_latency.count(), 1)
+        self.assertEqual(m.batch_size.get(group="wf1"), 25)
+        MockOp.return_value.inspect_redis.assert_not_called()
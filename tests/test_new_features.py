@@ -2,8 +2,9 @@ import unittest
 from unittest.mock import MagicMock, patch
 import os
 import json
-from n8n_factory.operator import SystemOperator
+from n8n_factory.operator import SystemOperator, RedisPipeline
 from n8n_factory.queue_manager import QueueManager
+from n8n_factory.resp import RedisError
 from n8n_factory.scheduler import Scheduler
 from n8n_factory.commands.schedule import schedule_run_command
 
@@ -63,21 +64,83 @@ class TestOperatorFeatures(unittest.TestCase):
         args = mock_run.call_args[0][0]
         self.assertIn("N8N_RUNNERS_BROKER_PORT=8888", " ".join(args))
 
+    def test_count_active_executions_bounded(self):
+        op = SystemOperator()
+        with patch.object(op, "run_db_query", return_value=[{"active": 3}]) as mock_query:
+            self.assertEqual(op.count_active_executions(limit=10), 3)
+        query = mock_query.call_args[0][0]
+        self.assertIn("LIMIT 10", query)
+        self.assertNotIn("JOIN", query)
+
+        with patch.object(op, "run_db_query", return_value=[]):
+            self.assertIsNone(op.count_active_executions())
+
+class TestRedisPipeline(unittest.TestCase):
+    def test_batches_commands_into_one_call(self):
+        mock_op = MagicMock()
+        mock_op.inspect_redis.return_value = json.dumps(["OK", None, ["a", "1"], {}])
+        with RedisPipeline(mock_op) as pipe:
+            pipe.command(["SET", "k", 1])
+            pipe.command(["GET", "missing"])
+            pipe.command(["HGETALL", "h"])
+            pipe.command(["LRANGE", "empty", 0, -1])
+        self.assertEqual(pipe.results, ["OK", None, ["a", "1"], []])
+        args = mock_op.inspect_redis.call_args[0][0]
+        self.assertEqual(args[:3], ["EVAL", RedisPipeline.SCRIPT, "0"])
+        self.assertEqual(json.loads(args[3])[0], ["SET", "k", "1"])
+        mock_op.inspect_redis.assert_called_once()
+
+    def test_failed_batch_yields_none(self):
+        mock_op = MagicMock()
+        mock_op.inspect_redis.return_value = "Redis command failed: connection refused"
+        pipe = RedisPipeline(mock_op)
+        pipe.command(["GET", "a"])
+        pipe.command(["GET", "b"])
+        self.assertEqual(pipe.execute(), [None, None])
+
+    def test_bytes_arguments_through_redis_cli(self):
+        mock_op = MagicMock()
+        mock_op.inspect_redis.return_value = json.dumps([1])
+        with RedisPipeline(mock_op) as pipe:
+            pipe.command(["HSET", "h", "f", b"text"])
+        self.assertEqual(json.loads(mock_op.inspect_redis.call_args[0][0][3]), [["HSET", "h", "f", "text"]])
+        # Binary values can't go through redis-cli: the batch fails instead of raising
+        pipe.command(["HSET", "h", "f", b"\x89\xff"])
+        pipe.command(["GET", "h"])
+        self.assertEqual(pipe.execute(), [None, None])
+        mock_op.inspect_redis.assert_called_once()
+
+    def test_empty_pipeline_skips_redis(self):
+        mock_op = MagicMock()
+        with RedisPipeline(mock_op):
+            pass
+        mock_op.inspect_redis.assert_not_called()
+
 class TestQueueRequeue(unittest.TestCase):
     def test_requeue(self):
         mock_op = MagicMock()
+        mock_op.inspect_redis.return_value = json.dumps([1, 4])
         queue = QueueManager(operator=mock_op)
         job = {"workflow": "wf1", "mode": "id"}
         
-        queue.requeue(job)
-        
-        # Should call LPUSH
-        mock_op.inspect_redis.assert_called_with(["LPUSH", "n8n_factory:job_queue", json.dumps(job)])
+        self.assertEqual(queue.requeue(job), "4")
+
+        # Payload is stored under the job's id and the id pushed back on the queue
+        commands = json.loads(mock_op.inspect_redis.call_args[0][0][3])
+        self.assertEqual(commands, [
+            ["HSET", QueueManager.JOBS_KEY, job["id"], json.dumps(job, separators=(",", ":"))],
+            ["LPUSH", "n8n_factory:job_queue", job["id"]],
+        ])
+
+    def test_requeue_failure_raises(self):
+        mock_op = MagicMock()
+        mock_op.inspect_redis.return_value = "Redis command failed: connection refused"
+        queue = QueueManager(operator=mock_op)
+        with self.assertRaises(RedisError):
+            queue.requeue({"workflow": "wf1", "mode": "id"})
 
 class TestSchedulerReliability(unittest.TestCase):
-    @patch('n8n_factory.scheduler.AdaptiveBatchSizer')
-    @patch('n8n_factory.scheduler.PhaseGate')
-    def setUp(self, MockGate, MockSizer):
+    def setUp(self):
         self.mock_op = MagicMock()
         self.mock_queue = MagicMock()
         
@@ -90,11 +153,13 @@ class TestSchedulerReliability(unittest.TestCase):
         
         self.patcher_sizer = patch('n8n_factory.scheduler.AdaptiveBatchSizer')
         self.patcher_gate = patch('n8n_factory.scheduler.PhaseGate')
+        # The runner is built in Scheduler.__init__, so it must get the mock operator
+        self.patcher_op = patch('n8n_factory.scheduler.SystemOperator', return_value=self.mock_op)
         self.MockSizer = self.patcher_sizer.start()
         self.MockGate = self.patcher_gate.start()
+        self.patcher_op.start()
         
         self.scheduler = Scheduler(concurrency=1)
-        self.scheduler.operator = self.mock_op
         self.scheduler.queue = self.mock_queue
         
         # Setup default mock returns for sizer/gate
@@ -104,6 +169,7 @@ class TestSchedulerReliability(unittest.TestCase):
     def tearDown(self):
         self.patcher_sizer.stop()
         self.patcher_gate.stop()
+        self.patcher_op.stop()
 
     def test_execute_job_success(self):
         job = {"workflow": "wf1", "mode": "id"}
@@ -123,6 +189,16 @@ class TestSchedulerReliability(unittest.TestCase):
         # Expect backoff delay
         self.mock_queue.requeue.assert_called_with(job, delay=2000)
 
+    def test_failed_requeue_is_not_counted_as_retry(self):
+        job = {"workflow": "wf1", "mode": "id", "retries": 0}
+        self.mock_op.execute_workflow.side_effect = Exception("Connection error")
+        self.mock_queue.requeue.side_effect = RedisError("connection refused")
+
+        self.scheduler._execute_job(job)
+
+        self.mock_queue.requeue.assert_called_once()
+        self.assertEqual(self.scheduler.metrics.retries.get(workflow="wf1"), 0)
+
     def test_execute_job_failure_msg_requeues(self):
         job = {"workflow": "wf1", "mode": "id", "retries": 0}
         self.mock_op.execute_workflow.return_value = "Execution failed: something went wrong"
@@ -149,7 +225,7 @@ class TestCLICommands(unittest.TestCase):
     def test_schedule_run_command(self, MockScheduler):
         schedule_run_command(concurrency=10, poll=2, broker_port=6000)
         
-        MockScheduler.assert_called_with(concurrency=10, poll_interval=2, broker_port=6000, refill_command=None, refill_threshold=5)
+        MockScheduler.assert_called_with(concurrency=10, poll_interval=2, broker_port=6000, refill_command=None, refill_threshold=5, metrics_port=None, cluster=False, instance_id=None, runner="cli", webhook_url=None, dispatch_threads=0)
         MockScheduler.return_value.start.assert_called_once()
 
 if __name__ == '__main__':
@@ -0,0 +1,136 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import json
+from datetime import datetime, timezone
+from n8n_factory.queue_manager import QueueManager
+from n8n_factory.recurring import CronExpression, RecurringJobs
+
+def ts(*args) -> float:
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+class TestCronExpression(unittest.TestCase):
+    def test_steps_ranges_and_names(self):
+        cron = CronExpression("*/15 9-17 * * mon-fri")
+        # Saturday noon -> Monday 09:00
+        self.assertEqual(cron.upcoming(ts(2026, 10, 17, 12, 0), 2), [ts(2026, 10, 19, 9, 0), ts(2026, 10, 19, 9, 15)])
+
+    def test_aliases_and_sunday_as_seven(self):
+        self.assertEqual(CronExpression("@daily").next_after(ts(2026, 1, 1, 0, 0)), ts(2026, 1, 2, 0, 0))
+        self.assertEqual(CronExpression("0 0 * * 7").weekdays, {0})
+
+    def test_day_fields_are_ored_when_both_restricted(self):
+        # 1st of the month or any Friday
+        cron = CronExpression("0 0 1 * fri")
+        self.assertEqual(cron.next_after(ts(2026, 10, 17, 0, 0)), ts(2026, 10, 23, 0, 0))
+        self.assertEqual(cron.next_after(ts(2026, 10, 30, 0, 0)), ts(2026, 11, 1, 0, 0))
+
+    def test_time_zone(self):
+        cron = CronExpression("0 9 * * *", "America/New_York")
+        self.assertEqual(cron.next_after(ts(2026, 7, 1, 0, 0)), ts(2026, 7, 1, 13, 0))
+
+    def test_invalid_expressions(self):
+        for expr in ["* * * *", "61 * * * *", "*/0 * * * *", "5-1 * * * *", "0 0 30 2 *"]:
+            with self.assertRaises(ValueError, msg=expr):
+                CronExpression(expr).next_after(0)
+        with self.assertRaises(ValueError):
+            CronExpression("* * * * *", "Mars/Olympus")
+
+class TestRecurringJobs(unittest.TestCase):
+    def setUp(self):
+        self.mock_op = MagicMock()
+        self.queue = QueueManager(operator=self.mock_op)
+        self.recurring = RecurringJobs(self.mock_op, self.queue)
+        self.spec = {"name": "hourly", "cron": "0 * * * *", "tz": "UTC", "workflow": "wf", "mode": "id",
+                     "inputs": {"a": 1}, "meta": {}, "jitter": 0, "missed": "skip", "horizon": 3}
+
+    def _redis(self, spec, state=None):
+        def redis(command, decode=True):
+            if command[1] == RecurringJobs.KEY_SPECS:
+                return [spec["name"], json.dumps(spec)]
+            if command[1] == RecurringJobs.KEY_STATE:
+                return [spec["name"], json.dumps(state)] if state else []
+            return None
+        self.mock_op.redis.side_effect = redis
+        self.mock_op.inspect_redis.return_value = "[]"
+
+    def _batch(self):
+        return json.loads(self.mock_op.inspect_redis.call_args[0][0][3])
+
+    def test_first_pass_materialises_horizon_in_one_batch(self):
+        self._redis(self.spec)
+        now = ts(2026, 10, 18, 10, 30)
+        self.assertEqual(self.recurring.materialize(now), 3)
+        self.mock_op.inspect_redis.assert_called_once()
+
+        batch = self._batch()
+        zadds = [c for c in batch if c[0] == "ZADD"]
+        self.assertEqual([c[3] for c in zadds], [f"cron:hourly:{int(ts(2026, 10, 18, h, 0))}" for h in (11, 12, 13)])
+        self.assertEqual(float(zadds[0][2]), ts(2026, 10, 18, 11, 0) * 1000)
+        job = json.loads(next(c for c in batch if c[0] == "HSET" and c[1] == QueueManager.JOBS_KEY)[3])
+        self.assertEqual(job["meta"]["recurring"], "hourly")
+        self.assertEqual(job["inputs"], {"a": 1})
+        state = json.loads(batch[-1][3])
+        self.assertEqual(state, {"last": ts(2026, 10, 18, 13, 0), "checked": now})
+
+    def test_later_pass_adds_only_new_runs(self):
+        self._redis(self.spec, {"last": ts(2026, 10, 18, 13, 0), "checked": ts(2026, 10, 18, 10, 30)})
+        self.assertEqual(self.recurring.materialize(ts(2026, 10, 18, 11, 5)), 1)
+        zadds = [c for c in self._batch() if c[0] == "ZADD"]
+        self.assertEqual([c[3] for c in zadds], [f"cron:hourly:{int(ts(2026, 10, 18, 14, 0))}"])
+
+    def test_catchup_enqueues_missed_runs_now(self):
+        self.spec["missed"] = "catchup"
+        self._redis(self.spec, {"last": ts(2026, 10, 18, 13, 0), "checked": ts(2026, 10, 18, 10, 30)})
+        now = ts(2026, 10, 18, 16, 30)
+        self.recurring.materialize(now)
+        zadds = [c for c in self._batch() if c[0] == "ZADD"]
+        missed = [c for c in zadds if float(c[2]) == now * 1000]
+        self.assertEqual([c[3] for c in missed], [f"cron:hourly:{int(ts(2026, 10, 18, h, 0))}" for h in (14, 15, 16)])
+
+    def test_skip_drops_missed_and_overdue_runs(self):
+        self._redis(self.spec, {"last": ts(2026, 10, 18, 13, 0), "checked": ts(2026, 10, 18, 10, 30)})
+        self.recurring.materialize(ts(2026, 10, 18, 16, 30))
+        batch = self._batch()
+        # No catch-up, only the next 3 runs
+        self.assertEqual(len([c for c in batch if c[0] == "ZADD"]), 3)
+        # Runs materialised before the outage are removed
+        removed = [c[2] for c in batch if c[0] == "ZREM"]
+        self.assertEqual(removed, [f"cron:hourly:{int(ts(2026, 10, 18, h, 0))}" for h in (11, 12, 13)])
+
+    def test_jitter_is_stable_and_bounded(self):
+        offsets = {RecurringJobs.jitter_for("a", t, 30) for t in range(0, 36000, 3600)}
+        self.assertTrue(all(0 <= o <= 30 for o in offsets))
+        self.assertEqual(RecurringJobs.jitter_for("a", 3600, 30), RecurringJobs.jitter_for("a", 3600, 30))
+
+    def test_add_validates(self):
+        with self.assertRaises(ValueError):
+            self.recurring.add("x", "not cron", "wf")
+        with self.assertRaises(ValueError):
+            self.recurring.add("x", "@hourly", "wf", missed="sometimes")
+        spec = self.recurring.add("x", "@hourly", "wf", jitter=5)
+        self.mock_op.inspect_redis.assert_called_with(["HSET", RecurringJobs.KEY_SPECS, "x", json.dumps(spec)])
+
+    def test_materialize_if_due_throttles(self):
+        self.mock_op.redis.return_value = []
+        self.recurring.materialize_if_due(1000.0)
+        self.recurring.materialize_if_due(1010.0)
+        self.assertEqual(self.mock_op.redis.call_count, 1) # specs read once
+
+class TestSchedulerRecurring(unittest.TestCase):
+    @patch('n8n_factory.scheduler.RecurringJobs')
+    @patch('n8n_factory.scheduler.SlotSemaphore')
+    @patch('n8n_factory.scheduler.PhaseGate')
+    @patch('n8n_factory.scheduler.QueueManager')
+    @patch('n8n_factory.scheduler.SystemOperator')
+    def test_leader_materialises(self, MockOp, MockQueue, MockGate, MockSlots, MockRecurring):
+        from n8n_factory.scheduler import Scheduler
+        MockOp.return_value.count_active_executions.return_value = 0
+        MockQueue.return_value.size.return_value = 0
+        MockQueue.return_value.delayed_size.return_value = 0
+        MockGate.return_value.release_ready.return_value = 0
+        scheduler = Scheduler(concurrency=1)
+        scheduler._tick()
+        MockRecurring.return_value.materialize_if_due.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import io
+import json
+import socket
+import threading
+import unittest
+from unittest.mock import patch
+from n8n_factory.operator import SystemOperator, RedisPipeline, format_raw
+from n8n_factory.resp import RedisConnection, RedisError, encode_command, read_reply, pairs_to_dict
+
+
+class TestRespProtocol(unittest.TestCase):
+    def test_encode_command(self):
+        self.assertEqual(encode_command(["SET", "k", 5]), b"*3\r\n$3\r\nSET\r\n$1\r\nk\r\n$1\r\n5\r\n")
+
+    def test_read_typed_replies(self):
+        stream = io.BytesIO(b"+OK\r\n:42\r\n$-1\r\n$11\r\nline1\nline2\r\n*2\r\n$1\r\na\r\n-ERR wrong type\r\n")
+        self.assertEqual(read_reply(stream), "OK")
+        self.assertEqual(read_reply(stream), 42)
+        self.assertIsNone(read_reply(stream))
+        self.assertEqual(read_reply(stream), b"line1\nline2")
+        nested = read_reply(stream)
+        self.assertEqual(nested[0], b"a")
+        self.assertIsInstance(nested[1], RedisError)
+
+    def test_truncated_reply_raises(self):
+        with self.assertRaises(RedisError):
+            read_reply(io.BytesIO(b"$10\r\nabc"))
+
+    def test_pairs_to_dict(self):
+        self.assertEqual(pairs_to_dict(["a", "1", "b", "2"]), {"a": "1", "b": "2"})
+        self.assertEqual(pairs_to_dict(None), {})
+
+    def test_format_raw_matches_redis_cli(self):
+        self.assertEqual(format_raw([b"a", None, 3]), "a\n\n3")
+
+
+class FakeRedis:
+    """
+    Answers every command with its argument count, or an error for BAD. CLOSE is
+    answered and then the connection is closed (like an idle timeout); HANGUP
+    (or the command named by hangup_on) closes it without answering.
+    """
+
+    def __init__(self, hangup_on: bytes = b"HANGUP"):
+        self.hangup_on = hangup_on
+        self.server = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(2)
+        self.port = self.server.getsockname()[1]
+        self.commands = []
+        self.closed = threading.Event()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            conn, _ = self.server.accept()
+            stream = conn.makefile("rb")
+            while True:
+                command = read_reply(stream) if stream.peek(1) else None
+                if command is None:
+                    break
+                self.commands.append(command)
+                if command[0] == self.hangup_on:
+                    break
+                conn.sendall(b"-ERR bad\r\n" if command[0] == b"BAD" else b":%d\r\n" % len(command))
+                if command[0] == b"CLOSE":
+                    break
+            stream.close()
+            conn.close()
+            self.closed.set()
+
+
+class TestRedisConnection(unittest.TestCase):
+    def test_pipeline_round_trip(self):
+        fake = FakeRedis()
+        conn = RedisConnection("127.0.0.1", fake.port)
+        try:
+            replies = conn.pipeline([["PING"], ["BAD"], ["SET", "k", "v"]])
+            self.assertEqual(replies[0], 1)
+            self.assertIsInstance(replies[1], RedisError)
+            self.assertEqual(replies[2], 3)
+            with self.assertRaises(RedisError):
+                conn.execute("BAD")
+        finally:
+            conn.close()
+        self.assertEqual(fake.commands[2], [b"SET", b"k", b"v"])
+
+    def test_reconnects_when_idle_connection_was_closed(self):
+        fake = FakeRedis()
+        conn = RedisConnection("127.0.0.1", fake.port, timeout=5)
+        try:
+            self.assertEqual(conn.execute("CLOSE"), 1)
+            self.assertTrue(fake.closed.wait(5))
+            self.assertEqual(conn.execute("INCR", "k"), 2)
+        finally:
+            conn.close()
+        self.assertEqual(fake.commands, [[b"CLOSE"], [b"INCR", b"k"]])
+
+    def test_written_commands_are_not_resent(self):
+        fake = FakeRedis()
+        conn = RedisConnection("127.0.0.1", fake.port, timeout=5)
+        try:
+            conn.execute("PING")
+            with self.assertRaises(RedisError):
+                conn.pipeline([["INCR", "k"], ["HANGUP"]])
+        finally:
+            conn.close()
+        self.assertEqual(fake.commands, [[b"PING"], [b"INCR", b"k"], [b"HANGUP"]])
+
+    def test_failed_setup_closes_connection(self):
+        fake = FakeRedis(hangup_on=b"AUTH")
+        conn = RedisConnection("127.0.0.1", fake.port, password="secret", timeout=5)
+        with self.assertRaisesRegex(RedisError, "setup failed"):
+            conn.execute("PING")
+        self.assertIsNone(conn._sock)
+        self.assertEqual(fake.commands, [[b"AUTH", b"secret"]])
+
+    def test_connection_refused(self):
+        probe = socket.socket()
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        with self.assertRaises(RedisError):
+            RedisConnection("127.0.0.1", port, timeout=1).execute("PING")
+
+
+class TestOperatorTypedRedis(unittest.TestCase):
+    def setUp(self):
+        with patch.dict("os.environ", {}, clear=True):
+            self.op = SystemOperator()
+
+    def test_redis_via_cli_keeps_types(self):
+        with patch.object(self.op, "inspect_redis", return_value=json.dumps([["a\nb", None]])) as mock_cli:
+            self.assertEqual(self.op.redis(["LRANGE", "k", 0, -1]), ["a\nb", None])
+        args = mock_cli.call_args[0][0]
+        self.assertEqual(args[:3], ["EVAL", RedisPipeline.SCRIPT, "0"])
+        self.assertEqual(json.loads(args[3]), [["LRANGE", "k", "0", "-1"]])
+
+    def test_redis_errors_raise(self):
+        with patch.object(self.op, "inspect_redis", return_value=json.dumps([{"err": "WRONGTYPE"}])):
+            with self.assertRaises(RedisError):
+                self.op.redis(["LLEN", "k"])
+        with patch.object(self.op, "inspect_redis", return_value="Redis command failed: Docker command not found."):
+            with self.assertRaises(RedisError):
+                self.op.redis(["LLEN", "k"])
+
+    def test_direct_connection_used_when_host_set(self):
+        fake = FakeRedis()
+        with patch.dict("os.environ", {"REDIS_HOST": "127.0.0.1", "REDIS_PORT": str(fake.port)}, clear=True):
+            op = SystemOperator()
+        try:
+            self.assertEqual(op.redis(["LLEN", "k"]), 2)
+            self.assertEqual(op.inspect_redis(["LLEN", "k"]), "2")
+        finally:
+            op.redis_connection().close()
+
+
+if __name__ == '__main__':
+    unittest.main()
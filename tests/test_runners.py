@@ -0,0 +1,109 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+from n8n_factory.runners import CliRunner, WebhookRunner, WorkflowRunner, create_runner
+from n8n_factory.scheduler import Scheduler
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, so the session can reuse connections
+    requests_seen = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        _WebhookHandler.requests_seen.append((self.path, self.headers.get("X-Batch-Size"), json.loads(body or b"{}")))
+        status = 404 if self.path.endswith("missing") else 200
+        payload = b'{"message":"Workflow was started"}'
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestRunners(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _WebhookHandler)
+        threading.Thread(target=cls.httpd.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.httpd.server_address[1]}/webhook"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+
+    def setUp(self):
+        _WebhookHandler.requests_seen = []
+
+    def test_cli_runner_modes(self):
+        op = MagicMock()
+        runner = CliRunner(op)
+        runner.run({"workflow": "wf1", "mode": "id"}, {"BATCH_SIZE": "5"}, broker_port=7000)
+        op.execute_workflow.assert_called_with(workflow_id="wf1", env={"BATCH_SIZE": "5"}, broker_port=7000)
+        runner.run({"workflow": "w.json", "mode": "file"}, {})
+        op.execute_workflow.assert_called_with(file_path="w.json", env={}, broker_port=None)
+
+    def test_runner_must_implement_run(self):
+        with self.assertRaises(TypeError):
+            WorkflowRunner()
+
+        class Incomplete(WorkflowRunner):
+            name = "incomplete"
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_webhook_runner_posts_inputs(self):
+        runner = WebhookRunner(self.base_url)
+        job = {"workflow": "wf1", "mode": "id", "inputs": {"a": 1}, "meta": {"webhook_path": "orders/import"}}
+        res = runner.run(job, {"BATCH_SIZE": "25"})
+        runner.run({"workflow": "wf2", "mode": "id"}, {"BATCH_SIZE": "25"})
+        runner.close()
+        self.assertIn("Workflow was started", res)
+        self.assertEqual(_WebhookHandler.requests_seen[0], ("/webhook/orders/import", "25", {"a": 1}))
+        self.assertEqual(_WebhookHandler.requests_seen[1][0], "/webhook/wf2")
+
+    def test_webhook_runner_failures(self):
+        runner = WebhookRunner(self.base_url)
+        self.assertTrue(runner.run({"workflow": "missing", "mode": "id"}, {}).startswith("Execution failed: HTTP 404"))
+        self.assertTrue(WebhookRunner("http://127.0.0.1:1").run({"workflow": "x", "mode": "id"}, {}).startswith("Execution failed"))
+
+    def test_webhook_runner_file_mode_falls_back(self):
+        op = MagicMock()
+        runner = create_runner("webhook", op, webhook_url=self.base_url)
+        runner.run({"workflow": "w.json", "mode": "file"}, {})
+        op.execute_workflow.assert_called_once()
+        with self.assertRaises(ValueError):
+            create_runner("grpc", op)
+
+class TestBackgroundDispatch(unittest.TestCase):
+    @patch('n8n_factory.scheduler.SystemOperator')
+    @patch('n8n_factory.scheduler.QueueManager')
+    @patch('n8n_factory.scheduler.AdaptiveBatchSizer')
+    @patch('n8n_factory.scheduler.PhaseGate')
+    @patch('n8n_factory.scheduler.RateLimiter')
+    def test_tick_does_not_wait_for_jobs(self, MockLimiter, MockGate, MockSizer, MockQueue, MockOp):
+        release = threading.Event()
+        MockOp.return_value.count_active_executions.return_value = 0
+        MockOp.return_value.execute_workflow.side_effect = lambda **kwargs: release.wait(5) and "OK"
+        MockQueue.return_value.size.return_value = 2
+        MockQueue.return_value.delayed_size.return_value = 0
+        MockQueue.return_value.dequeue.side_effect = [{"workflow": "a", "mode": "id"}, {"workflow": "b", "mode": "id"}]
+        MockLimiter.return_value.acquire.return_value = 0
+        MockGate.return_value.release_ready.return_value = 0
+        MockSizer.return_value.get_batch_size.return_value = 10
+
+        scheduler = Scheduler(concurrency=2, dispatch_threads=2)
+        scheduler.history = MagicMock()
+        scheduler.slots = MagicMock()
+        scheduler.slots.acquire.return_value = ["l1", "l2"]
+
+        scheduler._tick() # returns while both jobs are still running
+        scheduler.slots.release.assert_not_called()
+
+        release.set()
+        scheduler.dispatcher.shutdown(wait=True)
+        self.assertEqual(MockOp.return_value.execute_workflow.call_count, 2)
+        self.assertEqual(scheduler.slots.release.call_count, 2)
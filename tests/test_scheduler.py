@@ -1,10 +1,13 @@
 import unittest
 from unittest.mock import MagicMock, patch, ANY
 import json
+import os
+import signal
 import n8n_factory.scheduler
 print(f"DEBUG: Loaded scheduler from {n8n_factory.scheduler.__file__}")
 
 from n8n_factory.queue_manager import QueueManager
+from n8n_factory.resp import RedisError
 from n8n_factory.scheduler import Scheduler
 
 class TestQueueManager(unittest.TestCase):
@@ -13,16 +16,16 @@ class TestQueueManager(unittest.TestCase):
         self.queue = QueueManager(operator=self.mock_op)
 
     def test_enqueue(self):
-        self.mock_op.inspect_redis.return_value = "1"
+        self.mock_op.inspect_redis.return_value = json.dumps([1, 1])
         self.queue.enqueue("workflow_1")
-        # Check that LPUSH is called. inspecting the exact JSON string is brittle due to timestamp
-        # So we verify the call structure and key payload attributes
-        self.mock_op.inspect_redis.assert_called()
-        args = self.mock_op.inspect_redis.call_args[0][0]
-        self.assertEqual(args[0], "LPUSH")
-        self.assertEqual(args[1], "n8n_factory:job_queue")
-        
-        payload = json.loads(args[2])
+        # One pipelined round-trip: payload into the jobs hash, id onto the queue
+        self.mock_op.inspect_redis.assert_called_once()
+        hset, lpush = json.loads(self.mock_op.inspect_redis.call_args[0][0][3])
+        self.assertEqual(lpush[:2], ["LPUSH", "n8n_factory:job_queue"])
+        self.assertEqual(hset[:3], ["HSET", QueueManager.JOBS_KEY, lpush[2]])
+
+        payload = json.loads(hset[3])
+        self.assertEqual(payload["id"], lpush[2])
         self.assertEqual(payload["workflow"], "workflow_1")
         self.assertEqual(payload["mode"], "id")
         self.assertEqual(payload["retries"], 0)
@@ -30,19 +33,38 @@ class TestQueueManager(unittest.TestCase):
         self.assertIn("timestamp", payload)
 
     def test_dequeue(self):
-        # Sequence: 
-        # 1. ZRANGEBYSCORE (check delayed) -> return empty
-        # 2. RPOP (check regular) -> return job
-        self.mock_op.inspect_redis.side_effect = [
-            "", 
-            '{"workflow": "workflow_1"}'
+        # Sequence:
+        # 1. delayed claim -> nothing ready
+        # 2. pop from the queue -> job
+        self.mock_op.redis.side_effect = [
+            None,
+            b'{"workflow": "workflow_1"}'
         ]
         job = self.queue.dequeue()
         self.assertEqual(job["workflow"], "workflow_1")
 
     def test_size(self):
-        self.mock_op.inspect_redis.return_value = "5"
+        self.mock_op.redis.return_value = 5
         self.assertEqual(self.queue.size(), 5)
+        self.mock_op.redis.assert_called_with(["LLEN", QueueManager.QUEUE_KEY])
+
+    def test_size_on_redis_error(self):
+        self.mock_op.redis.side_effect = RedisError("connection refused")
+        self.assertEqual(self.queue.size(), 0)
+
+    def test_list_jobs_pages_typed_payloads(self):
+        # Payloads may contain newlines; they come back as separate bulk strings
+        job = {"workflow": "wf", "inputs": {"text": "line 1\nline 2"}}
+        self.queue.LIST_PAGE_SIZE = 2
+        payload = json.dumps(job).encode()
+        self.mock_op.redis.side_effect = [
+            [b"id1", b"id2"], [payload, payload],  # page 1: ids, then payloads from the jobs hash
+            [payload], [None],                     # page 2: an inline (older) entry
+        ]
+        self.assertEqual(self.queue.list_jobs(limit=3), [job] * 3)
+        pages = [c[0][0] for c in self.mock_op.redis.call_args_list if c[0][0][0] == "LRANGE"]
+        self.assertEqual(pages, [["LRANGE", QueueManager.QUEUE_KEY, 0, 1], ["LRANGE", QueueManager.QUEUE_KEY, 2, 3]])
+        self.mock_op.redis.assert_any_call(["HMGET", QueueManager.JOBS_KEY, b"id1", b"id2"], decode=False)
 
 class TestScheduler(unittest.TestCase):
     @patch('n8n_factory.scheduler.SystemOperator')
@@ -57,12 +79,14 @@ class TestScheduler(unittest.TestCase):
         mock_gate = MockGate.return_value
         
         # Scenario: 1 active, conc=5 -> 4 slots. Queue has 1 job.
-        mock_op.get_active_executions.return_value = [{"id": "1"}]
+        mock_op.count_active_executions.return_value = 1
         mock_queue.size.return_value = 1
         mock_queue.delayed_size.return_value = 0
         mock_queue.dequeue.return_value = {"workflow": "wf1", "mode": "id"}
         mock_sizer.get_batch_size.return_value = 10
         mock_gate.can_run.return_value = True
+        mock_gate.release_ready.return_value = 0
+        mock_op.redis.return_value = ["lease-1"] # SlotSemaphore grants one lease
         
         scheduler = Scheduler(concurrency=5)
         # Manually attach mocks if not injected by init (init creates new instances)
@@ -101,7 +125,10 @@ class TestScheduler(unittest.TestCase):
         mock_op = MockOp.return_value
         mock_queue = MockQueue.return_value
         
-        mock_op.get_active_executions.return_value = [{"id": i} for i in range(5)]
+        mock_op.count_active_executions.return_value = 5
+        mock_queue.size.return_value = 1
+        mock_queue.delayed_size.return_value = 0
+        MockGate.return_value.release_ready.return_value = 0
         
         scheduler = Scheduler(concurrency=5)
         scheduler.queue = mock_queue
@@ -113,5 +140,79 @@ class TestScheduler(unittest.TestCase):
         # Assert
         mock_queue.dequeue.assert_not_called()
 
+    @patch('n8n_factory.scheduler.SystemOperator')
+    @patch('n8n_factory.scheduler.QueueManager')
+    @patch('n8n_factory.scheduler.AdaptiveBatchSizer')
+    @patch('n8n_factory.scheduler.PhaseGate')
+    def test_tick_reconciles_db_occasionally(self, MockGate, MockSizer, MockQueue, MockOp):
+        mock_op = MockOp.return_value
+        mock_op.count_active_executions.return_value = 2
+        mock_queue = MockQueue.return_value
+        mock_queue.size.return_value = 0
+        mock_queue.delayed_size.return_value = 0
+        MockGate.return_value.release_ready.return_value = 0
+
+        scheduler = Scheduler(concurrency=5)
+        scheduler.slots = MagicMock()
+        scheduler.slots.in_use.return_value = 0
+        scheduler._tick()
+        scheduler._tick()
+
+        # Slots come from the semaphore; the DB only corrects drift once per reconcile interval
+        mock_op.count_active_executions.assert_called_once_with(limit=10)
+        mock_op.get_active_executions.assert_not_called()
+        scheduler.slots.reconcile.assert_called_once_with(2, ttl_ms=60000)
+        self.assertEqual(scheduler._db_active, 2)
+
+        scheduler._last_reconcile = 0
+        mock_op.count_active_executions.return_value = None # DB unreachable
+        scheduler._tick()
+        self.assertEqual(scheduler._db_active, 2)
+        scheduler.slots.reconcile.assert_called_once()
+
+    @patch('n8n_factory.scheduler.SystemOperator')
+    @patch('n8n_factory.scheduler.QueueManager')
+    @patch('n8n_factory.scheduler.AdaptiveBatchSizer')
+    @patch('n8n_factory.scheduler.PhaseGate')
+    def test_tick_uses_released_slots_before_reconcile(self, MockGate, MockSizer, MockQueue, MockOp):
+        mock_op = MockOp.return_value
+        mock_op.count_active_executions.return_value = 5 # stale: every slot was busy
+        mock_op.execute_workflow.return_value = "OK"
+        mock_queue = MockQueue.return_value
+        mock_queue.size.return_value = 1
+        mock_queue.delayed_size.return_value = 0
+        mock_queue.dequeue.side_effect = [{"workflow": "wf1", "mode": "id"}]
+        MockSizer.return_value.get_batch_size.return_value = 10
+        MockGate.return_value.can_run.return_value = True
+        MockGate.return_value.release_ready.return_value = 0
+
+        scheduler = Scheduler(concurrency=5)
+        scheduler.history = MagicMock()
+        scheduler.slots = MagicMock()
+        scheduler.slots.acquire.return_value = ["lease-1"] # a job finished and returned its lease
+        scheduler.slots.in_use.return_value = 4
+        scheduler._tick()
+
+        scheduler.slots.acquire.assert_called_once_with(1)
+        mock_op.execute_workflow.assert_called_once()
+        scheduler.slots.release.assert_called_once_with("lease-1")
+
+    @patch('n8n_factory.scheduler.SystemOperator')
+    @patch('n8n_factory.scheduler.QueueManager')
+    @patch('n8n_factory.scheduler.AdaptiveBatchSizer')
+    @patch('n8n_factory.scheduler.PhaseGate')
+    def test_sigterm_flushes_cursors(self, MockGate, MockSizer, MockQueue, MockOp):
+        scheduler = Scheduler(concurrency=1, poll_interval=0)
+        scheduler.history = MagicMock()
+        scheduler._tick = MagicMock(side_effect=lambda: os.kill(os.getpid(), signal.SIGTERM))
+        previous = signal.getsignal(signal.SIGTERM)
+
+        scheduler.start()
+
+        scheduler._tick.assert_called_once()
+        MockQueue.return_value.flush_cursors.assert_called_once()
+        scheduler.history.close.assert_called_once()
+        self.assertIs(signal.getsignal(signal.SIGTERM), previous)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -3,8 +3,13 @@ from unittest.mock import MagicMock, patch, ANY
 import time
 import json
 from typing import Any
-from n8n_factory.queue_manager import QueueManager
+from n8n_factory.queue_manager import QueueManager, JobCodec
 from n8n_factory.scheduler import Scheduler
+from n8n_factory.resp import RedisError
+
+def pipelined(mock_op):
+    """The commands of the last pipelined batch sent through inspect_redis."""
+    return json.loads(mock_op.inspect_redis.call_args[0][0][3])
 
 class TestQueueManagerAdvanced(unittest.TestCase):
     def setUp(self):
@@ -12,50 +17,145 @@ class TestQueueManagerAdvanced(unittest.TestCase):
         self.queue = QueueManager(operator=self.mock_op)
 
     def test_enqueue_delayed(self):
+        self.mock_op.inspect_redis.return_value = json.dumps([1, 1])
         self.queue.enqueue("wf1", delay=5000)
-        # Check ZADD called
-        self.mock_op.inspect_redis.assert_called()
-        args = self.mock_op.inspect_redis.call_args[0][0]
-        self.assertEqual(args[0], "ZADD")
-        self.assertEqual(args[1], "n8n_factory:job_queue:delayed")
+        # Payload stored under the job id, only the id goes in the ZSET
+        hset, zadd = pipelined(self.mock_op)
+        self.assertEqual(hset[:2], ["HSET", QueueManager.JOBS_KEY])
+        job = json.loads(hset[3])
+        self.assertEqual(hset[2], job["id"])
+        self.assertEqual(zadd[0], "ZADD")
+        self.assertEqual(zadd[1], "n8n_factory:job_queue:delayed")
         # Timestamp should be in future
-        self.assertTrue(float(args[2]) > time.time() * 1000)
+        self.assertTrue(float(zadd[2]) > time.time() * 1000)
+        self.assertEqual(zadd[3], job["id"])
 
     def test_dequeue_priority(self):
-        # Scenario: ZRANGEBYSCORE returns a job
-        job_json = json.dumps({"workflow": "delayed_wf"})
-        self.mock_op.inspect_redis.side_effect = [
-            job_json, # ZRANGEBYSCORE result
-            "1"       # ZREM result
-        ]
-        
+        # Scenario: a delayed job is ready
+        self.mock_op.redis.return_value = json.dumps({"workflow": "delayed_wf"})
+
         job = self.queue.dequeue()
         self.assertEqual(job["workflow"], "delayed_wf")
-        # Verify calls
-        calls = self.mock_op.inspect_redis.call_args_list
-        self.assertEqual(calls[0][0][0][0], "ZRANGEBYSCORE")
-        self.assertEqual(calls[1][0][0][0], "ZREM")
+        args = self.mock_op.redis.call_args[0][0]
+        self.assertEqual(args[:2], ["EVAL", QueueManager.CLAIM_DELAYED_SCRIPT])
+        self.assertEqual(args[3:5], [QueueManager.DELAYED_KEY, QueueManager.JOBS_KEY])
+        self.mock_op.redis.assert_called_once()
 
     def test_dequeue_fallback(self):
-        # Scenario: ZRANGEBYSCORE returns empty, RPOP returns job
-        self.mock_op.inspect_redis.side_effect = [
-            "",       # ZRANGEBYSCORE result (empty)
-            json.dumps({"workflow": "regular_wf"}) # RPOP result
-        ]
-        
+        # Scenario: no delayed job ready, the queue has one
+        self.mock_op.redis.side_effect = [None, json.dumps({"workflow": "regular_wf"}).encode()]
+
         job = self.queue.dequeue()
         self.assertEqual(job["workflow"], "regular_wf")
-        
+        args = self.mock_op.redis.call_args[0][0]
+        self.assertEqual(args[:5], ["EVAL", QueueManager.POP_SCRIPT, "2", QueueManager.QUEUE_KEY, QueueManager.JOBS_KEY])
+
+    def test_promote_delayed(self):
+        self.mock_op.inspect_redis.return_value = "3"
+        self.assertEqual(self.queue.promote_delayed(limit=50), 3)
+        args = self.mock_op.inspect_redis.call_args[0][0]
+        self.assertEqual(args[3:5], [QueueManager.DELAYED_KEY, QueueManager.QUEUE_KEY])
+        self.assertEqual(args[-1], "50")
+
+    def test_dequeue_without_delayed(self):
+        self.mock_op.redis.return_value = json.dumps({"workflow": "wf"})
+        self.assertEqual(self.queue.dequeue(include_delayed=False), {"workflow": "wf"})
+        self.mock_op.redis.assert_called_once_with(["EVAL", QueueManager.POP_SCRIPT, "2", QueueManager.QUEUE_KEY, QueueManager.JOBS_KEY], decode=False)
+
+    def test_remove_by_id(self):
+        self.mock_op.inspect_redis.return_value = "1"
+        self.assertTrue(self.queue.remove("abc"))
+        args = self.mock_op.inspect_redis.call_args[0][0]
+        self.assertEqual(args[3:], [QueueManager.QUEUE_KEY, QueueManager.DELAYED_KEY, QueueManager.JOBS_KEY, "abc"])
+
+    def test_job_codecs_round_trip(self):
+        job = {"id": "a1", "workflow": "wf", "inputs": {"text": "x" * 500}, "meta": {}, "retries": 0}
+        for binary in (False, True):
+            codec = JobCodec("zlib", binary=binary)
+            payload = codec.encode(job)
+            self.assertLess(len(payload), len(json.dumps(job)))
+            self.assertEqual(JobCodec.decode(payload), job)
+        # Plain JSON written by older versions still decodes
+        self.assertEqual(JobCodec.decode(json.dumps(job).encode()), job)
+        with self.assertRaises(ValueError):
+            JobCodec("xml")
+
     def test_cursor_operations(self):
         self.queue.set_cursor("run1", "step", 5)
         self.mock_op.inspect_redis.assert_called_with(["HSET", "n8n_factory:cursors:run1", "step", "5"])
         
-        self.queue.get_cursor("run1", "step")
-        self.mock_op.inspect_redis.assert_called_with(["HGET", "n8n_factory:cursors:run1", "step"])
+        self.mock_op.redis.return_value = "5"
+        self.assertEqual(self.queue.get_cursor("run1", "step"), "5")
+        self.mock_op.redis.assert_called_with(["HGET", "n8n_factory:cursors:run1", "step"])
         
         self.queue.reset_cursors("run1")
         self.mock_op.inspect_redis.assert_called_with(["DEL", "n8n_factory:cursors:run1"])
 
+    def test_cursor_writes_coalesced(self):
+        self.queue.cursor_flush_interval = 60
+        self.queue.set_cursor("run1", "step", 1)
+        self.queue.set_cursor("run1", "step", 2)
+        self.queue.set_cursor("run2", "step", 7)
+        self.mock_op.inspect_redis.assert_not_called()
+        self.assertEqual(self.queue.get_cursor("run1", "step"), "2")
+
+        self.mock_op.inspect_redis.return_value = "[1,1]"
+        self.queue.flush_cursors()
+        self.mock_op.inspect_redis.assert_called_once()
+        args = self.mock_op.inspect_redis.call_args[0][0]
+        self.assertEqual(json.loads(args[3]), [
+            ["HSET", "n8n_factory:cursors:run1", "step", "2"],
+            ["HSET", "n8n_factory:cursors:run2", "step", "7"],
+        ])
+
+    def test_get_cursors_bulk(self):
+        self.mock_op.inspect_redis.return_value = json.dumps([["step", "3"], {}])
+        cursors = self.queue.get_cursors_bulk(["run1", "run2"])
+        self.assertEqual(cursors, {"run1": {"step": "3"}, "run2": {}})
+        self.mock_op.inspect_redis.assert_called_once()
+
+    def test_enqueue_with_idempotency_key(self):
+        self.mock_op.inspect_redis.return_value = "3"
+        res = self.queue.enqueue("wf1", idempotency_key="order-42", dedup_window=60)
+        self.assertEqual(res, "3")
+
+        args = self.mock_op.inspect_redis.call_args[0][0]
+        self.assertEqual(args[0], "EVAL")
+        self.assertEqual(args[3:7], ["n8n_factory:dedup:order-42", "n8n_factory:job_queue", "n8n_factory:stats:dedup",
+                                     QueueManager.JOBS_KEY])
+        self.assertEqual(args[7], "60")
+        job = json.loads(args[8])
+        self.assertEqual(job["idempotency_key"], "order-42")
+        self.assertEqual(args[9], "")
+        self.assertEqual(args[10], job["id"])
+
+    def test_enqueue_duplicate_rejected(self):
+        self.mock_op.inspect_redis.return_value = "-1"
+        self.assertIsNone(self.queue.enqueue("wf1", idempotency_key="order-42"))
+
+    def test_enqueue_dedup_derives_stable_key(self):
+        self.mock_op.inspect_redis.return_value = "1"
+        self.queue.enqueue("wf1", inputs={"b": 2, "a": 1}, meta={"phase": "1"}, dedup=True, delay=1000)
+        first = self.mock_op.inspect_redis.call_args[0][0]
+        self.queue.enqueue("wf1", inputs={"a": 1, "b": 2}, meta={"phase": "1"}, dedup=True, delay=1000)
+        second = self.mock_op.inspect_redis.call_args[0][0]
+
+        self.assertEqual(first[3], second[3])
+        self.assertTrue(first[3].startswith("n8n_factory:dedup:wf1:"))
+        # Delayed jobs go to the ZSET with a ready time
+        self.assertEqual(first[4], "n8n_factory:job_queue:delayed")
+        self.assertTrue(float(first[9]) > time.time() * 1000)
+
+        self.queue.enqueue("wf1", inputs={"a": 1, "b": 2}, meta={"phase": "2"}, dedup=True)
+        self.assertNotEqual(first[3], self.mock_op.inspect_redis.call_args[0][0][3])
+
+    def test_dedup_stats(self):
+        self.mock_op.redis.return_value = ["accepted", "10", "rejected", "4"]
+        self.assertEqual(self.queue.dedup_stats(), {"accepted": 10, "rejected": 4})
+        self.mock_op.redis.assert_called_once_with(["HGETALL", QueueManager.DEDUP_STATS_KEY])
+        self.mock_op.redis.side_effect = RedisError("connection refused")
+        self.assertEqual(self.queue.dedup_stats(), {"accepted": 0, "rejected": 0})
+
 class TestSchedulerAdvanced(unittest.TestCase):
     @patch('n8n_factory.scheduler.SystemOperator')
     @patch('n8n_factory.scheduler.QueueManager')
@@ -4,6 +4,7 @@ import json
 import os
 from n8n_factory.scheduler import Scheduler
 from n8n_factory.control_plane import PhaseGate, AutoRefiller
+from n8n_factory.resp import RedisError
 
 class TestSchedulerIntegration(unittest.TestCase):
     @patch('n8n_factory.scheduler.SystemOperator')
@@ -40,7 +41,7 @@ class TestSchedulerIntegration(unittest.TestCase):
         self.assertEqual(env['N8N_BATCH_SIZE'], "42")
 
         # Check stats update
-        mock_sizer.update_stats.assert_called_with(ANY, success=True)
+        mock_sizer.update_stats.assert_called_with(ANY, success=True, group=mock_sizer.group_for.return_value)
 
     @patch('n8n_factory.scheduler.SystemOperator')
     @patch('n8n_factory.scheduler.QueueManager')
@@ -63,7 +64,8 @@ class TestSchedulerIntegration(unittest.TestCase):
         
         # Assertions
         mock_gate.can_run.assert_called_with("r1", "2")
-        mock_queue.requeue.assert_called_with(job, delay=10000)
+        mock_gate.park.assert_called_with(job)
+        mock_queue.requeue.assert_not_called()
 
     @patch('n8n_factory.scheduler.SystemOperator')
     @patch('n8n_factory.scheduler.QueueManager')
@@ -74,6 +76,9 @@ class TestSchedulerIntegration(unittest.TestCase):
         mock_queue = MockQueue.return_value
         mock_refiller = MockRefiller.return_value
         
+        MockOp.return_value.count_active_executions.return_value = 0
+        MockGate.return_value.release_ready.return_value = 0
+        MockSizer.return_value.get_batch_size.return_value = 10
         scheduler = Scheduler(refill_command="python refill.py", refill_threshold=10)
         scheduler.queue = mock_queue
         scheduler.refiller = mock_refiller
@@ -89,6 +94,32 @@ class TestSchedulerIntegration(unittest.TestCase):
         
         mock_refiller.check_and_refill.assert_called_with(5, 10, "python refill.py")
 
+    @patch('n8n_factory.scheduler.SystemOperator')
+    @patch('n8n_factory.scheduler.QueueManager')
+    @patch('n8n_factory.scheduler.AdaptiveBatchSizer')
+    @patch('n8n_factory.scheduler.PhaseGate')
+    @patch('n8n_factory.scheduler.RateLimiter')
+    def test_rate_limited_job_is_deferred(self, MockLimiter, MockGate, MockSizer, MockQueue, MockOp):
+        mock_op = MockOp.return_value
+        mock_queue = MockQueue.return_value
+        mock_limiter = MockLimiter.return_value
+
+        scheduler = Scheduler()
+        scheduler.operator = mock_op
+        scheduler.queue = mock_queue
+        scheduler.limiter = mock_limiter
+
+        mock_limiter.acquire.return_value = 1500
+
+        job = {"workflow": "wf1", "meta": {"api": "slack"}, "retries": 0}
+        scheduler._execute_job(job)
+
+        mock_limiter.acquire.assert_called_with("wf1", {"api": "slack"})
+        mock_queue.requeue.assert_called_with(job, delay=1500)
+        mock_op.execute_workflow.assert_not_called()
+        # Deferral is not a failure
+        self.assertEqual(job["retries"], 0)
+
 class TestControlPlaneExtras(unittest.TestCase):
     def test_phase_gate_fallback_file(self):
         mock_op = MagicMock()
@@ -96,10 +127,16 @@ class TestControlPlaneExtras(unittest.TestCase):
         
         # 1. Setup Rule
         gate.KEY_RULES = "mock_rules"
-        mock_op.inspect_redis.side_effect = [
-            json.dumps({"dependency": "p1", "condition": "complete"}), # get_rule
-            None # HMGET returns nothing (Redis fail)
-        ]
+        replies = {
+            gate.KEY_RULES_VERSION: "1",
+            gate.KEY_RULES: ["p2", json.dumps({"dependency": "p1", "condition": "complete"})],
+        }
+
+        def redis(cmd):
+            if cmd[1] not in replies:
+                raise RedisError("connection refused") # cursors unavailable
+            return replies[cmd[1]]
+        mock_op.redis.side_effect = redis
         
         # 2. Setup File Fallback
         # We need to mock os.path.exists and open
@@ -0,0 +1,86 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from n8n_factory.models import Recipe, RecipeStep
+from n8n_factory.sim_cache import SimulationCache
+from n8n_factory.simulator import WorkflowSimulator
+
+
+def make_recipe(value="b"):
+    return Recipe(name="Cached", steps=[
+        RecipeStep(id="src", template="webhook", mock=[{"json": {"value": i}} for i in range(5)]),
+        RecipeStep(id="big", template="filter", params={"operator": "larger", "value": 1}),
+        RecipeStep(id="tag", template="set", params={"name": "tag", "value": "a"}),
+        RecipeStep(id="last", template="set", params={"name": "last", "value": value}),
+    ])
+
+
+class TestSimulationCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "cache")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_keys_chain_and_ignore_unrelated_fields(self):
+        step = RecipeStep(id="a", template="set", params={"name": "x"})
+        key = SimulationCache.step_key("", step)
+        self.assertEqual(key, SimulationCache.step_key("", step.model_copy(update={"notes": "n", "assertions": ["True"]})))
+        self.assertNotEqual(key, SimulationCache.step_key("", step.model_copy(update={"params": {"name": "y"}})))
+        self.assertNotEqual(key, SimulationCache.step_key("other", step))
+        self.assertNotEqual(key, SimulationCache.step_key("", step, rendered="return items;"))
+
+    def test_put_and_get_from_disk(self):
+        cache = SimulationCache(self.root)
+        cache.put("ab" * 32, [[{"json": {"a": 1}}], []])
+        fresh = SimulationCache(self.root)
+        self.assertEqual(fresh.get("ab" * 32), [[{"json": {"a": 1}}], []])
+        self.assertIsNone(fresh.get("cd" * 32))
+        self.assertEqual((fresh.hits, fresh.misses), (1, 1))
+        fresh.clear()
+        self.assertFalse(os.path.exists(self.root))
+
+    def test_resimulation_resumes_from_first_changed_step(self):
+        first = WorkflowSimulator(cache=SimulationCache(self.root))
+        history = first.simulate(make_recipe())
+        self.assertEqual(first.cached_steps, [])
+
+        again = WorkflowSimulator(cache=SimulationCache(self.root))
+        self.assertEqual(again.simulate(make_recipe()), [dict(h, cached=True) if h["step_id"] != "src" else h for h in history])
+        self.assertEqual(again.cached_steps, ["big", "tag", "last"])
+
+        changed = WorkflowSimulator(cache=SimulationCache(self.root))
+        with patch.object(WorkflowSimulator, "_run_filter", side_effect=AssertionError("re-simulated")):
+            history = changed.simulate(make_recipe(value="c"))
+        self.assertEqual(changed.cached_steps, ["big", "tag"])
+        self.assertEqual(history[-1]["output"][0]["json"], {"value": 2, "tag": "a", "last": "c"})
+
+    def test_mock_file_changes_invalidate(self):
+        path = os.path.join(self.tmp.name, "data.json")
+        with open(path, "w") as f:
+            json.dump([{"json": {"value": 1}}], f)
+        recipe = Recipe(name="File", steps=[
+            RecipeStep(id="src", template="webhook", mock=f"file:{path}"),
+            RecipeStep(id="tag", template="set", params={"name": "tag", "value": "{{ $json.value }}"}),
+        ])
+        WorkflowSimulator(cache=SimulationCache(self.root)).simulate(recipe)
+        with open(path, "w") as f:
+            json.dump([{"json": {"value": 22}}], f)
+        simulator = WorkflowSimulator(cache=SimulationCache(self.root))
+        history = simulator.simulate(recipe)
+        self.assertEqual(simulator.cached_steps, [])
+        self.assertEqual(history[-1]["output"][0]["json"]["tag"], "22")
+
+    def test_watch_handler_resimulates_with_cache(self):
+        from n8n_factory.commands.watch import RecipeHandler
+        handler = RecipeHandler("recipe.yaml", "templates", simulate=True, cache_dir=self.root)
+        handler.resimulate(make_recipe())
+        handler.resimulate(make_recipe(value="c"))
+        self.assertEqual(handler.simulator.cached_steps, ["big", "tag"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+from n8n_factory.commands.simulate_load import load_payloads, run_load, simulate_load_command, source_step
+from n8n_factory.models import Recipe, RecipeStep
+
+
+def make_recipe():
+    return Recipe(name="Load", steps=[
+        RecipeStep(id="hook", template="webhook", mock=[{"json": {"value": 1}}, {"json": {"value": 5}}]),
+        RecipeStep(id="big", template="filter", params={"operator": "larger", "value": 2}),
+        RecipeStep(id="tag", template="set", params={"name": "tag", "value": "{{ $json.value * 2 }}"}),
+    ])
+
+
+class TestSimulateLoad(unittest.TestCase):
+    def test_streams_schema_items_through_steps(self):
+        schema = {"type": "object", "required": ["value"],
+                  "properties": {"value": {"type": "integer", "minimum": 0, "maximum": 4}}}
+        report = run_load(make_recipe(), 2500, schema=schema, chunk_size=1000, seed=3)
+        self.assertEqual(report["chunks"], 3)
+        self.assertEqual(report["source_step"], "hook")
+        self.assertEqual(report["steps"]["hook"]["items_in"], 2500)
+        self.assertEqual(report["steps"]["hook"]["items_out"], 2500)
+        self.assertEqual(report["steps"]["big"]["items_in"], 2500)
+        self.assertLess(report["steps"]["big"]["items_out"], 2500)
+        self.assertEqual(report["steps"]["tag"]["items_in"], report["steps"]["big"]["items_out"])
+        self.assertIn("peak_kb", report["steps"]["tag"])
+        self.assertGreater(report["peak_kb"], 0)
+        self.assertEqual(report["errors"], 0)
+
+    def test_throughput_pass_is_not_traced(self):
+        from unittest.mock import patch
+        from n8n_factory.simulator import WorkflowSimulator
+        traced = []
+        original = WorkflowSimulator.simulate
+
+        def simulate(sim, *args, **kwargs):
+            traced.append(tracemalloc.is_tracing())
+            return original(sim, *args, **kwargs)
+        with patch.object(WorkflowSimulator, "simulate", simulate):
+            run_load(make_recipe(), 30, chunk_size=10)
+        # Three timed chunks, then one traced chunk for memory
+        self.assertEqual(traced, [False, False, False, True])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_defaults_to_resampling_the_source_mock(self):
+        report = run_load(make_recipe(), 100, chunk_size=40, track_memory=False)
+        self.assertEqual(report["chunks"], 3)
+        self.assertIsNone(report["peak_kb"])
+        self.assertNotIn("peak_kb", report["steps"]["hook"])
+        self.assertEqual(report["steps"]["tag"]["items_in"], report["steps"]["big"]["items_out"])
+
+    def test_source_step_and_payload_files(self):
+        self.assertEqual(source_step(make_recipe()).id, "hook")
+        with self.assertRaises(ValueError):
+            source_step(make_recipe(), "missing")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "payloads.jsonl")
+            with open(path, "w") as f:
+                f.write('{"value": 3}\n{"value": 4}\n')
+            self.assertEqual(load_payloads(path), [{"value": 3}, {"value": 4}])
+
+    def test_command_json_output(self):
+        from io import StringIO
+        from unittest.mock import patch
+        with patch("sys.stdout", new_callable=StringIO) as out:
+            simulate_load_command(make_recipe(), 10, chunk_size=5, json_output=True)
+        self.assertEqual(json.loads(out.getvalue())["items"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import sys
+import xml.etree.ElementTree as ET
+import pytest
+import yaml
+from unittest.mock import patch
+from n8n_factory.commands.simulate_matrix import run_matrix, simulate_matrix_command, write_junit
+
+
+@pytest.fixture
+def matrix(tmp_path):
+    recipes = tmp_path / "recipes"
+    (recipes / "nested").mkdir(parents=True)
+    branching = {
+        "name": "Branching",
+        "steps": [
+            {"id": "src", "template": "webhook"},
+            {"id": "check", "template": "if", "params": {"left": "{{ $json.value }}", "right": "1"}},
+            {"id": "done", "template": "set"},
+        ],
+        "assertions": ["json['value'] == 1"],
+    }
+    (recipes / "branching.yaml").write_text(yaml.dump(branching))
+    (recipes / "nested" / "plain.yml").write_text(yaml.dump({"name": "Plain", "steps": [{"id": "a", "template": "set"}]}))
+
+    fixtures = tmp_path / "fixtures"
+    fixtures.mkdir()
+    (fixtures / "one.json").write_text(json.dumps({"value": 1}))
+    (fixtures / "two.json").write_text(json.dumps({"mocks": {"src": [{"json": {"value": 2}}]}}))
+    return recipes, fixtures
+
+
+def test_matrix_runs_every_combination(matrix):
+    recipes, fixtures = matrix
+    report = run_matrix(str(recipes), str(fixtures / "*.json"), workers=2)
+
+    assert report["summary"]["cases"] == 4
+    cases = {(c["name"], c["fixture"].rsplit("/", 1)[-1]): c for c in report["cases"]}
+    assert cases[("Branching", "one.json")]["status"] == "pass"
+    failed = cases[("Branching", "two.json")]
+    assert failed["status"] == "fail"
+    assert failed["assertions"] == [{"assertion": "json['value'] == 1", "status": "fail"}]
+    assert failed["coverage"]["branches"]["check"] == {"taken": [1], "missed": [0]}
+    # "two.json" mocks a step Plain doesn't have
+    assert cases[("Plain", "two.json")]["status"] == "error"
+    assert all(c["duration_ms"] >= 0 for c in report["cases"])
+    assert report["summary"]["pass"] == 2
+
+
+def test_matrix_reports_every_failed_assertion(tmp_path):
+    recipe = {
+        "name": "Checks",
+        "steps": [
+            {"id": "a", "template": "set", "params": {"name": "x", "value": "1"}, "assertions": ["json['x'] == '2'"]},
+            {"id": "b", "template": "set", "params": {"name": "y", "value": "1"}},
+        ],
+        "assertions": ["json['y'] == '2'"],
+    }
+    (tmp_path / "checks.yaml").write_text(yaml.dump(recipe))
+    report = run_matrix(str(tmp_path), None, workers=1)
+
+    case = report["cases"][0]
+    assert case["status"] == "fail"
+    assert [a["status"] for a in case["assertions"]] == ["fail", "fail"]
+
+
+def test_junit_report(matrix, tmp_path):
+    recipes, fixtures = matrix
+    report = run_matrix(str(recipes), str(fixtures / "*.json"), workers=1)
+    path = tmp_path / "junit.xml"
+    write_junit(report, str(path))
+
+    root = ET.parse(path).getroot()
+    assert root.get("tests") == "4"
+    assert root.get("failures") == "1" and root.get("errors") == "1"
+    suite = root.find("testsuite[@name='%s']" % str(recipes / "branching.yaml"))
+    assert suite.get("failures") == "1"
+    failure = suite.find("testcase[@name='two.json']/failure")
+    assert "json['value'] == 1" in failure.text
+
+
+def test_cli_matrix_exit_code(matrix, tmp_path):
+    from n8n_factory.cli import main
+    recipes, fixtures = matrix
+    report_path = tmp_path / "report.json"
+    argv = ["n8n-factory", "simulate", "--matrix", str(recipes), "--fixtures", str(fixtures / "one.json"),
+            "--workers", "1", "--export-json", str(report_path)]
+    with patch.object(sys, 'argv', argv), pytest.raises(SystemExit) as exit_info:
+        main()
+    assert exit_info.value.code == 0
+    assert json.loads(report_path.read_text())["summary"]["pass"] == 2
+
+    assert simulate_matrix_command(str(recipes), str(fixtures / "*.json"), workers=1) is False
@@ -76,3 +76,59 @@ def test_simulator_assertion_fail(caplog):
     
     simulator.simulate(recipe)
     assert "[FAIL] json['val'] == 99" in caplog.text
+
+def _branching_recipe():
+    return Recipe(name="Branches", steps=[
+        RecipeStep(id="src", template="webhook", mock=[{"json": {"value": "a"}}, {"json": {"value": "b"}}, {"json": {"value": "c"}}]),
+        RecipeStep(id="check", template="if", params={"left": "{{ $json.value }}", "right": "a", "operator": "equal"}),
+        RecipeStep(id="yes", template="set", connections_from=[{"node": "check", "index": 0}]),
+        RecipeStep(id="route", template="switch", params={"match_value": "b"}, connections_from=[{"node": "check", "index": 1}]),
+        RecipeStep(id="is_b", template="set", connections_from=[{"node": "route", "index": 0}]),
+        RecipeStep(id="other", template="set", connections_from=[{"node": "route", "index": 1}]),
+        RecipeStep(id="join", template="merge", connections_from=["yes", "is_b", "other"]),
+    ])
+
+def test_simulator_routes_if_and_switch_branches():
+    history = WorkflowSimulator().simulate(_branching_recipe())
+    by_id = {h["step_id"]: h for h in history}
+
+    assert by_id["check"]["branches"] == [1, 2]
+    assert by_id["yes"]["input"] == [{"json": {"value": "a"}}]
+    assert by_id["route"]["branches"] == [1, 1]
+    assert by_id["is_b"]["input"] == [{"json": {"value": "b"}}]
+    assert by_id["other"]["input"] == [{"json": {"value": "c"}}]
+    assert [i["json"]["value"] for i in by_id["join"]["output"]] == ["a", "b", "c"]
+
+def test_simulator_skips_unreachable_steps_and_runs_in_topological_order():
+    recipe = Recipe(name="Order", steps=[
+        RecipeStep(id="end", template="set", connections_from=["check"]),
+        RecipeStep(id="start", template="webhook", mock={"value": 1}, connections_from=[]),
+        RecipeStep(id="check", template="if", params={"left": "{{ $json.value }}", "right": "2"}, connections_from=["start"]),
+        RecipeStep(id="never", template="set", connections_from=[{"node": "check", "index": 1}]),
+    ])
+    history = WorkflowSimulator().simulate(recipe)
+    # check is false, so nothing reaches "end" (true output)
+    assert [h["step_id"] for h in history] == ["start", "check", "never"]
+
+def test_simulator_rejects_cycles(caplog):
+    recipe = Recipe(name="Cycle", steps=[
+        RecipeStep(id="a", template="set", connections_from=["b"]),
+        RecipeStep(id="b", template="set", connections_from=["a"]),
+    ])
+    assert WorkflowSimulator().simulate(recipe) == []
+    assert "Cycle detected" in caplog.text
+
+def test_coverage_reports_branches(tmp_path, capsys):
+    from n8n_factory.commands.coverage import coverage_command
+    recipe = _branching_recipe()
+    recipe.steps[0].mock = {"value": "a"}
+    history_file = tmp_path / "history.json"
+    history_file.write_text(json.dumps(WorkflowSimulator().simulate(recipe)))
+    capsys.readouterr()
+
+    coverage_command(recipe, str(history_file), json_output=True)
+    result = json.loads(capsys.readouterr().out)
+    assert result["branches"]["check"] == {"taken": [0], "missed": [1]}
+    assert result["branches"]["route"] == {"taken": [], "missed": [0, 1]}
+    assert result["branch_coverage_percent"] == 25.0
+    assert sorted(result["missed_steps"]) == ["is_b", "other", "route"]
@@ -0,0 +1,90 @@
+import csv
+import json
+import unittest
+import tempfile
+import os
+from n8n_factory.models import Recipe, RecipeStep
+from n8n_factory.simulator import WorkflowSimulator
+from n8n_factory.sinks import CsvSink, HistorySink, HtmlReportSink, JsonlSink
+
+
+class RecordingSink(HistorySink):
+    def __init__(self):
+        self.events = []
+        self.closed = False
+
+    def write(self, event):
+        self.events.append(event["step_id"])
+
+    def close(self):
+        self.closed = True
+
+
+class TestSinks(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.items = [{"json": {"value": i, "text": "<b>x</b>"}} for i in range(500)]
+        self.recipe = Recipe(name="Sinks", steps=[
+            RecipeStep(id="src", template="webhook", mock=self.items),
+            RecipeStep(id="next", template="set"),
+            RecipeStep(id="boom", template="set", mock_error="Upstream <500>"),
+        ])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_events_stream_as_steps_finish(self):
+        sink = RecordingSink()
+        WorkflowSimulator().simulate(self.recipe, sinks=[sink])
+        self.assertEqual(sink.events, ["src", "next", "boom"])
+        self.assertTrue(sink.closed)
+
+    def test_sinks_must_implement_write(self):
+        class Incomplete(HistorySink):
+            def close(self):
+                pass
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_jsonl_and_csv(self):
+        sim = WorkflowSimulator(history_items=10)
+        sim.simulate(self.recipe, sinks=[JsonlSink(self.path("h.jsonl")), CsvSink(self.path("h.csv"))])
+        with open(self.path("h.jsonl")) as f:
+            events = [json.loads(line) for line in f]
+        self.assertEqual([e["step_id"] for e in events], ["src", "next", "boom"])
+        self.assertEqual(events[0]["output"]["count"], 500)
+        with open(self.path("h.csv"), newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(rows[2]["error"], "Upstream <500>")
+
+    def test_html_truncates_escapes_and_paginates(self):
+        sink = HtmlReportSink(self.path("report.html"), steps_per_page=2, max_items=5, max_chars=300)
+        WorkflowSimulator(history_items=1000).simulate(self.recipe, sinks=[sink])
+        with open(self.path("report.html")) as f:
+            first = f.read()
+        with open(self.path("report.2.html")) as f:
+            second = f.read()
+        self.assertIn("495 more item(s)", first)
+        self.assertIn("truncated", first)
+        self.assertNotIn("<b>x</b>", first)
+        self.assertIn('href="report.2.html"', first)
+        self.assertIn('href="report.html"', second)
+        self.assertIn("Upstream &lt;500&gt;", second)
+        self.assertTrue(first.rstrip().endswith("</html>"))
+
+    def test_report_helpers_replay_history(self):
+        sim = WorkflowSimulator()
+        history = sim.simulate(self.recipe)
+        sim.export_csv(history, self.path("out.csv"))
+        sim.generate_html_report(history, self.path("out.html"))
+        with open(self.path("out.csv"), newline='') as f:
+            self.assertEqual(len(list(csv.DictReader(f))), 3)
+        with open(self.path("out.html")) as f:
+            self.assertIn("boom", f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
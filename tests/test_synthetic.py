@@ -0,0 +1,75 @@
+import unittest
+from n8n_factory.synthetic import ItemStream, compile_schema, item_stream, sample_generator
+import random
+
+
+SCHEMA = {
+    "type": "object",
+    "required": ["id", "email", "amount", "status", "tags"],
+    "properties": {
+        "id": {"type": "string", "format": "uuid"},
+        "email": {"type": "string", "format": "email"},
+        "amount": {"type": "number", "minimum": 10, "maximum": 20},
+        "count": {"type": "integer", "minimum": 1, "maximum": 3},
+        "status": {"enum": ["new", "paid"]},
+        "tags": {"type": "array", "items": {"type": "string", "maxLength": 4}, "maxItems": 2},
+        "address": {"type": "object", "properties": {"zip": {"type": "string", "minLength": 5, "maxLength": 5}}},
+    },
+}
+
+
+class TestSynthetic(unittest.TestCase):
+    def test_schema_values_respect_constraints(self):
+        generate = compile_schema(SCHEMA)
+        rng = random.Random(1)
+        for _ in range(200):
+            value = generate(rng)
+            self.assertEqual(len(value["id"]), 36)
+            self.assertTrue(value["email"].endswith("@example.com"))
+            self.assertTrue(10 <= value["amount"] <= 20)
+            self.assertIn(value["status"], ("new", "paid"))
+            self.assertLessEqual(len(value["tags"]), 2)
+            if "count" in value:
+                self.assertIn(value["count"], (1, 2, 3))
+            if "address" in value and "zip" in value["address"]:
+                self.assertEqual(len(value["address"]["zip"]), 5)
+
+    def test_exclusive_bounds(self):
+        rng = random.Random(2)
+        cases = [
+            ({"type": "integer", "exclusiveMinimum": 0, "exclusiveMaximum": 3}, {1, 2}),
+            ({"type": "integer", "minimum": 0, "maximum": 3, "exclusiveMinimum": True}, {1, 2, 3}),
+            ({"type": "integer", "minimum": 1, "exclusiveMinimum": 0, "maximum": 2}, {1, 2}),
+        ]
+        for schema, expected in cases:
+            generate = compile_schema(schema)
+            self.assertEqual({generate(rng) for _ in range(200)}, expected)
+        generate = compile_schema({"type": "number", "exclusiveMinimum": 0, "exclusiveMaximum": 0.001})
+        self.assertTrue(all(0 < generate(rng) < 0.001 for _ in range(500)))
+        with self.assertRaises(ValueError):
+            compile_schema({"type": "integer", "exclusiveMinimum": 1, "exclusiveMaximum": 2})
+
+    def test_stream_chunks_and_is_seeded(self):
+        stream = ItemStream.from_schema(SCHEMA, count=2500, chunk_size=1000, seed=7)
+        chunks = list(stream)
+        self.assertEqual([len(c) for c in chunks], [1000, 1000, 500])
+        self.assertIn("json", chunks[0][0])
+        self.assertEqual(chunks, list(ItemStream.from_schema(SCHEMA, count=2500, chunk_size=1000, seed=7)))
+
+    def test_samples_are_resampled_per_field(self):
+        samples = [{"json": {"a": 1, "b": "x"}}, {"json": {"a": 2, "b": "y"}}]
+        rng = random.Random(0)
+        generate = sample_generator(samples)
+        values = [generate(rng) for _ in range(100)]
+        self.assertEqual({v["a"] for v in values}, {1, 2})
+        self.assertEqual({v["b"] for v in values}, {"x", "y"})
+
+    def test_item_stream_requires_a_source(self):
+        with self.assertRaises(ValueError):
+            item_stream(10)
+        with self.assertRaises(ValueError):
+            sample_generator([])
+
+
+if __name__ == "__main__":
+    unittest.main()